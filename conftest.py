@@ -5,6 +5,7 @@ import sqlite3
 import pytest
 
 import dbreak
+import dbreak.outputs
 import dbreak.sessions
 
 
@@ -93,3 +94,19 @@ def sql_file(tmp_path):
     file.write_text("SELECT\n 1 as foo;")
 
     return file.absolute()
+
+
+@pytest.fixture()
+def stream_of():
+    """ Factory for ResultStreams of given rows, read in small batches """
+
+    def make_stream(rows, columns=("id", "name"), batch_size=2):
+
+        rows = list(rows)
+
+        return dbreak.outputs.ResultStream(
+            columns=list(columns),
+            batches=(rows[start:start + batch_size] for start in range(0, len(rows), batch_size))
+        )
+
+    return make_stream
@@ -1,3 +1,11 @@
-from .console import start_console
+from .console import start_console, start_console_async
+from .batch import run_batch
 from .connections import ConnectionWrapper
 from .dbapi import DBAPIWrapper
+from .sqlite import SQLiteWrapper
+from .locks import connection_lock
+from .aio import AsyncConnectionWrapper, AsyncDBAPIWrapper
+from .load import run_load
+from .capture import capture_statements, stop_capturing
+from .slowlog import enable_slow_log, disable_slow_log, SlowLogConnection
+from .scratch import configure_scratch
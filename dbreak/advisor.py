@@ -0,0 +1,449 @@
+""" Suggest sqlite indexes for statements whose plans scan whole tables or sort in temp B-trees
+
+For each problem statement, candidate indexes are built from the columns it
+filters and orders on. Each candidate is created inside a savepoint, the
+statement explained again, and the savepoint rolled back, so the database is
+left as it was. Note that creating a candidate still builds the index, which
+takes a while on large tables.
+"""
+
+import collections
+import re
+import sqlite3
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from .capture import StatementCapture, CapturedStatement
+from .outputs import TableOutput
+from .parser import is_read_statement
+from .plans import PlanNode, FULL_SCAN, TEMP_B_TREE
+
+if TYPE_CHECKING:
+    from .sqlite import SQLiteWrapper
+
+# Name of the savepoint candidate indexes are tried in
+_SAVEPOINT_NAME = "dbreak_index_advisor"
+
+# Name given to candidate indexes while they're tried
+_CANDIDATE_INDEX_NAME = "dbreak_index_advisor_candidate"
+
+# Matches string literals, which are removed before looking for column names
+_STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+
+# Matches a column compared for equality (group 1) or a range (group 2)
+_COMPARISON_PATTERN = (
+    r"(?<![\w.])(?:\w+\.)?{column}\s*(?:(=|==|\bIN\b|\bIS\b)|(<=|>=|<|>|\bBETWEEN\b|\bLIKE\b|\bGLOB\b))"
+)
+
+# Matches a table named in a FROM, JOIN or UPDATE clause (group 1), with any alias (group 2)
+_TABLE_REFERENCE_PATTERN = re.compile(
+    r"(?:\b(?:FROM|JOIN|UPDATE)\b|,)\s*([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?",
+    re.IGNORECASE
+)
+
+# Matches the columns listed in an ORDER BY or GROUP BY clause
+_ORDERING_PATTERN = re.compile(
+    r"\b(?:ORDER|GROUP)\s+BY\s+(.*?)(?=\bLIMIT\b|\bHAVING\b|\bORDER\b|\)|;|$)",
+    re.IGNORECASE | re.DOTALL
+)
+
+# The suggestion for a single statement
+IndexAdvice = collections.namedtuple(
+    "IndexAdvice",
+    ["statement", "runs", "problems", "index", "plan_after", "improvement"]
+)
+
+
+def load_statements(path: str) -> StatementCapture:
+    """ Read statements from a file, separated by semicolons
+
+    :param path: Path of the file
+    """
+
+    capture = StatementCapture()
+
+    pending = ""
+
+    with open(path) as file:
+
+        for line in file:
+
+            pending += line
+
+            if sqlite3.complete_statement(pending):
+                capture.record(pending.strip())
+                pending = ""
+
+    if pending.strip():
+        capture.record(pending.strip())
+
+    return capture
+
+
+def advise_indexes(wrapper: "SQLiteWrapper", statements: Iterable[CapturedStatement],
+                   variables: [Mapping[str, object], None] = None) -> List[IndexAdvice]:
+    """ Suggest an index for each statement whose plan does full scans or temp B-tree sorts
+
+    Statements are considered most-run first. Those without problems, or that
+    aren't reads, updates or deletes, are skipped.
+
+    :param wrapper: Connection to the database the statements run against
+    :param statements: Statements to consider
+    :param variables: Values available for binding, keyed by name
+    """
+
+    variables = variables or {}
+
+    advice = []
+
+    for captured in sorted(statements, key=lambda captured: -captured.count):
+
+        statement = captured.example
+
+        if not _is_indexable_statement(statement):
+            continue
+
+        plan = wrapper.explain(statement, variables)
+
+        problems = _find_problems(plan)
+
+        if not problems:
+            continue
+
+        best_index, best_plan = None, plan
+
+        aliases = _table_aliases(wrapper.raw_connection, statement)
+
+        # Candidates that couldn't be tried, described for the Improvement column
+        failures = []
+
+        for table, columns in _candidate_indexes(wrapper.raw_connection, statement, plan, aliases):
+
+            try:
+                candidate_plan = _try_index(wrapper, statement, variables, table, columns)
+            except sqlite3.Error as ex:
+                failures.append(f"Couldn't try {_create_index_statement(table, columns)}: {ex}")
+                continue
+
+            if _score(candidate_plan) < _score(best_plan):
+                best_index, best_plan = (table, columns), candidate_plan
+
+        advice.append(
+            IndexAdvice(
+                statement=captured.normalized,
+                runs=captured.count,
+                problems=[f"{flag}: {node.detail}" for flag, node in problems],
+                index=None if best_index is None else _create_index_statement(*best_index),
+                plan_after=None if best_index is None else _describe_plan(best_plan, *best_index),
+                improvement="\n".join([
+                    _describe_improvement(wrapper.raw_connection, problems, best_plan, aliases),
+                    *failures
+                ])
+            )
+        )
+
+    return advice
+
+
+def advice_table(advice: Sequence[IndexAdvice]) -> TableOutput:
+    """ Lay out index advice as a table
+
+    :param advice: Advice to show
+    """
+
+    return TableOutput(
+        rows=[
+            (
+                item.statement,
+                item.runs,
+                "\n".join(item.problems),
+                item.index or "(none found)",
+                item.plan_after or "",
+                item.improvement
+            )
+            for item
+            in advice
+        ],
+        columns=["Statement", "Runs", "Problems", "Suggested Index", "Plan With Index", "Improvement"]
+    )
+
+
+def _is_indexable_statement(statement: str) -> bool:
+    """ Returns True for statements an index could speed up
+
+    :param statement: Statement to check
+    """
+
+    first_word = statement.lstrip().split(None, 1)[:1]
+
+    return is_read_statement(statement) or [word.lower() for word in first_word] in (["update"], ["delete"])
+
+
+def _find_problems(plan: Sequence[PlanNode]) -> List[Tuple[str, PlanNode]]:
+    """ Returns (flag, node) tuples for every full scan or temp B-tree in a plan
+
+    :param plan: Plan to search
+    """
+
+    return [
+        (flag, node)
+        for root in plan
+        for _, node in root.walk()
+        for flag in node.flags
+        if flag in (FULL_SCAN, TEMP_B_TREE)
+    ]
+
+
+def _score(plan: Sequence[PlanNode]) -> int:
+    """ Returns how bad a plan looks, as its number of problems
+
+    :param plan: Plan to score
+    """
+
+    return len(_find_problems(plan))
+
+
+def _table_aliases(connection: sqlite3.Connection, statement: str) -> Dict[str, str]:
+    """ Returns the tables a statement names, keyed by their lower-cased aliases (or names, if not aliased)
+
+    Plans call tables by their aliases, so these are needed to find the tables themselves.
+
+    :param connection: Connection to the database
+    :param statement: Statement to search
+    """
+
+    tables = {
+        name.lower(): name
+        for name, in connection.execute("select name from sqlite_master where type in ('table', 'view')")
+    }
+
+    aliases = {}
+
+    for table, alias in _TABLE_REFERENCE_PATTERN.findall(_STRING_LITERAL_PATTERN.sub("''", statement)):
+
+        if table.lower() not in tables:
+            continue
+
+        aliases[table.lower()] = tables[table.lower()]
+
+        if alias:
+            aliases[alias.lower()] = tables[table.lower()]
+
+    return aliases
+
+
+def _plan_tables(plan: Sequence[PlanNode], aliases: [Mapping[str, str], None] = None) -> List[str]:
+    """ Returns the tables a plan scans or searches, in the order they appear
+
+    :param plan: Plan to search
+    :param aliases: Tables keyed by the lower-cased aliases the plan may use for them (see _table_aliases)
+    """
+
+    aliases = aliases or {}
+
+    tables = []
+
+    for root in plan:
+        for _, node in root.walk():
+
+            words = node.detail.split()
+
+            if words[:1] not in (["SCAN"], ["SEARCH"]) or len(words) < 2:
+                continue
+
+            # "SCAN TABLE foo" before sqlite 3.36, "SCAN foo" after
+            table = words[2] if words[1] == "TABLE" and len(words) > 2 else words[1]
+
+            table = aliases.get(table.lower(), table)
+
+            if table not in tables:
+                tables.append(table)
+
+    return tables
+
+
+def _candidate_indexes(connection: sqlite3.Connection, statement: str, plan: Sequence[PlanNode],
+                       aliases: Mapping[str, str]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """ Returns (table, columns) tuples for indexes that might help a statement
+
+    :param connection: Connection to the database
+    :param statement: Statement to build candidates for
+    :param plan: Current plan for the statement
+    :param aliases: Tables keyed by the lower-cased aliases the statement uses for them
+    """
+
+    searchable = _STRING_LITERAL_PATTERN.sub("''", statement)
+
+    ordering = [
+        column.strip().split()[0].split(".")[-1]
+        for clause in _ORDERING_PATTERN.findall(searchable)
+        for column in clause.split(",")
+        if column.strip()
+    ]
+
+    candidates = []
+
+    for table in _plan_tables(plan, aliases):
+
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_info({_quote_identifier(table)})")]
+
+        equality, ranged = [], []
+
+        for column in columns:
+
+            match = re.search(_COMPARISON_PATTERN.format(column=re.escape(column)), searchable, re.IGNORECASE)
+
+            if match is None:
+                continue
+
+            (equality if match.group(1) else ranged).append(column)
+
+        ordered = [column for column in ordering if column in columns]
+
+        # Equality columns first, then a range or the sort order, as in a
+        # typical composite index, followed by single columns
+        column_sets = [
+            tuple(equality + ranged[:1]),
+            tuple(equality + ordered),
+            tuple(ordered),
+            *((column,) for column in equality + ranged)
+        ]
+
+        for column_set in column_sets:
+            if column_set and (table, column_set) not in candidates:
+                candidates.append((table, column_set))
+
+    return candidates
+
+
+def _try_index(wrapper: "SQLiteWrapper", statement: str, variables: Mapping[str, object],
+               table: str, columns: Tuple[str, ...]) -> List[PlanNode]:
+    """ Explain a statement with a candidate index in place, then remove the index
+
+    :param wrapper: Connection to the database
+    :param statement: Statement to explain
+    :param variables: Values available for binding, keyed by name
+    :param table: Table to index
+    :param columns: Columns to index
+    """
+
+    connection = wrapper.raw_connection
+
+    connection.execute(f"SAVEPOINT {_SAVEPOINT_NAME}")
+
+    try:
+        connection.execute(
+            _create_index_statement(table, columns, name=_CANDIDATE_INDEX_NAME)
+        )
+
+        return wrapper.explain(statement, variables)
+
+    finally:
+        connection.execute(f"ROLLBACK TO {_SAVEPOINT_NAME}")
+        connection.execute(f"RELEASE {_SAVEPOINT_NAME}")
+
+
+def _create_index_statement(table: str, columns: Tuple[str, ...], name: [str, None] = None) -> str:
+    """ Returns a CREATE INDEX statement
+
+    :param table: Table to index
+    :param columns: Columns to index
+    :param name: Name of the index, defaulting to one built from the table and columns
+    """
+
+    name = name or _index_name(table, columns)
+
+    column_list = ", ".join(_quote_identifier(column) for column in columns)
+
+    return f"CREATE INDEX {_quote_identifier(name)} ON {_quote_identifier(table)} ({column_list})"
+
+
+def _index_name(table: str, columns: Tuple[str, ...]) -> str:
+    """ Returns the name suggested for an index
+
+    :param table: Table to index
+    :param columns: Columns to index
+    """
+
+    return "_".join(("idx", table, *columns))
+
+
+def _quote_identifier(identifier: str) -> str:
+    """ Quote an identifier if it isn't a plain word
+
+    :param identifier: Table, column or index name
+    """
+
+    if re.fullmatch(r"[A-Za-z_]\w*", identifier):
+        return identifier
+
+    escaped = identifier.replace('"', '""')
+
+    return f'"{escaped}"'
+
+
+def _describe_plan(plan: Sequence[PlanNode], table: str, columns: Tuple[str, ...]) -> str:
+    """ Describe a plan using a candidate index, calling the index by its suggested name
+
+    :param plan: Plan to describe
+    :param table: Table the candidate index is on
+    :param columns: Columns of the candidate index
+    """
+
+    suggested_name = _quote_identifier(_index_name(table, columns))
+
+    return "\n".join(
+        node.detail.replace(_CANDIDATE_INDEX_NAME, suggested_name)
+        for root in plan
+        for _, node in root.walk()
+    )
+
+
+def _describe_improvement(connection: sqlite3.Connection, problems: Sequence[Tuple[str, PlanNode]],
+                          plan_after: Sequence[PlanNode], aliases: Mapping[str, str]) -> str:
+    """ Describe which problems an index removes, and how many rows full scans read
+
+    :param connection: Connection to the database
+    :param problems: (flag, node) tuples found in the original plan
+    :param plan_after: Plan with the suggested index in place
+    :param aliases: Tables keyed by the lower-cased aliases the statement uses for them
+    """
+
+    remaining = {(flag, node.detail) for flag, node in _find_problems(plan_after)}
+
+    removed = [(flag, node) for flag, node in problems if (flag, node.detail) not in remaining]
+
+    if not removed:
+        return "No improvement found"
+
+    descriptions = []
+
+    for flag, node in removed:
+
+        if flag == FULL_SCAN:
+            table = _plan_tables([PlanNode(node.detail)], aliases)[0]
+            descriptions.append(f"Avoids scanning {_estimate_rows(connection, table)} rows of {table}")
+        else:
+            # e.g. "USE TEMP B-TREE FOR ORDER BY"
+            purpose = node.detail.partition(TEMP_B_TREE)[2].strip()
+            descriptions.append(f"Avoids a temp B-tree {purpose.lower()}")
+
+    return "\n".join(descriptions)
+
+
+def _estimate_rows(connection: sqlite3.Connection, table: str) -> int:
+    """ Returns the number of rows in a table, from ANALYZE statistics if gathered
+
+    :param connection: Connection to the database
+    :param table: Table to count
+    """
+
+    try:
+        row = connection.execute("select stat from sqlite_stat1 where tbl = ? limit 1", (table,)).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+
+    if row is not None:
+        return int(row[0].split()[0])
+
+    return connection.execute(f"select count(*) from {_quote_identifier(table)}").fetchone()[0]
@@ -0,0 +1,272 @@
+""" ConnectionWrappers and functions for console access to asyncio database drivers """
+
+import asyncio
+import inspect
+import threading
+
+from typing import List, Awaitable, Coroutine
+
+from .connections import ConnectionWrapper, is_async_connection
+from .dbapi import _read_resultset_columns
+from .locks import release_connection_lock
+from .outputs import TableOutput
+from .spill import RowCollector, collect_rows
+
+
+class EventLoopThread:
+    """ An event loop running on its own daemon thread, for driving coroutines from sync code """
+
+    def __init__(self):
+        """ Initialize an EventLoopThread. The thread is started on first use. """
+
+        self._loop = None
+
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """ Returns the event loop, starting its thread if needed """
+
+        with self._lock:
+
+            if self._loop is None:
+
+                loop = asyncio.new_event_loop()
+
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="dbreak-event-loop",
+                    daemon=True
+                )
+
+                thread.start()
+
+                self._loop = loop
+
+        return self._loop
+
+    def run(self, coroutine: Coroutine):
+        """ Run a coroutine on the event loop and wait for its result
+
+        :param coroutine: Coroutine to run
+        """
+
+        return run_on_loop(coroutine, self.loop)
+
+
+# Shared loop for connections that aren't tied to a particular loop
+_event_loop_thread = EventLoopThread()
+
+
+class AsyncConnectionWrapper(ConnectionWrapper):
+    """ Generic wrapper for connections with coroutine methods, meant for subclassing
+
+    Subclasses implement execute_statement_async. The console calls
+    execute_statement as usual, which drives the coroutine to completion on
+    an event loop: the loop given when wrapping the connection, or else a
+    dedicated loop running on a background thread.
+    """
+
+    def __init__(self, raw_connection: object, loop: [asyncio.AbstractEventLoop, None] = None):
+        """ Initialize an AsyncConnectionWrapper
+
+        :param raw_connection: Database connection being wrapped
+        :param loop: Event loop the connection is bound to, if any
+        """
+
+        super().__init__(raw_connection)
+
+        # Loop to run the connection's coroutines on. Drivers whose
+        # connections belong to a particular loop (such as asyncpg)
+        # must be given that loop, and it must be running in another thread.
+        self.loop = loop
+
+    def execute_statement(self, statement: str) -> List:
+        """ Return the results of executing a database statement
+
+        :param statement: Statement to execute in the database
+        """
+
+        return self.run(self.execute_statement_async(statement))
+
+    async def execute_statement_async(self, statement: str) -> List:
+        """ Return the results of executing a database statement, asynchronously
+
+        :param statement: Statement to execute in the database
+        """
+
+        raise NotImplementedError("Not implemented in base class")
+
+    def close(self):
+        """ Release console resources and close the raw connection, awaiting it if needed """
+
+        self.detach()
+
+        close = getattr(self.raw_connection, "close", None)
+
+        if close is not None:
+            self.run(_resolve(close()))
+
+        release_connection_lock(self.raw_connection)
+
+    def run(self, coroutine: Coroutine):
+        """ Run a coroutine on this connection's event loop and wait for its result
+
+        :param coroutine: Coroutine to run
+        """
+
+        if self.loop is None:
+            return _event_loop_thread.run(coroutine)
+
+        return run_on_loop(coroutine, self.loop)
+
+
+class AsyncDBAPIWrapper(AsyncConnectionWrapper):
+    """ Wraps DB API-like connections whose methods are coroutines
+
+    Covers both cursor-based drivers (aiosqlite, aiomysql, aiopg) and drivers
+    that fetch directly from the connection (asyncpg).
+    """
+
+    # This is given a low SEARCH_RANK so that more
+    # specific database connectors can take precedence
+    SEARCH_RANK = 0
+
+    # Number of rows requested from the driver at a time
+    FETCH_BATCH_SIZE = 1000
+
+    # Cheap statement used to check the connection works
+    PING_STATEMENT = "select 1"
+
+    async def execute_statement_async(self, statement: str) -> List:
+        """ Return the results of executing a database statement, asynchronously
+
+        :param statement: Statement to execute in the database
+        """
+
+        if hasattr(self.raw_connection, "cursor"):
+            return await self._execute_with_cursor(statement)
+        else:
+            return await self._execute_with_fetch(statement)
+
+    async def _execute_with_cursor(self, statement: str) -> List:
+        """ Execute a statement using a cursor, as in the DB API
+
+        :param statement: Statement to execute
+        """
+
+        cursor = await _resolve(self.raw_connection.cursor())
+
+        try:
+            await _resolve(cursor.execute(statement))
+
+            # Attempt to read the columns that appear in the resultset.
+            # This won't return anything for most non-select commands.
+            columns = _read_resultset_columns(cursor)
+
+            if not columns:
+                return []
+
+            rows = RowCollector(column_count=len(columns))
+
+            # Pull results out of the cursor a batch at a time,
+            # spilling them to disk if they outgrow the memory budget
+            async for batch in self._fetch_batches(cursor):
+                rows.extend(batch)
+
+            table = TableOutput(
+                rows=rows.finish(),
+                columns=columns
+            )
+
+            return [table]
+
+        finally:
+            await _resolve(cursor.close())
+
+    async def _fetch_batches(self, cursor):
+        """ Yield lists of rows from a cursor until it is exhausted
+
+        :param cursor: Cursor with a pending resultset
+        """
+
+        if not hasattr(cursor, "fetchmany"):
+            yield [tuple(row) for row in await _resolve(cursor.fetchall())]
+            return
+
+        while True:
+
+            batch = await _resolve(cursor.fetchmany(self.FETCH_BATCH_SIZE))
+
+            if not batch:
+                break
+
+            yield [tuple(row) for row in batch]
+
+    async def _execute_with_fetch(self, statement: str) -> List:
+        """ Execute a statement using a connection-level fetch method
+
+        :param statement: Statement to execute
+        """
+
+        records = await _resolve(self.raw_connection.fetch(statement))
+
+        # Record objects don't carry column names when no rows
+        # come back, so there's nothing useful to show
+        if not records:
+            return []
+
+        columns = list(records[0].keys())
+
+        rows = collect_rows((tuple(record) for record in records), column_count=len(columns))
+
+        table = TableOutput(
+            rows=rows,
+            columns=columns
+        )
+
+        return [table]
+
+    @classmethod
+    def handles(cls, raw_connection: object) -> bool:
+        """ Returns True if raw_connection is an asyncio database connection
+
+        :param raw_connection: An unwrapped database connection
+        """
+
+        return is_async_connection(raw_connection) and (
+            hasattr(raw_connection, "cursor") or hasattr(raw_connection, "fetch")
+        )
+
+
+def run_on_loop(coroutine: Coroutine, loop: asyncio.AbstractEventLoop):
+    """ Run a coroutine on an event loop running in another thread and wait for its result
+
+    :param coroutine: Coroutine to run
+    :param loop: Event loop to run it on
+    """
+
+    # Blocking on a loop from its own thread would never finish
+    if getattr(loop, "_thread_id", None) == threading.get_ident():
+        coroutine.close()
+        raise RuntimeError("Cannot wait on an event loop from its own thread; use start_console_async")
+
+    future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+    return future.result()
+
+
+async def _resolve(value: [Awaitable, object]):
+    """ Await a value if it is awaitable, otherwise return it as-is
+
+    Async drivers aren't consistent about which methods are coroutines
+    (aiosqlite cursors' description is a plain attribute, while close is
+    a coroutine, for example), so every call is passed through this.
+
+    :param value: Result of calling a driver method
+    """
+
+    if inspect.isawaitable(value):
+        return await value
+
+    return value
@@ -0,0 +1,231 @@
+""" Run console commands non-interactively, from a script or stdin
+
+Each command produces one JSON object per output, written on its own line:
+
+    {"command": "select 1 as x", "type": "table", "columns": ["x"], "rows": [[1]]}
+    {"command": "!exit", "type": "text", "text": "..."}
+    {"command": "selec 1", "type": "error", "error": "OperationalError", "message": "..."}
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+
+from typing import Iterable, List, TextIO
+
+from .commands import execute_command
+from .connections import prepare_connections
+from .exc import StopSession
+from .outputs import TableOutput
+from .sessions import DebugSession
+
+# Exit codes returned by run_batch and the command-line entry point
+EXIT_SUCCESS = 0
+EXIT_COMMAND_FAILED = 1
+
+
+def run_batch(commands: Iterable[str], *unnamed_connections: object, starting_connection: str = None,
+              output: [TextIO, None] = None, stop_on_error: bool = False,
+              **named_connections: object) -> int:
+    """ Run commands against a set of connections, writing results as JSON lines
+
+    Takes the same connection arguments as start_console. Commands are run
+    in order, one per line, with blank lines skipped. Returns EXIT_SUCCESS if
+    every command succeeded, otherwise EXIT_COMMAND_FAILED.
+
+    :param commands: Iterable of command strings, such as an open file
+    :param unnamed_connections: Raw or wrapped db connections to assign default names
+    :param starting_connection: Name of the connection to use at startup
+    :param output: Stream to write results to, defaulting to stdout
+    :param stop_on_error: If True, stop at the first command that fails
+    :param named_connections: Raw or wrapped db connections with specific names attached
+    """
+
+    output = output or sys.stdout
+
+    # Wrap and name all connections
+    connections = prepare_connections(
+        unnamed_connections=unnamed_connections,
+        named_connections=named_connections
+    )
+
+    session = DebugSession(
+        connections=connections,
+        current_connection_name=starting_connection
+    )
+
+    try:
+        exit_code = _run_commands(session, commands, output, stop_on_error)
+    finally:
+        session.close()
+
+    output.flush()
+
+    return exit_code
+
+
+def _run_commands(session: DebugSession, commands: Iterable[str], output: TextIO,
+                  stop_on_error: bool) -> int:
+    """ Run each command in turn, returning the batch's exit code
+
+    :param session: Current DebugSession
+    :param commands: Iterable of command strings
+    :param output: Stream to write results to
+    :param stop_on_error: If True, stop at the first command that fails
+    """
+
+    exit_code = EXIT_SUCCESS
+
+    for line in commands:
+
+        command_string = line.strip()
+
+        # Ignore lines with just whitespace
+        if not command_string:
+            continue
+
+        try:
+            outputs = execute_command(
+                command_string=command_string,
+                session=session
+            )
+        except StopSession:
+            break
+        except Exception as ex:
+            outputs = [ex]
+            exit_code = EXIT_COMMAND_FAILED
+
+        for record in outputs or ():
+            _write_record(output, command_string, record)
+
+        if exit_code != EXIT_SUCCESS and stop_on_error:
+            break
+
+    return exit_code
+
+
+def _write_record(output: TextIO, command_string: str, record: object):
+    """ Write a single output as a line of JSON
+
+    :param output: Stream to write to
+    :param command_string: Command that produced the output
+    :param record: Output object to write
+    """
+
+    serialized = {
+        "command": command_string,
+        **serialize_output(record)
+    }
+
+    # Values the json module doesn't know (dates, decimals, etc)
+    # are written as their string representation
+    output.write(json.dumps(serialized, default=str))
+    output.write("\n")
+
+
+def serialize_output(output: object) -> dict:
+    """ Convert an output object into a JSON-compatible dict
+
+    :param output: Output object to convert
+    """
+
+    if isinstance(output, TableOutput):
+        return {
+            "type": "table",
+            "columns": list(output.columns),
+            "rows": [list(row) for row in output.rows]
+        }
+
+    elif isinstance(output, Exception):
+        return {
+            "type": "error",
+            "error": type(output).__name__,
+            "message": str(output)
+        }
+
+    else:
+        return {
+            "type": "text",
+            "text": str(output)
+        }
+
+
+def main(argv: [List[str], None] = None) -> int:
+    """ Command-line entry point for running commands against sqlite databases
+
+    :param argv: Command-line arguments, defaulting to sys.argv
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="dbreak-batch",
+        description=(
+            "Run dbreak console commands from a script or stdin, writing JSON lines. "
+            "Changes are committed if every command succeeds, and rolled back otherwise."
+        )
+    )
+
+    parser.add_argument(
+        "databases",
+        nargs="+",
+        metavar="DATABASE",
+        help="sqlite database path, optionally named as name=path"
+    )
+
+    parser.add_argument(
+        "--script",
+        type=argparse.FileType("r"),
+        default=sys.stdin,
+        help="File of commands to run, one per line (default: stdin)"
+    )
+
+    parser.add_argument(
+        "--starting-connection",
+        help="Name of the connection to run commands against first"
+    )
+
+    parser.add_argument(
+        "--stop-on-error",
+        action="store_true",
+        help="Stop at the first command that fails"
+    )
+
+    arguments = parser.parse_args(argv)
+
+    unnamed_connections = []
+    named_connections = {}
+
+    try:
+        for database in arguments.databases:
+
+            name, separator, path = database.partition("=")
+
+            if separator:
+                named_connections[name] = sqlite3.connect(path)
+            else:
+                unnamed_connections.append(sqlite3.connect(database))
+
+        with arguments.script:
+
+            exit_code = run_batch(
+                arguments.script,
+                *unnamed_connections,
+                starting_connection=arguments.starting_connection,
+                stop_on_error=arguments.stop_on_error,
+                **named_connections
+            )
+
+        # Changes are kept only if every command succeeded
+        if exit_code == EXIT_SUCCESS:
+            for connection in (*unnamed_connections, *named_connections.values()):
+                connection.commit()
+
+        return exit_code
+
+    finally:
+        for connection in (*unnamed_connections, *named_connections.values()):
+            connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+""" Functions for benchmarking statements by running them repeatedly """
+
+import concurrent.futures
+import math
+import threading
+import time
+
+from typing import TYPE_CHECKING, List, Mapping, Sequence
+
+from .outputs import TableOutput, per_second
+
+if TYPE_CHECKING:
+    from .connections import ConnectionWrapper, StatementTiming
+
+
+class BenchmarkResult:
+    """ Timings gathered by running a statement repeatedly """
+
+    def __init__(self, timings: List["StatementTiming"], errors: List[Exception],
+                 elapsed_seconds: float, warmup: int, concurrency: int):
+        """ Initialize a BenchmarkResult
+
+        :param timings: Timing of each successful, non-warmup run
+        :param errors: Exceptions raised by failed runs
+        :param elapsed_seconds: Wall clock time taken by the measured runs
+        :param warmup: Number of unmeasured runs made first
+        :param concurrency: Number of threads runs were spread over
+        """
+
+        self.timings = timings
+        self.errors = errors
+        self.elapsed_seconds = elapsed_seconds
+        self.warmup = warmup
+        self.concurrency = concurrency
+
+    @property
+    def rows(self) -> int:
+        """ Returns the total number of rows fetched by measured runs """
+
+        return sum(timing.rows for timing in self.timings)
+
+    def to_outputs(self) -> List[TableOutput]:
+        """ Summarize the results as a latency table and a throughput table """
+
+        total = sorted(timing.execute_seconds + timing.fetch_seconds for timing in self.timings)
+        execute = sorted(timing.execute_seconds for timing in self.timings)
+        fetch = sorted(timing.fetch_seconds for timing in self.timings)
+
+        latency_rows = [
+            (measure, *(_milliseconds(function(values)) for values in (total, execute, fetch)))
+            for measure, function
+            in (
+                ("min", _minimum),
+                ("mean", _mean),
+                ("p50", lambda values: percentile(values, 50)),
+                ("p95", lambda values: percentile(values, 95)),
+                ("p99", lambda values: percentile(values, 99)),
+                ("max", _maximum)
+            )
+        ]
+
+        latency_table = TableOutput(
+            rows=latency_rows,
+            columns=["Latency", "Total (ms)", "Execute (ms)", "Fetch (ms)"]
+        )
+
+        runs = len(self.timings)
+
+        throughput_table = TableOutput(
+            rows=[
+                (
+                    runs,
+                    len(self.errors),
+                    self.warmup,
+                    self.concurrency,
+                    self.rows,
+                    round(self.elapsed_seconds, 3),
+                    per_second(runs, self.elapsed_seconds),
+                    per_second(self.rows, self.elapsed_seconds)
+                )
+            ],
+            columns=["Runs", "Errors", "Warmup", "Concurrency", "Rows", "Elapsed (s)", "Runs/s", "Rows/s"]
+        )
+
+        return [latency_table, throughput_table]
+
+
+def benchmark(wrapper: "ConnectionWrapper", statement: str, iterations: int, warmup: int = 0,
+              concurrency: int = 1, variables: [Mapping[str, object], None] = None) -> BenchmarkResult:
+    """ Run a statement repeatedly, timing each run without keeping its results
+
+    With a concurrency above 1, runs are spread over that many threads all
+    sharing the same connection, so the driver must allow that (for sqlite3,
+    connect with check_same_thread=False).
+
+    :param wrapper: Connection to run the statement against
+    :param statement: Statement to run
+    :param iterations: Number of measured runs
+    :param warmup: Number of unmeasured runs to make first
+    :param concurrency: Number of threads to spread runs over
+    :param variables: Values available for binding, keyed by name
+    """
+
+    if iterations < 1:
+        raise ValueError("Number of iterations must be at least 1")
+
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+
+    # Warm up caches (and the cursor pool) before measuring anything
+    for _ in range(warmup):
+        wrapper.time_statement(statement, variables)
+
+    timings = []
+    errors = []
+
+    # Runs still to be made, shared by all threads
+    remaining = iter(range(iterations))
+    remaining_lock = threading.Lock()
+
+    def run_until_done():
+        while True:
+
+            with remaining_lock:
+                if next(remaining, None) is None:
+                    return
+
+            try:
+                timings.append(wrapper.time_statement(statement, variables))
+            except Exception as ex:
+                errors.append(ex)
+
+    start = time.perf_counter()
+
+    if concurrency == 1:
+        run_until_done()
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(run_until_done) for _ in range(concurrency)]:
+                future.result()
+
+    elapsed = time.perf_counter() - start
+
+    # Nothing useful to report if every run failed
+    if errors and not timings:
+        raise errors[0]
+
+    return BenchmarkResult(
+        timings=timings,
+        errors=errors,
+        elapsed_seconds=elapsed,
+        warmup=warmup,
+        concurrency=concurrency
+    )
+
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """ Return a percentile of already-sorted values, interpolating between neighbours
+
+    :param sorted_values: Values in ascending order
+    :param percent: Percentile to find, from 0 to 100
+    """
+
+    if not sorted_values:
+        return math.nan
+
+    position = (len(sorted_values) - 1) * percent / 100
+
+    lower = math.floor(position)
+    upper = math.ceil(position)
+
+    fraction = position - lower
+
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def _minimum(sorted_values: Sequence[float]) -> float:
+    """ Returns the smallest of already-sorted values """
+
+    return sorted_values[0] if sorted_values else math.nan
+
+
+def _maximum(sorted_values: Sequence[float]) -> float:
+    """ Returns the largest of already-sorted values """
+
+    return sorted_values[-1] if sorted_values else math.nan
+
+
+def _mean(values: Sequence[float]) -> float:
+    """ Returns the mean of values """
+
+    return sum(values) / len(values) if values else math.nan
+
+
+def _milliseconds(seconds: float) -> float:
+    """ Convert seconds to milliseconds, rounded for display """
+
+    return round(seconds * 1000, 3)
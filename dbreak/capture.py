@@ -0,0 +1,206 @@
+""" Capture statements an application runs, for the console to analyze later
+
+Capturing is started from application code (or the console) and carries on
+while the application runs between breakpoints:
+
+    capture = dbreak.capture_statements(connection)
+
+Statements are grouped by their normalized text, with literals replaced by ?,
+keeping one example of each along with how many times it ran.
+"""
+
+import collections
+import contextlib
+import re
+import sqlite3
+import threading
+
+from typing import Dict, List, Tuple
+
+# Most distinct statements kept by a capture. Once reached, new
+# statements are ignored while known ones are still counted.
+MAX_CAPTURED_STATEMENTS = 1000
+
+# Matches string and numeric literals
+_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Matches lists of placeholders, such as the contents of IN (...)
+_PLACEHOLDER_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+# A captured statement: one example of it, and how many times it ran
+CapturedStatement = collections.namedtuple(
+    "CapturedStatement",
+    ["normalized", "example", "count"]
+)
+
+
+def normalize_statement(statement: str) -> str:
+    """ Reduce a statement to its shape, so statements differing only in values match
+
+    Literals become ?, lists of them become (?...), and runs of
+    whitespace become single spaces.
+
+    :param statement: Statement to normalize
+    """
+
+    normalized = _LITERAL_PATTERN.sub("?", statement)
+    normalized = _PLACEHOLDER_LIST_PATTERN.sub("(?...)", normalized)
+
+    return " ".join(normalized.split())
+
+
+class StatementCapture:
+    """ Collects statements run on a connection, grouped by normalized text """
+
+    def __init__(self, max_statements: int = MAX_CAPTURED_STATEMENTS):
+        """ Initialize a StatementCapture
+
+        :param max_statements: Most distinct statements to keep
+        """
+
+        self.max_statements = max_statements
+
+        # [example, count] lists keyed by normalized statement
+        self._statements: Dict[str, List] = collections.OrderedDict()
+
+        self._lock = threading.Lock()
+
+    def record(self, statement: str):
+        """ Record that a statement ran
+
+        :param statement: Text of the statement
+        """
+
+        normalized = normalize_statement(statement)
+
+        with self._lock:
+
+            entry = self._statements.get(normalized)
+
+            if entry is not None:
+                entry[1] += 1
+
+            elif len(self._statements) < self.max_statements:
+                self._statements[normalized] = [statement, 1]
+
+    def record_traced(self, statement: str):
+        """ Record a statement reported by a driver's trace callback
+
+        Statements run by the console itself are ignored.
+
+        :param statement: Text of the statement
+        """
+
+        if not _suppressed.active:
+            self.record(statement)
+
+    @property
+    def statements(self) -> List[CapturedStatement]:
+        """ Returns captured statements, in the order first seen """
+
+        with self._lock:
+
+            return [
+                CapturedStatement(normalized, example, count)
+                for normalized, (example, count)
+                in self._statements.items()
+            ]
+
+    def clear(self):
+        """ Forget all captured statements """
+
+        with self._lock:
+            self._statements.clear()
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+
+def capture_statements(raw_connection: object) -> StatementCapture:
+    """ Start capturing statements run on a connection, or return the capture already running
+
+    Currently supports sqlite3 connections, using their trace callback
+    (which replaces any trace callback the application set).
+
+    :param raw_connection: An unwrapped database connection
+    """
+
+    with _captures_guard:
+
+        try:
+            return _captures[id(raw_connection)][1]
+        except KeyError:
+            pass
+
+        if not isinstance(raw_connection, sqlite3.Connection):
+            raise TypeError(f"Can't capture statements run on {type(raw_connection).__name__} connections")
+
+        capture = StatementCapture()
+
+        raw_connection.set_trace_callback(capture.record_traced)
+
+        # The connection is kept so its id can't be reused while capturing
+        _captures[id(raw_connection)] = (raw_connection, capture)
+
+        return capture
+
+
+def stop_capturing(raw_connection: object) -> [StatementCapture, None]:
+    """ Stop capturing statements run on a connection, returning what was captured
+
+    :param raw_connection: An unwrapped database connection
+    """
+
+    with _captures_guard:
+
+        try:
+            _, capture = _captures.pop(id(raw_connection))
+        except KeyError:
+            return None
+
+        raw_connection.set_trace_callback(None)
+
+        return capture
+
+
+def find_capture(raw_connection: object) -> [StatementCapture, None]:
+    """ Returns the capture running on a connection, if any
+
+    :param raw_connection: An unwrapped database connection
+    """
+
+    with _captures_guard:
+
+        entry = _captures.get(id(raw_connection))
+
+        return None if entry is None else entry[1]
+
+
+@contextlib.contextmanager
+def suppress_capture():
+    """ Ignore statements the current thread runs while in this block
+
+    Used so the console's own statements aren't captured.
+    """
+
+    previous = _suppressed.active
+
+    _suppressed.active = True
+
+    try:
+        yield
+    finally:
+        _suppressed.active = previous
+
+
+class _Suppressed(threading.local):
+    """ Whether the current thread's statements are being ignored """
+
+    active = False
+
+
+_suppressed = _Suppressed()
+
+# (raw connection, capture) tuples keyed by id of the raw connection
+_captures: Dict[int, Tuple[object, StatementCapture]] = {}
+_captures_guard = threading.Lock()
@@ -1,15 +1,39 @@
 """ Functions handling the execution of commands, either locally or against a database """
 
-from typing import TYPE_CHECKING, Dict, List
-
-from .constants import SHELL_COMMAND_INDICATOR
-from .exc import StopSession, ConnectionAlreadyExistsError
-from .parser import parse
-from .outputs import TableOutput
+import contextlib
+import csv
+import json
+import math
+import re
+import time
+
+from typing import TYPE_CHECKING, Dict, Iterable, List
+
+from .bench import benchmark
+from .capture import suppress_capture
+from .connections import ConnectionWrapper, LazyConnection
+from .constants import SHELL_COMMAND_INDICATOR, RESULT_PAGE_SIZE, SCRATCH_CONNECTION_NAME, COPY_COMMIT_ROWS
+from .diff import diff_streams, diff_outputs, DIFF_SAMPLE_SIZE
+from .exc import StopSession, ConnectionAlreadyExistsError, WriteNotRoutedError, NoResultError
+from .join import join_streams, join_outputs, parse_join_condition
+from .parser import parse, parse_options, is_read_statement, unquote
+from .outputs import TableOutput, ResultStream
+from .plans import render_plan
+from .profiler import profile_stream, profile_table
+from .sampling import sample_stream, sample_outputs
+from .scratch import stash_stream
+from .slowlog import active_slow_log, log_statement, suppress_connection_logging
+from .spill import COMPARISON_OPERATORS
+from .transfer import copy_stream, copy_summary
+from .variables import parse_value
+from .views import ResultView
 
 if TYPE_CHECKING:
     from .sessions import DebugSession
 
+# Matches a condition given to !where, such as "status = 'failed'"
+_CONDITION_PATTERN = re.compile(r"(?P<column>\"[^\"]+\"|[^\s=!<>]+)\s*(?P<operator>!=|<=|>=|=|<|>)\s*(?P<value>.+)", re.DOTALL)
+
 
 def execute_command(command_string: str, session: "DebugSession") -> [List, None]:
     """ Parse and execute a command entered by the user
@@ -34,8 +58,39 @@ def execute_command(command_string: str, session: "DebugSession") -> [List, None
         shell_command_lookup=merged_command_list
     )
 
-    # Run the command and return results
-    return command_func(session, *arguments)
+    # Run the command and return results, holding the connection's
+    # lock so other threads sharing it are kept out in the meantime.
+    # The console's own statements are left out of any capture.
+    with session.current_connection.lock, suppress_capture():
+        return command_func(session, *arguments)
+
+
+def _bench(session: "DebugSession", iterations: str, statement: str) -> List[TableOutput]:
+    """ Run a statement repeatedly and report latency percentiles and throughput
+
+    The statement may be preceded by warmup=N (unmeasured runs made first)
+    and concurrency=N (number of threads to spread runs over) options.
+
+    :param session: Current DebugSession
+    :param iterations: Number of measured runs
+    :param statement: Statement to run, optionally preceded by options
+    """
+
+    options, statement = parse_options(
+        s=statement,
+        allowed_options=("warmup", "concurrency")
+    )
+
+    result = benchmark(
+        wrapper=_route_statement(session, statement),
+        statement=statement,
+        iterations=int(iterations),
+        warmup=int(options.get("warmup", 0)),
+        concurrency=int(options.get("concurrency", 1)),
+        variables=session.bindable_variables
+    )
+
+    return result.to_outputs()
 
 
 def _connections(session: "DebugSession") -> List[TableOutput]:
@@ -53,12 +108,7 @@ def _connections(session: "DebugSession") -> List[TableOutput]:
 
     # Construct rows with the connection name, wrapper type, and raw connection type
     rows = [
-        (
-            name,
-            type(wrapper).__name__,
-            type(wrapper.raw_connection).__module__,
-            type(wrapper.raw_connection).__name__
-        )
+        _describe_connection(name, wrapper)
         for name, wrapper
         in session.connections.items()
     ]
@@ -71,6 +121,152 @@ def _connections(session: "DebugSession") -> List[TableOutput]:
     ]
 
 
+def _describe_connection(name: str, wrapper: [ConnectionWrapper, LazyConnection]) -> tuple:
+    """ Returns a row describing a connection for the connections command
+
+    :param name: Name of the connection
+    :param wrapper: ConnectionWrapper, or LazyConnection not yet opened
+    """
+
+    # Connections that haven't been opened (or finished being prepared)
+    # yet don't have a wrapper or raw connection to describe
+    if isinstance(wrapper, LazyConnection):
+
+        if wrapper.ready_connection is None:
+            return name, wrapper.status, "", wrapper.description
+
+        wrapper = wrapper.ready_connection
+
+    return (
+        name,
+        type(wrapper).__name__,
+        type(wrapper.raw_connection).__module__,
+        type(wrapper.raw_connection).__name__
+    )
+
+
+def _copy(session: "DebugSession", target_connection: str, target_table: str, statement: str) -> List[str]:
+    """ Copy a statement's result from the current connection into a table on another, reporting throughput
+
+    The statement may be preceded by options: create=true to create the
+    table first, and commit_every=N to commit every N rows.
+
+    :param session: Current DebugSession
+    :param target_connection: Name of the connection to copy into
+    :param target_table: Name of the table to copy into
+    :param statement: Statement whose result is copied, optionally preceded by options
+    """
+
+    options, statement = parse_options(
+        s=statement,
+        allowed_options=("create", "commit_every")
+    )
+
+    target = session.open_connection(target_connection)
+
+    source = _route_statement(session, statement)
+
+    stream = source.stream_statement(
+        statement=statement,
+        variables=session.bindable_variables
+    )
+
+    with target.lock, stream:
+
+        if not stream.columns:
+            raise NoResultError("The statement didn't return a result to copy")
+
+        result = copy_stream(
+            stream=stream,
+            source=source,
+            target=target,
+            table=target_table,
+            create=options.get("create", "false").lower() == "true",
+            commit_rows=int(options.get("commit_every", COPY_COMMIT_ROWS))
+        )
+
+    return [copy_summary(result, target_table)]
+
+
+def _diff(session: "DebugSession", connection_a: str, connection_b: str, statement: str) -> List:
+    """ Compare a statement's result on two connections, streaming both rather than reading either into memory
+
+    The statement may be preceded by options: key=COLUMN[,COLUMN...] to
+    match rows by key and report changed rows, ordered=true if both results
+    are ordered by the key (or every column, without one) so they can be
+    merged, and sample=N to show up to N differing rows.
+
+    :param session: Current DebugSession
+    :param connection_a: Name of the first connection
+    :param connection_b: Name of the second connection
+    :param statement: Statement to run on both, optionally preceded by options
+    """
+
+    options, statement = parse_options(
+        s=statement,
+        allowed_options=("key", "ordered", "sample")
+    )
+
+    key_columns = [column for column in options.get("key", "").split(",") if column]
+
+    # Both connections are read at once, so both are kept from other threads
+    with contextlib.ExitStack() as stack:
+
+        streams = _open_streams(
+            session=session,
+            stack=stack,
+            connection_names=(connection_a, connection_b),
+            statements=(statement, statement)
+        )
+
+        result = diff_streams(
+            stream_a=streams[0],
+            stream_b=streams[1],
+            name_a=connection_a,
+            name_b=connection_b,
+            key_columns=key_columns,
+            ordered=options.get("ordered", "false").lower() == "true",
+            sample_size=int(options.get("sample", DIFF_SAMPLE_SIZE))
+        )
+
+    return diff_outputs(result, columns=list(streams[0].columns), name_a=connection_a, name_b=connection_b)
+
+
+def _open_streams(session: "DebugSession", stack: contextlib.ExitStack,
+                  connection_names: Iterable[str], statements: Iterable[str]) -> List[ResultStream]:
+    """ Start streaming statements' results from several connections at once, raising NoResultError if any has no result
+
+    Each connection's lock is held until the stack exits, which also closes the streams.
+
+    :param session: Current DebugSession
+    :param stack: ExitStack holding the locks and streams
+    :param connection_names: Name of the connection to run each statement on
+    :param statements: Statements to run
+    """
+
+    streams = []
+
+    for name, statement in zip(connection_names, statements):
+
+        wrapper = _route_statement(session, statement, session.open_connection(name))
+
+        stack.enter_context(wrapper.lock)
+
+        stream = stack.enter_context(
+            wrapper.stream_statement(
+                statement=statement,
+                variables=session.bindable_variables
+            )
+        )
+
+        if not stream.columns:
+            raise NoResultError(f"The statement didn't return a result on {name}")
+
+        streams.append(stream)
+
+    return streams
+
+
 def _execute_in_database(session: "DebugSession", statement: str) -> [List, None]:
     """ Execute a database command
 
@@ -78,7 +274,70 @@ def _execute_in_database(session: "DebugSession", statement: str) -> [List, None
     :param statement: Text of statement to execute
     """
 
-    return session.current_connection.execute_statement(statement)
+    return _run_statement(
+        session=session,
+        wrapper=_route_statement(session, statement),
+        statement=statement
+    )
+
+
+def _route_statement(session: "DebugSession", statement: str,
+                     wrapper: [ConnectionWrapper, None] = None) -> ConnectionWrapper:
+    """ Returns the connection a statement should run on
+
+    While a connection is isolated, reads go to its separate read
+    connection and anything else must be sent with !write.
+
+    :param session: Current DebugSession
+    :param statement: Text of statement to execute
+    :param wrapper: Connection the statement is meant for, defaulting to the current connection
+    """
+
+    wrapper = wrapper or session.current_connection
+
+    if wrapper.read_connection is None:
+        return wrapper
+
+    if not is_read_statement(statement):
+        message = f"Isolated connections only run reads. Use {SHELL_COMMAND_INDICATOR}write to run this on the application's connection."
+        raise WriteNotRoutedError(message)
+
+    return wrapper.read_connection
+
+
+def _run_statement(session: "DebugSession", wrapper: ConnectionWrapper, statement: str) -> [List, None]:
+    """ Execute a statement, logging it if slow and keeping its result for !page and !export
+
+    :param session: Current DebugSession
+    :param wrapper: Connection to execute the statement on
+    :param statement: Text of statement to execute
+    """
+
+    start = time.perf_counter()
+
+    # Logged below, so a SlowLogConnection being wrapped doesn't log it too
+    with suppress_connection_logging():
+        outputs = wrapper.execute_statement_with_variables(
+            statement=statement,
+            variables=session.bindable_variables
+        )
+
+    seconds = time.perf_counter() - start
+
+    # Rows are counted from tables returned; statements
+    # returning none are logged without a row count
+    tables = [output for output in outputs or () if isinstance(output, TableOutput)]
+
+    log_statement(
+        connection_name=session.current_connection_name,
+        statement=statement,
+        seconds=seconds,
+        rows=sum(len(table.rows) for table in tables) if tables else None
+    )
+
+    session.keep_last_output(outputs)
+
+    return outputs
 
 
 def _exit(_):
@@ -87,6 +346,52 @@ def _exit(_):
     raise StopSession()
 
 
+def _explain(session: "DebugSession", statement: str) -> List[TableOutput]:
+    """ Show the database's plan for a statement, flagging likely hot spots
+
+    :param session: Current DebugSession
+    :param statement: Statement to explain
+    """
+
+    plan = _route_statement(session, statement).explain(
+        statement=statement,
+        variables=session.bindable_variables
+    )
+
+    return [render_plan(plan)]
+
+
+def _export(session: "DebugSession", file_path: str) -> List[str]:
+    """ Write every row of the last result to a file, as CSV or (for .jsonl files) JSON lines
+
+    Filters, sort order and columns chosen with !where, !sort and !cols
+    apply. Rows spilled to disk are streamed from there rather than loaded
+    into memory.
+
+    :param session: Current DebugSession
+    :param file_path: Path of the file to write
+    """
+
+    view = _last_view(session)
+
+    columns = view.columns
+
+    with open(file_path, "w", newline="", encoding="utf-8") as file:
+
+        if file_path.lower().endswith(".jsonl"):
+
+            for row in view.rows():
+                file.write(json.dumps(dict(zip(columns, row)), default=str))
+                file.write("\n")
+
+        else:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            writer.writerows(view.rows())
+
+    return [f"Exported {len(view)} row(s) to {file_path}"]
+
+
 def _file(session: "DebugSession", file_path: str) -> [List, None]:
     """ Read and execute a database command from a file
 
@@ -162,7 +467,7 @@ def _create_help_table(first_column_name: str, command_lookup: Dict[str, dict])
     rows = [
         (
             f"{SHELL_COMMAND_INDICATOR}{command}",
-            " ".join(details['arguments']),
+            _format_arguments(details),
             details['description']
         )
         for command, details
@@ -175,6 +480,247 @@ def _create_help_table(first_column_name: str, command_lookup: Dict[str, dict])
     )
 
 
+def _format_arguments(details: dict) -> str:
+    """ Format a command's arguments for help, showing optional ones in brackets
+
+    :param details: Command details, as in SHELL_COMMANDS
+    """
+
+    arguments = details["arguments"]
+
+    minimum_arguments = details.get("minimum_arguments", len(arguments))
+
+    return " ".join(
+        argument if position < minimum_arguments else f"[{argument}]"
+        for position, argument
+        in enumerate(arguments)
+    )
+
+
+def _isolate(session: "DebugSession") -> List[str]:
+    """ Toggle sending reads to a separate read-only connection
+
+    :param session: Current DebugSession
+    """
+
+    wrapper = session.current_connection
+
+    if wrapper.read_connection is None:
+        wrapper.isolate_reads()
+        return [f"Reads now use a separate read-only connection. Use {SHELL_COMMAND_INDICATOR}write for anything else."]
+
+    wrapper.stop_isolating_reads()
+
+    return ["Statements now use the application's connection."]
+
+
+def _join(session: "DebugSession", connection_a: str, connection_b: str, condition: str,
+          statement_a: str, statement_b: str, join_type: str = "inner") -> List:
+    """ Join the results of statements on two connections, such as a database and its cache
+
+    :param session: Current DebugSession
+    :param connection_a: Name of the connection for the first statement
+    :param connection_b: Name of the connection for the second statement
+    :param condition: Columns to join on, as first_column=second_column[,...]
+    :param statement_a: Statement giving the first (left-hand) result
+    :param statement_b: Statement giving the second (right-hand) result
+    :param join_type: One of inner, left, right or full
+    """
+
+    on = parse_join_condition(condition)
+
+    # Both connections are read at once, so both are kept from other threads
+    with contextlib.ExitStack() as stack:
+
+        stream_a, stream_b = _open_streams(
+            session=session,
+            stack=stack,
+            connection_names=(connection_a, connection_b),
+            statements=(statement_a, statement_b)
+        )
+
+        result = join_streams(
+            stream_a=stream_a,
+            stream_b=stream_b,
+            name_a=connection_a,
+            name_b=connection_b,
+            on=on,
+            how=join_type.lower()
+        )
+
+    outputs = join_outputs(result)
+
+    # The joined rows can then be paged, filtered and exported like any result
+    session.keep_last_output(outputs)
+
+    return outputs
+
+
+def _head(session: "DebugSession", number: [str, None] = None) -> List:
+    """ Show the first rows of the last result, with any filters, sort order and columns applied
+
+    :param session: Current DebugSession
+    :param number: Number of rows to show, defaulting to a page
+    """
+
+    return _show_view(
+        session=session,
+        limit=RESULT_PAGE_SIZE if number is None else int(number)
+    )
+
+
+def _page(session: "DebugSession", number: [str, None] = None) -> List:
+    """ Show a page of the last result, reading only that page from disk if its rows were spilled
+
+    :param session: Current DebugSession
+    :param number: Page to show, starting from 1, defaulting to the page after the last one shown
+    """
+
+    view = _last_view(session)
+
+    row_count = len(view)
+
+    page_count = max(math.ceil(row_count / RESULT_PAGE_SIZE), 1)
+
+    page = session.last_page + 1 if number is None else int(number)
+
+    if not 1 <= page <= page_count:
+        raise ValueError(f"Page must be between 1 and {page_count}")
+
+    session.last_page = page
+
+    return [
+        TableOutput(
+            rows=list(view.rows(offset=(page - 1) * RESULT_PAGE_SIZE, limit=RESULT_PAGE_SIZE)),
+            columns=view.columns
+        ),
+        f"Page {page} of {page_count} ({row_count} row(s) in total)"
+    ]
+
+
+def _cols(session: "DebugSession", columns: str = "") -> List:
+    """ Choose which columns of the last result are shown, or show them all again if none are given
+
+    :param session: Current DebugSession
+    :param columns: Names of the columns, separated by commas or spaces
+    """
+
+    names = columns.replace(",", " ").split()
+
+    _last_view(session).select_columns(names or None)
+
+    return _show_view(session)
+
+
+def _sort(session: "DebugSession", order: str = "") -> List:
+    """ Sort the last result, or restore its original order if no columns are given
+
+    :param session: Current DebugSession
+    :param order: Columns to sort by, separated by commas, each optionally
+                  followed by asc or desc (or preceded by - for descending)
+    """
+
+    order_by = []
+
+    for term in filter(None, (term.strip() for term in order.split(","))):
+
+        column, *direction = term.split()
+
+        direction = [word.lower() for word in direction]
+
+        if direction not in ([], ["asc"], ["desc"]):
+            raise ValueError(f"Can't sort by '{term}'. Use a column name followed by asc or desc.")
+
+        descending = column.startswith("-") or direction == ["desc"]
+
+        order_by.append((column.lstrip("-"), descending))
+
+    _last_view(session).sort(order_by)
+
+    return _show_view(session)
+
+
+def _where(session: "DebugSession", condition: str = "") -> List:
+    """ Filter the last result, keeping rows that also match any earlier filters, or remove all filters
+
+    :param session: Current DebugSession
+    :param condition: Condition such as "status = 'failed'", or nothing to remove filters
+    """
+
+    view = _last_view(session)
+
+    if not condition.strip():
+        view.clear_conditions()
+        return _show_view(session)
+
+    match = _CONDITION_PATTERN.fullmatch(condition.strip())
+
+    if match is None:
+        raise ValueError(f"Can't filter by '{condition}'. Use a column, an operator ({' '.join(COMPARISON_OPERATORS)}) and a value.")
+
+    view.where(
+        column=unquote(match.group("column")),
+        operator=match.group("operator"),
+        value=parse_value(match.group("value"))
+    )
+
+    return _show_view(session)
+
+
+def _show_view(session: "DebugSession", limit: int = RESULT_PAGE_SIZE) -> List:
+    """ Show the first rows of the last result, with a summary of its filters and sort order
+
+    :param session: Current DebugSession
+    :param limit: Most rows to show
+    """
+
+    view = _last_view(session)
+
+    session.last_page = 1
+
+    return [
+        TableOutput(
+            rows=list(view.rows(limit=limit)),
+            columns=view.columns
+        ),
+        view.describe()
+    ]
+
+
+def _last_view(session: "DebugSession") -> ResultView:
+    """ Returns a view of the last table a statement returned, raising NoResultError if there isn't one
+
+    :param session: Current DebugSession
+    """
+
+    if session.last_view is None:
+        raise NoResultError("No statement has returned a result yet")
+
+    return session.last_view
+
+
+def _profile_result(session: "DebugSession", statement: str) -> List[TableOutput]:
+    """ Summarize each column of a statement's result, reading it a batch at a time
+
+    :param session: Current DebugSession
+    :param statement: Statement whose result to profile
+    """
+
+    stream = _route_statement(session, statement).stream_statement(
+        statement=statement,
+        variables=session.bindable_variables
+    )
+
+    with stream:
+
+        if not stream.columns:
+            raise NoResultError("The statement didn't return a result to profile")
+
+        profiles = profile_stream(stream)
+
+    return [profile_table(profiles)]
+
+
 def _rename(session: "DebugSession", connection_name: str):
     """ Rename the current connection
 
@@ -202,6 +748,195 @@ def _rename(session: "DebugSession", connection_name: str):
     session.current_connection_name = connection_name
 
 
+def _sample(session: "DebugSession", size: str, statement: str) -> List:
+    """ Show a uniform random sample of a statement's rows, reading the whole result but keeping only the sample
+
+    The statement may be preceded by a budget=SECONDS option, after which
+    reading stops and a sample of the rows read so far is shown.
+
+    :param session: Current DebugSession
+    :param size: Number of rows to sample
+    :param statement: Statement to sample, optionally preceded by options
+    """
+
+    options, statement = parse_options(
+        s=statement,
+        allowed_options=("budget",)
+    )
+
+    budget = float(options["budget"]) if "budget" in options else None
+
+    stream = _route_statement(session, statement).stream_statement(
+        statement=statement,
+        variables=session.bindable_variables
+    )
+
+    with stream:
+
+        if not stream.columns:
+            raise NoResultError("The statement didn't return a result to sample")
+
+        sample = sample_stream(
+            stream=stream,
+            size=int(size),
+            budget=budget
+        )
+
+    return sample_outputs(sample, columns=stream.columns, budget=budget)
+
+
+def _set(session: "DebugSession", name: str, value: str):
+    """ Set a variable that statements can reference as :name
+
+    :param session: Current DebugSession
+    :param name: Name of the variable
+    :param value: Value of the variable, as a Python literal or plain text
+    """
+
+    session.variables[name] = parse_value(value)
+
+
+def _unset(session: "DebugSession", name: str):
+    """ Remove a variable set with !set
+
+    :param session: Current DebugSession
+    :param name: Name of the variable
+    """
+
+    try:
+        del session.variables[name]
+    except KeyError:
+        raise KeyError(f"Variable '{name}' is not set")
+
+
+def _vars(session: "DebugSession") -> List[TableOutput]:
+    """ List variables statements can reference
+
+    :param session: Current DebugSession
+    """
+
+    columns = [
+        "Variable",
+        "Value",
+        "Type",
+        "Source"
+    ]
+
+    # Variables set with !set hide caller variables of the same name
+    rows = [
+        (name, repr(value), type(value).__name__, "set")
+        for name, value
+        in sorted(session.variables.items())
+    ]
+
+    rows.extend(
+        (name, repr(value), type(value).__name__, "caller")
+        for name, value
+        in sorted(session.caller_variables.items())
+        if name not in session.variables
+    )
+
+    return [
+        TableOutput(
+            rows=rows,
+            columns=columns
+        )
+    ]
+
+
+def _slowlog(session: "DebugSession", filters: str = "") -> List:
+    """ Show the most recent entries in the slow statement log
+
+    Entries can be filtered with limit=N (default 20), connection=NAME,
+    min_ms=N and contains=TEXT options.
+
+    :param session: Current DebugSession
+    :param filters: Filter options
+    """
+
+    slow_log = active_slow_log()
+
+    if slow_log is None:
+        return ["The slow log isn't enabled. Call dbreak.enable_slow_log() from the application to start it."]
+
+    options, rest = parse_options(
+        s=filters,
+        allowed_options=("limit", "connection", "min_ms", "contains")
+    )
+
+    if rest:
+        raise ValueError(f"Unrecognized filter '{rest}'. Filters are limit=N connection=NAME min_ms=N contains=TEXT")
+
+    entries = slow_log.entries(
+        limit=int(options.get("limit", 20)),
+        connection=options.get("connection"),
+        min_ms=float(options["min_ms"]) if "min_ms" in options else None,
+        contains=options.get("contains")
+    )
+
+    columns = [
+        "Timestamp",
+        "Connection",
+        "Duration (ms)",
+        "Rows",
+        "Statement"
+    ]
+
+    rows = [
+        (entry["timestamp"], entry["connection"], entry["duration_ms"], entry["rows"], entry["statement"])
+        for entry
+        in entries
+    ]
+
+    return [
+        TableOutput(
+            rows=rows,
+            columns=columns
+        )
+    ]
+
+
+def _stash(session: "DebugSession", name: str, statement: str) -> List[str]:
+    """ Copy a statement's result from the current connection into a table in the scratch database
+
+    The statement may be preceded by append=true to add to an existing
+    table, or replace=true to drop it first.
+
+    :param session: Current DebugSession
+    :param name: Name of the table to create
+    :param statement: Statement whose result is copied, optionally preceded by options
+    """
+
+    options, statement = parse_options(
+        s=statement,
+        allowed_options=("append", "replace")
+    )
+
+    scratch = session.open_connection(SCRATCH_CONNECTION_NAME)
+
+    source = _route_statement(session, statement)
+
+    stream = source.stream_statement(
+        statement=statement,
+        variables=session.bindable_variables
+    )
+
+    with scratch.lock, stream:
+
+        if not stream.columns:
+            raise NoResultError("The statement didn't return a result to stash")
+
+        rows = stash_stream(
+            scratch=scratch,
+            table=name,
+            stream=stream,
+            append=options.get("append", "false").lower() == "true",
+            replace=options.get("replace", "false").lower() == "true"
+        )
+
+    return [f"Stashed {rows} row(s) in {name}. Query it with {SHELL_COMMAND_INDICATOR}switch {SCRATCH_CONNECTION_NAME}."]
+
+
 def _switch(session: "DebugSession", connection_name: str):
     """ Switch to a different connection
 
@@ -213,10 +948,40 @@ def _switch(session: "DebugSession", connection_name: str):
     session.current_connection_name = connection_name
 
 
+def _write(session: "DebugSession", statement: str) -> [List, None]:
+    """ Execute a statement on the application's connection, even while reads are isolated
+
+    :param session: Current DebugSession
+    :param statement: Text of statement to execute
+    """
+
+    return _run_statement(
+        session=session,
+        wrapper=session.current_connection,
+        statement=statement
+    )
+
+
 # Commands available to all connections
 # Individual custom_commands dicts defined in ConnectionWrapper
 # objects should follow this same format.
 SHELL_COMMANDS = {
+    "bench": {
+        "func": _bench,
+        "description": "Run a statement n times and report latency and throughput "
+                       "(options: warmup=N concurrency=N)",
+        "arguments": ["n", "statement"],
+        "verbose_final_argument": True
+    },
+
+    "cols": {
+        "func": _cols,
+        "description": "Show only some columns of the last result, or all of them if none are given",
+        "arguments": ["columns"],
+        "minimum_arguments": 0,
+        "verbose_final_argument": True
+    },
+
     "connections": {
         "func": _connections,
         "description": "List connections available for switch statement",
@@ -224,6 +989,22 @@ SHELL_COMMANDS = {
         "verbose_final_argument": False
     },
 
+    "copy": {
+        "func": _copy,
+        "description": "Copy a statement's result into a table on another connection "
+                       "(options: create=true commit_every=N)",
+        "arguments": ["target_connection", "target_table", "statement"],
+        "verbose_final_argument": True
+    },
+
+    "diff": {
+        "func": _diff,
+        "description": "Compare a statement's result on two connections "
+                       "(options: key=COLUMN[,COLUMN...] ordered=true sample=N)",
+        "arguments": ["connection_a", "connection_b", "statement"],
+        "verbose_final_argument": True
+    },
+
     "execute": {
         "func": _execute_in_database,
         "description": "Execute a statement against the database",
@@ -238,6 +1019,20 @@ SHELL_COMMANDS = {
         "verbose_final_argument": False
     },
 
+    "explain": {
+        "func": _explain,
+        "description": "Show the plan for a statement, flagging full scans, temp B-trees and spills",
+        "arguments": ["statement"],
+        "verbose_final_argument": True
+    },
+
+    "export": {
+        "func": _export,
+        "description": "Write every row of the last result to a file, as CSV or (for .jsonl files) JSON lines",
+        "arguments": ["path"],
+        "verbose_final_argument": True
+    },
+
     "file": {
         "func": _file,
         "description": "Read and execute a database statement from a file",
@@ -245,6 +1040,14 @@ SHELL_COMMANDS = {
         "verbose_final_argument": True
     },
 
+    "head": {
+        "func": _head,
+        "description": "Show the first n rows of the last result, with any filters and sort order applied",
+        "arguments": ["n"],
+        "minimum_arguments": 0,
+        "verbose_final_argument": False
+    },
+
     "help": {
         "func": _help,
         "description": "Show debugger help information",
@@ -252,6 +1055,38 @@ SHELL_COMMANDS = {
         "verbose_final_argument": False
     },
 
+    "isolate": {
+        "func": _isolate,
+        "description": "Toggle sending reads to a separate read-only connection",
+        "arguments": [],
+        "verbose_final_argument": False
+    },
+
+    "join": {
+        "func": _join,
+        "description": "Join the results of statements on two connections (e.g. !join db cache id=user_id "
+                       "\"select ...\" \"select ...\"), optionally as a left, right or full join",
+        "arguments": ["connection_a", "connection_b", "condition", "statement_a", "statement_b", "type"],
+        "minimum_arguments": 5,
+        "verbose_final_argument": False
+    },
+
+    "page": {
+        "func": _page,
+        "description": f"Show the next (or nth) page of {RESULT_PAGE_SIZE} rows of the last result",
+        "arguments": ["n"],
+        "minimum_arguments": 0,
+        "verbose_final_argument": False
+    },
+
+    "profile-result": {
+        "func": _profile_result,
+        "description": "Summarize each column of a statement's result: nulls, min/max, mean, "
+                       "distinct values, most frequent values and string lengths",
+        "arguments": ["statement"],
+        "verbose_final_argument": True
+    },
+
     "rename": {
         "func": _rename,
         "description": "Rename the current connection",
@@ -259,10 +1094,81 @@ SHELL_COMMANDS = {
         "verbose_final_argument": True
     },
 
+    "sample": {
+        "func": _sample,
+        "description": "Show a uniform random sample of n rows from a statement's whole result "
+                       "(options: budget=SECONDS to stop reading early)",
+        "arguments": ["n", "statement"],
+        "verbose_final_argument": True
+    },
+
+    "set": {
+        "func": _set,
+        "description": "Set a variable that statements can reference as :name",
+        "arguments": ["name", "value"],
+        "verbose_final_argument": True
+    },
+
+    "slowlog": {
+        "func": _slowlog,
+        "description": "Show recent slow statements "
+                       "(filters: limit=N connection=NAME min_ms=N contains=TEXT)",
+        "arguments": ["filters"],
+        "minimum_arguments": 0,
+        "verbose_final_argument": True
+    },
+
+    "sort": {
+        "func": _sort,
+        "description": "Sort the last result without re-running it (e.g. !sort created desc, id), "
+                       "or restore its order if no columns are given",
+        "arguments": ["columns"],
+        "minimum_arguments": 0,
+        "verbose_final_argument": True
+    },
+
+    "stash": {
+        "func": _stash,
+        "description": f"Copy a statement's result into a table in the {SCRATCH_CONNECTION_NAME} database "
+                       "(options: append=true replace=true)",
+        "arguments": ["table", "statement"],
+        "verbose_final_argument": True
+    },
+
     "switch": {
         "func": _switch,
         "description": "Switch to another connection",
         "arguments": ["connection"],
         "verbose_final_argument": True
+    },
+
+    "unset": {
+        "func": _unset,
+        "description": "Remove a variable set with !set",
+        "arguments": ["name"],
+        "verbose_final_argument": True
+    },
+
+    "vars": {
+        "func": _vars,
+        "description": "List variables statements can reference as :name",
+        "arguments": [],
+        "verbose_final_argument": False
+    },
+
+    "where": {
+        "func": _where,
+        "description": "Filter the last result without re-running it (e.g. !where status = 'failed'), "
+                       "or remove all filters if no condition is given",
+        "arguments": ["condition"],
+        "minimum_arguments": 0,
+        "verbose_final_argument": True
+    },
+
+    "write": {
+        "func": _write,
+        "description": "Execute a statement on the application's connection while reads are isolated",
+        "arguments": ["statement"],
+        "verbose_final_argument": True
     }
 }
@@ -1,12 +1,31 @@
 """ Holds functions and classes related to managing and wrapping database connections """
 
+import collections
+import concurrent.futures
+import functools
+import inspect
 import itertools
 import pkg_resources
 import operator
+import sqlite3
+import time
+import types
 
-from typing import Tuple, Dict, Iterable, Generator, Type
+from typing import Tuple, Dict, Iterable, Generator, Type, Mapping, Callable, Union, List, Sequence
 
 from .constants import DEFAULT_CONNECTION_NAME_PATTERN
+from .exc import ConnectionTimeoutError, ReadConnectionUnavailableError
+from .locks import connection_lock, release_connection_lock
+from .outputs import TableOutput, ResultStream
+from .plans import PlanNode
+from .registry import wrapper_registry
+
+# Time taken by a single statement, split into executing it
+# and fetching its results, along with the number of rows fetched
+StatementTiming = collections.namedtuple(
+    "StatementTiming",
+    ["execute_seconds", "fetch_seconds", "rows"]
+)
 
 
 class ConnectionWrapper:
@@ -28,6 +47,20 @@ class ConnectionWrapper:
     #  2 = User-defined wrappers
     SEARCH_RANK = -1
 
+    # Connection classes this wrapper handles, or their "module.QualifiedName"
+    # strings for drivers that might not be installed. Subclasses declaring
+    # these (or HANDLES_MODULES) are added to the wrapper registry, which is
+    # searched before falling back to asking each subclass via handles().
+    HANDLES_TYPES = ()
+
+    # Module name prefixes (such as "psycopg2") whose connection classes this
+    # wrapper handles
+    HANDLES_MODULES = ()
+
+    # Cheap statement used by ping() to check the connection
+    # works, or None if the connection can't be checked
+    PING_STATEMENT = None
+
     def __init__(self, raw_connection: object):
         """ Initialize a ConnectionWrapper
 
@@ -37,12 +70,39 @@ class ConnectionWrapper:
         # Connection to the underlying database
         self.raw_connection = raw_connection
 
+        # Held while the console uses the connection, so that
+        # application threads sharing the same raw connection
+        # can avoid using it at the same time
+        self.lock = connection_lock(raw_connection)
+
         # Any custom shell commands the user should
         # be allowed to use while connected to this
         # database. Follows the same format as
         # commands.SHELL_COMMANDS.
         self.custom_commands = {}
 
+        # Separate read-only connection to the same database, which reads
+        # are sent to while isolated (see isolate_reads)
+        self.read_connection = None
+
+    def __init_subclass__(cls, **kwargs):
+        """ Register subclasses that declare the connections they handle, and note the ranks of those using handles() """
+
+        super().__init_subclass__(**kwargs)
+
+        # Only declarations made on the class itself count, so subclasses
+        # inheriting them aren't registered by accident
+        if "HANDLES_TYPES" in vars(cls) or "HANDLES_MODULES" in vars(cls):
+
+            wrapper_registry.register(
+                wrapper_class=cls,
+                types=cls.HANDLES_TYPES,
+                modules=cls.HANDLES_MODULES
+            )
+
+        if cls.handles.__func__ is not ConnectionWrapper.handles.__func__:
+            wrapper_registry.note_handles_wrapper(cls)
+
     def execute_statement(self, statement: str):
         """ Return the results of executing a database statement
 
@@ -51,6 +111,187 @@ class ConnectionWrapper:
 
         raise NotImplementedError("Not implemented in base class")
 
+    def execute_statement_with_variables(self, statement: str, variables: Mapping[str, object]):
+        """ Return the results of executing a statement that may reference session variables
+
+        Wrappers for databases supporting bind parameters should override this
+        to bind any :name references to variables. By default variables are
+        ignored and the statement is executed as-is.
+
+        :param statement: Statement to execute in the database
+        :param variables: Values available for binding, keyed by name
+        """
+
+        return self.execute_statement(statement)
+
+    def time_statement(self, statement: str, variables: [Mapping[str, object], None] = None) -> StatementTiming:
+        """ Execute a statement and measure how long it takes, discarding the results
+
+        Wrappers that can separate executing a statement from fetching its
+        results should override this. By default the whole call is counted
+        as execution time.
+
+        :param statement: Statement to execute in the database
+        :param variables: Values available for binding, keyed by name
+        """
+
+        start = time.perf_counter()
+
+        outputs = self.execute_statement_with_variables(statement, variables or {})
+
+        elapsed = time.perf_counter() - start
+
+        rows = sum(
+            len(output.rows)
+            for output in outputs or ()
+            if isinstance(output, TableOutput)
+        )
+
+        return StatementTiming(
+            execute_seconds=elapsed,
+            fetch_seconds=0.0,
+            rows=rows
+        )
+
+    def stream_statement(self, statement: str, variables: Mapping[str, object]) -> ResultStream:
+        """ Execute a statement, returning its rows as a ResultStream to read a batch at a time
+
+        Wrappers that can fetch results incrementally should override this.
+        By default the whole result is read first, then streamed as a single
+        batch, so only the last table a statement returns is streamed.
+
+        :param statement: Statement to execute in the database
+        :param variables: Values available for binding, keyed by name
+        """
+
+        outputs = self.execute_statement_with_variables(statement, variables)
+
+        tables = [output for output in outputs or () if isinstance(output, TableOutput)]
+
+        if not tables:
+            return ResultStream(columns=[], batches=[])
+
+        return ResultStream(
+            columns=tables[-1].columns,
+            batches=[tables[-1].rows]
+        )
+
+    def explain(self, statement: str, variables: Mapping[str, object]) -> List[PlanNode]:
+        """ Return the database's plan for a statement, as trees of PlanNode objects
+
+        Wrappers for databases that can explain statements should override
+        this, using the parsers in the plans module where they fit.
+
+        :param statement: Statement to explain
+        :param variables: Values available for binding, keyed by name
+        """
+
+        raise NotImplementedError(f"{type(self).__name__} can't explain statements")
+
+    def create_table(self, table: str, columns: Sequence[str], sample_rows: Iterable[Sequence] = ()):
+        """ Create a table to copy rows into, such as with !stash
+
+        Wrappers for databases that can should override this, along with insert_rows.
+
+        :param table: Name of the table
+        :param columns: Names of its columns
+        :param sample_rows: Rows the column types can be judged from
+        """
+
+        raise NotImplementedError(f"{type(self).__name__} can't create tables")
+
+    def insert_rows(self, table: str, columns: Sequence[str], rows: Sequence[Sequence]) -> int:
+        """ Insert a batch of rows into a table, returning the number inserted
+
+        :param table: Name of the table
+        :param columns: Names of the columns the rows' values go in
+        :param rows: Rows to insert
+        """
+
+        raise NotImplementedError(f"{type(self).__name__} can't insert rows")
+
+    def commit(self):
+        """ Commit changes made with create_table and insert_rows
+
+        Wrappers for databases with transactions should override this. By
+        default does nothing.
+        """
+
+        pass
+
+    def rollback(self):
+        """ Discard changes made with create_table and insert_rows since the last commit
+
+        Wrappers for databases with transactions should override this. By
+        default does nothing.
+        """
+
+        pass
+
+    def usable_from_other_threads(self) -> bool:
+        """ Returns True if the connection can be used from threads besides the console's, such as by !copy
+
+        Wrappers for drivers that refuse to be used from another thread
+        should override this. By default returns True.
+        """
+
+        return True
+
+    def ping(self):
+        """ Check the connection works, raising an exception if it doesn't
+
+        Runs PING_STATEMENT if one is set, otherwise does nothing.
+        """
+
+        if self.PING_STATEMENT is not None:
+            self.execute_statement(self.PING_STATEMENT)
+
+    def open_read_connection(self) -> "ConnectionWrapper":
+        """ Open a separate read-only connection to the same database
+
+        Wrappers able to should override this, so console reads don't join the
+        application's open transaction or hold its locks. By default raises
+        ReadConnectionUnavailableError.
+        """
+
+        raise ReadConnectionUnavailableError(f"{type(self).__name__} can't open a separate read connection")
+
+    def isolate_reads(self):
+        """ Open a read-only connection for reads to be sent to, if one isn't open already """
+
+        if self.read_connection is None:
+            self.read_connection = self.open_read_connection()
+
+    def stop_isolating_reads(self):
+        """ Close the read-only connection, sending reads to the application's connection again """
+
+        if self.read_connection is not None:
+            self.read_connection.close()
+            self.read_connection = None
+
+    def detach(self):
+        """ Release any resources held for the console when the debug session ends
+
+        The raw connection itself belongs to the application and stays open.
+        """
+
+        self.stop_isolating_reads()
+
+    def close(self):
+        """ Release console resources and close the raw connection
+
+        Only used for connections the console opened itself.
+        """
+
+        self.detach()
+
+        close = getattr(self.raw_connection, "close", None)
+
+        if close is not None:
+            close()
+
+        release_connection_lock(self.raw_connection)
+
     @classmethod
     def find_handler(cls, raw_connection: object) -> [None, Type["ConnectionWrapper"]]:
         """ Find an appropriate ConnectionWrapper class for a given connection
@@ -97,11 +338,247 @@ class ConnectionWrapper:
         return False
 
 
-def prepare_connections(unnamed_connections: Tuple, named_connections: Dict) -> Dict[str, ConnectionWrapper]:
+def is_async_connection(raw_connection: object) -> bool:
+    """ Returns True if a connection's core methods are coroutines
+
+    Connections from asyncio drivers (aiosqlite, asyncpg, etc.) look much like
+    DB API connections, but need their methods awaited on an event loop.
+
+    :param raw_connection: An unwrapped database connection to test
+    """
+
+    return any(
+        inspect.iscoroutinefunction(getattr(raw_connection, method_name, None))
+        for method_name
+        in ("cursor", "execute", "fetch", "commit", "close")
+    )
+
+
+class LazyConnection:
+    """ Stands in for a connection that isn't opened until it's first used """
+
+    # Whether the session should close the connection when it ends
+    owns_connection = True
+
+    def __init__(self, factory: Callable[[], object], description: [str, None] = None):
+        """ Initialize a LazyConnection
+
+        :param factory: Zero-argument callable returning a raw or wrapped connection
+        :param description: How to describe the connection before it's opened
+        """
+
+        self.factory = factory
+
+        self.description = description or _describe_factory(factory)
+
+    @property
+    def status(self) -> str:
+        """ Returns a short description of the connection's state, for !connections """
+
+        return "(not opened)"
+
+    @property
+    def ready_connection(self) -> [ConnectionWrapper, None]:
+        """ Returns the wrapped connection if it can be had without waiting, otherwise None """
+
+        return None
+
+    def open(self) -> ConnectionWrapper:
+        """ Open and wrap the connection """
+
+        return wrap_connection(
+            raw_connection=self.factory()
+        )
+
+    def discard(self):
+        """ Called when the session ends without having used the connection """
+
+        pass
+
+
+class PendingConnection(LazyConnection):
+    """ Stands in for a connection being prepared on a background thread """
+
+    def __init__(self, future: concurrent.futures.Future, description: str,
+                 owns_connection: bool, timeout: [float, None] = None):
+        """ Initialize a PendingConnection
+
+        :param future: Future resolving to the prepared ConnectionWrapper
+        :param description: How to describe the connection while it's being prepared
+        :param owns_connection: Whether the connection was opened for the console
+        :param timeout: Seconds from now the connection has to become ready
+        """
+
+        super().__init__(
+            factory=future.result,
+            description=description
+        )
+
+        self.future = future
+
+        self.owns_connection = owns_connection
+
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+
+    @property
+    def timed_out(self) -> bool:
+        """ Returns True if the connection wasn't ready in time """
+
+        return (
+            not self.future.done()
+            and self.deadline is not None
+            and time.monotonic() >= self.deadline
+        )
+
+    @property
+    def status(self) -> str:
+        """ Returns a short description of the connection's state, for !connections """
+
+        if not self.future.done():
+            return "(timed out)" if self.timed_out else "(preparing)"
+
+        error = self.future.exception()
+
+        if error is not None:
+            return f"(failed: {type(error).__name__})"
+
+        return "(ready)"
+
+    @property
+    def ready_connection(self) -> [ConnectionWrapper, None]:
+        """ Returns the wrapped connection if it can be had without waiting, otherwise None """
+
+        if self.future.done() and self.future.exception() is None:
+            return self.future.result()
+
+        return None
+
+    def open(self) -> ConnectionWrapper:
+        """ Wait for the connection to be prepared, up to the time remaining """
+
+        timeout = None if self.deadline is None else max(self.deadline - time.monotonic(), 0)
+
+        try:
+            return self.future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise ConnectionTimeoutError(f"Connection '{self.description}' wasn't ready in time") from None
+
+    def discard(self):
+        """ Called when the session ends without having used the connection
+
+        Connections still being prepared are released once they're ready.
+        """
+
+        self.future.add_done_callback(self._release)
+
+    def _release(self, future: concurrent.futures.Future):
+        """ Close or detach a prepared connection nobody used
+
+        :param future: Finished future holding the connection
+        """
+
+        if future.exception() is not None:
+            return
+
+        wrapper = future.result()
+
+        if self.owns_connection:
+            wrapper.close()
+        else:
+            wrapper.detach()
+
+
+def _describe_factory(factory: Callable) -> str:
+    """ Returns a short description of a connection factory
+
+    :param factory: Zero-argument callable returning a connection
+    """
+
+    if isinstance(factory, functools.partial):
+        return f"{_describe_factory(factory.func)}(...)"
+
+    return getattr(factory, "__qualname__", None) or repr(factory)
+
+
+def open_sqlite_spec(spec: str) -> sqlite3.Connection:
+    """ Open a sqlite connection from a spec like "sqlite:///path/to.db"
+
+    Follows the same convention as SQLAlchemy URLs: "sqlite:///relative.db",
+    "sqlite:////absolute.db", and "sqlite://" for an in-memory database.
+
+    :param spec: Spec to open
+    """
+
+    path = spec[len("sqlite://"):]
+
+    # Spec connections may be opened on a different thread
+    # than the console uses them from
+    if not path:
+        return sqlite3.connect(":memory:", check_same_thread=False)
+
+    return sqlite3.connect(path[1:], check_same_thread=False)
+
+
+# Functions opening connections from specs, keyed by the spec's scheme.
+# Plugins may add more through the "connection_specs" entry point group.
+CONNECTION_SPEC_OPENERS = {
+    "sqlite": open_sqlite_spec
+}
+
+
+def resolve_connection_spec(spec: str) -> LazyConnection:
+    """ Find a way to open a connection described by a spec like "scheme://..."
+
+    Nothing is opened until the returned LazyConnection is used.
+
+    :param spec: Spec describing the connection
+    """
+
+    scheme, separator, _ = spec.partition("://")
+
+    if not separator:
+        raise ValueError(f"Connection spec '{spec}' must look like scheme://...")
+
+    opener = CONNECTION_SPEC_OPENERS.get(scheme)
+
+    if opener is None:
+
+        for entry_point in pkg_resources.iter_entry_points("connection_specs", name=scheme):
+            opener = entry_point.load()
+            break
+
+        else:
+            raise TypeError(f"No plugin found to open connection specs with scheme '{scheme}'")
+
+    return LazyConnection(
+        factory=functools.partial(opener, spec),
+        description=spec
+    )
+
+
+def is_connection_factory(connection: object) -> bool:
+    """ Returns True if an object is a function returning a connection, rather than a connection
+
+    Only functions, methods and functools.partial objects count, since some
+    connection objects (like sqlite3's) are callable themselves.
+
+    :param connection: Object given to start_console
+    """
+
+    return isinstance(
+        connection,
+        (types.FunctionType, types.MethodType, types.BuiltinFunctionType, functools.partial)
+    )
+
+
+def prepare_connections(unnamed_connections: Tuple, named_connections: Dict) -> Dict[str, Union[ConnectionWrapper, LazyConnection]]:
     """ Wrap and name all provided named and unnamed connections
 
-    :param unnamed_connections: Raw or wrapped db connections to assign default names
-    :param named_connections: Raw or wrapped db connections with specific names attached
+    Factories and connection specs are not opened, but returned as
+    LazyConnection objects for the session to open when needed.
+
+    :param unnamed_connections: Raw or wrapped db connections, factories or specs to assign default names
+    :param named_connections: Raw or wrapped db connections, factories or specs with specific names attached
     """
 
     # Provide a name for all unnamed_connections and merge
@@ -122,6 +599,99 @@ def prepare_connections(unnamed_connections: Tuple, named_connections: Dict) ->
     )
 
 
+def prepare_connections_concurrently(unnamed_connections: Tuple, named_connections: Dict,
+                                     starting_connection: [str, None] = None, workers: int = 4,
+                                     timeout: [float, None] = None,
+                                     ping: bool = False) -> Dict[str, PendingConnection]:
+    """ Open, wrap, and optionally ping connections on a bounded pool of threads
+
+    Returns as soon as the starting connection is ready (or has failed),
+    leaving the rest to finish in the background. Each connection is given
+    timeout seconds to become ready, after which using it raises
+    ConnectionTimeoutError. Raw connections must allow being used from a
+    thread other than the one that created them (for sqlite3, connect with
+    check_same_thread=False) when pinged or opened by a factory.
+
+    :param unnamed_connections: Raw or wrapped db connections, factories or specs to assign default names
+    :param named_connections: Raw or wrapped db connections, factories or specs with specific names attached
+    :param starting_connection: Name of the connection the console starts on, or None for the first
+    :param workers: Most connections to prepare at once
+    :param timeout: Seconds each connection has to become ready, or None to wait indefinitely
+    :param ping: If True, check each connection works as part of preparing it
+    """
+
+    named_raw_connections = list(
+        itertools.chain(
+            name_connections(unnamed_connections),
+            named_connections.items()
+        )
+    )
+
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(min(workers, len(named_raw_connections)), 1),
+        thread_name_prefix="dbreak-prepare"
+    )
+
+    connections = {}
+
+    try:
+        for name, connection in named_raw_connections:
+
+            # Factories and specs are deferred here (checking specs have a
+            # known scheme up front), while finding wrappers for existing
+            # connections is left to the preparation threads
+            if isinstance(connection, (str, LazyConnection)) or is_connection_factory(connection):
+                connection = wrap_or_defer_connection(connection)
+                description = connection.description
+            else:
+                description = type(connection).__name__
+
+            connections[name] = PendingConnection(
+                future=executor.submit(_prepare_connection, connection, ping),
+                description=description,
+                owns_connection=isinstance(connection, LazyConnection),
+                timeout=timeout
+            )
+
+    finally:
+        # Let queued connections finish without waiting for them here
+        executor.shutdown(wait=False)
+
+    # Hold off starting the console until the starting connection is usable
+    if connections:
+        starting = connections.get(starting_connection) or next(iter(connections.values()))
+
+        concurrent.futures.wait([starting.future], timeout=timeout)
+
+    return connections
+
+
+def _prepare_connection(connection: object, ping: bool) -> ConnectionWrapper:
+    """ Open or wrap a connection and optionally ping it, on a preparation thread
+
+    :param connection: Raw or wrapped connection, or LazyConnection to open
+    :param ping: If True, check the connection works
+    """
+
+    if isinstance(connection, LazyConnection):
+        wrapper = connection.open()
+    else:
+        wrapper = wrap_connection(connection)
+
+    if ping:
+        try:
+            wrapper.ping()
+        except Exception:
+
+            # Don't leak connections opened just to be pinged
+            if isinstance(connection, LazyConnection):
+                wrapper.close()
+
+            raise
+
+    return wrapper
+
+
 def name_connections(raw_connections: Iterable) -> Generator[Tuple[str, object], None, None]:
     """ Provide a name to an iterable of raw connection objects
 
@@ -137,21 +707,39 @@ def name_connections(raw_connections: Iterable) -> Generator[Tuple[str, object],
         yield name, raw_connection
 
 
-def wrap_connections(named_raw_connections: Iterable[Tuple[str, object]]) -> Dict[str, ConnectionWrapper]:
+def wrap_connections(named_raw_connections: Iterable[Tuple[str, object]]) -> Dict[str, Union[ConnectionWrapper, LazyConnection]]:
     """ Wrap all connections in ConnectionWrappers and produce a name-keyed dictionary
 
     :param named_raw_connections: Iterable of (name, raw connection) tuples
     """
 
     return {
-        name: wrap_connection(
-            raw_connection=raw_connection
+        name: wrap_or_defer_connection(
+            connection=raw_connection
         )
         for name, raw_connection
         in named_raw_connections
     }
 
 
+def wrap_or_defer_connection(connection: object) -> Union[ConnectionWrapper, LazyConnection]:
+    """ Wrap a connection, or defer opening it if given a factory or spec
+
+    :param connection: A connection, zero-argument factory, or spec string
+    """
+
+    if isinstance(connection, LazyConnection):
+        return connection
+
+    elif isinstance(connection, str):
+        return resolve_connection_spec(connection)
+
+    elif is_connection_factory(connection):
+        return LazyConnection(connection)
+
+    return wrap_connection(connection)
+
+
 def wrap_connection(raw_connection: object) -> ConnectionWrapper:
     """ Wrap a connection in the appropriate ConnectionWrapper
 
@@ -161,27 +749,38 @@ def wrap_connection(raw_connection: object) -> ConnectionWrapper:
     if isinstance(raw_connection, ConnectionWrapper):
         return raw_connection
 
-    # Functions used to search for potential wrappers
-    search_functions = (
-        _search_loaded_wrappers,
-        _search_entry_points
-    )
+    # Registered wrappers are found with a few lookups, but wrappers only
+    # defining handles() are still asked if any of them could outrank it
+    wrapper_class = _search_registry(raw_connection)
 
-    # Apply all search functions to the raw connection
-    # and return an initialized wrapper if a match is found
-    for search_function in search_functions:
+    if wrapper_class is None or wrapper_registry.highest_handles_rank > wrapper_class.SEARCH_RANK:
 
-        wrapper_class = search_function(raw_connection)
+        loaded_class = _search_loaded_wrappers(raw_connection)
 
-        if wrapper_class is not None:
+        if loaded_class is not None and (wrapper_class is None or loaded_class.SEARCH_RANK > wrapper_class.SEARCH_RANK):
+            wrapper_class = loaded_class
 
-            return wrapper_class(
-                raw_connection=raw_connection
-            )
+    if wrapper_class is None:
+        wrapper_class = _search_entry_points(raw_connection)
+
+    if wrapper_class is not None:
+
+        return wrapper_class(
+            raw_connection=raw_connection
+        )
 
     raise TypeError(f"Could not find connection wrapper for {type(raw_connection).__name__}")
 
 
+def _search_registry(raw_connection: object) -> [Type[ConnectionWrapper], None]:
+    """ Look up wrappers registered for the connection's type or module
+
+    :param raw_connection: A database connection
+    """
+
+    return wrapper_registry.find(raw_connection)
+
+
 def _search_loaded_wrappers(raw_connection: object) -> [Type[ConnectionWrapper], None]:
     """ Search ConnectionWrapper for subclasses that handle a connection type
 
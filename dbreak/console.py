@@ -1,20 +1,39 @@
 """ Holds functions related to the interactive debugging console """
 
+import asyncio
+import concurrent.futures
+import functools
 import sys
+import threading
+import weakref
 
-from typing import Iterable
+from typing import Iterable, List, TextIO
 
 import tabulate
 
-from .connections import prepare_connections
-from .constants import SHELL_COMMAND_INDICATOR
+from .aio import AsyncConnectionWrapper
+from .connections import prepare_connections, prepare_connections_concurrently
+from .constants import SHELL_COMMAND_INDICATOR, RESULT_PAGE_SIZE
 from .commands import execute_command
 from .exc import StopSession
+from .locks import ConsoleQueue
 from .sessions import DebugSession
 from .outputs import TableOutput
+from .spill import SpilledRows
+
+# Queues up breakpoints hit by multiple threads so that
+# only one console is served at a time
+_console_queue = ConsoleQueue()
+
+# Same as above, for consoles awaited from coroutines. Keyed by
+# event loop, since asyncio locks can't be shared between loops.
+_async_console_locks = weakref.WeakKeyDictionary()
 
 
 def start_console(*unnamed_connections: object, starting_connection: str = None,
+                  threaded: bool = False, remote: [str, bool, None] = None,
+                  remote_timeout: [float, None] = None, prepare_workers: [int, None] = None,
+                  prepare_timeout: [float, None] = None, ping: bool = False,
                   **named_connections: object):
     """ Pause execution and start a database debugging console
 
@@ -24,31 +43,189 @@ def start_console(*unnamed_connections: object, starting_connection: str = None,
     they are provided. A starting_connection string may be provided to select
     which connection is opened up with the console.
 
+    Instead of an open connection, a zero-argument function returning one or
+    a spec string such as "sqlite:///app.db" may be given. These are only
+    opened when first switched to or queried, reused for the rest of the
+    session, and closed when the console exits.
+
+    If threaded is True, only the calling thread is paused. Breakpoints hit
+    by other threads while a console is open wait their turn and are served
+    one at a time, in the order they arrived.
+
+    If remote is given, the console is served over a local socket instead of
+    the terminal, for use in processes without a TTY. It may be an address
+    such as "unix:/tmp/debug.sock" or "tcp:127.0.0.1:7000", or True to use a
+    Unix socket in the temp directory. Attach to it with dbreak-attach. If no
+    client attaches within remote_timeout seconds the application resumes.
+
     :param unnamed_connections: Raw or wrapped db connections to assign default names
     :param starting_connection: Name of the connection to use at startup
+    :param threaded: If True, queue consoles started from multiple threads
+    :param remote: Address to serve the console on, or True for the default address
+    :param remote_timeout: Seconds to wait for a remote client before resuming
+    :param prepare_workers: Number of threads to prepare connections on, or None to prepare them in turn
+    :param prepare_timeout: Seconds each connection has to become ready when prepared on threads
+    :param ping: If True, check each connection works when prepared on threads
     :param named_connections: Raw or wrapped db connections with specific names attached
     """
 
     if not isinstance(starting_connection, str) and starting_connection is not None:
         raise TypeError("starting_connection must be a string or None")
 
-    # Wrap and name all connections
-    connections = prepare_connections(
-        unnamed_connections=unnamed_connections,
-        named_connections=named_connections
-    )
+    # Statements may reference the paused code's local variables
+    caller_variables = sys._getframe(1).f_locals
 
-    # Initialize the session object
-    session = DebugSession(
-        connections=connections,
-        current_connection_name=starting_connection
-    )
+    if threaded:
+        _wait_for_console()
+
+    try:
+
+        # Wrap and name all connections
+        if prepare_workers:
+            connections = prepare_connections_concurrently(
+                unnamed_connections=unnamed_connections,
+                named_connections=named_connections,
+                starting_connection=starting_connection,
+                workers=prepare_workers,
+                timeout=prepare_timeout,
+                ping=ping
+            )
+        else:
+            connections = prepare_connections(
+                unnamed_connections=unnamed_connections,
+                named_connections=named_connections
+            )
+
+        # Initialize the session object
+        session = DebugSession(
+            connections=connections,
+            current_connection_name=starting_connection,
+            caller_variables=caller_variables
+        )
+
+        try:
+            if remote:
+
+                # Imported here since remote.py imports this module
+                from .remote import serve_console
+
+                serve_console(
+                    session=session,
+                    address=None if remote is True else remote,
+                    timeout=remote_timeout
+                )
+
+            else:
+
+                # Show starting help information
+                _print_console_intro(session)
+
+                # Enter the main input loop
+                _do_main_loop(session)
+
+        finally:
+            session.close()
+
+    finally:
+
+        if threaded:
+            _console_queue.release()
+
+
+async def start_console_async(*unnamed_connections: object, starting_connection: str = None,
+                              **named_connections: object):
+    """ Pause the awaiting coroutine and start a database debugging console
+
+    Takes the same connection arguments as start_console. Console input and
+    database calls are run on a worker thread, so the rest of the event loop
+    keeps running while the console is open. Connections must therefore be
+    usable from a thread other than the one that created them (for sqlite3,
+    connect with check_same_thread=False).
+
+    Consoles awaited by several coroutines at once are served one at a time.
+
+    :param unnamed_connections: Raw or wrapped db connections to assign default names
+    :param starting_connection: Name of the connection to use at startup
+    :param named_connections: Raw or wrapped db connections with specific names attached
+    """
+
+    if not isinstance(starting_connection, str) and starting_connection is not None:
+        raise TypeError("starting_connection must be a string or None")
+
+    loop = asyncio.get_event_loop()
+
+    # Statements may reference the paused code's local variables
+    caller_variables = sys._getframe(1).f_locals
+
+    # All blocking work for this console happens on a single thread,
+    # so drivers only ever see one thread besides their own
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    try:
+        async with _async_console_lock(loop):
+
+            # Wrap and name all connections (searching plugins may hit the disk)
+            connections = await loop.run_in_executor(
+                executor,
+                functools.partial(
+                    prepare_connections,
+                    unnamed_connections=unnamed_connections,
+                    named_connections=named_connections
+                )
+            )
+
+            # Async drivers' coroutines are run on this loop from the worker
+            # thread, since some drivers' connections are bound to it
+            for wrapper in connections.values():
+                if isinstance(wrapper, AsyncConnectionWrapper) and wrapper.loop is None:
+                    wrapper.loop = loop
+
+            # Initialize the session object
+            session = DebugSession(
+                connections=connections,
+                current_connection_name=starting_connection,
+                caller_variables=caller_variables
+            )
+
+            # Show starting help information
+            _print_console_intro(session)
+
+            # Enter the main input loop
+            try:
+                await _do_main_loop_async(session, executor)
+            finally:
+                await loop.run_in_executor(executor, session.close)
+
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _async_console_lock(loop: asyncio.AbstractEventLoop) -> asyncio.Lock:
+    """ Get the lock queueing up async consoles on an event loop
+
+    :param loop: Event loop the console is running on
+    """
 
-    # Show starting help information
-    _print_console_intro(session)
+    try:
+        return _async_console_locks[loop]
+    except KeyError:
+        return _async_console_locks.setdefault(loop, asyncio.Lock())
 
-    # Enter the main input loop
-    _do_main_loop(session)
+
+def _wait_for_console():
+    """ Block until it is the current thread's turn to use the console """
+
+    owner = _console_queue.owner
+
+    # Let the user know why this breakpoint hasn't opened yet
+    if owner is not None and owner is not threading.current_thread():
+
+        print(
+            f"Thread '{threading.current_thread().name}' is waiting for the debug console "
+            f"(in use by thread '{owner.name}')."
+        )
+
+    _console_queue.acquire()
 
 
 def _print_console_intro(session: DebugSession):
@@ -57,6 +234,15 @@ def _print_console_intro(session: DebugSession):
     :param session: Current DebugSession
     """
 
+    print(_console_intro(session))
+
+
+def _console_intro(session: DebugSession) -> str:
+    """ Construct the console startup greeting
+
+    :param session: Current DebugSession
+    """
+
     lines = (
         "",
         f"Starting debug session on connection '{session.current_connection_name}'.",
@@ -67,7 +253,7 @@ def _print_console_intro(session: DebugSession):
         "\n"
     )
 
-    print("\n".join(lines))
+    return "\n".join(lines)
 
 
 def _do_main_loop(session: DebugSession):
@@ -91,75 +277,156 @@ def _do_main_loop(session: DebugSession):
         # Run the command
         # Abort if StopSession raised (for example, on exit)
         try:
-            outputs = execute_command(
-                command_string=command_string,
-                session=session
+            outputs = _run_command(
+                session=session,
+                command_string=command_string
             )
         except StopSession:
             break
-        except Exception as ex:
-            outputs = [ex]
 
         # Display any outputted data
         _display_outputs(outputs)
 
 
-def _display_outputs(outputs: [None, Iterable]):
+async def _do_main_loop_async(session: DebugSession, executor: concurrent.futures.Executor):
+    """ Same as _do_main_loop, but waits on input and commands without blocking the event loop
+
+    :param session: Current DebugSession
+    :param executor: Executor to run input and commands on
+    """
+
+    loop = asyncio.get_event_loop()
+
+    # Run forever until StopSession is raised or process is killed
+    while True:
+
+        prompt = f"{session.current_connection_name}> "
+
+        # Gather user input
+        command_string = await loop.run_in_executor(executor, input, prompt)
+        command_string = command_string.strip()
+
+        # Ignore lines with just whitespace
+        if not command_string:
+            continue
+
+        # Run the command
+        # Abort if StopSession raised (for example, on exit)
+        try:
+            outputs = await loop.run_in_executor(
+                executor,
+                functools.partial(
+                    _run_command,
+                    session=session,
+                    command_string=command_string
+                )
+            )
+        except StopSession:
+            break
+
+        # Display any outputted data
+        _display_outputs(outputs)
+
+
+def _run_command(session: DebugSession, command_string: str) -> [List, None]:
+    """ Execute a command, returning any exception it raises as an output
+
+    StopSession is the only exception allowed to propagate.
+
+    :param session: Current DebugSession
+    :param command_string: Command entered by the user
+    """
+
+    try:
+        return execute_command(
+            command_string=command_string,
+            session=session
+        )
+    except StopSession:
+        raise
+    except Exception as ex:
+        return [ex]
+
+
+def _display_outputs(outputs: [None, Iterable], file: [TextIO, None] = None,
+                     error_file: [TextIO, None] = None):
     """ Print each of an iterable of outputs to the console
 
     :param outputs: Iterable of outputs to display
+    :param file: Stream to print to, defaulting to stdout
+    :param error_file: Stream to print exceptions to, defaulting to stderr
     """
 
     if not outputs:
         return
 
     for output in outputs:
-        _display_output(output)
+        _display_output(output, file=file, error_file=error_file)
 
-    print("")
+    print("", file=file)
 
 
-def _display_output(output: object):
+def _display_output(output: object, file: [TextIO, None] = None,
+                    error_file: [TextIO, None] = None):
     """ Display a specific output object
 
     :param output: Output object to display
+    :param file: Stream to print to, defaulting to stdout
+    :param error_file: Stream to print exceptions to, defaulting to stderr
     """
 
     # A blank line will precede each displayed output
-    print("")
+    print("", file=file)
 
     if isinstance(output, TableOutput):
-        _display_table(output)
+        _display_table(output, file=file)
     elif isinstance(output, Exception):
-        _display_exception(output)
+        _display_exception(output, file=error_file)
     else:
-        print(output)
+        print(output, file=file)
 
 
-def _display_table(output: TableOutput):
+def _display_table(output: TableOutput, file: [TextIO, None] = None):
     """ Display a TableOutput object
 
     :param output: TableOutput object to display
+    :param file: Stream to print to, defaulting to stdout
     """
 
+    rows = output.rows
+
+    row_count = len(rows)
+
+    # Rows spilled to disk are too many to show, so only the first page is read
+    spilled = isinstance(rows, SpilledRows)
+
+    if spilled:
+        rows = rows[:RESULT_PAGE_SIZE]
+
     formatted_table = tabulate.tabulate(
-        output.rows,
+        rows,
         headers=output.columns,
         tablefmt="rst"
     )
 
-    row_count = len(output.rows)
+    print(formatted_table, file=file)
+    print(f"({row_count} row(s) returned)", file=file)
 
-    print(formatted_table)
-    print(f"({row_count} row(s) returned)")
+    if spilled:
+        print(
+            f"(Too large to keep in memory, so stored on disk. Showing the first {len(rows)}; "
+            f"use {SHELL_COMMAND_INDICATOR}page for more or {SHELL_COMMAND_INDICATOR}export to save them all)",
+            file=file
+        )
 
 
-def _display_exception(output: Exception):
+def _display_exception(output: Exception, file: [TextIO, None] = None):
     """ Display an exception
 
     :param output: Exception to display details for
+    :param file: Stream to print to, defaulting to stderr
     """
 
     exception_name = type(output).__name__
 
-    print(f"Error: {exception_name}\n{output}", file=sys.stderr)
+    print(f"Error: {exception_name}\n{output}", file=file or sys.stderr)
@@ -8,3 +8,42 @@ DEFAULT_CONNECTION_NAME_PATTERN = "db[{number}]"
 # command that should NOT be sent to the database
 # directly
 SHELL_COMMAND_INDICATOR = "!"
+
+# File name pattern for Unix sockets created by remote consoles
+# when no address is given. Sockets are created in the temp directory.
+REMOTE_SOCKET_NAME_PATTERN = "dbreak-{pid}-{thread}.sock"
+
+# Glob used by clients to find sockets created with the above pattern
+REMOTE_SOCKET_GLOB = "dbreak-*.sock"
+
+# Hosts remote consoles are allowed to listen on. The console runs
+# arbitrary statements, so it must never be exposed beyond the machine.
+REMOTE_LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+# Default settings for the slow statement log. Statements taking at least
+# the threshold are appended to the file, which is rotated at the size limit.
+SLOW_LOG_FILE_NAME = "dbreak-slow.log"
+SLOW_LOG_THRESHOLD_SECONDS = 0.5
+SLOW_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_LOG_BACKUP_COUNT = 3
+
+# Estimated size a result's rows may take up in memory before they're moved
+# to a temporary sqlite database on disk
+RESULT_MEMORY_BUDGET_BYTES = 128 * 1024 * 1024
+
+# Number of rows shown at a time for results too large to show in full
+RESULT_PAGE_SIZE = 50
+
+# Number of temporary files inputs are split between when comparing or
+# joining results too large to hold in memory
+SPILL_PARTITIONS = 64
+
+# Name of the sqlite database every session has for staging results from
+# other connections, and the size it may grow to unless configured otherwise
+SCRATCH_CONNECTION_NAME = "scratch"
+SCRATCH_MAX_BYTES = 1024 * 1024 * 1024
+
+# Number of rows !copy inserts between commits, and the most batches of rows
+# fetched but not yet inserted it holds in memory
+COPY_COMMIT_ROWS = 10000
+COPY_QUEUE_BATCHES = 4
@@ -1,9 +1,17 @@
 """ ConnectionWrapper and functions for DB API database console access """
 
-from typing import List
+import collections
+import datetime
+import decimal
+import threading
+import time
 
-from .connections import ConnectionWrapper
-from .outputs import TableOutput
+from typing import Generator, Iterable, List, Mapping, Sequence
+
+from .connections import ConnectionWrapper, StatementTiming, is_async_connection
+from .outputs import TableOutput, ResultStream
+from .spill import collect_rows
+from .variables import bind_variables, driver_paramstyle, row_placeholders, Parameters
 
 
 class DBAPIWrapper(ConnectionWrapper):
@@ -13,34 +21,375 @@ class DBAPIWrapper(ConnectionWrapper):
     # specific database connectors can take precedence
     SEARCH_RANK = 0
 
+    # Whether cursors are kept open and reused between statements.
+    # Subclasses for drivers where that isn't safe should set this
+    # to False, so each statement gets a fresh cursor.
+    REUSE_CURSORS = True
+
+    # Maximum number of idle cursors kept open for reuse
+    CURSOR_POOL_SIZE = 4
+
+    # Number of rows fetched at a time when results aren't kept
+    FETCH_BATCH_SIZE = 1000
+
+    # DB API paramstyle used when binding session variables. If None,
+    # it's read from the module the raw connection's class belongs to.
+    PARAMSTYLE = None
+
+    # Cheap statement used to check the connection works
+    PING_STATEMENT = "select 1"
+
+    # Quote character for column names in statements dbreak writes itself,
+    # such as when creating tables for !stash
+    IDENTIFIER_QUOTE = '"'
+
+    # Column types declared for Python values when creating tables, checked
+    # in order, and the type declared for columns with no values to go by.
+    # Subclasses for databases lacking any of these should override them.
+    COLUMN_TYPES = (
+        (bool, "BOOLEAN"),
+        (int, "BIGINT"),
+        (float, "DOUBLE PRECISION"),
+        (decimal.Decimal, "NUMERIC"),
+        (str, "TEXT"),
+        (bytes, "BLOB"),
+        (datetime.datetime, "TIMESTAMP"),
+        (datetime.date, "DATE"),
+        (datetime.time, "TIME")
+    )
+
+    DEFAULT_COLUMN_TYPE = "TEXT"
+
+    def __init__(self, raw_connection: object, reuse_cursors: [bool, None] = None):
+        """ Initialize a DBAPIWrapper
+
+        :param raw_connection: Database connection being wrapped
+        :param reuse_cursors: Override REUSE_CURSORS for this connection
+        """
+
+        super().__init__(raw_connection)
+
+        if reuse_cursors is None:
+            reuse_cursors = self.REUSE_CURSORS
+
+        # Cursors kept between statements, saving drivers where
+        # opening a cursor costs a round trip from doing so each time
+        self.cursor_pool = CursorPool(
+            raw_connection=raw_connection,
+            size=self.CURSOR_POOL_SIZE if reuse_cursors else 0
+        )
+
+    @property
+    def paramstyle(self) -> str:
+        """ Returns the DB API paramstyle of the underlying driver """
+
+        if self.PARAMSTYLE:
+            return self.PARAMSTYLE
+
+        return driver_paramstyle(self.raw_connection)
+
     def execute_statement(self, statement: str) -> List:
         """ Return the results of executing a database statement
 
         :param statement: Statement to execute in the database
         """
 
-        # Execute the statement and get a cursor for the results
-        cursor = self.raw_connection.cursor()
+        return self._execute_with_cursor(
+            statement=statement,
+            parameters=None
+        )
+
+    def execute_statement_with_variables(self, statement: str, variables: Mapping[str, object]) -> List:
+        """ Return the results of executing a statement, binding any :name variables it references
+
+        Variables are sent as real bind parameters, so statements differing only
+        in their values share the same text. That lets the driver reuse its
+        prepared statement (sqlite3 caches them by text, and cursors that last
+        ran the same text are preferred from the cursor pool).
+
+        :param statement: Statement to execute in the database
+        :param variables: Values available for binding, keyed by name
+        """
+
+        statement, parameters = bind_variables(
+            statement=statement,
+            variables=variables,
+            paramstyle=self.paramstyle
+        )
+
+        return self._execute_with_cursor(
+            statement=statement,
+            parameters=parameters
+        )
+
+    def time_statement(self, statement: str, variables: [Mapping[str, object], None] = None) -> StatementTiming:
+        """ Execute a statement and measure how long it takes, discarding the results
+
+        Execution and fetching are timed separately. Rows are counted as
+        they're fetched but not kept.
+
+        :param statement: Statement to execute in the database
+        :param variables: Values available for binding, keyed by name
+        """
+
+        statement, parameters = bind_variables(
+            statement=statement,
+            variables=variables or {},
+            paramstyle=self.paramstyle
+        )
+
+        cursor = self.cursor_pool.acquire(statement)
+
+        try:
+            start = time.perf_counter()
+
+            if parameters is None:
+                cursor.execute(statement)
+            else:
+                cursor.execute(statement, parameters)
+
+            executed = time.perf_counter()
+
+            rows = 0
+
+            while cursor.description is not None:
+
+                batch = cursor.fetchmany(self.FETCH_BATCH_SIZE)
+
+                if not batch:
+                    break
+
+                rows += len(batch)
+
+            fetched = time.perf_counter()
+
+        except BaseException:
+            self.cursor_pool.discard(cursor)
+            raise
+
+        self.cursor_pool.release(cursor, statement)
+
+        return StatementTiming(
+            execute_seconds=executed - start,
+            fetch_seconds=fetched - executed,
+            rows=rows
+        )
+
+    def stream_statement(self, statement: str, variables: Mapping[str, object]) -> ResultStream:
+        """ Execute a statement, returning its rows as a ResultStream read FETCH_BATCH_SIZE rows at a time
+
+        The stream holds a cursor until closed. Cursors whose results were
+        read to the end go back to the pool, while others are closed rather
+        than having the rest of their results fetched.
+
+        :param statement: Statement to execute in the database
+        :param variables: Values available for binding, keyed by name
+        """
+
+        statement, parameters = bind_variables(
+            statement=statement,
+            variables=variables,
+            paramstyle=self.paramstyle
+        )
+
+        cursor = self.cursor_pool.acquire(statement)
+
+        try:
+            if parameters is None:
+                cursor.execute(statement)
+            else:
+                cursor.execute(statement, parameters)
+
+        except BaseException:
+            self.cursor_pool.discard(cursor)
+            raise
+
+        def release(exhausted: bool):
+            if exhausted:
+                self.cursor_pool.release(cursor, statement)
+            else:
+                self.cursor_pool.discard(cursor)
+
+        columns = _read_resultset_columns(cursor)
+
+        return ResultStream(
+            columns=columns,
+            batches=self._fetch_batches(cursor) if columns else [],
+            on_close=release
+        )
+
+    def _fetch_batches(self, cursor) -> Generator[list, None, None]:
+        """ Yield lists of rows from a cursor until it is exhausted
+
+        :param cursor: Cursor with a pending resultset
+        """
+
+        while True:
+
+            batch = cursor.fetchmany(self.FETCH_BATCH_SIZE)
+
+            if not batch:
+                break
+
+            yield batch
+
+    def _execute_with_cursor(self, statement: str, parameters: Parameters) -> List:
+        """ Execute a statement using a cursor from the pool
+
+        :param statement: Statement to execute in the database
+        :param parameters: Bind parameters for the statement, if any
+        """
+
+        # Get a cursor to execute the statement and read results from.
+        # Cursors that last ran the same statement are preferred, since
+        # some drivers keep it prepared on the cursor.
+        cursor = self.cursor_pool.acquire(statement)
 
         try:
             outputs = self._execute(
                 cursor=cursor,
-                statement=statement
+                statement=statement,
+                parameters=parameters
             )
-        finally:
-            cursor.close()
+        except BaseException:
+            # A cursor that failed may be in a bad state, so it isn't reused
+            self.cursor_pool.discard(cursor)
+            raise
+
+        self.cursor_pool.release(cursor, statement)
 
         return outputs
 
-    def _execute(self, cursor, statement: str) -> List:
+    def create_table(self, table: str, columns: Sequence[str], sample_rows: Iterable[Sequence] = ()):
+        """ Create a table, declaring each column's type from its first value in sample_rows that isn't NULL
+
+        :param table: Name of the table, used as typed so it may include a schema
+        :param columns: Names of its columns
+        :param sample_rows: Rows the column types are judged from
+        """
+
+        types = [None] * len(columns)
+
+        for row in sample_rows:
+
+            for index, value in enumerate(row):
+                if types[index] is None and value is not None:
+                    types[index] = self._column_type(value)
+
+            if None not in types:
+                break
+
+        definitions = ", ".join(
+            f"{self.quote_identifier(column)} {column_type or self.DEFAULT_COLUMN_TYPE}"
+            for column, column_type
+            in zip(columns, types)
+        )
+
+        self._execute_with_cursor(
+            statement=f"CREATE TABLE {table} ({definitions})",
+            parameters=None
+        )
+
+    def insert_rows(self, table: str, columns: Sequence[str], rows: Sequence[Sequence]) -> int:
+        """ Insert a batch of rows into a table with a single executemany, returning the number inserted
+
+        :param table: Name of the table, used as typed so it may include a schema
+        :param columns: Names of the columns the rows' values go in
+        :param rows: Rows to insert
+        """
+
+        placeholders, to_parameters = row_placeholders(self.paramstyle, len(columns))
+
+        column_list = ", ".join(self.quote_identifier(column) for column in columns)
+
+        statement = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(placeholders)})"
+
+        cursor = self.cursor_pool.acquire(statement)
+
+        try:
+            cursor.executemany(statement, [to_parameters(row) for row in rows])
+        except BaseException:
+            self.cursor_pool.discard(cursor)
+            raise
+
+        self.cursor_pool.release(cursor, statement)
+
+        return len(rows)
+
+    def commit(self):
+        """ Commit the connection's open transaction """
+
+        self.raw_connection.commit()
+
+    def rollback(self):
+        """ Roll back the connection's open transaction """
+
+        self.raw_connection.rollback()
+
+    def usable_from_other_threads(self) -> bool:
+        """ Returns False if the driver refuses to open a cursor from another thread
+
+        Some drivers tie connections to the thread that opened them, such as
+        sqlite3 unless connected with check_same_thread=False.
+        """
+
+        usable = []
+
+        def open_cursor():
+            try:
+                self.raw_connection.cursor().close()
+                usable.append(True)
+            except Exception:
+                usable.append(False)
+
+        thread = threading.Thread(target=open_cursor)
+        thread.start()
+        thread.join()
+
+        return usable == [True]
+
+    def quote_identifier(self, name: str) -> str:
+        """ Quote a column name for use in a statement
+
+        :param name: Name to quote
+        """
+
+        quote = self.IDENTIFIER_QUOTE
+
+        return f"{quote}{name.replace(quote, quote * 2)}{quote}"
+
+    def _column_type(self, value: object) -> str:
+        """ Returns the column type to declare for a value
+
+        :param value: Value from a row
+        """
+
+        for value_type, column_type in self.COLUMN_TYPES:
+            if isinstance(value, value_type):
+                return column_type
+
+        return self.DEFAULT_COLUMN_TYPE
+
+    def detach(self):
+        """ Close any cursors kept open for reuse, and any read connection """
+
+        super().detach()
+
+        self.cursor_pool.clear()
+
+    def _execute(self, cursor, statement: str, parameters: Parameters = None) -> List:
         """ Execute a statement against a cursor and return a list of outputs
 
         :param cursor: DB API cursor object
         :param statement: Statement to execute
+        :param parameters: Bind parameters for the statement, if any
         """
 
         # Execute the query
-        cursor.execute(statement)
+        if parameters is None:
+            cursor.execute(statement)
+        else:
+            cursor.execute(statement, parameters)
 
         # Attempt to read the columns that appear in the
         # resultset. This won't return anything for
@@ -52,8 +401,9 @@ class DBAPIWrapper(ConnectionWrapper):
         if not columns:
             return []
 
-        # Pull all results out of the cursor
-        rows = list(cursor)
+        # Pull all results out of the cursor, spilling
+        # them to disk if they outgrow the memory budget
+        rows = collect_rows(cursor, column_count=len(columns))
 
         # Put the data into tabular format
         table = TableOutput(
@@ -72,12 +422,14 @@ class DBAPIWrapper(ConnectionWrapper):
         """
 
         # Check for attributes that should be defined on
-        # a DB API compliant connection
+        # a DB API compliant connection. Async drivers have
+        # the same attributes but are handled by aio.py.
         return all(
             (
                 hasattr(raw_connection, "cursor"),
                 hasattr(raw_connection, "commit"),
-                hasattr(raw_connection, "close")
+                hasattr(raw_connection, "close"),
+                not is_async_connection(raw_connection)
             )
         )
 
@@ -92,3 +444,145 @@ def _read_resultset_columns(cursor) -> List[str]:
         return []
     else:
         return [x[0] for x in cursor.description]
+
+
+class CursorPool:
+    """ Keeps a connection's idle cursors open so they can be reused """
+
+    def __init__(self, raw_connection: object, size: int):
+        """ Initialize a CursorPool
+
+        :param raw_connection: DB API connection to open cursors from
+        :param size: Maximum number of idle cursors to keep, or 0 to disable reuse
+        """
+
+        self.raw_connection = raw_connection
+
+        self.size = size
+
+        # Idle cursors, each with the last statement it executed,
+        # from least to most recently used
+        self._idle = collections.deque()
+
+        # Statements may be run from several threads (e.g. by !bench)
+        self._lock = threading.Lock()
+
+    def acquire(self, statement: [str, None] = None):
+        """ Get a cursor, reusing an idle one if possible
+
+        :param statement: Statement the cursor will execute, used to prefer a matching cursor
+        """
+
+        with self._lock:
+            entry = self._take_idle(statement)
+
+        if entry is not None:
+            return entry[0]
+
+        return self.raw_connection.cursor()
+
+    def _take_idle(self, statement: [str, None]) -> [list, None]:
+        """ Remove and return the best idle [cursor, statement] entry, if any
+
+        :param statement: Statement the cursor will execute
+        """
+
+        # Close any cursors that have gone bad while idle
+        for entry in list(self._idle):
+            if not _cursor_is_healthy(entry[0]):
+                self._idle.remove(entry)
+                _close_quietly(entry[0])
+
+        if not self._idle:
+            return None
+
+        # Prefer the most recent cursor that ran this same statement
+        for entry in reversed(self._idle):
+            if entry[1] == statement:
+                self._idle.remove(entry)
+                return entry
+
+        return self._idle.pop()
+
+    def release(self, cursor, statement: [str, None] = None):
+        """ Return a cursor after use, keeping it for reuse if there is room
+
+        :param cursor: Cursor to return
+        :param statement: Statement the cursor last executed
+        """
+
+        if not _reset_cursor(cursor):
+            self.discard(cursor)
+            return
+
+        with self._lock:
+
+            self._idle.append([cursor, statement])
+
+            # Close the least recently used cursors beyond the pool size
+            while len(self._idle) > self.size:
+                _close_quietly(self._idle.popleft()[0])
+
+    def discard(self, cursor):
+        """ Close a cursor without returning it to the pool
+
+        :param cursor: Cursor to close
+        """
+
+        _close_quietly(cursor)
+
+    def clear(self):
+        """ Close all idle cursors """
+
+        with self._lock:
+
+            while self._idle:
+                _close_quietly(self._idle.pop()[0])
+
+    def __len__(self) -> int:
+
+        return len(self._idle)
+
+
+def _cursor_is_healthy(cursor) -> bool:
+    """ Returns False if a cursor is known to be unusable
+
+    :param cursor: Idle cursor to check
+    """
+
+    # Not part of the DB API, but psycopg2, pymysql and others
+    # report whether a cursor (or its connection) has been closed
+    return not getattr(cursor, "closed", False)
+
+
+def _reset_cursor(cursor) -> bool:
+    """ Clear any state left on a cursor by its last statement
+
+    Returns False if the cursor couldn't be reset and shouldn't be reused.
+
+    :param cursor: Cursor to reset
+    """
+
+    try:
+        # Throw away any results that weren't read
+        if cursor.description is not None:
+            cursor.fetchall()
+
+        cursor.arraysize = 1
+
+    except Exception:
+        return False
+
+    return _cursor_is_healthy(cursor)
+
+
+def _close_quietly(cursor):
+    """ Close a cursor, ignoring any errors since it's being thrown away
+
+    :param cursor: Cursor to close
+    """
+
+    try:
+        cursor.close()
+    except Exception:
+        pass
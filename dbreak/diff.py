@@ -0,0 +1,365 @@
+""" Streaming comparison of a statement's results on two connections
+
+Each row is reduced to a key (its key columns, or the whole row) and a
+digest of its values, with values normalized (see views.match_key) so that, for example, 1 from
+one driver matches 1.0 or Decimal("1") from another. Rows are then matched
+one of two ways:
+
+* A merge of both results in key order, for results known to be ordered by
+  key. Only the current row from each side is held in memory.
+* A hash table of the first result's rows, probed with the second's. If the
+  table outgrows the memory budget, both results are split between
+  temporary files by key (see spill.HashPartitions) and each pair of
+  partitions is compared in turn.
+"""
+
+import collections
+import hashlib
+
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+from .constants import RESULT_MEMORY_BUDGET_BYTES
+from .outputs import ResultStream, TableOutput
+from .spill import HashPartitions, estimate_row_size
+from .views import find_column, match_key
+
+# Most differing rows shown by default
+DIFF_SAMPLE_SIZE = 20
+
+# Outcome of comparing two results. The sample holds (difference,
+# connection name, row) tuples for the first differences found.
+DiffResult = collections.namedtuple(
+    "DiffResult",
+    ["rows_a", "rows_b", "matching", "only_a", "only_b", "changed", "sample", "method"]
+)
+
+# A row reduced for comparison: its key, a digest of its values, and the row itself
+_Record = collections.namedtuple("_Record", ["key", "digest", "row"])
+
+
+class _Differences:
+    """ Counts matches and differences, keeping the first few differences as a sample """
+
+    def __init__(self, name_a: str, name_b: str, sample_size: int):
+        """ Initialize an empty _Differences
+
+        :param name_a: Name of the first connection
+        :param name_b: Name of the second connection
+        :param sample_size: Most differences to keep
+        """
+
+        self.name_a = name_a
+        self.name_b = name_b
+        self.sample_size = sample_size
+
+        self.rows_a = self.rows_b = 0
+        self.matching = self.only_a = self.only_b = self.changed = 0
+
+        self.sample = []
+
+    def match(self):
+        self.rows_a += 1
+        self.rows_b += 1
+        self.matching += 1
+
+    def found_only_a(self, row: Sequence):
+        self.rows_a += 1
+        self.only_a += 1
+        self._keep(("only in", self.name_a, row))
+
+    def found_only_b(self, row: Sequence):
+        self.rows_b += 1
+        self.only_b += 1
+        self._keep(("only in", self.name_b, row))
+
+    def found_changed(self, row_a: Sequence, row_b: Sequence):
+        self.rows_a += 1
+        self.rows_b += 1
+        self.changed += 1
+
+        # Both versions are kept, or neither
+        if len(self.sample) + 2 <= self.sample_size:
+            self.sample.append(("changed", self.name_a, row_a))
+            self.sample.append(("changed", self.name_b, row_b))
+
+    def result(self, method: str) -> DiffResult:
+        """ Returns the totals as a DiffResult
+
+        :param method: Description of how rows were matched
+        """
+
+        return DiffResult(
+            rows_a=self.rows_a,
+            rows_b=self.rows_b,
+            matching=self.matching,
+            only_a=self.only_a,
+            only_b=self.only_b,
+            changed=self.changed,
+            sample=self.sample,
+            method=method
+        )
+
+    def _keep(self, difference: tuple):
+        if len(self.sample) < self.sample_size:
+            self.sample.append(difference)
+
+
+def diff_streams(stream_a: ResultStream, stream_b: ResultStream, name_a: str, name_b: str,
+                 key_columns: Sequence[str] = (), ordered: bool = False,
+                 sample_size: int = DIFF_SAMPLE_SIZE) -> DiffResult:
+    """ Compare two results, reporting rows only in one and (when keyed) rows that changed
+
+    Without key columns, results are compared as multisets of whole rows, so
+    a changed row counts as one row only in each result.
+
+    :param stream_a: First result
+    :param stream_b: Second result
+    :param name_a: Name of the first connection
+    :param name_b: Name of the second connection
+    :param key_columns: Names of columns identifying a row in both results
+    :param ordered: Whether both results are ordered by the key columns (or every column if not keyed)
+    :param sample_size: Most differing rows to keep
+    """
+
+    records_a = _records(stream_a, key_columns, hashed_key=not ordered)
+    records_b = _records(stream_b, key_columns, hashed_key=not ordered)
+
+    differences = _Differences(name_a, name_b, sample_size)
+
+    if ordered:
+        _merge_diff(_check_order(records_a, name_a), _check_order(records_b, name_b), differences)
+        return differences.result("merge of results ordered by key")
+
+    partition_count = _hash_diff(records_a, records_b, differences)
+
+    if partition_count:
+        return differences.result(f"hash table, spilled to disk in {partition_count} partitions")
+
+    return differences.result("hash table in memory")
+
+
+def diff_outputs(result: DiffResult, columns: List[str], name_a: str, name_b: str) -> List:
+    """ Lay out a comparison as a summary table, a table of sample differences and how rows were matched
+
+    :param result: Outcome of the comparison
+    :param columns: Names of the compared columns
+    :param name_a: Name of the first connection
+    :param name_b: Name of the second connection
+    """
+
+    summary = TableOutput(
+        rows=[
+            (f"Rows in {name_a}", result.rows_a),
+            (f"Rows in {name_b}", result.rows_b),
+            ("Matching", result.matching),
+            (f"Only in {name_a}", result.only_a),
+            (f"Only in {name_b}", result.only_b),
+            ("Changed", result.changed)
+        ],
+        columns=["Comparison", "Rows"]
+    )
+
+    outputs = [summary]
+
+    if result.sample:
+        outputs.append(
+            TableOutput(
+                rows=[(difference, name, *row) for difference, name, row in result.sample],
+                columns=["Difference", "Connection", *columns]
+            )
+        )
+
+    outputs.append(f"Compared using a {result.method}")
+
+    return outputs
+
+
+def _records(stream: ResultStream, key_columns: Sequence[str], hashed_key: bool) -> Iterator[_Record]:
+    """ Yield a _Record for each row of a result
+
+    :param stream: Result to read
+    :param key_columns: Names of columns identifying a row, or nothing to use the whole row
+    :param hashed_key: Whether whole-row keys can be the row's digest, rather than sortable values
+    """
+
+    key_indexes = [find_column(stream.columns, column) for column in key_columns]
+
+    for row in stream:
+
+        values = tuple(match_key(value) for value in row)
+
+        digest = hashlib.blake2b(repr(values).encode(), digest_size=16).digest()
+
+        if key_indexes:
+            key = tuple(values[index] for index in key_indexes)
+        else:
+            key = digest if hashed_key else values
+
+        yield _Record(key, digest, row)
+
+
+def _check_order(records: Iterable[_Record], name: str) -> Iterator[_Record]:
+    """ Pass records through, raising ValueError if their keys go backwards
+
+    :param records: Records to check
+    :param name: Name of the connection, for error messages
+    """
+
+    previous = None
+
+    for record in records:
+
+        if previous is not None and record.key < previous:
+            raise ValueError(f"The result from {name} isn't ordered by key. Leave out ordered=true to compare it unordered.")
+
+        previous = record.key
+
+        yield record
+
+
+def _merge_diff(records_a: Iterator[_Record], records_b: Iterator[_Record], differences: _Differences):
+    """ Compare two results ordered by key, a row from each at a time
+
+    :param records_a: Records of the first result, in key order
+    :param records_b: Records of the second result, in key order
+    :param differences: Totals to update
+    """
+
+    a = next(records_a, None)
+    b = next(records_b, None)
+
+    while a is not None or b is not None:
+
+        if b is None or (a is not None and a.key < b.key):
+            differences.found_only_a(a.row)
+            a = next(records_a, None)
+
+        elif a is None or b.key < a.key:
+            differences.found_only_b(b.row)
+            b = next(records_b, None)
+
+        else:
+            if a.digest == b.digest:
+                differences.match()
+            else:
+                differences.found_changed(a.row, b.row)
+
+            a = next(records_a, None)
+            b = next(records_b, None)
+
+
+def _hash_diff(records_a: Iterator[_Record], records_b: Iterator[_Record], differences: _Differences) -> int:
+    """ Compare two results with a hash table of the first, spilling both to disk if it outgrows memory
+
+    Returns the number of partitions spilled to disk, or 0 if everything fit in memory.
+
+    :param records_a: Records of the first result
+    :param records_b: Records of the second result
+    :param differences: Totals to update
+    """
+
+    table = {}
+    size = 0
+
+    for record in records_a:
+
+        table.setdefault(record.key, []).append(record)
+
+        size += estimate_row_size(record.row)
+
+        if size > RESULT_MEMORY_BUDGET_BYTES:
+            return _partitioned_diff(table, records_a, records_b, differences)
+
+    _probe(table, records_b, differences)
+
+    return 0
+
+
+def _partitioned_diff(table: Dict[object, List[_Record]], records_a: Iterator[_Record],
+                      records_b: Iterator[_Record], differences: _Differences) -> int:
+    """ Finish a hash comparison by splitting both results between temporary files by key
+
+    :param table: Records of the first result read so far, keyed by key
+    :param records_a: Remaining records of the first result
+    :param records_b: Records of the second result
+    :param differences: Totals to update
+    """
+
+    partitions_a = HashPartitions()
+    partitions_b = HashPartitions()
+
+    try:
+        for records in table.values():
+            for record in records:
+                partitions_a.add(record.key, _picklable(record))
+
+        table.clear()
+
+        for record in records_a:
+            partitions_a.add(record.key, _picklable(record))
+
+        for record in records_b:
+            partitions_b.add(record.key, _picklable(record))
+
+        for partition in range(partitions_a.count):
+
+            for record in partitions_a.read(partition):
+                record = _Record(*record)
+                table.setdefault(record.key, []).append(record)
+
+            _probe(table, (_Record(*record) for record in partitions_b.read(partition)), differences)
+
+            table.clear()
+
+    finally:
+        partitions_a.close()
+        partitions_b.close()
+
+    return partitions_a.count
+
+
+def _picklable(record: _Record) -> tuple:
+    """ Returns a record as a tuple for writing to a partition, with its row as a tuple too
+
+    Driver row types such as sqlite3.Row can't be pickled.
+
+    :param record: Record to convert
+    """
+
+    return record.key, record.digest, tuple(record.row)
+
+
+def _probe(table: Dict[object, List[_Record]], records_b: Iterable[_Record], differences: _Differences):
+    """ Match records of the second result against a hash table of the first's
+
+    Records left in the table afterwards are only in the first result.
+
+    :param table: Records of the first result, keyed by key
+    :param records_b: Records of the second result
+    :param differences: Totals to update
+    """
+
+    for record in records_b:
+
+        candidates = table.get(record.key)
+
+        if not candidates:
+            differences.found_only_b(record.row)
+            continue
+
+        # Prefer an identical row among those sharing the key
+        for position, candidate in enumerate(candidates):
+            if candidate.digest == record.digest:
+                del candidates[position]
+                differences.match()
+                break
+
+        else:
+            differences.found_changed(candidates.pop(0).row, record.row)
+
+        if not candidates:
+            del table[record.key]
+
+    for candidates in table.values():
+        for candidate in candidates:
+            differences.found_only_a(candidate.row)
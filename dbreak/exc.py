@@ -21,6 +21,41 @@ class ConnectionNotFoundError(Exception):
     pass
 
 
+class ConnectionTimeoutError(Exception):
+    """ Raised when a connection isn't ready within the time allowed for preparing it """
+    pass
+
+
+class StatementCancelledError(Exception):
+    """ Raised when a statement is cancelled before it finishes """
+    pass
+
+
 class ConnectionAlreadyExistsError(Exception):
     """ Raised when trying to assign two connections to the same name """
     pass
+
+
+class ReadConnectionUnavailableError(Exception):
+    """ Raised when a connection can't open a separate read-only connection """
+    pass
+
+
+class WriteNotRoutedError(Exception):
+    """ Raised when a statement that may write is sent to an isolated read connection """
+    pass
+
+
+class RemoteConsoleError(Exception):
+    """ Raised when a remote console cannot be served or attached to """
+    pass
+
+
+class NoResultError(Exception):
+    """ Raised when a command needs a statement's result but there isn't one """
+    pass
+
+
+class ScratchFullError(Exception):
+    """ Raised when the scratch database reaches its size limit """
+    pass
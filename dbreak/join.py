@@ -0,0 +1,342 @@
+""" Hash joins of results from two connections, which may be different kinds of database
+
+Both results are read a batch at a time, alternately, until one of them
+runs out. That one is the smaller, so it's built into a hash table keyed by
+its join columns, and the rest of the other is streamed past it.
+
+If the rows buffered pass the memory budget before either result runs out,
+the join falls back to a grace hash join: both results are split between
+temporary files by key (see spill.HashPartitions), and each pair of
+partitions is joined in turn, building whichever side of the pair is
+smaller. Joined rows are collected with spill.RowCollector, so a large
+result spills to disk too.
+
+Values are matched as in views.match_key, and as in SQL, rows with a NULL
+join column never match.
+"""
+
+import collections
+
+from typing import Generator, Iterable, Iterator, List, Sequence, Tuple
+
+from .constants import RESULT_MEMORY_BUDGET_BYTES
+from .outputs import ResultStream, TableOutput
+from .spill import HashPartitions, RowCollector, estimate_row_size
+from .views import find_column, match_key
+
+# Kinds of join supported, as in SQL
+JOIN_TYPES = ("inner", "left", "right", "full")
+
+# Key of NULL values, which never match
+_NULL_KEY = match_key(None)
+
+# Joined rows, the names of their columns, and a description of how the join was done
+JoinResult = collections.namedtuple(
+    "JoinResult",
+    ["rows", "columns", "method"]
+)
+
+
+class _Side:
+    """ One of the two results being joined, read a batch at a time """
+
+    def __init__(self, stream: ResultStream, key_columns: Sequence[str], first: bool,
+                 keep_unmatched: bool, other_width: int):
+        """ Initialize a _Side
+
+        :param stream: Result to read
+        :param key_columns: Names of the columns joined on
+        :param first: Whether this is the first (left-hand) result
+        :param keep_unmatched: Whether rows matching nothing in the other result are kept
+        :param other_width: Number of columns in the other result
+        """
+
+        self.key_indexes = [find_column(stream.columns, column) for column in key_columns]
+        self.first = first
+        self.keep_unmatched = keep_unmatched
+
+        self.buffered = []
+        self.size = 0
+        self.finished = False
+
+        self._batches = iter(stream.batches())
+        self._missing = (None,) * other_width
+
+    def read_batch(self) -> int:
+        """ Buffer the next batch of rows, returning its estimated size """
+
+        batch = next(self._batches, None)
+
+        if batch is None:
+            self.finished = True
+            return 0
+
+        size = sum(estimate_row_size(row) for row in batch)
+
+        self.buffered.extend(batch)
+        self.size += size
+
+        return size
+
+    def rows(self) -> Iterator[Sequence]:
+        """ Yield the rows buffered so far and then the rest of the result, emptying the buffer """
+
+        buffered, self.buffered = self.buffered, []
+
+        yield from buffered
+
+        for batch in self._batches:
+            yield from batch
+
+    def key_of(self, row: Sequence) -> [tuple, None]:
+        """ Returns the join key of a row, or None if any of its join columns are NULL
+
+        :param row: Row from this result
+        """
+
+        key = tuple(match_key(row[index]) for index in self.key_indexes)
+
+        if _NULL_KEY in key:
+            return None
+
+        return key
+
+    def combine(self, row: Sequence, other_row: [Sequence, None]) -> tuple:
+        """ Returns a joined row, with the first result's columns before the second's
+
+        :param row: Row from this result
+        :param other_row: Matching row from the other result, or None to fill its columns with NULLs
+        """
+
+        other_row = self._missing if other_row is None else tuple(other_row)
+
+        return (*row, *other_row) if self.first else (*other_row, *row)
+
+
+def join_streams(stream_a: ResultStream, stream_b: ResultStream, name_a: str, name_b: str,
+                 on: Sequence[Tuple[str, str]], how: str = "inner") -> JoinResult:
+    """ Join two results on equal column values
+
+    :param stream_a: First (left-hand) result
+    :param stream_b: Second (right-hand) result
+    :param name_a: Name of the first connection, used to tell apart columns both results have
+    :param name_b: Name of the second connection
+    :param on: (first result's column, second result's column) tuples that must be equal
+    :param how: One of JOIN_TYPES
+    """
+
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unsupported join type '{how}'. Use one of {' '.join(JOIN_TYPES)}")
+
+    if not on:
+        raise ValueError("At least one pair of columns to join on is needed")
+
+    columns_a, columns_b = list(stream_a.columns), list(stream_b.columns)
+
+    side_a = _Side(
+        stream=stream_a,
+        key_columns=[column for column, _ in on],
+        first=True,
+        keep_unmatched=how in ("left", "full"),
+        other_width=len(columns_b)
+    )
+
+    side_b = _Side(
+        stream=stream_b,
+        key_columns=[column for _, column in on],
+        first=False,
+        keep_unmatched=how in ("right", "full"),
+        other_width=len(columns_a)
+    )
+
+    columns = _joined_columns(columns_a, columns_b, name_a, name_b)
+
+    collector = RowCollector(column_count=len(columns))
+
+    # Read both results a batch at a time until one runs out
+    # or together they no longer fit in memory
+    while not (side_a.finished or side_b.finished):
+
+        side_a.read_batch()
+        side_b.read_batch()
+
+        if side_a.size + side_b.size > RESULT_MEMORY_BUDGET_BYTES:
+            partition_count = _grace_join(side_a, side_b, collector)
+            return JoinResult(collector.finish(), columns, f"grace hash join, spilled to disk in {partition_count} partitions")
+
+    # The finished result is the smaller, unless both finished together
+    if side_a.finished and (not side_b.finished or side_a.size <= side_b.size):
+        build, probe = side_a, side_b
+    else:
+        build, probe = side_b, side_a
+
+    collector.extend(_hash_join(build, build.rows(), probe, probe.rows()))
+
+    build_name = name_a if build is side_a else name_b
+
+    return JoinResult(collector.finish(), columns, f"hash join, building the result from {build_name} in memory")
+
+
+def join_outputs(result: JoinResult) -> List:
+    """ Lay out a join as a table, followed by how it was done
+
+    :param result: Outcome of the join
+    """
+
+    return [
+        TableOutput(
+            rows=result.rows,
+            columns=result.columns
+        ),
+        f"Joined {len(result.rows)} row(s) using a {result.method}"
+    ]
+
+
+def parse_join_condition(condition: str) -> List[Tuple[str, str]]:
+    """ Split a condition like "id=user_id,org=org_id" into (first column, second column) tuples
+
+    :param condition: Comma-separated pairs of column names joined by =
+    """
+
+    pairs = []
+
+    for pair in condition.split(","):
+
+        first, equals, second = pair.partition("=")
+
+        if not equals or not first.strip() or not second.strip():
+            raise ValueError(f"Join condition '{pair}' should look like first_column=second_column")
+
+        pairs.append((first.strip(), second.strip()))
+
+    return pairs
+
+
+def _joined_columns(columns_a: List[str], columns_b: List[str], name_a: str, name_b: str) -> List[str]:
+    """ Returns the names of the joined columns, prefixing names both results use with their connection's name
+
+    :param columns_a: Names of the first result's columns
+    :param columns_b: Names of the second result's columns
+    :param name_a: Name of the first connection
+    :param name_b: Name of the second connection
+    """
+
+    shared = {column.lower() for column in columns_a} & {column.lower() for column in columns_b}
+
+    return [
+        *(f"{name_a}.{column}" if column.lower() in shared else column for column in columns_a),
+        *(f"{name_b}.{column}" if column.lower() in shared else column for column in columns_b)
+    ]
+
+
+def _hash_join(build: _Side, build_rows: Iterable[Sequence],
+               probe: _Side, probe_rows: Iterable[Sequence]) -> Generator[tuple, None, None]:
+    """ Yield joined rows, building a hash table from one result and streaming the other past it
+
+    :param build: Result built into the hash table
+    :param build_rows: Rows of the built result
+    :param probe: Result streamed past the hash table
+    :param probe_rows: Rows of the streamed result
+    """
+
+    # Each key maps to [row, matched] entries for the rows with that key
+    table = {}
+
+    for row in build_rows:
+
+        key = build.key_of(row)
+
+        if key is None:
+            if build.keep_unmatched:
+                yield build.combine(row, None)
+            continue
+
+        table.setdefault(key, []).append([row, False])
+
+    for row in probe_rows:
+
+        key = probe.key_of(row)
+
+        entries = None if key is None else table.get(key)
+
+        if not entries:
+            if probe.keep_unmatched:
+                yield probe.combine(row, None)
+            continue
+
+        for entry in entries:
+            entry[1] = True
+            yield probe.combine(row, entry[0])
+
+    if build.keep_unmatched:
+        for entries in table.values():
+            for row, matched in entries:
+                if not matched:
+                    yield build.combine(row, None)
+
+
+def _grace_join(side_a: _Side, side_b: _Side, collector: RowCollector) -> int:
+    """ Join two results too large for memory by splitting both between temporary files by key
+
+    Returns the number of partitions used.
+
+    :param side_a: First result
+    :param side_b: Second result
+    :param collector: Collects the joined rows
+    """
+
+    partitions = {side_a: HashPartitions(), side_b: HashPartitions()}
+
+    try:
+        # Numbers of rows written to each partition, to choose which side of each pair to build
+        counts = {side: [0] * partitions[side].count for side in partitions}
+
+        for side, side_partitions in partitions.items():
+            collector.extend(_partition_rows(side, side_partitions, counts[side]))
+
+        for partition in range(partitions[side_a].count):
+
+            if counts[side_a][partition] <= counts[side_b][partition]:
+                build, probe = side_a, side_b
+            else:
+                build, probe = side_b, side_a
+
+            collector.extend(
+                _hash_join(
+                    build=build,
+                    build_rows=partitions[build].read(partition),
+                    probe=probe,
+                    probe_rows=partitions[probe].read(partition)
+                )
+            )
+
+    finally:
+        for side_partitions in partitions.values():
+            side_partitions.close()
+
+    return partitions[side_a].count
+
+
+def _partition_rows(side: _Side, partitions: HashPartitions, counts: List[int]) -> Generator[tuple, None, None]:
+    """ Write a result's rows to partitions by key, yielding any kept rows that can't match anything
+
+    :param side: Result to partition
+    :param partitions: Partitions to write to
+    :param counts: Numbers of rows written to each partition, updated as rows are written
+    """
+
+    for row in side.rows():
+
+        key = side.key_of(row)
+
+        # Rows with NULL keys don't need partitioning
+        if key is None:
+            if side.keep_unmatched:
+                yield side.combine(row, None)
+            continue
+
+        partition = partitions.partition_of(key)
+
+        # Driver row types such as sqlite3.Row can't be pickled
+        partitions.add(key, tuple(row))
+        counts[partition] += 1
@@ -0,0 +1,593 @@
+""" Functions for generating concurrent load against a database
+
+Unlike !bench, which shares a single connection, each load worker opens its
+own connection from a factory, so contention between connections (locks,
+connection limits, etc.) can be reproduced.
+"""
+
+import collections
+import copy
+import math
+import multiprocessing
+import queue
+import random
+import sys
+import threading
+import time
+
+from typing import Callable, List, Mapping, Sequence, TextIO, Tuple, Union
+
+from .connections import wrap_connection
+from .outputs import TableOutput, per_second
+
+# Ratio between the upper bounds of neighbouring histogram buckets,
+# which bounds the error of reported percentiles to about 5%
+_BUCKET_GROWTH = 1.05
+
+# Statements can be given as a single statement, a list of statements
+# run equally often, or a dict of statements and their relative weights
+StatementMix = Union[str, Sequence[str], Mapping[str, float]]
+
+
+class LatencyHistogram:
+    """ Records latencies in logarithmic buckets, using constant memory """
+
+    def __init__(self):
+        """ Initialize an empty LatencyHistogram """
+
+        # Number of latencies recorded in each bucket, keyed by bucket index
+        self.counts = collections.Counter()
+
+        self.maximum = 0.0
+
+    @property
+    def count(self) -> int:
+        """ Returns the number of latencies recorded """
+
+        return sum(self.counts.values())
+
+    def record(self, seconds: float):
+        """ Record a single latency
+
+        :param seconds: Latency to record
+        """
+
+        microseconds = max(seconds * 1e6, 1.0)
+
+        self.counts[int(math.log(microseconds, _BUCKET_GROWTH))] += 1
+
+        self.maximum = max(self.maximum, seconds)
+
+    def merge(self, other: "LatencyHistogram"):
+        """ Add the latencies recorded by another histogram to this one
+
+        :param other: Histogram to merge in
+        """
+
+        self.counts.update(other.counts)
+
+        self.maximum = max(self.maximum, other.maximum)
+
+    def percentile(self, percent: float) -> float:
+        """ Return an estimate, in seconds, of a percentile of recorded latencies
+
+        :param percent: Percentile to find, from 0 to 100
+        """
+
+        total = self.count
+
+        if not total:
+            return math.nan
+
+        threshold = total * percent / 100
+
+        seen = 0
+
+        for index in sorted(self.counts):
+
+            seen += self.counts[index]
+
+            if seen >= threshold:
+                return min(_bucket_upper_bound(index), self.maximum)
+
+        return self.maximum
+
+    def to_output(self) -> TableOutput:
+        """ Summarize the histogram as a table of power-of-two millisecond ranges """
+
+        ranges = collections.Counter()
+
+        for index, count in self.counts.items():
+
+            milliseconds = _bucket_upper_bound(index) * 1000
+
+            # Range n covers latencies from 2^(n-1) up to 2^n milliseconds
+            ranges[max(math.ceil(math.log2(milliseconds)), 0)] += count
+
+        total = self.count
+
+        rows = [
+            (
+                f"{0 if n == 0 else 2 ** (n - 1)} - {2 ** n}",
+                ranges[n],
+                round(100 * ranges[n] / total, 1)
+            )
+            for n in sorted(ranges)
+        ]
+
+        return TableOutput(
+            rows=rows,
+            columns=["Latency (ms)", "Count", "Percent"]
+        )
+
+
+def _bucket_upper_bound(index: int) -> float:
+    """ Returns the largest latency, in seconds, that falls in a bucket
+
+    :param index: Index of the bucket
+    """
+
+    return _BUCKET_GROWTH ** (index + 1) / 1e6
+
+
+class WorkerStats:
+    """ Running totals for a single load worker """
+
+    def __init__(self):
+        """ Initialize empty WorkerStats """
+
+        self.histogram = LatencyHistogram()
+        self.errors = collections.Counter()
+        self.operations = 0
+        self.rows = 0
+
+        # Workers update their stats while the reporter reads them
+        self.lock = threading.Lock()
+
+    def merge(self, other: "WorkerStats"):
+        """ Add another worker's totals to these
+
+        :param other: Stats to merge in
+        """
+
+        self.histogram.merge(other.histogram)
+        self.errors.update(other.errors)
+        self.operations += other.operations
+        self.rows += other.rows
+
+    def __getstate__(self) -> dict:
+
+        # Locks can't be sent between processes
+        state = dict(self.__dict__)
+        del state["lock"]
+
+        return state
+
+    def __setstate__(self, state: dict):
+
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+class LoadResult:
+    """ Totals gathered by a load test """
+
+    def __init__(self, stats: WorkerStats, elapsed_seconds: float, workers: int, processes: bool):
+        """ Initialize a LoadResult
+
+        :param stats: Combined stats of all workers
+        :param elapsed_seconds: Wall clock time taken by the test
+        :param workers: Number of workers used
+        :param processes: Whether workers were processes rather than threads
+        """
+
+        self.stats = stats
+        self.elapsed_seconds = elapsed_seconds
+        self.workers = workers
+        self.processes = processes
+
+    def to_outputs(self) -> List[TableOutput]:
+        """ Summarize the results as a summary table, a latency histogram and any errors """
+
+        stats = self.stats
+
+        histogram = stats.histogram
+
+        summary = TableOutput(
+            rows=[
+                (
+                    self.workers,
+                    "processes" if self.processes else "threads",
+                    stats.operations,
+                    sum(stats.errors.values()),
+                    round(self.elapsed_seconds, 3),
+                    per_second(stats.operations, self.elapsed_seconds),
+                    per_second(stats.rows, self.elapsed_seconds),
+                    *(round(histogram.percentile(percent) * 1000, 3) for percent in (50, 95, 99)),
+                    round(histogram.maximum * 1000, 3)
+                )
+            ],
+            columns=[
+                "Workers", "Mode", "Operations", "Errors", "Elapsed (s)", "Operations/s",
+                "Rows/s", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)"
+            ]
+        )
+
+        outputs = [summary, histogram.to_output()]
+
+        if stats.errors:
+            outputs.append(
+                TableOutput(
+                    rows=stats.errors.most_common(),
+                    columns=["Error", "Count"]
+                )
+            )
+
+        return outputs
+
+
+def run_load(connection_factory: Callable[[], object], statements: StatementMix, workers: int = 4,
+             duration: [float, None] = None, iterations: [int, None] = None, processes: bool = False,
+             report_interval: [float, None] = 1.0, report_stream: [TextIO, None] = None,
+             seed: [int, None] = None) -> LoadResult:
+    """ Run a mix of statements from many connections at once, reporting progress as it goes
+
+    Each worker opens its own connection by calling connection_factory, then
+    runs randomly chosen statements until the duration has passed or it has
+    run the given number of iterations, whichever comes first. With
+    processes=True, workers are separate processes, so connection_factory
+    and statements must be picklable (functools.partial(sqlite3.connect, path)
+    works, for example).
+
+    :param connection_factory: Zero-argument callable returning a new raw or wrapped connection
+    :param statements: Statement, list of statements, or dict of statements and weights
+    :param workers: Number of workers, each with its own connection
+    :param duration: Seconds to run for
+    :param iterations: Number of statements each worker runs
+    :param processes: If True, use worker processes rather than threads
+    :param report_interval: Seconds between progress reports, or None for no reports
+    :param report_stream: Stream to write progress reports to, defaulting to stdout
+    :param seed: Seed for choosing statements, for repeatable runs
+    """
+
+    if duration is None and iterations is None:
+        raise ValueError("A duration or number of iterations must be given")
+
+    if workers < 1:
+        raise ValueError("Number of workers must be at least 1")
+
+    statement_list, weights = _normalize_mix(statements)
+
+    seed = random.randrange(2 ** 32) if seed is None else seed
+
+    deadline = None if duration is None else time.time() + duration
+
+    worker_arguments = [
+        (connection_factory, statement_list, weights, iterations, deadline, seed + number)
+        for number in range(workers)
+    ]
+
+    if processes:
+        runner = _ProcessRunner(worker_arguments)
+    else:
+        runner = _ThreadRunner(worker_arguments)
+
+    start = time.perf_counter()
+
+    runner.start()
+
+    _report_until_done(
+        runner=runner,
+        start=start,
+        interval=report_interval,
+        stream=report_stream or sys.stdout
+    )
+
+    return LoadResult(
+        stats=runner.totals(),
+        elapsed_seconds=time.perf_counter() - start,
+        workers=workers,
+        processes=processes
+    )
+
+
+def _normalize_mix(statements: StatementMix) -> Tuple[List[str], List[float]]:
+    """ Convert a statement mix into parallel lists of statements and weights
+
+    :param statements: Statement, list of statements, or dict of statements and weights
+    """
+
+    if isinstance(statements, str):
+        statements = [statements]
+
+    if isinstance(statements, Mapping):
+        statement_list, weights = list(statements.keys()), list(statements.values())
+    else:
+        statement_list, weights = list(statements), [1.0] * len(statements)
+
+    if not statement_list:
+        raise ValueError("At least one statement must be given")
+
+    return statement_list, weights
+
+
+def _run_worker(connection_factory: Callable[[], object], statements: List[str], weights: List[float],
+                iterations: [int, None], deadline: [float, None], seed: int, stats: WorkerStats,
+                on_progress: [Callable[[], None], None] = None):
+    """ Run statements from a single connection until told to stop
+
+    :param connection_factory: Zero-argument callable returning a new connection
+    :param statements: Statements to choose from
+    :param weights: Relative weight of each statement
+    :param iterations: Number of statements to run, or None for no limit
+    :param deadline: time.time() to stop at, or None for no limit
+    :param seed: Seed for choosing statements
+    :param stats: Stats to record results in
+    :param on_progress: Called after each statement, if given
+    """
+
+    chooser = random.Random(seed)
+
+    try:
+        wrapper = wrap_connection(connection_factory())
+    except Exception as ex:
+        with stats.lock:
+            stats.errors[f"connect: {type(ex).__name__}"] += 1
+        return
+
+    try:
+        completed = 0
+
+        while (iterations is None or completed < iterations) and (deadline is None or time.time() < deadline):
+
+            statement = chooser.choices(statements, weights)[0]
+
+            try:
+                timing = wrapper.time_statement(statement)
+            except Exception as ex:
+                with stats.lock:
+                    stats.errors[type(ex).__name__] += 1
+            else:
+                with stats.lock:
+                    stats.operations += 1
+                    stats.rows += timing.rows
+                    stats.histogram.record(timing.execute_seconds + timing.fetch_seconds)
+
+            completed += 1
+
+            if on_progress is not None:
+                on_progress()
+
+    finally:
+        wrapper.close()
+
+
+class _ThreadRunner:
+    """ Runs load workers on threads in this process """
+
+    def __init__(self, worker_arguments: List[tuple]):
+        """ Initialize a _ThreadRunner
+
+        :param worker_arguments: Positional arguments for each call to _run_worker
+        """
+
+        self.stats = [WorkerStats() for _ in worker_arguments]
+
+        self.threads = [
+            threading.Thread(
+                target=_run_worker,
+                args=(*arguments, stats),
+                name=f"dbreak-load-{number}",
+                daemon=True
+            )
+            for number, (arguments, stats)
+            in enumerate(zip(worker_arguments, self.stats))
+        ]
+
+    def start(self):
+        """ Start all workers """
+
+        for thread in self.threads:
+            thread.start()
+
+    def wait(self, timeout: [float, None]) -> bool:
+        """ Wait for workers to finish, returning True once they all have
+
+        :param timeout: Seconds to wait
+        """
+
+        deadline = None if timeout is None else time.perf_counter() + timeout
+
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(deadline - time.perf_counter(), 0))
+
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def totals(self) -> WorkerStats:
+        """ Returns the combined stats of all workers so far """
+
+        totals = WorkerStats()
+
+        for stats in self.stats:
+            with stats.lock:
+                totals.merge(stats)
+
+        return totals
+
+
+class _ProcessRunner:
+    """ Runs load workers in separate processes, which send their stats back periodically """
+
+    # Seconds between stats updates sent by each worker process
+    UPDATE_INTERVAL = 0.25
+
+    # Seconds to wait for an update before checking whether worker processes have died
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, worker_arguments: List[tuple]):
+        """ Initialize a _ProcessRunner
+
+        :param worker_arguments: Positional arguments for each call to _run_worker
+        """
+
+        # Spawned rather than forked, since forking a paused
+        # multi-threaded application isn't safe
+        context = multiprocessing.get_context("spawn")
+
+        self.updates = context.Queue()
+
+        self.stats = [WorkerStats() for _ in worker_arguments]
+
+        self.running = len(worker_arguments)
+
+        # Numbers of workers that have finished, and of workers whose processes were seen to have exited
+        self.finished = set()
+        self.exited = set()
+
+        self.processes = [
+            context.Process(
+                target=_process_worker,
+                args=(number, arguments, self.updates, self.UPDATE_INTERVAL),
+                name=f"dbreak-load-{number}",
+                daemon=True
+            )
+            for number, arguments
+            in enumerate(worker_arguments)
+        ]
+
+    def start(self):
+        """ Start all workers """
+
+        for process in self.processes:
+            process.start()
+
+    def wait(self, timeout: [float, None]) -> bool:
+        """ Collect stats updates until workers finish, returning True once they all have
+
+        A worker process that exits without saying it finished (killed, or
+        crashed in the interpreter) counts as finished, with an error.
+
+        :param timeout: Seconds to wait
+        """
+
+        deadline = None if timeout is None else time.perf_counter() + timeout
+
+        while self.running:
+
+            remaining = None if deadline is None else deadline - time.perf_counter()
+
+            if remaining is not None and remaining <= 0:
+                return False
+
+            poll = self.POLL_INTERVAL if remaining is None else min(remaining, self.POLL_INTERVAL)
+
+            try:
+                number, stats, finished = self.updates.get(timeout=poll)
+            except queue.Empty:
+                self._check_processes()
+                continue
+
+            self.stats[number] = stats
+
+            if finished:
+                self.finished.add(number)
+                self.running -= 1
+
+        for process in self.processes:
+            process.join()
+
+        return True
+
+    def _check_processes(self):
+        """ Count workers whose processes have exited without saying they finished as finished
+
+        A process is only given up on once the queue has come up empty after
+        its exit was first noticed, in case its last update was still on the way.
+        """
+
+        for number, process in enumerate(self.processes):
+
+            if number in self.finished or process.exitcode is None:
+                continue
+
+            if number not in self.exited:
+                self.exited.add(number)
+                continue
+
+            self.stats[number].errors[f"worker process exited with code {process.exitcode}"] += 1
+
+            self.finished.add(number)
+            self.running -= 1
+
+    def totals(self) -> WorkerStats:
+        """ Returns the combined stats of all workers as of their latest updates """
+
+        totals = WorkerStats()
+
+        for stats in self.stats:
+            totals.merge(stats)
+
+        return totals
+
+
+def _process_worker(number: int, arguments: tuple, updates: multiprocessing.Queue, interval: float):
+    """ Entry point for worker processes, sending stats back as the worker runs
+
+    :param number: Position of this worker
+    :param arguments: Positional arguments for _run_worker
+    :param updates: Queue to send (number, stats, finished) tuples to
+    :param interval: Seconds between updates
+    """
+
+    stats = WorkerStats()
+
+    last_update = [time.perf_counter()]
+
+    # Queues pickle objects on a background thread, so a copy is sent
+    # rather than stats that may change before they're pickled
+    def send_update():
+        if time.perf_counter() - last_update[0] >= interval:
+            updates.put((number, copy.deepcopy(stats), False))
+            last_update[0] = time.perf_counter()
+
+    try:
+        _run_worker(*arguments, stats, on_progress=send_update)
+    finally:
+        updates.put((number, copy.deepcopy(stats), True))
+
+
+def _report_until_done(runner: [_ThreadRunner, _ProcessRunner], start: float,
+                       interval: [float, None], stream: TextIO):
+    """ Wait for workers to finish, writing a progress line every interval
+
+    :param runner: Runner whose workers to wait for
+    :param start: time.perf_counter() the test started at
+    :param interval: Seconds between reports, or None for no reports
+    :param stream: Stream to write reports to
+    """
+
+    previous_operations = 0
+    previous_time = start
+
+    while not runner.wait(interval):
+
+        totals = runner.totals()
+
+        now = time.perf_counter()
+
+        rate = per_second(totals.operations - previous_operations, now - previous_time)
+
+        histogram = totals.histogram
+
+        stream.write(
+            f"[{now - start:7.1f}s] operations={totals.operations} ({rate}/s) "
+            f"errors={sum(totals.errors.values())} "
+            f"p50={histogram.percentile(50) * 1000:.2f}ms "
+            f"p95={histogram.percentile(95) * 1000:.2f}ms "
+            f"p99={histogram.percentile(99) * 1000:.2f}ms\n"
+        )
+
+        stream.flush()
+
+        previous_operations = totals.operations
+        previous_time = now
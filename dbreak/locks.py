@@ -0,0 +1,146 @@
+""" Locks used to coordinate debug sessions started from multiple threads """
+
+import collections
+import threading
+import weakref
+
+from typing import Dict, Tuple
+
+
+class ConsoleQueue:
+    """ First-come, first-served lock allowing one thread at a time to use the console
+
+    Threads that hit a breakpoint while another thread holds the console
+    wait in the order they arrived. The lock is reentrant, so a thread
+    that already holds the console may acquire it again.
+    """
+
+    def __init__(self):
+        """ Initialize a new ConsoleQueue """
+
+        # Used to wake waiting threads whenever the console is released
+        self._condition = threading.Condition()
+
+        # Threads waiting for the console, in arrival order
+        self._waiting = collections.deque()
+
+        # Thread currently holding the console, and how many
+        # times it has acquired it
+        self._owner = None
+        self._depth = 0
+
+    @property
+    def owner(self) -> [threading.Thread, None]:
+        """ Returns the thread currently holding the console, if any """
+
+        return self._owner
+
+    @property
+    def waiting(self) -> int:
+        """ Returns the number of threads waiting for the console """
+
+        with self._condition:
+            return len(self._waiting)
+
+    def acquire(self, timeout: [float, None] = None) -> bool:
+        """ Wait for this thread's turn at the console
+
+        Returns True if the console was acquired, False on timeout.
+
+        :param timeout: Seconds to wait before giving up, or None to wait forever
+        """
+
+        current_thread = threading.current_thread()
+
+        with self._condition:
+
+            # Reentrant acquisition by the thread already holding the console
+            if self._owner is current_thread:
+                self._depth += 1
+                return True
+
+            self._waiting.append(current_thread)
+
+            acquired = self._condition.wait_for(
+                lambda: self._owner is None and self._waiting[0] is current_thread,
+                timeout=timeout
+            )
+
+            # Give up our place in line if we timed out
+            if not acquired:
+                self._waiting.remove(current_thread)
+                self._condition.notify_all()
+                return False
+
+            self._waiting.popleft()
+            self._owner = current_thread
+            self._depth = 1
+
+            return True
+
+    def release(self):
+        """ Release the console, letting the next waiting thread take its turn """
+
+        with self._condition:
+
+            if self._owner is not threading.current_thread():
+                raise RuntimeError("Cannot release a console held by another thread")
+
+            self._depth -= 1
+
+            if self._depth == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+    def __enter__(self) -> "ConsoleQueue":
+
+        self.acquire()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.release()
+
+
+# Locks shared between the console and the application for each
+# raw connection. Connections that support weak references are
+# tracked weakly, while others fall back to being keyed by id(),
+# kept alongside the connection so its id can't be reused until
+# release_connection_lock is called.
+_weak_connection_locks = weakref.WeakKeyDictionary()
+_connection_locks_by_id: Dict[int, Tuple[object, threading.RLock]] = {}
+_connection_locks_guard = threading.Lock()
+
+
+def connection_lock(raw_connection: object) -> threading.RLock:
+    """ Get the lock guarding a raw database connection
+
+    The console holds this lock while running commands against the
+    connection. Application threads that share the same connection
+    object can hold it too, so they never use the connection at the
+    same time as the console.
+
+    :param raw_connection: An unwrapped database connection
+    """
+
+    with _connection_locks_guard:
+
+        try:
+            return _weak_connection_locks.setdefault(raw_connection, threading.RLock())
+        except TypeError:
+            return _connection_locks_by_id.setdefault(id(raw_connection), (raw_connection, threading.RLock()))[1]
+
+
+def release_connection_lock(raw_connection: object):
+    """ Forget the lock of a connection that can't be weakly referenced, once the connection is closed
+
+    Locks of other connections are forgotten when the connection is
+    garbage collected, so this does nothing for them.
+
+    :param raw_connection: An unwrapped database connection
+    """
+
+    with _connection_locks_guard:
+        _connection_locks_by_id.pop(id(raw_connection), None)
+
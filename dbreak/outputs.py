@@ -5,7 +5,9 @@ should be displayed. A TableOutput, for example, could be displayed
 as an HTML table, an ASCII table, etc.
 """
 
-from typing import Iterable
+import math
+
+from typing import Callable, Generator, Iterable, Sequence
 
 
 class TableOutput:
@@ -20,3 +22,62 @@ class TableOutput:
 
         self.rows = rows
         self.columns = columns
+
+
+class ResultStream:
+    """ Represents rows returned by a statement, read a batch at a time rather than all at once
+
+    Streams should be closed when finished with (or used in a with block),
+    so whatever they read from, such as a cursor, is released.
+    """
+
+    def __init__(self, columns: Iterable[str], batches: Iterable[Sequence],
+                 on_close: [Callable[[bool], None], None] = None):
+        """ Construct a new ResultStream
+
+        :param columns: Iterable of column names, empty if the statement returned no result
+        :param batches: Iterable of lists of rows
+        :param on_close: Called once when the stream is closed, with whether every batch was read
+        """
+
+        self.columns = columns
+        self.exhausted = False
+
+        self._batches = batches
+        self._on_close = on_close
+
+    def batches(self) -> Generator[Sequence, None, None]:
+        """ Yield lists of rows until the result is exhausted """
+
+        yield from self._batches
+
+        self.exhausted = True
+
+    def close(self):
+        """ Release whatever the stream reads from """
+
+        on_close, self._on_close = self._on_close, None
+
+        if on_close is not None:
+            on_close(self.exhausted)
+
+    def __iter__(self):
+
+        for batch in self.batches():
+            yield from batch
+
+    def __enter__(self) -> "ResultStream":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def per_second(count: int, seconds: float) -> float:
+    """ Returns a rate per second, rounded for display
+
+    :param count: Number of things counted
+    :param seconds: Time they took
+    """
+
+    return round(count / seconds, 1) if seconds else math.inf
@@ -1,12 +1,22 @@
 """ Functions for parsing database and shell commands """
 
+import re
 import shlex
 
-from typing import Tuple, Callable, List, Dict, Generator
+from typing import Tuple, Callable, List, Dict, Generator, Iterable
 
 from .constants import SHELL_COMMAND_INDICATOR
 from .exc import WrongNumberOfArgumentsError, UnknownCommandError
 
+# Matches a single key=value option at the start of a string
+_OPTION_PATTERN = re.compile(r"\s*(?P<key>[A-Za-z_]+)=(?P<value>\S+)(?=\s|$)")
+
+# Matches the first keyword of a statement, skipping comments and parentheses
+_FIRST_KEYWORD_PATTERN = re.compile(r"(?:\s+|--[^\n]*|/\*.*?\*/|\()*(?P<keyword>\w+)", re.DOTALL)
+
+# Statements starting with these keywords only read from the database
+_READ_KEYWORDS = {"select", "with", "values", "explain", "show", "describe"}
+
 
 def parse(command_string: str, shell_command_lookup: Dict[str, dict]) -> Tuple[Callable, List]:
     """ Parse a string of commands and arguments into a (command function, arguments) tuple
@@ -94,6 +104,52 @@ def tokenize(s: str, maximum_tokens: [int, None] = None) -> Generator[str, None,
         yield unquote(token)
 
 
+def parse_options(s: str, allowed_options: Iterable[str]) -> Tuple[Dict[str, str], str]:
+    """ Split key=value options off the front of a string
+
+    Lets commands whose final argument is a statement take optional settings
+    before it, as in "warmup=5 select * from foo". Returns an (options, rest
+    of string) tuple. Parsing stops at the first token that isn't an allowed
+    option.
+
+    :param s: String that may begin with options
+    :param allowed_options: Names of options to recognize
+    """
+
+    allowed_options = set(allowed_options)
+
+    options = {}
+
+    position = 0
+
+    while True:
+
+        match = _OPTION_PATTERN.match(s, position)
+
+        if match is None or match.group("key") not in allowed_options:
+            break
+
+        options[match.group("key")] = match.group("value")
+
+        position = match.end()
+
+    return options, s[position:].strip()
+
+
+def is_read_statement(statement: str) -> bool:
+    """ Returns True if a statement only reads from the database, judging by its first keyword
+
+    Statements starting with WITH count as reads, so a read-only connection
+    may still reject the rare CTE that writes.
+
+    :param statement: Statement to check
+    """
+
+    match = _FIRST_KEYWORD_PATTERN.match(statement)
+
+    return match is not None and match.group("keyword").lower() in _READ_KEYWORDS
+
+
 def _parse_shell_command(command_string: str, shell_command_lookup: Dict[str, dict]) -> Tuple[Callable, List]:
     """ Parse a shell (non-db) command into a (command function, arguments) tuple
 
@@ -110,9 +166,12 @@ def _parse_shell_command(command_string: str, shell_command_lookup: Dict[str, di
         shell_command_lookup=shell_command_lookup
     )
 
-    # Determine how many arguments we should expect
+    # Determine how many arguments we should expect. Commands may
+    # set "minimum_arguments" to make their last arguments optional.
     number_of_arguments = len(command_details["arguments"])
 
+    minimum_arguments = command_details.get("minimum_arguments", number_of_arguments)
+
     # Convert argument_string into a list of arguments
     arguments = _parse_arguments(
         argument_string=argument_string,
@@ -121,9 +180,14 @@ def _parse_shell_command(command_string: str, shell_command_lookup: Dict[str, di
     )
 
     # Raise an error if too many or too few arguments are provided
-    # (Optional arguments currently aren't a thing)
-    if len(arguments) != number_of_arguments:
-        message = f"Command '{command}' expects {number_of_arguments} arguments, got {len(arguments)}"
+    if not minimum_arguments <= len(arguments) <= number_of_arguments:
+
+        if minimum_arguments == number_of_arguments:
+            expected = number_of_arguments
+        else:
+            expected = f"{minimum_arguments} to {number_of_arguments}"
+
+        message = f"Command '{command}' expects {expected} arguments, got {len(arguments)}"
         raise WrongNumberOfArgumentsError(message)
 
     return command_details["func"], arguments
@@ -0,0 +1,230 @@
+""" Structured query plans, with parsers for sqlite and Postgres plan output
+
+Wrappers implementing ConnectionWrapper.explain return a list of PlanNode
+trees, which render_plan turns into a TableOutput with hot spots (full scans,
+temporary B-trees, sorts spilling to disk, etc) flagged.
+"""
+
+import json
+
+from typing import Generator, Iterable, List, Mapping, Sequence, Tuple, Union
+
+from .outputs import TableOutput
+
+# Flags marking parts of a plan likely to be slow
+FULL_SCAN = "FULL SCAN"
+TEMP_B_TREE = "TEMP B-TREE"
+SORT_SPILL = "SORT SPILL"
+HASH_SPILL = "HASH SPILL"
+
+# Prefix Postgres plugins can use so plans come back as JSON with timings and
+# buffer counts. Note that ANALYZE actually runs the statement.
+POSTGRES_EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+# Postgres plan fields shown as metrics, along with their column names
+_POSTGRES_METRICS = (
+    ("Plan Rows", "Est. Rows"),
+    ("Actual Rows", "Rows"),
+    ("Actual Loops", "Loops"),
+    ("Actual Total Time", "Time (ms)"),
+    ("Shared Hit Blocks", "Buffers Hit"),
+    ("Shared Read Blocks", "Buffers Read"),
+    ("Temp Written Blocks", "Temp Written")
+)
+
+
+class PlanNode:
+    """ A single step of a query plan """
+
+    def __init__(self, detail: str, children: [List["PlanNode"], None] = None,
+                 flags: [List[str], None] = None, metrics: [Mapping[str, object], None] = None):
+        """ Initialize a PlanNode
+
+        :param detail: Description of the step, such as "SCAN foo"
+        :param children: Steps feeding into this one
+        :param flags: Hot spots found in this step, such as FULL_SCAN
+        :param metrics: Measurements for this step (rows, timings, etc) keyed by column name
+        """
+
+        self.detail = detail
+        self.children = children or []
+        self.flags = flags or []
+        self.metrics = dict(metrics or {})
+
+    def walk(self, depth: int = 0) -> Generator[Tuple[int, "PlanNode"], None, None]:
+        """ Yield (depth, node) tuples for this node and all nodes beneath it, depth-first
+
+        :param depth: Depth of this node
+        """
+
+        yield depth, self
+
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+def render_plan(roots: Sequence[PlanNode]) -> TableOutput:
+    """ Lay out plan trees as a table, indenting each step beneath its parent
+
+    :param roots: Top-level plan nodes
+    """
+
+    steps = [
+        (depth, node)
+        for root in roots
+        for depth, node in root.walk()
+    ]
+
+    # Every metric any step has gets a column, in the order first seen
+    metric_columns = []
+
+    for _, node in steps:
+        for name in node.metrics:
+            if name not in metric_columns:
+                metric_columns.append(name)
+
+    rows = [
+        (
+            _indent(node.detail, depth),
+            ", ".join(node.flags),
+            *(node.metrics.get(name, "") for name in metric_columns)
+        )
+        for depth, node
+        in steps
+    ]
+
+    return TableOutput(
+        rows=rows,
+        columns=["Plan", "Flags", *metric_columns]
+    )
+
+
+def _indent(detail: str, depth: int) -> str:
+    """ Indent a step's detail to show its depth in the tree
+
+    :param detail: Description of the step
+    :param depth: Depth of the step
+    """
+
+    if depth == 0:
+        return detail
+
+    return "   " * (depth - 1) + "-> " + detail
+
+
+def parse_sqlite_plan(rows: Iterable[Sequence]) -> List[PlanNode]:
+    """ Build plan trees from the rows returned by sqlite's EXPLAIN QUERY PLAN
+
+    Each row is (id, parent id, unused, detail), with parent id 0 for top-level steps.
+
+    :param rows: Rows returned by EXPLAIN QUERY PLAN
+    """
+
+    nodes = {}
+
+    roots = []
+
+    for node_id, parent_id, _, detail in rows:
+
+        node = PlanNode(
+            detail=detail,
+            flags=_sqlite_flags(detail)
+        )
+
+        nodes[node_id] = node
+
+        parent = nodes.get(parent_id)
+
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.children.append(node)
+
+    return roots
+
+
+def _sqlite_flags(detail: str) -> List[str]:
+    """ Find hot spots in a step of a sqlite plan
+
+    :param detail: Detail text of the step
+    """
+
+    flags = []
+
+    words = detail.split()
+
+    # "SCAN foo" (or "SCAN TABLE foo" before sqlite 3.36) reads every row,
+    # while "SCAN foo USING INDEX ..." at least reads them in index order
+    if words[:1] == ["SCAN"] and "USING" not in words and words[1:3] != ["CONSTANT", "ROW"]:
+        flags.append(FULL_SCAN)
+
+    if "TEMP B-TREE" in detail:
+        flags.append(TEMP_B_TREE)
+
+    return flags
+
+
+def parse_postgres_plan(document: Union[str, list]) -> List[PlanNode]:
+    """ Build plan trees from the output of Postgres' EXPLAIN (FORMAT JSON)
+
+    Works with or without ANALYZE and BUFFERS, though timings and spills
+    are only reported with ANALYZE.
+
+    :param document: JSON text, or the already decoded list
+    """
+
+    if isinstance(document, str):
+        document = json.loads(document)
+
+    return [
+        _parse_postgres_node(entry["Plan"])
+        for entry
+        in document
+    ]
+
+
+def _parse_postgres_node(plan: Mapping[str, object]) -> PlanNode:
+    """ Convert one node of a Postgres JSON plan, along with its children
+
+    :param plan: Decoded JSON object for the node
+    """
+
+    detail = plan["Node Type"]
+
+    if "Relation Name" in plan:
+        detail += f" on {plan['Relation Name']}"
+
+    if "Index Name" in plan:
+        detail += f" using {plan['Index Name']}"
+
+    return PlanNode(
+        detail=detail,
+        children=[_parse_postgres_node(child) for child in plan.get("Plans", ())],
+        flags=_postgres_flags(plan),
+        metrics={
+            column: plan[field]
+            for field, column
+            in _POSTGRES_METRICS
+            if field in plan
+        }
+    )
+
+
+def _postgres_flags(plan: Mapping[str, object]) -> List[str]:
+    """ Find hot spots in a node of a Postgres plan
+
+    :param plan: Decoded JSON object for the node
+    """
+
+    flags = []
+
+    if plan["Node Type"] == "Seq Scan":
+        flags.append(FULL_SCAN)
+
+    if plan.get("Sort Space Type") == "Disk":
+        flags.append(SORT_SPILL)
+
+    if plan.get("Hash Batches", 1) > 1:
+        flags.append(HASH_SPILL)
+
+    return flags
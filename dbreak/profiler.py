@@ -0,0 +1,282 @@
+""" One-pass profiling of a statement's result, column by column
+
+Rows are read a batch at a time from a ResultStream, and each column keeps
+only running totals, so results far larger than memory can be profiled:
+
+* Null counts, and minimum and maximum values (compared as sqlite would)
+* Mean and standard deviation of numbers, using Welford's algorithm
+* Distinct values, estimated with a HyperLogLog sketch
+* Most frequent values, found with the Misra-Gries algorithm, whose
+  counts may be low when a column has more distinct values than it tracks
+* Lengths of strings, counted in power-of-two buckets
+"""
+
+import decimal
+import hashlib
+import math
+
+from typing import Dict, Iterable, List, Sequence
+
+from .outputs import ResultStream, TableOutput
+from .views import order_key
+
+# Number of most frequent values reported for each column
+TOP_VALUES = 5
+
+# Number of candidate values tracked when looking for the most frequent.
+# Columns with no more distinct values than this get exact counts.
+_TOP_VALUE_CANDIDATES = 100
+
+# Number of bits of each hash used to pick a HyperLogLog register, giving
+# 2 ** 12 registers and a typical error of 1.04 / sqrt(2 ** 12), about 1.6%
+_HYPERLOGLOG_PRECISION = 12
+
+
+class HyperLogLog:
+    """ Estimates the number of distinct values seen, using a fixed amount of memory """
+
+    def __init__(self, precision: int = _HYPERLOGLOG_PRECISION):
+        """ Initialize an empty HyperLogLog sketch
+
+        :param precision: Number of hash bits used to pick a register
+        """
+
+        self.precision = precision
+
+        self.registers = bytearray(2 ** precision)
+
+    def add(self, value: object):
+        """ Record a value
+
+        :param value: Value to record
+        """
+
+        hashed = int.from_bytes(
+            hashlib.blake2b(repr(order_key(value)).encode(), digest_size=8).digest(),
+            "big"
+        )
+
+        register = hashed >> (64 - self.precision)
+
+        # Position of the first 1 bit in the rest of the hash
+        remaining_bits = 64 - self.precision
+        rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def estimate(self) -> int:
+        """ Returns the estimated number of distinct values recorded """
+
+        register_count = len(self.registers)
+
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+
+        raw_estimate = alpha * register_count ** 2 / sum(2.0 ** -rank for rank in self.registers)
+
+        # Linear counting is more accurate while many registers are still empty
+        empty_registers = self.registers.count(0)
+
+        if raw_estimate <= 2.5 * register_count and empty_registers:
+            return round(register_count * math.log(register_count / empty_registers))
+
+        return round(raw_estimate)
+
+
+class ColumnProfile:
+    """ Running statistics for one column of a result """
+
+    def __init__(self, name: str):
+        """ Initialize an empty ColumnProfile
+
+        :param name: Name of the column
+        """
+
+        self.name = name
+
+        self.rows = 0
+        self.nulls = 0
+
+        # Smallest and largest values, along with their sort keys
+        self.minimum = self.maximum = None
+        self._minimum_key = self._maximum_key = None
+
+        # Count, mean and sum of squared differences from the mean of
+        # numeric values, updated with Welford's algorithm
+        self.numbers = 0
+        self.mean = 0.0
+        self._squared_differences = 0.0
+
+        self.distinct = HyperLogLog()
+
+        # Misra-Gries counters for the most frequent values, keyed by sort key
+        self._candidates: Dict[tuple, List] = {}
+
+        # Numbers of strings with lengths in each bucket, keyed by the bit
+        # length of the string's length (0 for empty, 1 for 1, 2 for 2-3, etc)
+        self.length_buckets: Dict[int, int] = {}
+
+    def update(self, values: Iterable[object]):
+        """ Add values from the column to the statistics
+
+        :param values: Values, one from each row
+        """
+
+        for value in values:
+
+            self.rows += 1
+
+            if value is None:
+                self.nulls += 1
+                continue
+
+            key = order_key(value)
+
+            if self._minimum_key is None or key < self._minimum_key:
+                self.minimum, self._minimum_key = value, key
+
+            if self._maximum_key is None or key > self._maximum_key:
+                self.maximum, self._maximum_key = value, key
+
+            if isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool):
+                self._add_number(float(value))
+
+            elif isinstance(value, str):
+                bucket = len(value).bit_length()
+                self.length_buckets[bucket] = self.length_buckets.get(bucket, 0) + 1
+
+            self.distinct.add(value)
+
+            self._count_candidate(key, value)
+
+    @property
+    def standard_deviation(self) -> [float, None]:
+        """ Returns the sample standard deviation of numeric values, if there are at least two """
+
+        if self.numbers < 2:
+            return None
+
+        return math.sqrt(self._squared_differences / (self.numbers - 1))
+
+    def top_values(self, count: int = TOP_VALUES) -> List[tuple]:
+        """ Returns (value, count) tuples for the most frequent values, most frequent first
+
+        :param count: Most values to return
+        """
+
+        ranked = sorted(self._candidates.values(), key=lambda candidate: -candidate[1])
+
+        return [(value, occurrences) for value, occurrences in ranked[:count]]
+
+    def length_histogram(self) -> List[tuple]:
+        """ Returns (length range, count) tuples for string lengths, shortest first """
+
+        return [
+            (_describe_bucket(bucket), self.length_buckets[bucket])
+            for bucket
+            in sorted(self.length_buckets)
+        ]
+
+    def _add_number(self, number: float):
+        """ Add a number to the running mean and variance
+
+        :param number: Value to add
+        """
+
+        self.numbers += 1
+
+        difference = number - self.mean
+
+        self.mean += difference / self.numbers
+
+        self._squared_differences += difference * (number - self.mean)
+
+    def _count_candidate(self, key: tuple, value: object):
+        """ Count a value towards the most frequent values
+
+        :param key: Sort key of the value, used to group equal values
+        :param value: Value to count
+        """
+
+        candidate = self._candidates.get(key)
+
+        if candidate is not None:
+            candidate[1] += 1
+
+        elif len(self._candidates) < _TOP_VALUE_CANDIDATES:
+            self._candidates[key] = [value, 1]
+
+        else:
+            # No room, so every candidate loses a count and those
+            # reaching zero make room for new values
+            for candidate_key, candidate in list(self._candidates.items()):
+
+                candidate[1] -= 1
+
+                if not candidate[1]:
+                    del self._candidates[candidate_key]
+
+
+def _describe_bucket(bucket: int) -> str:
+    """ Describe the range of string lengths in a length bucket
+
+    :param bucket: Bit length of the lengths in the bucket
+    """
+
+    if bucket <= 1:
+        return str(bucket)
+
+    return f"{2 ** (bucket - 1)}-{2 ** bucket - 1}"
+
+
+def profile_stream(stream: ResultStream) -> List[ColumnProfile]:
+    """ Profile every column of a result in one pass, a batch at a time
+
+    :param stream: Result to profile
+    """
+
+    profiles = [ColumnProfile(name) for name in stream.columns]
+
+    for batch in stream.batches():
+
+        # One tuple of values per column
+        for profile, values in zip(profiles, zip(*batch)):
+            profile.update(values)
+
+    return profiles
+
+
+def profile_table(profiles: Sequence[ColumnProfile]) -> TableOutput:
+    """ Lay out column profiles as a table, one row per column
+
+    :param profiles: Profiles to show
+    """
+
+    rows = []
+
+    for profile in profiles:
+
+        standard_deviation = profile.standard_deviation
+
+        rows.append(
+            (
+                profile.name,
+                profile.rows,
+                profile.nulls,
+                profile.distinct.estimate(),
+                profile.minimum,
+                profile.maximum,
+                round(profile.mean, 6) if profile.numbers else None,
+                None if standard_deviation is None else round(standard_deviation, 6),
+                "\n".join(f"{value!r}: {count}" for value, count in profile.top_values()),
+                "\n".join(f"{lengths}: {count}" for lengths, count in profile.length_histogram())
+            )
+        )
+
+    return TableOutput(
+        rows=rows,
+        columns=[
+            "Column", "Rows", "Nulls", "Distinct (est.)", "Min", "Max",
+            "Mean", "Std Dev", "Top Values", "String Lengths"
+        ]
+    )
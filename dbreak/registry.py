@@ -0,0 +1,150 @@
+""" Index of ConnectionWrapper classes by the connection types they handle
+
+Wrappers declare the connection classes they handle (HANDLES_TYPES) and/or the
+modules those classes come from (HANDLES_MODULES). Finding a wrapper for a
+connection is then a few dictionary lookups along the MRO of its type, rather
+than asking every ConnectionWrapper subclass in turn.
+"""
+
+import threading
+
+from typing import TYPE_CHECKING, Iterable, List, Type, Union
+
+if TYPE_CHECKING:
+    from .connections import ConnectionWrapper
+
+
+class WrapperRegistry:
+    """ Maps connection types and modules to the wrappers that handle them """
+
+    def __init__(self):
+        """ Initialize an empty WrapperRegistry """
+
+        # Wrappers keyed by connection class
+        self.by_type = {}
+
+        # Wrappers keyed by "module.QualifiedName" of a connection class,
+        # so wrappers needn't import a driver just to declare it
+        self.by_type_name = {}
+
+        # Wrappers keyed by module name prefix
+        self.by_module = {}
+
+        # Chosen wrapper for each connection type looked up so far
+        self._cache = {}
+
+        # Highest SEARCH_RANK of any loaded wrapper defining handles(), so
+        # those wrappers need only be asked when one could outrank a registered one
+        self.highest_handles_rank = -1
+
+        self._lock = threading.Lock()
+
+    def register(self, wrapper_class: Type["ConnectionWrapper"], types: Iterable[Union[type, str]] = (),
+                 modules: Iterable[str] = ()):
+        """ Add a wrapper to the registry
+
+        :param wrapper_class: ConnectionWrapper subclass to register
+        :param types: Connection classes, or their "module.QualifiedName", the wrapper handles
+        :param modules: Module name prefixes whose connection classes the wrapper handles
+        """
+
+        with self._lock:
+
+            for connection_type in types:
+
+                if isinstance(connection_type, str):
+                    self.by_type_name.setdefault(connection_type, []).append(wrapper_class)
+                else:
+                    self.by_type.setdefault(connection_type, []).append(wrapper_class)
+
+            for module in modules:
+                self.by_module.setdefault(module, []).append(wrapper_class)
+
+            self._cache.clear()
+
+    def note_handles_wrapper(self, wrapper_class: Type["ConnectionWrapper"]):
+        """ Record the SEARCH_RANK of a wrapper that finds its connections with handles()
+
+        :param wrapper_class: ConnectionWrapper subclass defining or inheriting handles()
+        """
+
+        with self._lock:
+            self.highest_handles_rank = max(self.highest_handles_rank, wrapper_class.SEARCH_RANK)
+
+    def find(self, raw_connection: object) -> [Type["ConnectionWrapper"], None]:
+        """ Find the registered wrapper with the highest SEARCH_RANK for a connection
+
+        Returns None if no registered wrapper handles the connection.
+
+        :param raw_connection: An unwrapped database connection
+        """
+
+        connection_type = type(raw_connection)
+
+        try:
+            return self._cache[connection_type]
+        except KeyError:
+            pass
+
+        candidates = self.candidates(connection_type)
+
+        # Ties go to whichever wrapper was declared for the most specific class
+        wrapper_class = max(
+            candidates,
+            key=lambda candidate: candidate.SEARCH_RANK,
+            default=None
+        )
+
+        with self._lock:
+            self._cache[connection_type] = wrapper_class
+
+        return wrapper_class
+
+    def candidates(self, connection_type: type) -> List[Type["ConnectionWrapper"]]:
+        """ Returns all registered wrappers for a connection type, most specific first
+
+        :param connection_type: Class of an unwrapped database connection
+        """
+
+        candidates = []
+
+        for klass in connection_type.__mro__:
+
+            candidates.extend(self.by_type.get(klass, ()))
+            candidates.extend(self.by_type_name.get(_qualified_name(klass), ()))
+
+            for module in _module_prefixes(klass.__module__):
+                candidates.extend(self.by_module.get(module, ()))
+
+        return candidates
+
+
+def _qualified_name(klass: type) -> str:
+    """ Returns the "module.QualifiedName" of a class
+
+    :param klass: Class to name
+    """
+
+    return f"{klass.__module__}.{klass.__qualname__}"
+
+
+def _module_prefixes(module: str) -> List[str]:
+    """ Returns a module's name and the names of all packages containing it, longest first
+
+    For example, "psycopg2.extensions" gives ["psycopg2.extensions", "psycopg2"].
+
+    :param module: Dotted module name
+    """
+
+    parts = module.split(".")
+
+    return [
+        ".".join(parts[:length])
+        for length
+        in range(len(parts), 0, -1)
+    ]
+
+
+# Registry ConnectionWrapper subclasses add themselves to
+wrapper_registry = WrapperRegistry()
+
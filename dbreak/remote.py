@@ -0,0 +1,441 @@
+""" Serve debug sessions over a local socket, and attach to them from another process
+
+Used when the paused process has no terminal, such as a daemonized worker.
+The server side runs an asyncio server on a Unix socket or loopback TCP port
+for the duration of the breakpoint. Messages sent from server to client are
+JSON objects, one per line, with one of these forms:
+
+    {"output": "text to display"}
+    {"prompt": "text to display before reading a line of input"}
+    {"closed": "reason the session ended"}
+
+The client replies to each prompt with a single line of plain text.
+"""
+
+import argparse
+import asyncio
+import glob
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+from typing import Tuple, List, TextIO
+
+from .console import _console_intro, _run_command, _display_outputs
+from .constants import REMOTE_SOCKET_NAME_PATTERN, REMOTE_SOCKET_GLOB, REMOTE_LOOPBACK_HOSTS
+from .exc import StopSession, RemoteConsoleError
+from .sessions import DebugSession
+
+
+class RemoteConsoleServer:
+    """ Serves a single DebugSession to one attached client at a time """
+
+    def __init__(self, session: DebugSession, address: [str, None] = None,
+                 timeout: [float, None] = None):
+        """ Initialize a RemoteConsoleServer
+
+        :param session: DebugSession to serve
+        :param address: Address to listen on, or None for a default Unix socket
+        :param timeout: Seconds to wait without a client before giving up
+        """
+
+        self.session = session
+
+        self.address = address or default_address()
+
+        self.timeout = timeout
+
+        # Set once the server is listening, at which point
+        # self.address reflects the actual bound address
+        self.ready = threading.Event()
+
+        # Set to True if the server stopped because no client attached in time
+        self.timed_out = False
+
+        # Event loop state, created when serving starts
+        self._finished = None
+        self._wake = None
+        self._client = None
+        self._idle_since = None
+
+    def serve(self):
+        """ Serve the session until a client exits it or the timeout expires """
+
+        # A fresh event loop is used so this works whether or
+        # not the calling thread already has one
+        loop = asyncio.new_event_loop()
+
+        try:
+            loop.run_until_complete(self._serve())
+        finally:
+            loop.close()
+
+    async def _serve(self):
+        """ Run the server until the session is finished """
+
+        loop = asyncio.get_event_loop()
+
+        self._finished = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._idle_since = loop.time()
+
+        kind, location = parse_address(self.address)
+
+        if kind == "unix":
+            server = await self._start_unix_server(location)
+        else:
+            server = await self._start_tcp_server(*location)
+
+        self.ready.set()
+
+        self._announce()
+
+        try:
+            await self._wait_until_finished()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+            if kind == "unix" and os.path.exists(location):
+                os.remove(location)
+
+    def _announce(self):
+        """ Tell the user where to attach, since there's no terminal to show a prompt on """
+
+        print(
+            f"Debug console for thread '{threading.current_thread().name}' waiting at {self.address}. "
+            f"Attach with: dbreak-attach {self.address}",
+            file=sys.stderr
+        )
+
+    async def _start_unix_server(self, path: str):
+        """ Listen on a Unix socket only accessible to the current user
+
+        :param path: File system path of the socket
+        """
+
+        server = await asyncio.start_unix_server(self._handle_client, path=path)
+
+        os.chmod(path, 0o600)
+
+        return server
+
+    async def _start_tcp_server(self, host: str, port: int):
+        """ Listen on a loopback TCP port
+
+        :param host: Loopback host name or address
+        :param port: Port to listen on, or 0 to pick a free one
+        """
+
+        server = await asyncio.start_server(self._handle_client, host=host, port=port)
+
+        # Record the real port in case an arbitrary one was requested
+        bound_port = server.sockets[0].getsockname()[1]
+
+        self.address = f"tcp:{host}:{bound_port}"
+
+        return server
+
+    async def _wait_until_finished(self):
+        """ Wait for the session to end, or for the idle timeout to expire """
+
+        loop = asyncio.get_event_loop()
+
+        while not self._finished.is_set():
+
+            # Only count down while nobody is attached
+            remaining = None
+
+            if self.timeout is not None and self._client is None:
+
+                remaining = self._idle_since + self.timeout - loop.time()
+
+                if remaining <= 0:
+                    self.timed_out = True
+                    return
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wake.clear()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Drive the session from a newly attached client
+
+        :param reader: Stream of lines sent by the client
+        :param writer: Stream of messages sent to the client
+        """
+
+        # Only one client may drive the session at once
+        if self._client is not None or self._finished.is_set():
+            await _send(writer, closed="Session is already in use by another client")
+            writer.close()
+            return
+
+        self._client = writer
+        self._wake.set()
+
+        try:
+            await _send(writer, output=_console_intro(self.session))
+
+            while True:
+
+                await _send(writer, prompt=f"{self.session.current_connection_name}> ")
+
+                line = await reader.readline()
+
+                # The client went away without exiting the session,
+                # so wait for another one to attach
+                if not line:
+                    break
+
+                command_string = line.decode().strip()
+
+                if not command_string:
+                    continue
+
+                try:
+                    output = _run_and_render(self.session, command_string)
+                except StopSession:
+                    await _send(writer, closed="Debug session ended")
+                    self._finished.set()
+                    break
+
+                if output:
+                    await _send(writer, output=output)
+
+        except ConnectionError:
+            pass
+
+        finally:
+            self._client = None
+            self._idle_since = asyncio.get_event_loop().time()
+            self._wake.set()
+
+            writer.close()
+
+
+def serve_console(session: DebugSession, address: [str, None] = None, timeout: [float, None] = None):
+    """ Serve a session over a local socket until it is exited or times out
+
+    :param session: DebugSession to serve
+    :param address: Address to listen on, or None for a default Unix socket
+    :param timeout: Seconds to wait without a client before resuming
+    """
+
+    server = RemoteConsoleServer(
+        session=session,
+        address=address,
+        timeout=timeout
+    )
+
+    server.serve()
+
+    if server.timed_out:
+        print(f"No client attached to {server.address} within {timeout} seconds, resuming.", file=sys.stderr)
+
+
+def _run_and_render(session: DebugSession, command_string: str) -> str:
+    """ Run a command and render its outputs as console text
+
+    :param session: Current DebugSession
+    :param command_string: Command sent by the client
+    """
+
+    outputs = _run_command(
+        session=session,
+        command_string=command_string
+    )
+
+    buffer = io.StringIO()
+
+    _display_outputs(outputs, file=buffer, error_file=buffer)
+
+    return buffer.getvalue()
+
+
+async def _send(writer: asyncio.StreamWriter, **message: str):
+    """ Send a single message to the client
+
+    :param writer: Stream of messages sent to the client
+    :param message: Message contents
+    """
+
+    writer.write(json.dumps(message).encode() + b"\n")
+
+    await writer.drain()
+
+
+def default_address() -> str:
+    """ Returns the address used when none is given """
+
+    if not hasattr(socket, "AF_UNIX"):
+        return "tcp:127.0.0.1:0"
+
+    file_name = REMOTE_SOCKET_NAME_PATTERN.format(
+        pid=os.getpid(),
+        thread=threading.get_ident()
+    )
+
+    return f"unix:{os.path.join(tempfile.gettempdir(), file_name)}"
+
+
+def parse_address(address: str) -> Tuple[str, object]:
+    """ Split an address into (kind, location)
+
+    "unix:/path" gives ("unix", "/path"), while "tcp:host:port" and
+    "tcp:port" give ("tcp", (host, port)).
+
+    :param address: Address to parse
+    """
+
+    kind, _, location = address.partition(":")
+
+    if kind == "unix" and location:
+        return kind, location
+
+    if kind == "tcp" and location:
+
+        host, _, port = location.rpartition(":")
+
+        host = host.strip("[]") or "127.0.0.1"
+
+        if host not in REMOTE_LOOPBACK_HOSTS:
+            raise RemoteConsoleError(f"Remote consoles may only listen on loopback addresses, not '{host}'")
+
+        try:
+            return kind, (host, int(port))
+        except ValueError:
+            pass
+
+    raise RemoteConsoleError(f"Invalid remote console address '{address}'")
+
+
+def find_sockets() -> List[str]:
+    """ Returns addresses of all remote consoles listening on default Unix sockets """
+
+    pattern = os.path.join(tempfile.gettempdir(), REMOTE_SOCKET_GLOB)
+
+    return [f"unix:{path}" for path in sorted(glob.glob(pattern))]
+
+
+def attach(address: str, input_stream: TextIO = None, output_stream: TextIO = None) -> str:
+    """ Attach to a remote console and relay it to the given streams
+
+    Returns the reason the server gave for ending the session, or an
+    empty string if this client detached first.
+
+    :param address: Address of the remote console
+    :param input_stream: Stream to read commands from, defaulting to stdin
+    :param output_stream: Stream to write console output to, defaulting to stdout
+    """
+
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+
+    with _connect(address) as sock, sock.makefile("rwb") as stream:
+
+        for line in stream:
+
+            message = json.loads(line)
+
+            if "output" in message:
+                output_stream.write(message["output"] + "\n")
+
+            elif "prompt" in message:
+                output_stream.write(message["prompt"])
+                output_stream.flush()
+
+                command_string = input_stream.readline()
+
+                # End of input detaches, leaving the session running
+                if not command_string:
+                    return ""
+
+                stream.write(command_string.encode())
+                stream.flush()
+
+            elif "closed" in message:
+                output_stream.write(message["closed"] + "\n")
+                return message["closed"]
+
+    return ""
+
+
+def _connect(address: str) -> socket.socket:
+    """ Open a socket connected to a remote console
+
+    :param address: Address of the remote console
+    """
+
+    kind, location = parse_address(address)
+
+    try:
+        if kind == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(location)
+            return sock
+        else:
+            return socket.create_connection(location)
+    except OSError as ex:
+        raise RemoteConsoleError(f"Could not attach to {address}: {ex}")
+
+
+def main(argv: [List[str], None] = None) -> int:
+    """ Command-line entry point for attaching to remote consoles
+
+    :param argv: Command-line arguments, defaulting to sys.argv
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="dbreak-attach",
+        description="Attach to a dbreak console served by another process"
+    )
+
+    parser.add_argument(
+        "address",
+        nargs="?",
+        help="Console address, such as unix:/tmp/dbreak.sock or tcp:127.0.0.1:7000"
+    )
+
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="List consoles waiting on default Unix sockets and exit"
+    )
+
+    arguments = parser.parse_args(argv)
+
+    available = find_sockets()
+
+    if arguments.list:
+        print("\n".join(available))
+        return 0
+
+    address = arguments.address
+
+    # Without an address, attach to the only waiting console if there's just one
+    if address is None:
+
+        if len(available) != 1:
+            parser.error(f"{len(available)} consoles found, please give an address (see --list)")
+
+        address = available[0]
+
+    try:
+        attach(address)
+    except RemoteConsoleError as ex:
+        print(ex, file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
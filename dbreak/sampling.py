@@ -0,0 +1,123 @@
+""" Uniform random samples of results too large to read into memory
+
+Rows are streamed through a reservoir using Algorithm L (Li, 1994), which
+works out how many rows to skip before the next one joins the sample. Only
+the sample is kept, and skipped rows within a batch aren't even looked at.
+"""
+
+import collections
+import math
+import random
+import time
+
+from typing import List
+
+from .outputs import ResultStream, TableOutput
+
+# Rows sampled from a result, the number of rows read to choose them, and
+# whether the whole result was read (False if a time budget ran out first)
+Sample = collections.namedtuple(
+    "Sample",
+    ["rows", "scanned", "complete"]
+)
+
+
+def sample_stream(stream: ResultStream, size: int, budget: [float, None] = None,
+                  random_generator: [random.Random, None] = None) -> Sample:
+    """ Choose a uniform random sample of rows from a result
+
+    :param stream: Result to sample
+    :param size: Number of rows to sample
+    :param budget: Seconds to spend reading before settling for a sample of the rows read so far
+    :param random_generator: Source of randomness, defaulting to a new random.Random
+    """
+
+    if size < 1:
+        raise ValueError("Sample size must be at least 1")
+
+    random_generator = random_generator or random.Random()
+
+    deadline = None if budget is None else time.monotonic() + budget
+
+    reservoir = []
+
+    # Position of the next row to join the reservoir once it's full,
+    # and the weight Algorithm L uses to choose the position after it
+    next_position = None
+    weight = None
+
+    scanned = 0
+
+    for batch in stream.batches():
+
+        batch_end = scanned + len(batch)
+
+        # Fill the reservoir with the first rows
+        if len(reservoir) < size:
+
+            reservoir.extend(batch[:size - len(reservoir)])
+
+            if len(reservoir) == size and next_position is None:
+                weight = math.exp(math.log(_open_uniform(random_generator)) / size)
+                next_position = size + _skip(weight, random_generator)
+
+        # Then replace a random member with each row chosen
+        while next_position is not None and next_position < batch_end:
+
+            reservoir[random_generator.randrange(size)] = batch[next_position - scanned]
+
+            weight *= math.exp(math.log(_open_uniform(random_generator)) / size)
+            next_position += _skip(weight, random_generator) + 1
+
+        scanned = batch_end
+
+        if deadline is not None and time.monotonic() >= deadline:
+            return Sample(rows=reservoir, scanned=scanned, complete=False)
+
+    return Sample(rows=reservoir, scanned=scanned, complete=True)
+
+
+def sample_outputs(sample: Sample, columns: List[str], budget: [float, None] = None) -> List:
+    """ Lay out a sample as a table, followed by a note of how much of the result was read
+
+    :param sample: Sample to show
+    :param columns: Names of the result's columns
+    :param budget: Time budget the sample was taken with, if any
+    """
+
+    summary = f"Sampled {len(sample.rows)} of {sample.scanned} row(s) read"
+
+    if not sample.complete:
+        summary += f". Stopped once the {budget}s budget ran out, so rows after these weren't considered"
+
+    return [
+        TableOutput(
+            rows=sample.rows,
+            columns=columns
+        ),
+        summary
+    ]
+
+
+def _skip(weight: float, random_generator: random.Random) -> int:
+    """ Returns how many rows to pass over before the next one joins the sample
+
+    :param weight: Current Algorithm L weight
+    :param random_generator: Source of randomness
+    """
+
+    return math.floor(math.log(_open_uniform(random_generator)) / math.log(1 - weight))
+
+
+def _open_uniform(random_generator: random.Random) -> float:
+    """ Returns a random number strictly between 0 and 1
+
+    :param random_generator: Source of randomness
+    """
+
+    value = random_generator.random()
+
+    while value == 0.0:
+        value = random_generator.random()
+
+    return value
@@ -0,0 +1,124 @@
+""" Built-in sqlite database for staging results pulled from other connections
+
+Every DebugSession has a connection named SCRATCH_CONNECTION_NAME, opened
+the first time it's used. !stash streams a statement's result into a table
+there, so results from several databases can be queried together with SQL.
+
+The database is kept in memory unless configure_scratch gives it a file,
+and can only grow to a set size, enforced with PRAGMA max_page_count.
+"""
+
+import itertools
+import sqlite3
+
+from .connections import ConnectionWrapper, LazyConnection
+from .constants import SCRATCH_CONNECTION_NAME, SCRATCH_MAX_BYTES
+from .exc import ScratchFullError
+from .outputs import ResultStream
+from .sqlite import SQLiteWrapper
+
+# Settings for scratch databases of sessions started from now on
+_settings = {
+    "path": None,
+    "max_bytes": SCRATCH_MAX_BYTES
+}
+
+
+def configure_scratch(path: [str, None] = None, max_bytes: int = SCRATCH_MAX_BYTES):
+    """ Set where sessions started from now on keep their scratch database, and how large it may grow
+
+    A file is kept after the session ends, so its tables can be used again
+    by later sessions.
+
+    :param path: File to keep the database in, or None to keep it in memory
+    :param max_bytes: Size the database may grow to
+    """
+
+    _settings["path"] = path
+    _settings["max_bytes"] = max_bytes
+
+
+class ScratchConnection(LazyConnection):
+    """ Stands in for a session's scratch database until it's first used """
+
+    def __init__(self, path: [str, None] = None, max_bytes: [int, None] = None):
+        """ Initialize a ScratchConnection, defaulting to the settings given to configure_scratch
+
+        :param path: File to keep the database in, or None to keep it in memory
+        :param max_bytes: Size the database may grow to
+        """
+
+        self.path = path or _settings["path"]
+        self.max_bytes = max_bytes or _settings["max_bytes"]
+
+        super().__init__(
+            factory=self._connect,
+            description=f"Scratch sqlite database ({self.path or 'in memory'})"
+        )
+
+    def open(self) -> SQLiteWrapper:
+        """ Open and wrap the scratch database """
+
+        return SQLiteWrapper(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Open the scratch database, limiting its size """
+
+        raw_connection = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+
+        page_size = raw_connection.execute("PRAGMA page_size").fetchone()[0]
+
+        raw_connection.execute(f"PRAGMA max_page_count = {max(self.max_bytes // page_size, 1)}")
+
+        # Staged rows can always be pulled again, so durability isn't needed
+        raw_connection.execute("PRAGMA synchronous = OFF")
+        raw_connection.execute("PRAGMA journal_mode = MEMORY")
+
+        return raw_connection
+
+
+def stash_stream(scratch: ConnectionWrapper, table: str, stream: ResultStream,
+                 append: bool = False, replace: bool = False) -> int:
+    """ Copy a result into a table a batch at a time, returning the number of rows copied
+
+    The table is created unless appending, with column types judged from
+    the first batch of rows.
+
+    :param scratch: Connection to copy into
+    :param table: Name of the table
+    :param stream: Result to copy
+    :param append: Whether to add to an existing table
+    :param replace: Whether to drop an existing table first
+    """
+
+    batches = iter(stream.batches())
+
+    first_batch = next(batches, [])
+
+    rows = 0
+
+    try:
+        if replace:
+            scratch.execute_statement(f"DROP TABLE IF EXISTS {table}")
+
+        if not append:
+            scratch.create_table(table, stream.columns, sample_rows=first_batch)
+
+        for batch in itertools.chain([first_batch], batches):
+            rows += scratch.insert_rows(table, stream.columns, batch)
+
+        scratch.commit()
+
+    except sqlite3.OperationalError as ex:
+
+        if "full" not in str(ex):
+            raise
+
+        scratch.raw_connection.rollback()
+
+        raise ScratchFullError(
+            f"The {SCRATCH_CONNECTION_NAME} database is full. Allow it more room, or keep it in a "
+            f"file, with dbreak.configure_scratch() before starting the session."
+        ) from ex
+
+    return rows
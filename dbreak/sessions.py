@@ -1,8 +1,16 @@
 """ Holds functions and objects related to debug sessions """
 
-from typing import TYPE_CHECKING, Dict
+import collections
 
+from typing import TYPE_CHECKING, Dict, Iterable, Mapping, Union
+
+from .connections import LazyConnection
+from .constants import SCRATCH_CONNECTION_NAME
 from .exc import ConnectionNotFoundError
+from .outputs import TableOutput
+from .scratch import ScratchConnection
+from .spill import SpilledRows
+from .views import ResultView
 
 if TYPE_CHECKING:
     from .connections import ConnectionWrapper
@@ -11,11 +19,13 @@ if TYPE_CHECKING:
 class DebugSession:
     """ Represents a debugging session """
 
-    def __init__(self, connections: Dict[str, "ConnectionWrapper"], current_connection_name: [str, None] = None):
+    def __init__(self, connections: Dict[str, Union["ConnectionWrapper", LazyConnection]], current_connection_name: [str, None] = None,
+                 caller_variables: [Mapping[str, object], None] = None):
         """ Initialize a new DebugSession
 
-        :param connections: Dict of named ConnectionWrapper objects
+        :param connections: Dict of named ConnectionWrapper objects, or LazyConnection objects to open when first used
         :param current_connection_name: Name of the connection to use
+        :param caller_variables: Local variables of the code that started the session
         """
 
         # Make sure we've been given at least one connection
@@ -26,15 +36,44 @@ class DebugSession:
         if not current_connection_name:
             current_connection_name = next(iter(connections))
 
-        # Holds a dictionary of ConnectionWrapper objects,
-        # keyed by connection name
-        self.connections = connections
+        # Holds a dictionary of ConnectionWrapper objects (or
+        # LazyConnection objects not yet opened), keyed by connection name.
+        # Copied, so adding the scratch database doesn't change the caller's dict.
+        self.connections = dict(connections)
+
+        # Every session has a scratch database for staging results, unless
+        # a connection already has its name
+        self.connections.setdefault(SCRATCH_CONNECTION_NAME, ScratchConnection())
+
+        # Wrappers for connections the session opened itself,
+        # which it's responsible for closing
+        self.opened_connections = []
 
         # Set via the current_connection_name property
         self._current_connection_name = None
 
         self.current_connection_name = current_connection_name
 
+        # Variables set with !set, which statements can reference as :name
+        self.variables = {}
+
+        # Snapshot of the paused code's local variables, which
+        # statements can also reference unless hidden by !set
+        self.caller_variables = dict(caller_variables or {})
+
+        # Table most recently returned by a statement, for !page, !export,
+        # !where, etc, with the filters and sort order applied to it by
+        # those commands, and the page of it last shown
+        self.last_output = None
+        self.last_view = None
+        self.last_page = 1
+
+    @property
+    def bindable_variables(self) -> Mapping[str, object]:
+        """ Returns all variables statements can reference, with !set variables taking precedence """
+
+        return collections.ChainMap(self.variables, self.caller_variables)
+
     @property
     def current_connection_name(self) -> str:
         """ Returns the name of the connection currently in use """
@@ -45,7 +84,60 @@ class DebugSession:
     def current_connection(self) -> "ConnectionWrapper":
         """ Get a reference to the current connection """
 
-        return self.connections[self.current_connection_name]
+        return self.open_connection(self.current_connection_name)
+
+    def open_connection(self, name: str) -> "ConnectionWrapper":
+        """ Get a connection by name, opening it first if it hasn't been used yet
+
+        Lazily-opened connections are cached for the rest of the session.
+
+        :param name: Name of the connection
+        """
+
+        if name not in self.connections:
+            raise ConnectionNotFoundError(name)
+
+        connection = self.connections[name]
+
+        if isinstance(connection, LazyConnection):
+            owns_connection = connection.owns_connection
+
+            connection = connection.open()
+
+            self.connections[name] = connection
+
+            if owns_connection:
+                self.opened_connections.append(connection)
+
+        return connection
+
+    def keep_last_output(self, outputs: [Iterable, None]):
+        """ Remember the last table among a statement's outputs, if any
+
+        Rows a previous table spilled to disk are deleted.
+
+        :param outputs: Outputs returned by the statement
+        """
+
+        tables = [output for output in outputs or () if isinstance(output, TableOutput)]
+
+        if not tables:
+            return
+
+        self._discard_last_output()
+
+        self.last_output = tables[-1]
+        self.last_view = ResultView(self.last_output)
+        self.last_page = 1
+
+    def _discard_last_output(self):
+        """ Forget the last table, deleting any rows it spilled to disk """
+
+        if self.last_output is not None and isinstance(self.last_output.rows, SpilledRows):
+            self.last_output.rows.close()
+
+        self.last_output = None
+        self.last_view = None
 
     @current_connection_name.setter
     def current_connection_name(self, name: str):
@@ -58,4 +150,29 @@ class DebugSession:
         if name not in self.connections:
             raise ConnectionNotFoundError(name)
 
+        # Only switch once a lazy connection has opened successfully
+        # (skipped while initializing, so nothing opens until first used)
+        if self._current_connection_name is not None:
+            self.open_connection(name)
+
         self._current_connection_name = name
+
+    def close(self):
+        """ End the session, letting each connection release anything it holds for the console
+
+        Connections the session opened itself are closed.
+        """
+
+        self._discard_last_output()
+
+        for wrapper in self.connections.values():
+            if isinstance(wrapper, LazyConnection):
+                wrapper.discard()
+
+            elif wrapper not in self.opened_connections:
+                wrapper.detach()
+
+        for wrapper in self.opened_connections:
+            wrapper.close()
+
+        self.opened_connections.clear()
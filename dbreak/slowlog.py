@@ -0,0 +1,478 @@
+""" Log of slow statements, run from the console or by the application
+
+Once enabled, statements taking at least the threshold are appended to a
+rotating file as JSON lines:
+
+    {"timestamp": "...", "connection": "db[0]", "duration_ms": 812.4, "rows": 3, "statement": "select ..."}
+
+Entries are handed to a background thread for formatting and writing, so
+logging never adds file I/O to the statement's own thread.
+"""
+
+import collections
+import contextlib
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from typing import List, Sequence
+
+from .capture import normalize_statement
+from .constants import SLOW_LOG_FILE_NAME, SLOW_LOG_THRESHOLD_SECONDS, SLOW_LOG_MAX_BYTES, SLOW_LOG_BACKUP_COUNT
+from .variables import driver_paramstyle
+
+
+class SlowLog:
+    """ Appends statements slower than a threshold to a rotating file, on a background thread """
+
+    def __init__(self, path: [str, None] = None, threshold: float = SLOW_LOG_THRESHOLD_SECONDS,
+                 max_bytes: int = SLOW_LOG_MAX_BYTES, backup_count: int = SLOW_LOG_BACKUP_COUNT):
+        """ Initialize a SlowLog, starting its writer thread
+
+        :param path: File to write to, defaulting to SLOW_LOG_FILE_NAME in the temp directory
+        :param threshold: Seconds a statement must take to be logged
+        :param max_bytes: Size the file may reach before being rotated
+        :param backup_count: Number of rotated files to keep
+        """
+
+        self.path = path or os.path.join(tempfile.gettempdir(), SLOW_LOG_FILE_NAME)
+        self.threshold = threshold
+        self.backup_count = backup_count
+
+        self._file_handler = logging.handlers.RotatingFileHandler(
+            filename=self.path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True
+        )
+
+        self._file_handler.setFormatter(_EntryFormatter())
+        self._file_handler.addFilter(_FlushMarkerFilter())
+
+        # Entries are queued by the statement's thread and
+        # written by the listener's thread
+        self._queue = queue.Queue()
+
+        self._listener = logging.handlers.QueueListener(self._queue, self._file_handler)
+        self._listener.start()
+
+        # Held while queueing flush markers, so none are queued behind close()
+        self._closed = False
+        self._closed_guard = threading.Lock()
+
+        # A standalone logger, so the application's logging
+        # configuration neither sees nor affects these entries
+        self._logger = logging.Logger(f"dbreak.slowlog.{id(self)}")
+        self._logger.propagate = False
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+
+    def record(self, connection_name: str, statement: str, seconds: float, rows: [int, None]):
+        """ Log a statement if it took at least the threshold
+
+        :param connection_name: Name of the connection the statement ran on
+        :param statement: Text of the statement
+        :param seconds: How long it took
+        :param rows: Number of rows it returned or affected, if known
+        """
+
+        if seconds < self.threshold:
+            return
+
+        self._logger.info(
+            "slow statement",
+            extra={"slow_statement": (connection_name, statement, seconds, rows)}
+        )
+
+    def flush(self):
+        """ Wait for entries queued so far to be written
+
+        A marker is queued behind them, and the writer thread signals when it
+        reaches it, so calls from several threads can overlap safely.
+        """
+
+        flushed = threading.Event()
+
+        with self._closed_guard:
+
+            if self._closed:
+                return
+
+            self._queue.put(logging.makeLogRecord({"flushed": flushed}))
+
+        flushed.wait()
+
+    def entries(self, limit: int = 20, connection: [str, None] = None, min_ms: [float, None] = None,
+                contains: [str, None] = None) -> List[dict]:
+        """ Returns the most recent entries matching the filters, newest first
+
+        :param limit: Most entries to return
+        :param connection: Only include entries for this connection
+        :param min_ms: Only include entries taking at least this many milliseconds
+        :param contains: Only include statements containing this text (ignoring case)
+        """
+
+        self.flush()
+
+        # Oldest rotated file first, current file last
+        paths = [f"{self.path}.{number}" for number in range(self.backup_count, 0, -1)]
+        paths.append(self.path)
+
+        matching = collections.deque(maxlen=limit)
+
+        for path in paths:
+
+            if not os.path.exists(path):
+                continue
+
+            with open(path, encoding="utf-8") as file:
+
+                for line in file:
+
+                    entry = json.loads(line)
+
+                    if _matches(entry, connection, min_ms, contains):
+                        matching.append(entry)
+
+        return list(reversed(matching))
+
+    def close(self):
+        """ Write any queued entries and stop the writer thread """
+
+        with self._closed_guard:
+            self._closed = True
+
+        self._listener.stop()
+        self._file_handler.close()
+
+
+class _FlushMarkerFilter(logging.Filter):
+    """ Signals SlowLog.flush when the writer thread reaches its marker, which isn't written """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """ Returns False for flush markers, after signalling them
+
+        :param record: Record about to be written
+        """
+
+        flushed = getattr(record, "flushed", None)
+
+        if flushed is None:
+            return True
+
+        flushed.set()
+
+        return False
+
+
+class _EntryFormatter(logging.Formatter):
+    """ Formats slow statement records as JSON lines, on the writer thread """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """ Format a record logged by SlowLog.record
+
+        :param record: Record to format
+        """
+
+        connection_name, statement, seconds, rows = record.slow_statement
+
+        return json.dumps(
+            {
+                "timestamp": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                "connection": connection_name,
+                "duration_ms": round(seconds * 1000, 3),
+                "rows": rows,
+                "statement": normalize_statement(statement)
+            },
+            default=str
+        )
+
+
+def _matches(entry: dict, connection: [str, None], min_ms: [float, None], contains: [str, None]) -> bool:
+    """ Returns True if a log entry passes the filters
+
+    :param entry: Entry read from the log
+    :param connection: Required connection name, if any
+    :param min_ms: Required minimum duration, if any
+    :param contains: Required statement text, if any
+    """
+
+    return (
+        (connection is None or entry["connection"] == connection)
+        and (min_ms is None or entry["duration_ms"] >= min_ms)
+        and (contains is None or contains.lower() in entry["statement"].lower())
+    )
+
+
+def enable_slow_log(path: [str, None] = None, threshold: float = SLOW_LOG_THRESHOLD_SECONDS,
+                    max_bytes: int = SLOW_LOG_MAX_BYTES, backup_count: int = SLOW_LOG_BACKUP_COUNT) -> SlowLog:
+    """ Start logging slow statements, replacing any slow log already enabled
+
+    Statements run from the console are logged, as are those the application
+    runs through connections wrapped in SlowLogConnection.
+
+    :param path: File to write to, defaulting to SLOW_LOG_FILE_NAME in the temp directory
+    :param threshold: Seconds a statement must take to be logged
+    :param max_bytes: Size the file may reach before being rotated
+    :param backup_count: Number of rotated files to keep
+    """
+
+    global _slow_log
+
+    slow_log = SlowLog(path, threshold, max_bytes, backup_count)
+
+    with _slow_log_guard:
+        previous, _slow_log = _slow_log, slow_log
+
+    if previous is not None:
+        previous.close()
+
+    return slow_log
+
+
+def disable_slow_log():
+    """ Stop logging slow statements """
+
+    global _slow_log
+
+    with _slow_log_guard:
+        previous, _slow_log = _slow_log, None
+
+    if previous is not None:
+        previous.close()
+
+
+def active_slow_log() -> [SlowLog, None]:
+    """ Returns the slow log, if enabled """
+
+    return _slow_log
+
+
+def log_statement(connection_name: str, statement: str, seconds: float, rows: [int, None]):
+    """ Log a statement to the slow log if it's enabled and the statement was slow enough
+
+    :param connection_name: Name of the connection the statement ran on
+    :param statement: Text of the statement
+    :param seconds: How long it took
+    :param rows: Number of rows it returned or affected, if known
+    """
+
+    slow_log = _slow_log
+
+    if slow_log is not None:
+        slow_log.record(connection_name, statement, seconds, rows)
+
+
+@contextlib.contextmanager
+def suppress_connection_logging():
+    """ Don't log statements the current thread starts through SlowLogConnection while in this block
+
+    Used while the console runs a statement, which it logs itself.
+    """
+
+    previous = _suppressed.active
+
+    _suppressed.active = True
+
+    try:
+        yield
+    finally:
+        _suppressed.active = previous
+
+
+class _Suppressed(threading.local):
+    """ Whether statements the current thread starts through SlowLogConnection are left unlogged """
+
+    active = False
+
+
+class SlowLogConnection:
+    """ Wraps a DB API connection so statements the application runs are timed for the slow log
+
+    Use it in place of the connection:
+
+        connection = dbreak.SlowLogConnection(psycopg2.connect(...), name="orders")
+
+    A statement's time covers executing it and fetching its results, and is
+    logged once the results are exhausted, or the cursor is reused or closed.
+    """
+
+    def __init__(self, raw_connection: object, name: str):
+        """ Initialize a SlowLogConnection
+
+        :param raw_connection: DB API connection to wrap
+        :param name: Name to log statements under
+        """
+
+        self._raw_connection = raw_connection
+        self._name = name
+
+    @property
+    def paramstyle(self) -> str:
+        """ Returns the wrapped driver's DB API paramstyle, which can't be told from this class's module """
+
+        return driver_paramstyle(self._raw_connection)
+
+    def cursor(self, *args, **kwargs) -> "_TimedCursor":
+        """ Returns a cursor whose statements are timed """
+
+        return _TimedCursor(self._raw_connection.cursor(*args, **kwargs), self._name)
+
+    def execute(self, statement: str, *args, **kwargs) -> "_TimedCursor":
+        """ Execute a statement on a new cursor, as sqlite3 connections allow """
+
+        return self.cursor().execute(statement, *args, **kwargs)
+
+    def executemany(self, statement: str, *args, **kwargs) -> "_TimedCursor":
+        """ Execute a statement for each set of parameters on a new cursor, as sqlite3 connections allow """
+
+        return self.cursor().executemany(statement, *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self._raw_connection, name)
+
+
+class _TimedCursor:
+    """ Wraps a DB API cursor, timing each statement and logging it once its results are used up """
+
+    def __init__(self, cursor: object, connection_name: str):
+        """ Initialize a _TimedCursor
+
+        :param cursor: DB API cursor to wrap
+        :param connection_name: Name to log statements under
+        """
+
+        self._cursor = cursor
+        self._connection_name = connection_name
+
+        # Statement whose results are still being fetched, along
+        # with the time taken and rows fetched so far
+        self._statement = None
+        self._seconds = 0.0
+        self._rows = 0
+
+        # Whether the statement is left unlogged, decided when it starts
+        # since its results may be used up outside suppress_connection_logging
+        self._suppressed = False
+
+    def execute(self, statement: str, *args, **kwargs) -> "_TimedCursor":
+        """ Execute a statement, timing it """
+
+        return self._timed_execute(self._cursor.execute, statement, *args, **kwargs)
+
+    def executemany(self, statement: str, *args, **kwargs) -> "_TimedCursor":
+        """ Execute a statement for each set of parameters, timing it """
+
+        return self._timed_execute(self._cursor.executemany, statement, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+
+        return row
+
+    def fetchmany(self, *args, **kwargs) -> Sequence:
+        rows = self._timed_fetch(self._cursor.fetchmany, *args, **kwargs)
+
+        self._rows += len(rows)
+
+        if not rows:
+            self._finish()
+
+        return rows
+
+    def fetchall(self) -> Sequence:
+        rows = self._timed_fetch(self._cursor.fetchall)
+
+        self._rows += len(rows)
+
+        self._finish()
+
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+
+        if row is None:
+            raise StopIteration
+
+        return row
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def _timed_execute(self, execute, statement: str, *args, **kwargs) -> "_TimedCursor":
+        """ Run an execute method, logging the previous statement first
+
+        :param execute: Bound execute or executemany method of the cursor
+        :param statement: Statement to execute
+        """
+
+        self._finish()
+
+        start = time.perf_counter()
+
+        execute(statement, *args, **kwargs)
+
+        self._statement = statement
+        self._seconds = time.perf_counter() - start
+        self._rows = 0
+        self._suppressed = _suppressed.active
+
+        # Nothing to fetch, so log it now with the rows it affected
+        if self._cursor.description is None:
+            rowcount = getattr(self._cursor, "rowcount", -1)
+            self._rows = rowcount if rowcount >= 0 else None
+            self._finish()
+
+        return self
+
+    def _timed_fetch(self, fetch, *args, **kwargs):
+        """ Run a fetch method, adding its time to the statement's
+
+        :param fetch: Bound fetch method of the cursor
+        """
+
+        start = time.perf_counter()
+
+        try:
+            return fetch(*args, **kwargs)
+        finally:
+            self._seconds += time.perf_counter() - start
+
+    def _finish(self):
+        """ Log the statement whose results were being fetched, if any """
+
+        if self._statement is None:
+            return
+
+        statement, self._statement = self._statement, None
+
+        if self._suppressed:
+            return
+
+        log_statement(self._connection_name, statement, self._seconds, self._rows)
+
+
+_suppressed = _Suppressed()
+
+# Slow log in use, if enabled
+_slow_log = None
+_slow_log_guard = threading.Lock()
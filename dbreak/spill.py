@@ -0,0 +1,456 @@
+""" Result rows that spill to a temporary sqlite database once over a memory budget, and other disk spills
+
+Rows are collected in memory until their estimated size passes the budget,
+after which all of them move to a SpilledRows store on disk. A store acts as
+a read-only sequence, so TableOutput.rows can be either a list or a store,
+while paging, sorting and filtering read only the rows they need from disk.
+
+Each stored row keeps its values as sortable key columns alongside a pickled
+copy of the original row, which is what's returned.
+
+HashPartitions splits records between temporary files by key instead, for
+comparing and joining results that don't fit in memory.
+"""
+
+import collections.abc
+import decimal
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import weakref
+
+from typing import Generator, Hashable, Iterable, List, Sequence, Tuple, Union
+
+from .constants import RESULT_MEMORY_BUDGET_BYTES, SPILL_PARTITIONS
+
+# Operators conditions passed to SpilledRows.select may use
+COMPARISON_OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+
+# Number of rows written to or read from the store at a time
+_BATCH_SIZE = 1000
+
+# Integers sqlite can store as integers; larger ones are kept as floats
+_SQLITE_INTEGER_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+def estimate_row_size(row: Sequence) -> int:
+    """ Returns a rough estimate of the memory a row takes up, in bytes
+
+    :param row: Row to measure
+    """
+
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+def sortable_value(value: object) -> object:
+    """ Convert a value to one sqlite can store and order sensibly
+
+    Numbers, strings, bytes and None are kept as they are (with decimals and
+    very large integers becoming floats). Anything else, such as dates, is
+    stored as its string representation.
+
+    :param value: Value from a result row
+    """
+
+    if value is None or isinstance(value, (str, bytes, float)):
+        return value
+
+    if isinstance(value, int):
+        low, high = _SQLITE_INTEGER_RANGE
+        return value if low <= value <= high else float(value)
+
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+
+    return str(value)
+
+
+class SpilledRows(collections.abc.Sequence):
+    """ Read-only sequence of result rows held in a temporary sqlite database """
+
+    def __init__(self, column_count: int):
+        """ Initialize an empty SpilledRows store
+
+        :param column_count: Number of columns in each row
+        """
+
+        self.column_count = column_count
+
+        descriptor, self.path = tempfile.mkstemp(prefix="dbreak-spill-", suffix=".sqlite")
+        os.close(descriptor)
+
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        # The store is thrown away when closed, so durability isn't needed
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+
+        key_columns = "".join(f", {key_column(index)}" for index in range(column_count))
+
+        self._connection.execute(f"CREATE TABLE rows (position INTEGER PRIMARY KEY{key_columns}, row BLOB)")
+
+        self._length = 0
+
+        self._lock = threading.Lock()
+
+        # Removes the file even if close() is never called
+        self._finalizer = weakref.finalize(self, _remove_store, self._connection, self.path)
+
+    def extend(self, rows: Iterable[Sequence]):
+        """ Append rows to the store
+
+        :param rows: Rows to append
+        """
+
+        placeholders = ", ".join("?" * (self.column_count + 2))
+
+        insert = f"INSERT INTO rows VALUES ({placeholders})"
+
+        batch = []
+
+        with self._lock:
+
+            for row in rows:
+
+                # Driver row types such as sqlite3.Row can't be pickled
+                row = tuple(row)
+
+                batch.append(
+                    (
+                        self._length,
+                        *(sortable_value(value) for value in row),
+                        pickle.dumps(row, protocol=pickle.HIGHEST_PROTOCOL)
+                    )
+                )
+
+                self._length += 1
+
+                if len(batch) >= _BATCH_SIZE:
+                    self._connection.executemany(insert, batch)
+                    batch = []
+
+            if batch:
+                self._connection.executemany(insert, batch)
+
+            self._connection.commit()
+
+    def select(self, order_by: Sequence[Tuple[int, bool]] = (),
+               conditions: Sequence[Tuple[int, str, object]] = (),
+               offset: int = 0, limit: [int, None] = None) -> Generator[tuple, None, None]:
+        """ Yield stored rows, optionally filtered, sorted and windowed, reading from disk in batches
+
+        :param order_by: (column index, descending) tuples to sort by, defaulting to the original order
+        :param conditions: (column index, operator, value) tuples rows must all match
+        :param offset: Number of matching rows to skip
+        :param limit: Most rows to return
+        """
+
+        statement, parameters = self._build_select(order_by, conditions, offset, limit)
+
+        with self._lock:
+            cursor = self._connection.execute(statement, parameters)
+
+        while True:
+
+            with self._lock:
+                batch = cursor.fetchmany(_BATCH_SIZE)
+
+            if not batch:
+                break
+
+            for (blob,) in batch:
+                yield pickle.loads(blob)
+
+    def count(self, conditions: Sequence[Tuple[int, str, object]] = ()) -> int:
+        """ Returns the number of stored rows matching conditions
+
+        :param conditions: (column index, operator, value) tuples rows must all match
+        """
+
+        where, parameters = _build_where(conditions)
+
+        with self._lock:
+            return self._connection.execute(f"SELECT count(*) FROM rows{where}", parameters).fetchone()[0]
+
+    def create_index(self, column_index: int):
+        """ Index a column, so filtering and sorting on it don't scan the whole store
+
+        :param column_index: Position of the column to index
+        """
+
+        column = key_column(column_index)
+
+        with self._lock:
+            self._connection.execute(f"CREATE INDEX IF NOT EXISTS {column}_index ON rows ({column}, position)")
+
+    def close(self):
+        """ Close the store and delete its file """
+
+        self._finalizer()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        return self.select()
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[tuple, List[tuple]]:
+
+        if isinstance(index, slice):
+
+            start, stop, step = index.indices(self._length)
+
+            if step != 1:
+                return list(self)[index]
+
+            return list(self.select(offset=start, limit=max(stop - start, 0)))
+
+        if index < 0:
+            index += self._length
+
+        if not 0 <= index < self._length:
+            raise IndexError("SpilledRows index out of range")
+
+        return next(self.select(offset=index, limit=1))
+
+    def _build_select(self, order_by: Sequence[Tuple[int, bool]], conditions: Sequence[Tuple[int, str, object]],
+                      offset: int, limit: [int, None]) -> Tuple[str, list]:
+        """ Build the statement used by select, returning a (statement, parameters) tuple
+
+        :param order_by: (column index, descending) tuples to sort by
+        :param conditions: (column index, operator, value) tuples rows must all match
+        :param offset: Number of matching rows to skip
+        :param limit: Most rows to return
+        """
+
+        where, parameters = _build_where(conditions)
+
+        # Pages in the original order seek straight to their first
+        # position, rather than having sqlite step over the rows before it
+        if not order_by and not conditions:
+            where, parameters, offset = " WHERE position >= ?", [offset], 0
+
+        # Ties are broken by the original order, so sorts are stable
+        ordering = [
+            f"{key_column(index)} {'DESC' if descending else 'ASC'}"
+            for index, descending
+            in order_by
+        ]
+
+        ordering.append("position")
+
+        statement = f"SELECT row FROM rows{where} ORDER BY {', '.join(ordering)} LIMIT ? OFFSET ?"
+
+        parameters.extend((-1 if limit is None else limit, offset))
+
+        return statement, parameters
+
+
+def key_column(index: int) -> str:
+    """ Returns the name of the store column holding the sortable value of a result column
+
+    :param index: Position of the result column
+    """
+
+    return f"k{index}"
+
+
+def _build_where(conditions: Sequence[Tuple[int, str, object]]) -> Tuple[str, list]:
+    """ Build a WHERE clause from conditions, returning a (clause, parameters) tuple
+
+    :param conditions: (column index, operator, value) tuples rows must all match
+    """
+
+    if not conditions:
+        return "", []
+
+    clauses = []
+
+    parameters = []
+
+    for index, operator, value in conditions:
+
+        if operator not in COMPARISON_OPERATORS:
+            raise ValueError(f"Unsupported operator '{operator}'. Use one of {' '.join(COMPARISON_OPERATORS)}")
+
+        if value is None:
+            clauses.append(f"{key_column(index)} IS {'NOT ' if operator == '!=' else ''}NULL")
+        else:
+            clauses.append(f"{key_column(index)} {operator} ?")
+            parameters.append(sortable_value(value))
+
+    return " WHERE " + " AND ".join(clauses), parameters
+
+
+def _remove_store(connection: sqlite3.Connection, path: str):
+    """ Close a store's connection and delete its file
+
+    :param connection: Connection to the store
+    :param path: Path of the store's file
+    """
+
+    connection.close()
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class HashPartitions:
+    """ Records split between temporary files by the hash of a key
+
+    Used to compare or join inputs too large for memory: both inputs are
+    partitioned the same way, so records with equal keys land in the same
+    partition, and each pair of partitions is small enough to handle alone.
+    """
+
+    def __init__(self, count: int = SPILL_PARTITIONS):
+        """ Initialize an empty set of partitions
+
+        :param count: Number of partitions
+        """
+
+        self.count = count
+
+        self.directory = tempfile.mkdtemp(prefix="dbreak-partitions-")
+
+        self._files = [
+            open(os.path.join(self.directory, f"{number}.pickle"), "w+b")
+            for number
+            in range(count)
+        ]
+
+        # Removes the files even if close() is never called
+        self._finalizer = weakref.finalize(self, _remove_partitions, self._files, self.directory)
+
+    def partition_of(self, key: Hashable) -> int:
+        """ Returns the partition records with a key belong in
+
+        :param key: Key of the record
+        """
+
+        return hash(key) % self.count
+
+    def add(self, key: Hashable, record: object):
+        """ Write a record to the partition for its key
+
+        :param key: Key deciding the partition
+        :param record: Record to write, which must be picklable (so rows from drivers should be tuples)
+        """
+
+        pickle.dump(record, self._files[self.partition_of(key)], protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read(self, partition: int) -> Generator[object, None, None]:
+        """ Yield the records written to a partition, in the order written
+
+        :param partition: Number of the partition
+        """
+
+        file = self._files[partition]
+
+        file.flush()
+        file.seek(0)
+
+        while True:
+
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                break
+
+        file.seek(0, os.SEEK_END)
+
+    def close(self):
+        """ Delete the partition files """
+
+        self._finalizer()
+
+
+def _remove_partitions(files: Sequence, directory: str):
+    """ Close and delete partition files
+
+    :param files: Open partition files
+    :param directory: Directory holding them
+    """
+
+    for file in files:
+        file.close()
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class RowCollector:
+    """ Collects result rows in memory, moving them to a SpilledRows store once over a memory budget """
+
+    def __init__(self, column_count: int, budget_bytes: [int, None] = None):
+        """ Initialize a RowCollector
+
+        :param column_count: Number of columns in each row
+        :param budget_bytes: Estimated size rows may take up before spilling to disk, defaulting to RESULT_MEMORY_BUDGET_BYTES
+        """
+
+        self.column_count = column_count
+        self.budget_bytes = RESULT_MEMORY_BUDGET_BYTES if budget_bytes is None else budget_bytes
+
+        self._rows = []
+        self._size = 0
+
+        self._store = None
+
+    def extend(self, rows: Iterable[Sequence]):
+        """ Add rows to the result
+
+        :param rows: Rows to add
+        """
+
+        if self._store is not None:
+            self._store.extend(rows)
+            return
+
+        rows = iter(rows)
+
+        for row in rows:
+
+            self._rows.append(row)
+
+            self._size += estimate_row_size(row)
+
+            if self._size > self.budget_bytes:
+                self._spill()
+                self._store.extend(rows)
+                return
+
+    def finish(self) -> Union[List[Sequence], SpilledRows]:
+        """ Returns the rows collected, as a list or a SpilledRows store """
+
+        return self._rows if self._store is None else self._store
+
+    def _spill(self):
+        """ Move the rows collected so far into a new store """
+
+        self._store = SpilledRows(self.column_count)
+        self._store.extend(self._rows)
+
+        self._rows = []
+        self._size = 0
+
+
+def collect_rows(rows: Iterable[Sequence], column_count: int,
+                 budget_bytes: [int, None] = None) -> Union[List[Sequence], SpilledRows]:
+    """ Returns rows as a list, or as a SpilledRows store if they don't fit in the memory budget
+
+    :param rows: Rows to collect, such as a cursor
+    :param column_count: Number of columns in each row
+    :param budget_bytes: Estimated size rows may take up before spilling to disk, defaulting to RESULT_MEMORY_BUDGET_BYTES
+    """
+
+    collector = RowCollector(column_count, budget_bytes)
+
+    collector.extend(rows)
+
+    return collector.finish()
@@ -0,0 +1,518 @@
+""" ConnectionWrapper making use of features specific to the sqlite3 module """
+
+import contextlib
+import pathlib
+import re
+import sqlite3
+import sys
+import time
+
+from typing import TYPE_CHECKING, List, Mapping
+
+from .advisor import advise_indexes, advice_table, load_statements
+from .capture import capture_statements, find_capture, stop_capturing
+from .dbapi import DBAPIWrapper
+from .exc import StatementCancelledError, ReadConnectionUnavailableError
+from .outputs import TableOutput
+from .plans import PlanNode, parse_sqlite_plan
+from .variables import Parameters, bind_variables
+
+if TYPE_CHECKING:
+    from .sessions import DebugSession
+
+# PRAGMAs that can be changed for the duration of a debug session
+TUNABLE_PRAGMAS = ("cache_size", "mmap_size", "temp_store", "journal_mode")
+
+# Values accepted when tuning a PRAGMA, such as -2000, 268435456, MEMORY or WAL
+_PRAGMA_VALUE_PATTERN = re.compile(r"^-?\w+$")
+
+
+class SQLiteWrapper(DBAPIWrapper):
+    """ Wraps sqlite3 connections, adding timeouts, cancelling, scripts and tuning commands """
+
+    HELP_TEXT = "SQL statements, or scripts of several statements separated by semicolons"
+
+    # Preferred over DBAPIWrapper for sqlite3 connections
+    SEARCH_RANK = 1
+
+    HANDLES_TYPES = (sqlite3.Connection,)
+
+    # Number of sqlite virtual machine instructions between progress handler calls
+    PROGRESS_INSTRUCTIONS = 1000
+
+    def __init__(self, raw_connection: sqlite3.Connection, reuse_cursors: [bool, None] = None):
+        """ Initialize a SQLiteWrapper
+
+        :param raw_connection: sqlite3 connection being wrapped
+        :param reuse_cursors: Override REUSE_CURSORS for this connection
+        """
+
+        super().__init__(raw_connection, reuse_cursors)
+
+        # Seconds a statement may run before it's cancelled, or None for no limit
+        self.statement_timeout = None
+
+        # Seconds between reports that a statement is still running, or None for none
+        self.progress_interval = None
+
+        # Values PRAGMAs had before being tuned, restored on detach
+        self.original_pragmas = {}
+
+        # (handler, instructions) the application set with set_progress_handler,
+        # put back after each console statement
+        self.application_progress_handler = None
+
+        # Why the running statement was cancelled, if it was
+        self._cancel_reason = None
+
+        # Time the running statement started, and was last reported on
+        self._statement_started = None
+        self._last_progress_report = None
+
+        self.custom_commands = {
+            "advise": {
+                "func": self._advise,
+                "description": "Suggest indexes for statements captured with !capture, or listed in a file",
+                "arguments": ["captured|path"],
+                "verbose_final_argument": True
+            },
+            "capture": {
+                "func": self._capture,
+                "description": "Capture statements the application runs on this connection (on, off or clear)",
+                "arguments": ["action"],
+                "verbose_final_argument": False
+            },
+            "captured": {
+                "func": self._captured,
+                "description": "List statements captured so far",
+                "arguments": [],
+                "verbose_final_argument": False
+            },
+            "pragmas": {
+                "func": self._pragmas,
+                "description": "Show the tunable PRAGMAs and any values they had before tuning",
+                "arguments": [],
+                "verbose_final_argument": False
+            },
+            "progress": {
+                "func": self._progress,
+                "description": "Report every n seconds while a statement runs (0 to stop)",
+                "arguments": ["seconds"],
+                "verbose_final_argument": False
+            },
+            "stats": {
+                "func": self._stats,
+                "description": "Show index statistics gathered by ANALYZE (sqlite_stat1)",
+                "arguments": [],
+                "verbose_final_argument": False
+            },
+            "timeout": {
+                "func": self._timeout,
+                "description": "Cancel statements running longer than n seconds (0 for no limit)",
+                "arguments": ["seconds"],
+                "verbose_final_argument": False
+            },
+            "tune": {
+                "func": self._tune,
+                "description": f"Set a PRAGMA until the session ends ({', '.join(TUNABLE_PRAGMAS)})",
+                "arguments": ["pragma", "value"],
+                "verbose_final_argument": False
+            }
+        }
+
+    @classmethod
+    def handles(cls, raw_connection: object) -> bool:
+        """ Returns True if raw_connection is a sqlite3 connection
+
+        Overridden so other DB API connections aren't claimed through
+        DBAPIWrapper.handles(), since this wrapper outranks it.
+
+        :param raw_connection: An unwrapped database connection
+        """
+
+        return isinstance(raw_connection, sqlite3.Connection)
+
+    def cancel(self):
+        """ Cancel the statement running on this connection
+
+        Safe to call from any thread.
+        """
+
+        self._cancel_reason = "Statement cancelled"
+
+        self.raw_connection.interrupt()
+
+    def set_progress_handler(self, handler: [callable, None], instructions: int):
+        """ Set the connection's progress handler, as sqlite3.Connection.set_progress_handler does
+
+        Console statements install their own progress handler while they run.
+        One set here is put back afterwards, where one set directly on the raw
+        connection is cleared, since sqlite3 offers no way to read it back.
+
+        :param handler: Called every instructions sqlite virtual machine instructions, or None to clear it
+        :param instructions: Number of instructions between calls
+        """
+
+        self.application_progress_handler = None if handler is None else (handler, instructions)
+
+        self.raw_connection.set_progress_handler(handler, instructions)
+
+    def explain(self, statement: str, variables: Mapping[str, object]) -> List[PlanNode]:
+        """ Return sqlite's plan for a statement, using EXPLAIN QUERY PLAN
+
+        :param statement: Statement to explain
+        :param variables: Values available for binding, keyed by name
+        """
+
+        statement, parameters = bind_variables(
+            statement=f"EXPLAIN QUERY PLAN {statement}",
+            variables=variables,
+            paramstyle=self.paramstyle
+        )
+
+        cursor = self.raw_connection.cursor()
+
+        try:
+            if parameters is None:
+                cursor.execute(statement)
+            else:
+                cursor.execute(statement, parameters)
+
+            return parse_sqlite_plan(cursor.fetchall())
+
+        finally:
+            cursor.close()
+
+    def open_read_connection(self) -> "SQLiteWrapper":
+        """ Open the same database file again in read-only mode
+
+        Best used with databases in WAL mode, where readers never block the
+        application's writers. In other journal modes a long read still holds
+        a shared lock, but at least doesn't join the application's transaction.
+        """
+
+        path = self._read_database_path()
+
+        if not path:
+            raise ReadConnectionUnavailableError("In-memory and temporary databases can't be opened twice")
+
+        reader = SQLiteWrapper(
+            sqlite3.connect(
+                f"{pathlib.Path(path).as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False
+            )
+        )
+
+        reader.statement_timeout = self.statement_timeout
+        reader.progress_interval = self.progress_interval
+
+        return reader
+
+    def detach(self):
+        """ Restore any tuned PRAGMAs and close cursors kept open for reuse """
+
+        super().detach()
+
+        for name, value in self.original_pragmas.items():
+            if value is not None:
+                self.raw_connection.execute(f"PRAGMA {name} = {value}")
+
+        self.original_pragmas.clear()
+
+    def _execute_with_cursor(self, statement: str, parameters: Parameters) -> List:
+        """ Execute a statement, watching for timeouts and cancellation
+
+        :param statement: Statement to execute in the database
+        :param parameters: Bind parameters for the statement, if any
+        """
+
+        with self._watch_statement():
+            try:
+                return super()._execute_with_cursor(statement, parameters)
+
+            except (sqlite3.ProgrammingError, sqlite3.Warning) as ex:
+
+                # The sqlite3 module only runs one statement per execute()
+                if "one statement at a time" not in str(ex) or parameters is not None:
+                    raise
+
+                return self._execute_script(statement)
+
+    def _execute_script(self, script: str) -> List:
+        """ Run several statements separated by semicolons, one at a time, returning all their outputs
+
+        Each statement is run with execute() as if entered alone, rather than
+        with executescript(), which would commit any transaction the
+        application has open.
+
+        :param script: Statements to run
+        """
+
+        outputs = []
+
+        for statement in _split_script(script):
+            outputs.extend(super()._execute_with_cursor(statement, None) or ())
+
+        return outputs
+
+    @contextlib.contextmanager
+    def _watch_statement(self):
+        """ Install a progress handler while a statement runs
+
+        The handler reports on long-running statements, cancels ones running
+        past the timeout, and lets Ctrl+C cancel the statement rather than
+        waiting for it to finish. Afterwards the handler set through
+        set_progress_handler is put back, or any other is cleared.
+        """
+
+        self._cancel_reason = None
+
+        self._statement_started = self._last_progress_report = time.monotonic()
+
+        self.raw_connection.set_progress_handler(self._on_progress, self.PROGRESS_INSTRUCTIONS)
+
+        try:
+            yield
+
+        except sqlite3.OperationalError as ex:
+
+            if self._cancel_reason is None:
+                raise
+
+            raise StatementCancelledError(self._cancel_reason) from ex
+
+        finally:
+            self.raw_connection.set_progress_handler(*(self.application_progress_handler or (None, 0)))
+
+    def _on_progress(self) -> int:
+        """ Called by sqlite while a statement runs. Returning non-zero aborts the statement """
+
+        try:
+            now = time.monotonic()
+
+            elapsed = now - self._statement_started
+
+            if self.statement_timeout and elapsed >= self.statement_timeout:
+                self._cancel_reason = f"Statement cancelled after running for {self.statement_timeout} seconds"
+                return 1
+
+            if self.progress_interval and now - self._last_progress_report >= self.progress_interval:
+                self._last_progress_report = now
+                print(f"Statement still running ({elapsed:.1f}s)...", file=sys.stderr)
+
+            return 0
+
+        except KeyboardInterrupt:
+            self._cancel_reason = "Statement cancelled"
+            return 1
+
+    def _advise(self, session: "DebugSession", source: str) -> List[TableOutput]:
+        """ Suggest indexes for statements doing full scans or temp B-tree sorts
+
+        :param session: Current DebugSession
+        :param source: "captured" for captured statements, otherwise the path of a file of statements
+        """
+
+        if source == "captured":
+            capture = find_capture(self.raw_connection)
+
+            if capture is None:
+                raise ValueError("Not capturing statements. Start with !capture on.")
+        else:
+            capture = load_statements(source)
+
+        advice = advise_indexes(
+            wrapper=self,
+            statements=capture.statements,
+            variables=session.bindable_variables
+        )
+
+        return [advice_table(advice)]
+
+    def _capture(self, _: "DebugSession", action: str) -> List[str]:
+        """ Start, stop or clear capturing statements
+
+        Capturing carries on between breakpoints until turned off.
+
+        :param action: "on", "off" or "clear"
+        """
+
+        if action == "on":
+            capture_statements(self.raw_connection)
+            return ["Capturing statements. They can be listed with !captured and analyzed with !advise captured."]
+
+        elif action == "off":
+            stop_capturing(self.raw_connection)
+            return ["Stopped capturing statements."]
+
+        elif action == "clear":
+            capture = find_capture(self.raw_connection)
+
+            if capture is not None:
+                capture.clear()
+
+            return ["Cleared captured statements."]
+
+        raise ValueError(f"Unknown capture action '{action}' (expected on, off or clear)")
+
+    def _captured(self, _: "DebugSession") -> List[TableOutput]:
+        """ List statements captured so far, most run first """
+
+        capture = find_capture(self.raw_connection)
+
+        statements = [] if capture is None else capture.statements
+
+        return [
+            TableOutput(
+                rows=[
+                    (captured.normalized, captured.count)
+                    for captured
+                    in sorted(statements, key=lambda captured: -captured.count)
+                ],
+                columns=["Statement", "Runs"]
+            )
+        ]
+
+    def _pragmas(self, _: "DebugSession") -> List[TableOutput]:
+        """ Show tunable PRAGMAs along with their values before tuning """
+
+        rows = [
+            (
+                name,
+                self._read_pragma(name),
+                self.original_pragmas.get(name, "")
+            )
+            for name
+            in TUNABLE_PRAGMAS
+        ]
+
+        return [
+            TableOutput(
+                rows=rows,
+                columns=["PRAGMA", "Value", "Value Before Tuning"]
+            )
+        ]
+
+    def _progress(self, _: "DebugSession", seconds: str):
+        """ Set how often to report on long-running statements
+
+        :param seconds: Seconds between reports, or 0 to stop reporting
+        """
+
+        self.progress_interval = float(seconds) or None
+
+        if self.read_connection is not None:
+            self.read_connection.progress_interval = self.progress_interval
+
+    def _read_database_path(self) -> str:
+        """ Returns the file path of the main database, or "" if it's in memory """
+
+        for _, name, path in self.raw_connection.execute("PRAGMA database_list"):
+            if name == "main":
+                return path
+
+        return ""
+
+    def _read_pragma(self, name: str) -> object:
+        """ Returns the current value of a PRAGMA, or None if it doesn't apply (such as mmap_size in memory)
+
+        :param name: Name of the PRAGMA
+        """
+
+        row = self.raw_connection.execute(f"PRAGMA {name}").fetchone()
+
+        return None if row is None else row[0]
+
+    def _stats(self, _: "DebugSession") -> List:
+        """ Show statistics ANALYZE gathered about each index """
+
+        exists = self.raw_connection.execute(
+            "select 1 from sqlite_master where type = 'table' and name = 'sqlite_stat1'"
+        ).fetchone()
+
+        if not exists:
+            return ["No statistics found. Run ANALYZE to gather them."]
+
+        rows = []
+
+        for table, index, stat in self.raw_connection.execute("select tbl, idx, stat from sqlite_stat1 order by tbl, idx"):
+
+            # The first number is the table's row count, followed by the
+            # average number of rows sharing each prefix of the index's columns
+            counts = stat.split()
+
+            rows.append((table, index, counts[0], " ".join(counts[1:])))
+
+        return [
+            TableOutput(
+                rows=rows,
+                columns=["Table", "Index", "Rows", "Rows per Key Prefix"]
+            )
+        ]
+
+    def _timeout(self, _: "DebugSession", seconds: str):
+        """ Set how long statements may run before being cancelled
+
+        :param seconds: Seconds statements may run for, or 0 for no limit
+        """
+
+        self.statement_timeout = float(seconds) or None
+
+        if self.read_connection is not None:
+            self.read_connection.statement_timeout = self.statement_timeout
+
+    def _tune(self, session: "DebugSession", pragma: str, value: str) -> List[TableOutput]:
+        """ Set a PRAGMA, remembering its value beforehand so it can be restored on detach
+
+        :param session: Current DebugSession
+        :param pragma: Name of the PRAGMA
+        :param value: Value to give it
+        """
+
+        pragma = pragma.lower()
+
+        if pragma not in TUNABLE_PRAGMAS:
+            raise ValueError(f"Can only tune these PRAGMAs: {', '.join(TUNABLE_PRAGMAS)}")
+
+        if not _PRAGMA_VALUE_PATTERN.match(value):
+            raise ValueError(f"Invalid value for PRAGMA {pragma}: {value}")
+
+        original = self._read_pragma(pragma)
+
+        self.raw_connection.execute(f"PRAGMA {pragma} = {value}")
+
+        # Only the value from before the first tuning is restored
+        self.original_pragmas.setdefault(pragma, original)
+
+        return self._pragmas(session)
+
+
+def _split_script(script: str) -> List[str]:
+    """ Split a script into statements at the semicolons ending them
+
+    Semicolons inside string literals, comments and trigger bodies don't end
+    a statement, as judged by sqlite3.complete_statement.
+
+    :param script: Statements separated by semicolons
+    """
+
+    statements = []
+
+    pending = ""
+
+    for piece in script.split(";"):
+
+        pending += piece + ";"
+
+        if sqlite3.complete_statement(pending):
+            statements.append(pending.strip())
+            pending = ""
+
+    # Anything left over is run as-is, so sqlite reports what's wrong with it
+    remainder = pending[:-1].strip()
+
+    if remainder:
+        statements.append(remainder)
+
+    return statements
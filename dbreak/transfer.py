@@ -0,0 +1,207 @@
+""" Streaming copies of results from one connection into a table on another
+
+Fetching and inserting are pipelined: one of them runs on a worker thread,
+passing batches of rows to the other through a bounded queue, so the source
+database is producing the next batch while the target inserts the last. The
+queue's bound keeps a fast source from getting far ahead of a slow target.
+
+Whichever connection can be used from another thread is handed to the
+worker. If neither can (such as sqlite3 connections opened without
+check_same_thread=False), the copy runs on the console's thread alone.
+"""
+
+import collections
+import queue
+import threading
+import time
+
+from typing import Callable, Iterable, Sequence
+
+from .connections import ConnectionWrapper
+from .constants import COPY_COMMIT_ROWS, COPY_QUEUE_BATCHES
+from .outputs import ResultStream
+
+# Rows copied, time taken and commits made by a copy, and which side
+# (if any) ran on a worker thread
+CopyResult = collections.namedtuple(
+    "CopyResult",
+    ["rows", "seconds", "commits", "worker"]
+)
+
+# Put on the queue after the last batch
+_END = object()
+
+# Seconds to wait on the queue before checking whether the other side stopped
+_QUEUE_POLL_SECONDS = 0.1
+
+
+def copy_stream(stream: ResultStream, source: ConnectionWrapper, target: ConnectionWrapper,
+                table: str, create: bool = False, commit_rows: int = COPY_COMMIT_ROWS) -> CopyResult:
+    """ Copy a result into a table a batch at a time, committing every commit_rows rows
+
+    If the copy fails, rows inserted since the last commit are rolled back.
+
+    :param stream: Result to copy
+    :param source: Connection the result is read from
+    :param target: Connection to copy into
+    :param table: Name of the table to copy into
+    :param create: Whether to create the table, judging column types from the first batch
+    :param commit_rows: Number of rows inserted between commits
+    """
+
+    if commit_rows < 1:
+        raise ValueError("Rows between commits must be at least 1")
+
+    columns = list(stream.columns)
+
+    # Rows inserted, rows since the last commit, commits made,
+    # and whether the table still needs creating
+    state = {"rows": 0, "uncommitted": 0, "commits": 0, "create": create}
+
+    def create_table(sample_rows: Sequence[Sequence]):
+        target.create_table(table, columns, sample_rows=sample_rows)
+        state["create"] = False
+
+    def insert(batch: Sequence[Sequence]):
+
+        if state["create"]:
+            create_table(batch)
+
+        state["rows"] += target.insert_rows(table, columns, batch)
+        state["uncommitted"] += len(batch)
+
+        if state["uncommitted"] >= commit_rows:
+            target.commit()
+            state["uncommitted"] = 0
+            state["commits"] += 1
+
+    if source.usable_from_other_threads():
+        worker = "fetch"
+    elif target.usable_from_other_threads():
+        worker = "insert"
+    else:
+        worker = None
+
+    start = time.perf_counter()
+
+    # Rows inserted since the last commit are rolled back if the copy fails
+    try:
+        if worker is None:
+            for batch in stream.batches():
+                insert(batch)
+        else:
+            _pipeline(stream.batches(), insert, fetch_on_worker=worker == "fetch")
+
+        # An empty result still gets its table
+        if state["create"]:
+            create_table(())
+
+        target.commit()
+
+    except BaseException:
+        target.rollback()
+        raise
+
+    return CopyResult(
+        rows=state["rows"],
+        seconds=time.perf_counter() - start,
+        commits=state["commits"] + 1,
+        worker=worker
+    )
+
+
+def copy_summary(result: CopyResult, table: str) -> str:
+    """ Describe a copy's throughput
+
+    :param result: Outcome of the copy
+    :param table: Name of the table copied into
+    """
+
+    rate = result.rows / result.seconds if result.seconds else 0
+
+    summary = (
+        f"Copied {result.rows} row(s) into {table} in {result.seconds:.2f}s "
+        f"({rate:,.0f} rows/s, {result.commits} commit(s))"
+    )
+
+    if result.worker is None:
+        return f"{summary}. Neither connection can be used from another thread, so fetching and inserting took turns."
+
+    return f"{summary}, with rows fetched and inserted on separate threads"
+
+
+def _pipeline(batches: Iterable[Sequence], insert: Callable[[Sequence], None], fetch_on_worker: bool):
+    """ Pass batches from one thread to another through a bounded queue, inserting each
+
+    Errors on either side stop both, and are raised on the calling thread.
+
+    :param batches: Batches of rows to insert
+    :param insert: Inserts a batch of rows
+    :param fetch_on_worker: Whether the worker thread fetches (otherwise it inserts)
+    """
+
+    batch_queue = queue.Queue(maxsize=COPY_QUEUE_BATCHES)
+
+    stop = threading.Event()
+
+    errors = []
+
+    def fetch():
+        for batch in batches:
+            if not _put(batch_queue, batch, stop):
+                return
+
+        _put(batch_queue, _END, stop)
+
+    def consume():
+        while not stop.is_set():
+
+            try:
+                batch = batch_queue.get(timeout=_QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+            if batch is _END:
+                return
+
+            insert(batch)
+
+    def run(side: Callable[[], None]):
+        try:
+            side()
+        except BaseException as ex:
+            errors.append(ex)
+            stop.set()
+
+    worker_side, own_side = (fetch, consume) if fetch_on_worker else (consume, fetch)
+
+    worker = threading.Thread(target=run, args=(worker_side,), name="dbreak-copy", daemon=True)
+
+    worker.start()
+
+    run(own_side)
+
+    worker.join()
+
+    if errors:
+        raise errors[0]
+
+
+def _put(batch_queue: queue.Queue, item: object, stop: threading.Event) -> bool:
+    """ Put an item on a queue, waiting for room unless told to stop. Returns False if stopped.
+
+    :param batch_queue: Queue to put the item on
+    :param item: Item to put
+    :param stop: Set when the other side has stopped
+    """
+
+    while not stop.is_set():
+
+        try:
+            batch_queue.put(item, timeout=_QUEUE_POLL_SECONDS)
+            return True
+
+        except queue.Full:
+            continue
+
+    return False
@@ -0,0 +1,204 @@
+""" Functions for binding session variables into statements as driver parameters
+
+Statements typed at the console reference variables as :name, regardless of
+the driver. Before execution these are rewritten into the placeholder style
+the driver expects (its DB API paramstyle) and the values are passed as real
+bind parameters rather than pasted into the statement text.
+"""
+
+import ast
+import functools
+import re
+import sys
+
+from typing import Callable, Mapping, Sequence, Tuple, List, Dict, Union
+
+# Matches the parts of a statement that placeholders may NOT appear
+# in (string literals, quoted identifiers, comments, Postgres-style
+# casts), along with the placeholders themselves
+_PLACEHOLDER_PATTERN = re.compile(
+    r"""
+      '(?:[^']|'')*'
+    | "(?:[^"]|"")*"
+    | --[^\n]*
+    | /\*.*?\*/
+    | ::
+    | :(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    """,
+    re.VERBOSE | re.DOTALL
+)
+
+# Paramstyles whose placeholders use %, requiring literal % to be doubled
+_PERCENT_PARAMSTYLES = {"format", "pyformat"}
+
+# Parameters are either positional or named depending on paramstyle
+Parameters = Union[List, Dict, None]
+
+
+def driver_paramstyle(raw_connection: object) -> str:
+    """ Returns the DB API paramstyle of the driver a connection comes from, defaulting to qmark
+
+    Proxies standing in for a driver's connection (such as SlowLogConnection)
+    report the driver's paramstyle with a paramstyle attribute. Otherwise it's
+    read from the package the connection's class belongs to.
+
+    :param raw_connection: An unwrapped database connection, or a proxy for one
+    """
+
+    paramstyle = getattr(raw_connection, "paramstyle", None)
+
+    if isinstance(paramstyle, str):
+        return paramstyle
+
+    # e.g. "psycopg2" for psycopg2.extensions.connection
+    package_name = type(raw_connection).__module__.split(".")[0]
+
+    return getattr(sys.modules.get(package_name), "paramstyle", "qmark")
+
+
+def bind_variables(statement: str, variables: Mapping[str, object],
+                   paramstyle: str) -> Tuple[str, Parameters]:
+    """ Rewrite :name references to variables into driver placeholders
+
+    Returns a (statement, parameters) tuple. If the statement doesn't
+    reference any known variables it is returned unchanged, with None
+    for parameters. References to unknown names are left as-is.
+
+    :param statement: Statement that may contain :name references
+    :param variables: Values available for binding, keyed by name
+    :param paramstyle: DB API paramstyle of the driver
+    """
+
+    segments = _split_placeholders(statement)
+
+    # Nothing to do if no known variables are referenced
+    if not any(name in variables for _, name in segments):
+        return statement, None
+
+    named = paramstyle in {"named", "pyformat"}
+
+    parameters = {} if named else []
+
+    pieces = []
+
+    for text, name in segments:
+
+        if paramstyle in _PERCENT_PARAMSTYLES:
+            text = text.replace("%", "%%")
+
+        pieces.append(text)
+
+        if name is None:
+            continue
+
+        if name not in variables:
+            pieces.append(f":{name}")
+            continue
+
+        if named:
+            parameters[name] = variables[name]
+        else:
+            parameters.append(variables[name])
+
+        pieces.append(
+            _placeholder(
+                paramstyle=paramstyle,
+                name=name,
+                position=len(parameters)
+            )
+        )
+
+    return "".join(pieces), parameters
+
+
+@functools.lru_cache(maxsize=256)
+def _split_placeholders(statement: str) -> Tuple[Tuple[str, Union[str, None]], ...]:
+    """ Split a statement into (text, variable name) segments
+
+    Each segment is the text leading up to a :name reference, followed by
+    the name (or None for the final segment). Cached, since the same
+    statement shapes tend to be run over and over.
+
+    :param statement: Statement to split
+    """
+
+    segments = []
+
+    position = 0
+
+    for match in _PLACEHOLDER_PATTERN.finditer(statement):
+
+        name = match.group("name")
+
+        # Literals, comments and casts are kept as plain text
+        if name is None:
+            continue
+
+        segments.append((statement[position:match.start()], name))
+
+        position = match.end()
+
+    segments.append((statement[position:], None))
+
+    return tuple(segments)
+
+
+def _placeholder(paramstyle: str, name: str, position: int) -> str:
+    """ Return a placeholder in a given paramstyle
+
+    :param paramstyle: DB API paramstyle of the driver
+    :param name: Name of the variable being bound
+    :param position: 1-based position of the parameter
+    """
+
+    if paramstyle == "qmark":
+        return "?"
+    elif paramstyle == "numeric":
+        return f":{position}"
+    elif paramstyle == "named":
+        return f":{name}"
+    elif paramstyle == "format":
+        return "%s"
+    elif paramstyle == "pyformat":
+        return f"%({name})s"
+
+    raise ValueError(f"Unsupported paramstyle '{paramstyle}'")
+
+
+def row_placeholders(paramstyle: str, column_count: int) -> Tuple[List[str], Callable[[Sequence], Parameters]]:
+    """ Returns placeholders for each value of a row, and a function turning rows into matching parameters
+
+    Used to insert rows with executemany. Named paramstyles get parameters
+    named p1, p2, etc.
+
+    :param paramstyle: DB API paramstyle of the driver
+    :param column_count: Number of values in each row
+    """
+
+    names = [f"p{position}" for position in range(1, column_count + 1)]
+
+    placeholders = [
+        _placeholder(paramstyle=paramstyle, name=name, position=position)
+        for position, name
+        in enumerate(names, 1)
+    ]
+
+    if paramstyle in {"named", "pyformat"}:
+        return placeholders, lambda row: dict(zip(names, row))
+
+    return placeholders, tuple
+
+
+def parse_value(text: str) -> object:
+    """ Convert text entered at the console into a Python value
+
+    Numbers, None, booleans and other Python literals are converted,
+    while anything else is kept as a string.
+
+    :param text: Text to convert
+    """
+
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
@@ -0,0 +1,413 @@
+""" Filtered, sorted and projected views of a result, without running its statement again
+
+A ResultView wraps the last TableOutput a session received. Filters and sort
+orders are answered from indexes built the first time a column is used:
+
+* For rows held in memory, a dict of positions keyed by value answers
+  equality filters, and a cached sort order (with its keys) answers range
+  filters by bisection as well as sorts.
+* For rows spilled to disk, the store's key column is indexed in sqlite
+  and the filters and sort order become a query against it.
+
+Values are compared as sqlite compares them: NULLs first, then numbers,
+then text, then bytes, with NULLs never matching range filters.
+"""
+
+import bisect
+
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from .outputs import TableOutput
+from .spill import COMPARISON_OPERATORS, SpilledRows, sortable_value
+
+# Order of each kind of value, as sqlite sorts them
+_NULL_RANK, _NUMBER_RANK, _TEXT_RANK, _BYTES_RANK = range(4)
+
+
+class ResultView:
+    """ A result with filters, a sort order and a choice of columns applied """
+
+    def __init__(self, table: TableOutput):
+        """ Initialize a ResultView showing every row and column of a table
+
+        :param table: Result to view
+        """
+
+        self.table = table
+
+        # Names of the table's columns
+        self.all_columns = list(table.columns)
+
+        # (column index, operator, value) tuples rows must all match
+        self.conditions = []
+
+        # (column index, descending) tuples to sort by
+        self.order_by = []
+
+        # Indexes of the columns shown, or None for all of them
+        self.projection = None
+
+        self._spilled = isinstance(table.rows, SpilledRows)
+
+        # Indexes of in-memory rows, keyed by column index. Value indexes
+        # are {key: [positions]} dicts, and sort indexes are (positions,
+        # keys) tuples with both lists in ascending order of key.
+        self._value_indexes: Dict[int, Dict[tuple, List[int]]] = {}
+        self._sort_indexes: Dict[int, Tuple[List[int], List[tuple]]] = {}
+        self._descending_orders: Dict[int, List[int]] = {}
+
+        # Positions of the rows matching the current filters, in order,
+        # or the number of them for spilled rows. Reset when filters change.
+        self._matching = None
+
+    @property
+    def columns(self) -> List[str]:
+        """ Returns the names of the columns shown """
+
+        if self.projection is None:
+            return self.all_columns
+
+        return [self.all_columns[index] for index in self.projection]
+
+    def column_index(self, name: str) -> int:
+        """ Returns the position of a column, matching its name exactly or else ignoring case
+
+        :param name: Name of the column
+        """
+
+        return find_column(self.all_columns, name)
+
+    def where(self, column: str, operator: str, value: object):
+        """ Add a filter, which rows must match along with any added before it
+
+        :param column: Name of the column to compare
+        :param operator: One of COMPARISON_OPERATORS
+        :param value: Value to compare against
+        """
+
+        if operator not in COMPARISON_OPERATORS:
+            raise ValueError(f"Unsupported operator '{operator}'. Use one of {' '.join(COMPARISON_OPERATORS)}")
+
+        index = self.column_index(column)
+
+        self._index_store(index)
+
+        self.conditions.append((index, operator, value))
+
+        self._matching = None
+
+    def sort(self, order_by: Sequence[Tuple[str, bool]]):
+        """ Set the sort order, replacing any set before
+
+        :param order_by: (column name, descending) tuples, or nothing for the original order
+        """
+
+        order_by = [(self.column_index(column), descending) for column, descending in order_by]
+
+        for index, _ in order_by:
+            self._index_store(index)
+
+        self.order_by = order_by
+
+        self._matching = None
+
+    def select_columns(self, columns: [Sequence[str], None]):
+        """ Choose the columns shown, replacing any chosen before
+
+        :param columns: Names of the columns, or None for all of them
+        """
+
+        self.projection = None if columns is None else [self.column_index(column) for column in columns]
+
+    def clear_conditions(self):
+        """ Remove all filters """
+
+        self.conditions = []
+
+        self._matching = None
+
+    def rows(self, offset: int = 0, limit: [int, None] = None) -> Iterator[tuple]:
+        """ Yield the rows matching the filters, in order, with only the columns chosen
+
+        :param offset: Number of matching rows to skip
+        :param limit: Most rows to return
+        """
+
+        if self._spilled:
+            selected = self.table.rows.select(
+                order_by=self.order_by,
+                conditions=self.conditions,
+                offset=offset,
+                limit=limit
+            )
+
+        else:
+            stop = None if limit is None else offset + limit
+
+            positions = self._matching_positions()[offset:stop]
+
+            selected = (self.table.rows[position] for position in positions)
+
+        if self.projection is None:
+            yield from (tuple(row) for row in selected)
+
+        else:
+            for row in selected:
+                yield tuple(row[index] for index in self.projection)
+
+    def describe(self) -> str:
+        """ Returns a summary of the view, such as "3 of 10 row(s) where a = 1, sorted by b desc" """
+
+        description = f"{len(self)} of {len(self.table.rows)} row(s)"
+
+        if self.conditions:
+            description += " where " + " and ".join(
+                f"{self.all_columns[index]} {operator} {value!r}"
+                for index, operator, value
+                in self.conditions
+            )
+
+        if self.order_by:
+            description += ", sorted by " + ", ".join(
+                f"{self.all_columns[index]}{' desc' if descending else ''}"
+                for index, descending
+                in self.order_by
+            )
+
+        return description
+
+    def __len__(self) -> int:
+
+        if self._spilled:
+
+            if self._matching is None:
+                self._matching = self.table.rows.count(self.conditions)
+
+            return self._matching
+
+        return len(self._matching_positions())
+
+    def _index_store(self, index: int):
+        """ Index a column of spilled rows, if it isn't already
+
+        :param index: Position of the column
+        """
+
+        if self._spilled:
+            self.table.rows.create_index(index)
+
+    def _matching_positions(self) -> Sequence[int]:
+        """ Returns the positions of in-memory rows matching the filters, in order """
+
+        if self._matching is not None:
+            return self._matching
+
+        matching = None
+
+        for index, operator, value in self.conditions:
+
+            found = self._find(index, operator, value)
+
+            matching = found if matching is None else matching & found
+
+        if self.order_by:
+            self._matching = self._sorted_positions(matching)
+
+        elif matching is None:
+            self._matching = range(len(self.table.rows))
+
+        else:
+            self._matching = sorted(matching)
+
+        return self._matching
+
+    def _find(self, index: int, operator: str, value: object) -> set:
+        """ Returns the positions of in-memory rows matching a single filter
+
+        :param index: Position of the column to compare
+        :param operator: One of COMPARISON_OPERATORS
+        :param value: Value to compare against
+        """
+
+        key = order_key(value)
+
+        if operator == "=":
+            return set(self._value_index(index).get(key, ()))
+
+        positions, keys = self._sort_index(index)
+
+        # NULLs only ever match "= None" and "!= None"
+        first_value = bisect.bisect_left(keys, (_NUMBER_RANK,))
+
+        if operator == "!=":
+
+            not_null = set(positions[first_value:])
+
+            if key == (_NULL_RANK,):
+                return not_null
+
+            return not_null - set(self._value_index(index).get(key, ()))
+
+        if key == (_NULL_RANK,):
+            return set()
+
+        if operator in ("<", "<="):
+            bisect_function = bisect.bisect_left if operator == "<" else bisect.bisect_right
+            return set(positions[first_value:bisect_function(keys, key, first_value)])
+
+        bisect_function = bisect.bisect_right if operator == ">" else bisect.bisect_left
+
+        return set(positions[max(bisect_function(keys, key), first_value):])
+
+    def _sorted_positions(self, matching: [set, None]) -> List[int]:
+        """ Sort the positions of in-memory rows by the sort order, keeping ties in their original order
+
+        :param matching: Positions to sort, or None for all of them
+        """
+
+        if len(self.order_by) == 1:
+
+            index, descending = self.order_by[0]
+
+            positions = self._descending_order(index) if descending else self._sort_index(index)[0]
+
+            if matching is None:
+                return positions
+
+            return [position for position in positions if position in matching]
+
+        rows = self.table.rows
+
+        positions = list(range(len(rows))) if matching is None else sorted(matching)
+
+        # Stable sorts from the last key to the first give the combined order
+        for index, descending in reversed(self.order_by):
+            positions.sort(key=lambda position: order_key(rows[position][index]), reverse=descending)
+
+        return positions
+
+    def _value_index(self, index: int) -> Dict[tuple, List[int]]:
+        """ Returns a dict of in-memory row positions keyed by their value in a column, building it on first use
+
+        :param index: Position of the column
+        """
+
+        value_index = self._value_indexes.get(index)
+
+        if value_index is None:
+
+            value_index = {}
+
+            for position, row in enumerate(self.table.rows):
+                value_index.setdefault(order_key(row[index]), []).append(position)
+
+            self._value_indexes[index] = value_index
+
+        return value_index
+
+    def _sort_index(self, index: int) -> Tuple[List[int], List[tuple]]:
+        """ Returns in-memory row positions sorted by a column, with their keys, building them on first use
+
+        :param index: Position of the column
+        """
+
+        sort_index = self._sort_indexes.get(index)
+
+        if sort_index is None:
+
+            keys = [order_key(row[index]) for row in self.table.rows]
+
+            positions = sorted(range(len(keys)), key=keys.__getitem__)
+
+            sort_index = self._sort_indexes[index] = (positions, [keys[position] for position in positions])
+
+        return sort_index
+
+    def _descending_order(self, index: int) -> List[int]:
+        """ Returns in-memory row positions in descending order of a column, building it on first use
+
+        :param index: Position of the column
+        """
+
+        descending_order = self._descending_orders.get(index)
+
+        if descending_order is None:
+            descending_order = self._descending_orders[index] = _reverse_runs(*self._sort_index(index))
+
+        return descending_order
+
+
+def order_key(value: object) -> tuple:
+    """ Returns a key sorting a value as sqlite would, and comparing equal to matching values
+
+    :param value: Value from a result row, or entered at the console
+    """
+
+    value = sortable_value(value)
+
+    if value is None:
+        return (_NULL_RANK,)
+
+    if isinstance(value, (int, float)):
+        return _NUMBER_RANK, value
+
+    if isinstance(value, str):
+        return _TEXT_RANK, value
+
+    return _BYTES_RANK, value
+
+
+def match_key(value: object) -> tuple:
+    """ Returns a key that's equal for values that match, with whole numbers as integers so 1.0 and 1 hash alike
+
+    :param value: Value from a result row
+    """
+
+    key = order_key(value)
+
+    if key[0] == _NUMBER_RANK and isinstance(key[1], float) and key[1].is_integer():
+        return _NUMBER_RANK, int(key[1])
+
+    return key
+
+
+def find_column(columns: Sequence[str], name: str) -> int:
+    """ Returns the position of a column, matching its name exactly or else ignoring case
+
+    :param columns: Names of the columns
+    :param name: Name of the column to find
+    """
+
+    columns = list(columns)
+
+    if name in columns:
+        return columns.index(name)
+
+    lowered = [column.lower() for column in columns]
+
+    if name.lower() in lowered:
+        return lowered.index(name.lower())
+
+    raise KeyError(f"No column named '{name}'. Columns are: {', '.join(columns)}")
+
+
+def _reverse_runs(positions: List[int], keys: List[tuple]) -> List[int]:
+    """ Reverse positions sorted by key, keeping positions with equal keys in their original order
+
+    :param positions: Positions in ascending order of key
+    :param keys: Keys of the positions, in the same order
+    """
+
+    reversed_positions = []
+
+    end = len(keys)
+
+    while end > 0:
+
+        start = bisect.bisect_left(keys, keys[end - 1], 0, end)
+
+        reversed_positions.extend(positions[start:end])
+
+        end = start
+
+    return reversed_positions
@@ -39,7 +39,13 @@ setup(
 
     entry_points={
         "connection_wrappers": [
-            "dbapi = dbreak.dbapi:DBAPIWrapper"
+            "dbapi = dbreak.dbapi:DBAPIWrapper",
+            "async_dbapi = dbreak.aio:AsyncDBAPIWrapper",
+            "sqlite = dbreak.sqlite:SQLiteWrapper"
+        ],
+        "console_scripts": [
+            "dbreak-attach = dbreak.remote:main",
+            "dbreak-batch = dbreak.batch:main"
         ]
     }
 )
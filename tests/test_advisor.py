@@ -0,0 +1,168 @@
+""" Tests for advisor.py module """
+
+import sqlite3
+
+import pytest
+
+import dbreak
+import dbreak.advisor
+import dbreak.capture
+import dbreak.commands
+import dbreak.sessions
+
+
+@pytest.fixture()
+def wrapper():
+    """ A SQLiteWrapper around a database with an unindexed table """
+
+    connection = sqlite3.connect(":memory:")
+
+    connection.execute("create table t (a int, b int, c int)")
+    connection.executemany("insert into t values (?, ?, ?)", [(i, i % 10, i % 7) for i in range(100)])
+    connection.commit()
+
+    return dbreak.SQLiteWrapper(connection)
+
+
+def capture_of(*statements: str) -> dbreak.capture.StatementCapture:
+    """ Returns a capture holding the given statements """
+
+    capture = dbreak.capture.StatementCapture()
+
+    for statement in statements:
+        capture.record(statement)
+
+    return capture
+
+
+class TestAdviseIndexes:
+    """ Tests for the advise_indexes function """
+
+    def test_composite_index(self, wrapper):
+        """ Test an index covering both the filter and the sort is suggested """
+
+        capture = capture_of("select * from t where b = 1 order by c")
+
+        advice, = dbreak.advisor.advise_indexes(wrapper, capture.statements)
+
+        assert advice.index == "CREATE INDEX idx_t_b_c ON t (b, c)"
+        assert advice.problems == ["FULL SCAN: SCAN t", "TEMP B-TREE: USE TEMP B-TREE FOR ORDER BY"]
+        assert "Avoids scanning 100 rows of t" in advice.improvement
+        assert "Avoids a temp B-tree for order by" in advice.improvement
+        assert "idx_t_b_c" in advice.plan_after
+
+    def test_range(self, wrapper):
+        """ Test range comparisons are indexed """
+
+        advice, = dbreak.advisor.advise_indexes(wrapper, capture_of("delete from t where a > 50").statements)
+
+        assert advice.index == "CREATE INDEX idx_t_a ON t (a)"
+
+    def test_aliased_table(self, wrapper):
+        """ Test tables are found when the plan calls them by an alias """
+
+        advice, = dbreak.advisor.advise_indexes(wrapper, capture_of("select * from t x where x.b = 1").statements)
+
+        assert advice.index == "CREATE INDEX idx_t_b ON t (b)"
+        assert "Avoids scanning 100 rows of t" in advice.improvement
+
+    def test_statements_without_problems_skipped(self, wrapper):
+        """ Test statements that already use indexes, and inserts, are skipped """
+
+        wrapper.raw_connection.execute("create index t_a on t (a)")
+
+        capture = capture_of("select * from t where a = 1", "insert into t values (1, 2, 3)")
+
+        assert dbreak.advisor.advise_indexes(wrapper, capture.statements) == []
+
+    def test_database_unchanged(self, wrapper):
+        """ Test candidate indexes are rolled back """
+
+        dbreak.advisor.advise_indexes(wrapper, capture_of("select * from t where b = 1").statements)
+
+        indexes = wrapper.raw_connection.execute("select name from sqlite_master where type = 'index'").fetchall()
+
+        assert indexes == []
+        assert not wrapper.raw_connection.in_transaction
+
+    def test_no_candidate(self, wrapper):
+        """ Test problems no index can fix are still reported """
+
+        advice, = dbreak.advisor.advise_indexes(wrapper, capture_of("select * from t").statements)
+
+        assert advice.index is None
+        assert advice.improvement == "No improvement found"
+
+    def test_failed_candidate(self, wrapper):
+        """ Test candidates that can't be created are reported without stopping the advice """
+
+        wrapper.raw_connection.execute("pragma query_only = on")
+
+        advice, = dbreak.advisor.advise_indexes(wrapper, capture_of("select * from t where b = 1").statements)
+
+        assert advice.index is None
+        assert "Couldn't try CREATE INDEX idx_t_b ON t (b): attempt to write a readonly database" in advice.improvement
+
+
+class TestLoadStatements:
+    """ Tests for the load_statements function """
+
+    def test_load(self, tmp_path):
+        """ Test statements spanning lines are split on semicolons """
+
+        path = tmp_path / "statements.sql"
+        path.write_text("select *\nfrom t\nwhere a = 1;\nselect * from t where a = 2;\nselect 3")
+
+        capture = dbreak.advisor.load_statements(str(path))
+
+        assert [(captured.normalized, captured.count) for captured in capture.statements] == [
+            ("select * from t where a = ?;", 2),
+            ("select ?", 1)
+        ]
+
+
+class TestCommands:
+    """ Tests for the !capture and !advise commands """
+
+    def test_capture_and_advise(self, wrapper):
+        """ Test statements the application runs are captured and advised on, and the console's aren't """
+
+        session = dbreak.sessions.DebugSession(connections={"conn1": wrapper})
+
+        dbreak.commands.execute_command("!capture on", session)
+
+        try:
+            wrapper.raw_connection.execute("select * from t where b = 3").fetchall()
+
+            dbreak.commands.execute_command("select * from t where c = 1", session)
+
+            captured = dbreak.commands.execute_command("!captured", session)
+
+            assert captured[0].rows == [("select * from t where b = ?", 1)]
+
+            outputs = dbreak.commands.execute_command("!advise captured", session)
+
+            assert outputs[0].rows[0][3] == "CREATE INDEX idx_t_b ON t (b)"
+
+        finally:
+            dbreak.commands.execute_command("!capture off", session)
+
+    def test_advise_file(self, wrapper, tmp_path):
+        """ Test statements can be read from a file """
+
+        session = dbreak.sessions.DebugSession(connections={"conn1": wrapper})
+
+        path = tmp_path / "statements.sql"
+        path.write_text("select * from t where c = 1;")
+
+        outputs = dbreak.commands.execute_command(f"!advise {path}", session)
+
+        assert outputs[0].rows[0][3] == "CREATE INDEX idx_t_c ON t (c)"
+
+    def test_advise_without_capture(self, wrapper):
+        """ Test advising on captured statements needs capturing to have started """
+
+        session = dbreak.sessions.DebugSession(connections={"conn1": wrapper})
+
+        with pytest.raises(ValueError):
+            dbreak.commands.execute_command("!advise captured", session)
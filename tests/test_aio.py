@@ -0,0 +1,176 @@
+""" Tests for aio.py module """
+
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+import dbreak
+import dbreak.aio
+import dbreak.connections
+
+
+class FakeAsyncCursor:
+    """ Cursor of a fake asyncio driver built on sqlite3 """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    async def execute(self, statement):
+        self._cursor.execute(statement)
+        return self
+
+    async def fetchmany(self, size):
+        await asyncio.sleep(0)
+        return self._cursor.fetchmany(size)
+
+    async def close(self):
+        self._cursor.close()
+
+
+class FakeAsyncConnection:
+    """ Connection of a fake cursor-based asyncio driver, like aiosqlite """
+
+    def __init__(self):
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+
+    async def cursor(self):
+        return FakeAsyncCursor(self._connection.cursor())
+
+    async def commit(self):
+        self._connection.commit()
+
+    async def close(self):
+        self._connection.close()
+
+
+class FakeFetchConnection:
+    """ Connection of a fake fetch-based asyncio driver, like asyncpg """
+
+    def __init__(self):
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+
+        # Record which loop coroutines were run on
+        self.loops = []
+
+    async def fetch(self, statement):
+        self.loops.append(asyncio.get_event_loop())
+        return self._connection.execute(statement).fetchall()
+
+    async def execute(self, statement):
+        self._connection.execute(statement)
+        return "OK"
+
+    async def close(self):
+        self._connection.close()
+
+
+class TestWrapConnection:
+    """ Tests for detecting async connections """
+
+    def test_cursor_driver(self):
+        """ Test a cursor-based async connection gets the async wrapper """
+
+        wrapped = dbreak.connections.wrap_connection(FakeAsyncConnection())
+
+        assert type(wrapped) is dbreak.AsyncDBAPIWrapper, "Wrong ConnectionWrapper returned"
+
+    def test_fetch_driver(self):
+        """ Test a fetch-based async connection gets the async wrapper """
+
+        wrapped = dbreak.connections.wrap_connection(FakeFetchConnection())
+
+        assert type(wrapped) is dbreak.AsyncDBAPIWrapper, "Wrong ConnectionWrapper returned"
+
+    def test_sync_driver(self, basic_raw_connections):
+        """ Test a regular DB API connection isn't treated as async """
+
+        wrapped = dbreak.connections.wrap_connection(basic_raw_connections["conn1"])
+
+        assert not isinstance(wrapped, dbreak.AsyncDBAPIWrapper), "Wrong ConnectionWrapper returned"
+
+
+class TestAsyncDBAPIWrapper:
+    """ Tests for the AsyncDBAPIWrapper class """
+
+    def test_cursor_select(self):
+        """ Test selecting through a cursor-based driver, in several batches """
+
+        wrapper = dbreak.AsyncDBAPIWrapper(FakeAsyncConnection())
+        wrapper.FETCH_BATCH_SIZE = 2
+
+        outputs = wrapper.execute_statement(
+            "with recursive n(i) as (select 1 union all select i + 1 from n where i < 5) select i from n"
+        )
+
+        table = outputs[0]
+
+        assert table.columns == ["i"], "Unexpected columns returned"
+        assert table.rows == [(1,), (2,), (3,), (4,), (5,)], "Unexpected rows returned"
+
+    def test_cursor_create_table(self):
+        """ Test a statement without results """
+
+        wrapper = dbreak.AsyncDBAPIWrapper(FakeAsyncConnection())
+
+        outputs = wrapper.execute_statement("create table foobar (i int)")
+
+        assert outputs == [], "Unexpected outputs returned"
+
+    def test_fetch_select(self):
+        """ Test selecting through a fetch-based driver """
+
+        wrapper = dbreak.AsyncDBAPIWrapper(FakeFetchConnection())
+
+        outputs = wrapper.execute_statement("select 1 as foo, 'a' as bar")
+
+        table = outputs[0]
+
+        assert table.columns == ["foo", "bar"], "Unexpected columns returned"
+        assert table.rows == [(1, "a")], "Unexpected rows returned"
+
+    def test_given_loop(self):
+        """ Test coroutines run on the loop the wrapper was given """
+
+        loop = asyncio.new_event_loop()
+
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        connection = FakeFetchConnection()
+
+        wrapper = dbreak.AsyncDBAPIWrapper(connection, loop=loop)
+
+        try:
+            wrapper.execute_statement("select 1")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+        assert connection.loops == [loop], "Coroutine ran on the wrong loop"
+
+    def test_own_loop(self):
+        """ Test waiting on a loop from its own thread is refused """
+
+        async def main():
+            wrapper = dbreak.AsyncDBAPIWrapper(
+                FakeFetchConnection(),
+                loop=asyncio.get_event_loop()
+            )
+
+            wrapper.execute_statement("select 1")
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            with pytest.raises(RuntimeError):
+                loop.run_until_complete(main())
+        finally:
+            loop.close()
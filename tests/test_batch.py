@@ -0,0 +1,135 @@
+""" Tests for batch.py module """
+
+import io
+import json
+import sqlite3
+
+import dbreak
+import dbreak.batch
+
+
+def read_records(output):
+    """ Parse JSON lines written by run_batch """
+
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+class TestRunBatch:
+    """ Tests for the run_batch function """
+
+    def test_commands(self, basic_raw_connections):
+        """ Test running a mix of shell and database commands """
+
+        commands = io.StringIO(
+            "create table foobar (x int)\n"
+            "\n"
+            "insert into foobar select 1\n"
+            "select x from foobar\n"
+            "!switch conn2\n"
+            "select 'b' as y\n"
+        )
+
+        output = io.StringIO()
+
+        exit_code = dbreak.run_batch(
+            commands,
+            output=output,
+            starting_connection="conn1",
+            **basic_raw_connections
+        )
+
+        expected = [
+            {"command": "select x from foobar", "type": "table", "columns": ["x"], "rows": [[1]]},
+            {"command": "select 'b' as y", "type": "table", "columns": ["y"], "rows": [["b"]]}
+        ]
+
+        assert exit_code == dbreak.batch.EXIT_SUCCESS, "Unexpected exit code"
+        assert read_records(output) == expected, "Unexpected output"
+
+    def test_error(self, basic_raw_connections):
+        """ Test a failing command gives a nonzero exit code but later commands still run """
+
+        commands = io.StringIO("select * from nowhere\nselect 1 as x\n")
+
+        output = io.StringIO()
+
+        exit_code = dbreak.run_batch(commands, output=output, **basic_raw_connections)
+
+        records = read_records(output)
+
+        assert exit_code == dbreak.batch.EXIT_COMMAND_FAILED, "Unexpected exit code"
+        assert records[0]["type"] == "error", "Error not reported"
+        assert records[0]["error"] == "OperationalError", "Wrong error reported"
+        assert records[1]["rows"] == [[1]], "Later command did not run"
+
+    def test_stop_on_error(self, basic_raw_connections):
+        """ Test stopping at the first failing command """
+
+        commands = io.StringIO("select * from nowhere\nselect 1 as x\n")
+
+        output = io.StringIO()
+
+        dbreak.run_batch(commands, output=output, stop_on_error=True, **basic_raw_connections)
+
+        assert len(read_records(output)) == 1, "Kept running after an error"
+
+    def test_exit(self, basic_raw_connections):
+        """ Test !exit stops the batch """
+
+        commands = io.StringIO("!exit\nselect 1 as x\n")
+
+        output = io.StringIO()
+
+        exit_code = dbreak.run_batch(commands, output=output, **basic_raw_connections)
+
+        assert exit_code == dbreak.batch.EXIT_SUCCESS, "Unexpected exit code"
+        assert output.getvalue() == "", "Kept running after !exit"
+
+
+class TestMain:
+    """ Tests for the command-line entry point """
+
+    def test_main(self, tmp_path, capsys):
+        """ Test running a script against named sqlite databases """
+
+        database = tmp_path / "test.db"
+
+        connection = sqlite3.connect(str(database))
+        connection.execute("create table foobar (x int)")
+        connection.execute("insert into foobar select 7")
+        connection.commit()
+        connection.close()
+
+        script = tmp_path / "script.txt"
+        script.write_text("!connections\nselect x from foobar\n")
+
+        exit_code = dbreak.batch.main([f"app={database}", "--script", str(script)])
+
+        out, err = capsys.readouterr()
+
+        records = [json.loads(line) for line in out.splitlines()]
+
+        assert exit_code == dbreak.batch.EXIT_SUCCESS, "Unexpected exit code"
+        assert records[0]["rows"][0][0] == "app", "Connection not named"
+        assert records[1]["rows"] == [[7]], "Unexpected query results"
+
+    def test_main_commits(self, tmp_path, capsys):
+        """ Test changes are committed only when every command succeeds """
+
+        database = tmp_path / "test.db"
+
+        script = tmp_path / "script.txt"
+        script.write_text("create table foobar (x int)\ninsert into foobar select 7\n")
+
+        assert dbreak.batch.main([str(database), "--script", str(script)]) == dbreak.batch.EXIT_SUCCESS
+
+        script.write_text("insert into foobar select 8\nselect * from nowhere\n")
+
+        assert dbreak.batch.main([str(database), "--script", str(script)]) == dbreak.batch.EXIT_COMMAND_FAILED
+
+        connection = sqlite3.connect(str(database))
+
+        try:
+            assert connection.execute("select x from foobar").fetchall() == [(7,)]
+        finally:
+            connection.close()
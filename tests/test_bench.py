@@ -0,0 +1,97 @@
+""" Tests for bench.py module """
+
+import sqlite3
+
+import pytest
+
+import dbreak
+import dbreak.bench
+
+
+@pytest.fixture()
+def connection_with_table():
+    """ A wrapped SQLite connection, usable from any thread, with a 10 row table """
+
+    connection = dbreak.DBAPIWrapper(sqlite3.connect(":memory:", check_same_thread=False))
+
+    connection.raw_connection.execute("create table foobar (i int)")
+    connection.raw_connection.executemany("insert into foobar values (?)", [(i,) for i in range(10)])
+
+    return connection
+
+
+class TestBenchmark:
+    """ Tests for the benchmark function """
+
+    def test_benchmark(self, connection_with_table):
+        """ Test timing a statement several times """
+
+        result = dbreak.bench.benchmark(
+            wrapper=connection_with_table,
+            statement="select * from foobar",
+            iterations=5,
+            warmup=2
+        )
+
+        assert len(result.timings) == 5, "Wrong number of measured runs"
+        assert result.rows == 50, "Wrong number of rows counted"
+        assert result.errors == [], "Unexpected errors"
+
+    def test_concurrency(self, connection_with_table):
+        """ Test spreading runs over several threads """
+
+        result = dbreak.bench.benchmark(
+            wrapper=connection_with_table,
+            statement="select * from foobar where i < :limit",
+            iterations=20,
+            concurrency=4,
+            variables={"limit": 5}
+        )
+
+        assert len(result.timings) == 20, "Wrong number of measured runs"
+        assert result.rows == 100, "Wrong number of rows counted"
+
+    def test_all_runs_fail(self, connection_with_table):
+        """ Test the error is raised if no runs succeed """
+
+        with pytest.raises(sqlite3.OperationalError):
+            dbreak.bench.benchmark(
+                wrapper=connection_with_table,
+                statement="select * from nowhere",
+                iterations=3
+            )
+
+    def test_outputs(self, connection_with_table):
+        """ Test results are summarized as tables """
+
+        result = dbreak.bench.benchmark(
+            wrapper=connection_with_table,
+            statement="select * from foobar",
+            iterations=3
+        )
+
+        latency, throughput = result.to_outputs()
+
+        assert [row[0] for row in latency.rows] == ["min", "mean", "p50", "p95", "p99", "max"], "Wrong measures"
+        assert throughput.rows[0][0] == 3, "Wrong number of runs reported"
+
+
+class TestPercentile:
+    """ Tests for the percentile function """
+
+    @pytest.mark.parametrize(
+        "percent,expected",
+        [
+            (0, 1),
+            (50, 3),
+            (75, 4),
+            (90, 4.6),
+            (100, 5),
+        ]
+    )
+    def test_percentile(self, percent, expected):
+        """ Test interpolated percentiles """
+
+        found = dbreak.bench.percentile([1, 2, 3, 4, 5], percent)
+
+        assert found == pytest.approx(expected), "Unexpected percentile"
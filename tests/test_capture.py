@@ -0,0 +1,97 @@
+""" Tests for capture.py module """
+
+import sqlite3
+
+import pytest
+
+import dbreak
+import dbreak.capture
+
+
+class TestNormalizeStatement:
+    """ Tests for the normalize_statement function """
+
+    def test_literals(self):
+        """ Test literals are replaced, leaving identifiers alone """
+
+        normalized = dbreak.capture.normalize_statement("select * from t1 where a = 10 and b = 'it''s'")
+
+        assert normalized == "select * from t1 where a = ? and b = ?"
+
+    def test_lists_and_whitespace(self):
+        """ Test lists of values are collapsed and whitespace tidied """
+
+        normalized = dbreak.capture.normalize_statement("select *\n  from t where a in (1, 2,3)")
+
+        assert normalized == "select * from t where a in (?...)"
+
+
+class TestStatementCapture:
+    """ Tests for the StatementCapture class """
+
+    def test_grouped(self):
+        """ Test statements differing only in values are counted together """
+
+        capture = dbreak.capture.StatementCapture()
+
+        capture.record("select * from t where a = 1")
+        capture.record("select * from t where a = 2")
+        capture.record("select * from t")
+
+        assert capture.statements == [
+            ("select * from t where a = ?", "select * from t where a = 1", 2),
+            ("select * from t", "select * from t", 1)
+        ]
+
+    def test_limit(self):
+        """ Test new statements are ignored once the limit is reached """
+
+        capture = dbreak.capture.StatementCapture(max_statements=1)
+
+        capture.record("select 1 from a")
+        capture.record("select 1 from b")
+        capture.record("select 2 from a")
+
+        assert capture.statements == [("select ? from a", "select 1 from a", 2)]
+
+    def test_suppressed(self):
+        """ Test traced statements are ignored while suppressed """
+
+        capture = dbreak.capture.StatementCapture()
+
+        with dbreak.capture.suppress_capture():
+            capture.record_traced("select 1")
+
+        capture.record_traced("select 2")
+
+        assert [captured.example for captured in capture.statements] == ["select 2"]
+
+
+class TestCaptureStatements:
+    """ Tests for capturing statements run on connections """
+
+    def test_sqlite(self):
+        """ Test statements run on a sqlite connection are captured until stopped """
+
+        connection = sqlite3.connect(":memory:")
+
+        capture = dbreak.capture_statements(connection)
+
+        try:
+            assert dbreak.capture_statements(connection) is capture
+
+            connection.execute("select 1")
+
+        finally:
+            assert dbreak.stop_capturing(connection) is capture
+
+        connection.execute("select 2")
+
+        assert [captured.example for captured in capture.statements] == ["select 1"]
+        assert dbreak.capture.find_capture(connection) is None
+
+    def test_unsupported(self, custom_connection):
+        """ Test connections that can't be traced are rejected """
+
+        with pytest.raises(TypeError):
+            dbreak.capture_statements(custom_connection())
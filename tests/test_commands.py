@@ -1,5 +1,8 @@
 """ Tests for commands.py module """
 
+import concurrent.futures
+import sqlite3
+
 import pytest
 
 import dbreak
@@ -7,6 +10,7 @@ import dbreak.exc
 import dbreak.commands
 import dbreak.connections
 import dbreak.sessions
+import dbreak.spill
 
 
 class TestExecuteCommand:
@@ -49,13 +53,57 @@ class TestExecuteCommand:
 
         expected = [
             ("conn1", "DBAPIWrapper", "sqlite3", "Connection"),
-            ("conn2", "DBAPIWrapper", "sqlite3", "Connection")
+            ("conn2", "DBAPIWrapper", "sqlite3", "Connection"),
+            ("scratch", "(not opened)", "", "Scratch sqlite database (in memory)")
         ]
 
         found = outputs[0].rows
 
         assert expected == found, "!connections returned unexpected output"
 
+    def test_connections_command_not_opened(self, basic_debug_session):
+        """ Test !connections describes lazy connections without opening them """
+
+        basic_debug_session.connections["lazy"] = dbreak.connections.LazyConnection(
+            factory=lambda: sqlite3.connect(":memory:"),
+            description="sqlite://"
+        )
+
+        outputs = dbreak.commands.execute_command(
+            "!connections",
+            basic_debug_session
+        )
+
+        assert outputs[0].rows[-1] == ("lazy", "(not opened)", "", "sqlite://")
+        assert isinstance(basic_debug_session.connections["lazy"], dbreak.connections.LazyConnection)
+
+    def test_connections_command_preparing(self, basic_debug_session):
+        """ Test !connections reports connections still being prepared """
+
+        future = concurrent.futures.Future()
+
+        basic_debug_session.connections["slow"] = dbreak.connections.PendingConnection(
+            future=future,
+            description="Connection",
+            owns_connection=False
+        )
+
+        outputs = dbreak.commands.execute_command(
+            "!connections",
+            basic_debug_session
+        )
+
+        assert outputs[0].rows[-1] == ("slow", "(preparing)", "", "Connection")
+
+        future.set_result(dbreak.DBAPIWrapper(sqlite3.connect(":memory:")))
+
+        outputs = dbreak.commands.execute_command(
+            "!connections",
+            basic_debug_session
+        )
+
+        assert outputs[0].rows[-1] == ("slow", "DBAPIWrapper", "sqlite3", "Connection")
+
     def test_execute_in_database_command(self, basic_debug_session):
         """ Test executing a SQL command via !execute """
 
@@ -99,8 +147,8 @@ class TestExecuteCommand:
             custom_debug_session
         )
 
-        # Count rows
-        expected_rows = 8
+        # Count rows: all standard commands plus the one custom command
+        expected_rows = len(dbreak.commands.SHELL_COMMANDS) + 1
         found_rows = len(outputs[0].rows) + len(outputs[1].rows)
 
         assert expected_rows == found_rows, "!help returned an unexpected number of rows"
@@ -187,3 +235,360 @@ class TestSwitch:
                 basic_debug_session,
                 "conn100"
             )
+
+
+class TestVariables:
+    """ Tests for the !set, !unset and !vars commands """
+
+    def test_set_and_bind(self, basic_debug_session):
+        """ Test a variable set with !set is bound into statements """
+
+        dbreak.commands.execute_command("!set id 42", basic_debug_session)
+
+        outputs = dbreak.commands.execute_command("select :id as x, typeof(:id) as t", basic_debug_session)
+
+        assert outputs[0].rows == [(42, "integer")], "Variable not bound as a parameter"
+
+    def test_caller_variables(self, basic_wrapped_connections):
+        """ Test the paused code's variables can be referenced, and !set hides them """
+
+        session = dbreak.sessions.DebugSession(
+            connections=basic_wrapped_connections,
+            caller_variables={"name": "from caller", "other": 1}
+        )
+
+        first = dbreak.commands.execute_command("select :name as x", session)
+
+        dbreak.commands.execute_command("!set name 'from set'", session)
+
+        second = dbreak.commands.execute_command("select :name as x", session)
+
+        assert first[0].rows == [("from caller",)], "Caller variable not bound"
+        assert second[0].rows == [("from set",)], "!set variable did not take precedence"
+
+    def test_unset(self, basic_debug_session):
+        """ Test removing a variable """
+
+        dbreak.commands.execute_command("!set id 42", basic_debug_session)
+        dbreak.commands.execute_command("!unset id", basic_debug_session)
+
+        assert basic_debug_session.variables == {}, "Variable not removed"
+
+    def test_unset_unknown(self, basic_debug_session):
+        """ Test removing a variable that isn't set """
+
+        with pytest.raises(KeyError):
+            dbreak.commands.execute_command("!unset id", basic_debug_session)
+
+    def test_vars(self, basic_wrapped_connections):
+        """ Test listing variables """
+
+        session = dbreak.sessions.DebugSession(
+            connections=basic_wrapped_connections,
+            caller_variables={"a": 1, "b": 2}
+        )
+
+        dbreak.commands.execute_command("!set a hello", session)
+
+        outputs = dbreak.commands.execute_command("!vars", session)
+
+        expected = [
+            ("a", "'hello'", "str", "set"),
+            ("b", "2", "int", "caller")
+        ]
+
+        assert outputs[0].rows == expected, "Unexpected variables listed"
+
+
+class TestBench:
+    """ Tests for the !bench command """
+
+    def test_bench(self, basic_debug_session):
+        """ Test benchmarking a statement with options """
+
+        outputs = dbreak.commands.execute_command(
+            "!bench 10 warmup=3 select 1 as x",
+            basic_debug_session
+        )
+
+        throughput = outputs[1]
+
+        runs, errors, warmup = throughput.rows[0][:3]
+
+        assert (runs, errors, warmup) == (10, 0, 3), "Unexpected benchmark results"
+
+
+class TestExplain:
+    """ Tests for the !explain command """
+
+    def test_not_supported(self, custom_connection, custom_connection_wrapper):
+        """ Test wrappers that can't explain statements say so """
+
+        session = dbreak.sessions.DebugSession(
+            connections={"custom": custom_connection_wrapper(custom_connection())}
+        )
+
+        with pytest.raises(NotImplementedError):
+            dbreak.commands.execute_command("!explain select 1", session)
+
+
+class TestLastResult:
+    """ Tests for the !page and !export commands """
+
+    @pytest.fixture()
+    def spilled_session(self, basic_debug_session, monkeypatch):
+        """ Session whose last result of 120 rows was spilled to disk """
+
+        monkeypatch.setattr(dbreak.spill, "RESULT_MEMORY_BUDGET_BYTES", 1000)
+
+        dbreak.commands.execute_command(
+            "with recursive n(x) as (select 1 union all select x + 1 from n where x < 120) select x, 'row ' || x as label from n",
+            basic_debug_session
+        )
+
+        yield basic_debug_session
+
+        basic_debug_session.close()
+
+    def test_page(self, spilled_session):
+        """ Test pages are read from the spilled rows """
+
+        assert isinstance(spilled_session.last_output.rows, dbreak.spill.SpilledRows)
+
+        outputs = dbreak.commands.execute_command("!page", spilled_session)
+
+        assert outputs[0].rows[0] == (51, "row 51")
+        assert outputs[1] == "Page 2 of 3 (120 row(s) in total)"
+
+        outputs = dbreak.commands.execute_command("!page 3", spilled_session)
+
+        assert len(outputs[0].rows) == 20
+
+        with pytest.raises(ValueError):
+            dbreak.commands.execute_command("!page 4", spilled_session)
+
+    def test_export(self, spilled_session, tmp_path):
+        """ Test exporting every row as CSV and JSON lines """
+
+        dbreak.commands.execute_command(f"!export {tmp_path / 'rows.csv'}", spilled_session)
+        dbreak.commands.execute_command(f"!export {tmp_path / 'rows.jsonl'}", spilled_session)
+
+        lines = (tmp_path / "rows.csv").read_text().splitlines()
+
+        assert lines[:2] == ["x,label", "1,row 1"]
+        assert len(lines) == 121
+
+        lines = (tmp_path / "rows.jsonl").read_text().splitlines()
+
+        assert lines[-1] == '{"x": 120, "label": "row 120"}'
+
+    def test_no_result(self, basic_debug_session):
+        """ Test paging before any statement returned a result """
+
+        with pytest.raises(dbreak.exc.NoResultError):
+            dbreak.commands.execute_command("!page", basic_debug_session)
+
+
+class TestLastResultViews:
+    """ Tests for the !where, !sort, !cols and !head commands """
+
+    @pytest.fixture()
+    def result_session(self, basic_debug_session):
+        """ Session whose last result has 120 rows """
+
+        dbreak.commands.execute_command(
+            "with recursive n(x) as (select 1 union all select x + 1 from n where x < 120) select x, x % 3 as remainder from n",
+            basic_debug_session
+        )
+
+        return basic_debug_session
+
+    def test_where_sort_cols(self, result_session, tmp_path):
+        """ Test filtering, sorting and choosing columns, then paging and exporting the view """
+
+        outputs = dbreak.commands.execute_command("!where remainder = 0", result_session)
+
+        assert outputs[1] == "40 of 120 row(s) where remainder = 0"
+
+        outputs = dbreak.commands.execute_command("!where x > 100", result_session)
+
+        assert [row[0] for row in outputs[0].rows] == [102, 105, 108, 111, 114, 117, 120]
+
+        dbreak.commands.execute_command("!sort x desc", result_session)
+
+        outputs = dbreak.commands.execute_command("!cols x", result_session)
+
+        assert outputs[0].columns == ["x"]
+        assert outputs[0].rows[:2] == [(120,), (117,)]
+
+        dbreak.commands.execute_command(f"!export {tmp_path / 'rows.csv'}", result_session)
+
+        assert (tmp_path / "rows.csv").read_text().split() == ["x", "120", "117", "114", "111", "108", "105", "102"]
+
+    def test_head(self, result_session):
+        """ Test showing the first few rows """
+
+        dbreak.commands.execute_command("!sort -x", result_session)
+
+        outputs = dbreak.commands.execute_command("!head 3", result_session)
+
+        assert outputs[0].rows == [(120, 0), (119, 2), (118, 1)]
+
+    def test_clear(self, result_session):
+        """ Test running the commands without arguments removes filters, sorting and column choices """
+
+        dbreak.commands.execute_command("!where x < 3", result_session)
+        dbreak.commands.execute_command("!sort x desc", result_session)
+        dbreak.commands.execute_command("!cols remainder", result_session)
+
+        dbreak.commands.execute_command("!where", result_session)
+        dbreak.commands.execute_command("!sort", result_session)
+
+        outputs = dbreak.commands.execute_command("!cols", result_session)
+
+        assert outputs[0].rows[0] == (1, 1)
+        assert outputs[1] == "120 of 120 row(s)"
+
+    @pytest.mark.parametrize("command", ["!where x ~ 1", "!sort x sideways"])
+    def test_invalid(self, result_session, command):
+        """ Test conditions and sort orders that can't be understood """
+
+        with pytest.raises(ValueError):
+            dbreak.commands.execute_command(command, result_session)
+
+
+class TestProfileResult:
+    """ Tests for the !profile-result command """
+
+    def test_profile(self, basic_debug_session):
+        """ Test profiling a statement's result """
+
+        outputs = dbreak.commands.execute_command(
+            "!profile-result select 1 as a, 'x' as b union all select 3, null",
+            basic_debug_session
+        )
+
+        assert outputs[0].rows[0][:6] == ("a", 2, 0, 2, 1, 3)
+        assert outputs[0].rows[1][:3] == ("b", 2, 1)
+
+    def test_no_result(self, basic_debug_session):
+        """ Test profiling a statement that doesn't return a result """
+
+        with pytest.raises(dbreak.exc.NoResultError):
+            dbreak.commands.execute_command("!profile-result create table t (a)", basic_debug_session)
+
+
+class TestSample:
+    """ Tests for the !sample command """
+
+    def test_sample(self, basic_debug_session):
+        """ Test sampling a statement's rows """
+
+        outputs = dbreak.commands.execute_command(
+            "!sample 5 budget=60 with recursive n(x) as (select 1 union all select x + 1 from n where x < 50) select x from n",
+            basic_debug_session
+        )
+
+        assert len(outputs[0].rows) == 5
+        assert all(1 <= row[0] <= 50 for row in outputs[0].rows)
+        assert outputs[1] == "Sampled 5 of 50 row(s) read"
+
+
+class TestDiff:
+    """ Tests for the !diff command """
+
+    @pytest.fixture()
+    def diff_session(self, basic_debug_session):
+        """ Session whose two connections have slightly different tables """
+
+        for name, rows in (("conn1", [(1, "a"), (2, "b"), (3, "c")]), ("conn2", [(1, "a"), (2, "x"), (4, "d")])):
+            raw_connection = basic_debug_session.open_connection(name).raw_connection
+            raw_connection.execute("create table foo (id integer, name text)")
+            raw_connection.executemany("insert into foo values (?, ?)", rows)
+
+        return basic_debug_session
+
+    def test_diff(self, diff_session):
+        """ Test comparing a keyed, ordered result """
+
+        summary, sample, method = dbreak.commands.execute_command(
+            "!diff conn1 conn2 key=id ordered=true select * from foo order by id",
+            diff_session
+        )
+
+        assert [row[1] for row in summary.rows] == [3, 3, 1, 1, 1, 1]
+        assert sample.rows[0] == ("changed", "conn1", 2, "b")
+        assert "merge" in method
+
+    def test_no_result(self, diff_session):
+        """ Test comparing a statement without a result fails """
+
+        with pytest.raises(dbreak.exc.NoResultError):
+            dbreak.commands.execute_command("!diff conn1 conn2 create table bar (id integer)", diff_session)
+
+
+class TestJoin:
+    """ Tests for the !join command """
+
+    def test_join(self, basic_debug_session):
+        """ Test joining results from two connections, then filtering the joined rows """
+
+        basic_debug_session.open_connection("conn2").raw_connection.execute("create table names (n integer, name text)")
+        basic_debug_session.open_connection("conn2").raw_connection.executemany(
+            "insert into names values (?, ?)", [(1, "one"), (2, "two")]
+        )
+
+        table, message = dbreak.commands.execute_command(
+            "!join conn1 conn2 x=n \"select 1 as x union all select 3\" \"select * from names\" left",
+            basic_debug_session
+        )
+
+        assert table.columns == ["x", "n", "name"]
+        assert sorted(table.rows, key=repr) == [(1, 1, "one"), (3, None, None)]
+        assert message.startswith("Joined 2 row(s)")
+
+        outputs = dbreak.commands.execute_command("!where name = 'one'", basic_debug_session)
+        assert outputs[0].rows == [(1, 1, "one")]
+
+
+class TestStash:
+    """ Tests for the !stash command """
+
+    def test_stash(self, basic_debug_session):
+        """ Test stashing results from two connections and joining them in the scratch database """
+
+        dbreak.commands.execute_command("!stash a select 1 as id, 'one' as name", basic_debug_session)
+
+        dbreak.commands.execute_command("!switch conn2", basic_debug_session)
+        outputs = dbreak.commands.execute_command("!stash b select 1 as id, 'uno' as word", basic_debug_session)
+
+        assert outputs[0].startswith("Stashed 1 row(s) in b")
+
+        dbreak.commands.execute_command("!switch scratch", basic_debug_session)
+        outputs = dbreak.commands.execute_command("select name, word from a join b using (id)", basic_debug_session)
+
+        assert outputs[0].rows == [("one", "uno")]
+
+    def test_no_result(self, basic_debug_session):
+        """ Test stashing a statement without a result fails """
+
+        with pytest.raises(dbreak.exc.NoResultError):
+            dbreak.commands.execute_command("!stash a create table foo (id integer)", basic_debug_session)
+
+
+class TestCopy:
+    """ Tests for the !copy command """
+
+    def test_copy(self, basic_debug_session):
+        """ Test copying a result into a new table on another connection """
+
+        outputs = dbreak.commands.execute_command(
+            "!copy scratch copied create=true commit_every=1 select 1 as x union all select 2",
+            basic_debug_session
+        )
+
+        assert outputs[0].startswith("Copied 2 row(s) into copied")
+
+        rows = basic_debug_session.open_connection("scratch").execute_statement("select * from copied")[0].rows
+
+        assert rows == [(1,), (2,)]
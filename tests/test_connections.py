@@ -1,5 +1,9 @@
 """ Tests for connections.py module """
 
+import functools
+import sqlite3
+import threading
+
 import pytest
 
 import dbreak
@@ -225,3 +229,189 @@ class TestWrapConnection:
         wrapped = dbreak.connections.wrap_connection(connection)
 
         assert isinstance(wrapped, custom_connection_wrapper), "Wrong wrapper returned"
+
+
+class TestLazyConnections:
+    """ Tests for connections given as factories or specs """
+
+    def test_factory_not_opened(self):
+        """ Test factories are kept as LazyConnection objects without being called """
+
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return sqlite3.connect(":memory:")
+
+        connections = dbreak.connections.prepare_connections(
+            unnamed_connections=(factory,),
+            named_connections={}
+        )
+
+        assert isinstance(connections["db[0]"], dbreak.connections.LazyConnection)
+        assert not calls, "Factory called before the connection was used"
+
+    def test_factory_opened(self):
+        """ Test opening a LazyConnection wraps the factory's connection """
+
+        lazy = dbreak.connections.wrap_or_defer_connection(
+            functools.partial(sqlite3.connect, ":memory:")
+        )
+
+        wrapped = lazy.open()
+
+        assert isinstance(wrapped, dbreak.DBAPIWrapper)
+
+    def test_raw_connection_not_treated_as_factory(self, basic_raw_connections):
+        """ Test callable connection objects are wrapped rather than deferred """
+
+        wrapped = dbreak.connections.wrap_or_defer_connection(basic_raw_connections["conn1"])
+
+        assert isinstance(wrapped, dbreak.DBAPIWrapper)
+
+    def test_sqlite_spec(self, tmp_path):
+        """ Test sqlite specs open the given file """
+
+        path = tmp_path / "spec.db"
+
+        lazy = dbreak.connections.wrap_or_defer_connection(f"sqlite:///{path}")
+
+        assert lazy.description == f"sqlite:///{path}"
+        assert not path.exists(), "Database opened before being used"
+
+        lazy.open().execute_statement("create table t (x int)")
+
+        assert path.exists()
+
+    def test_sqlite_memory_spec(self):
+        """ Test an empty sqlite spec opens an in-memory database """
+
+        wrapped = dbreak.connections.resolve_connection_spec("sqlite://").open()
+
+        assert wrapped.execute_statement("select 1 as x")[0].rows == [(1,)]
+
+    def test_unknown_scheme(self):
+        """ Test specs with no plugin to open them are rejected up front """
+
+        with pytest.raises(TypeError):
+            dbreak.connections.resolve_connection_spec("nosuchdb://localhost")
+
+    def test_not_a_spec(self):
+        """ Test strings without a scheme are rejected """
+
+        with pytest.raises(ValueError):
+            dbreak.connections.resolve_connection_spec("app.db")
+
+
+class TestPrepareConnectionsConcurrently:
+    """ Tests for prepare_connections_concurrently function """
+
+    @pytest.fixture()
+    def release(self):
+        """ Provides an event that slow factories wait on, set when the test ends """
+
+        event = threading.Event()
+
+        yield event
+
+        event.set()
+
+    @staticmethod
+    def slow_factory(release: threading.Event):
+        """ Returns a factory that blocks until the event is set """
+
+        def factory():
+            release.wait(5)
+            return sqlite3.connect(":memory:", check_same_thread=False)
+
+        return factory
+
+    def test_connections_prepared(self):
+        """ Test raw connections and factories are all wrapped """
+
+        connections = dbreak.connections.prepare_connections_concurrently(
+            unnamed_connections=(sqlite3.connect(":memory:", check_same_thread=False),),
+            named_connections={
+                "factory": lambda: sqlite3.connect(":memory:", check_same_thread=False)
+            },
+            ping=True
+        )
+
+        wrappers = [connection.open() for connection in connections.values()]
+
+        assert list(connections) == ["db[0]", "factory"]
+        assert all(isinstance(wrapper, dbreak.DBAPIWrapper) for wrapper in wrappers)
+
+    def test_returns_when_starting_connection_ready(self, release):
+        """ Test stragglers don't hold up the starting connection """
+
+        connections = dbreak.connections.prepare_connections_concurrently(
+            unnamed_connections=(),
+            named_connections={
+                "slow": self.slow_factory(release),
+                "fast": lambda: sqlite3.connect(":memory:", check_same_thread=False)
+            },
+            starting_connection="fast"
+        )
+
+        assert connections["fast"].status == "(ready)"
+        assert connections["slow"].status == "(preparing)"
+
+        release.set()
+
+        assert isinstance(connections["slow"].open(), dbreak.DBAPIWrapper)
+
+    def test_timeout(self, release):
+        """ Test connections not ready in time raise ConnectionTimeoutError """
+
+        connections = dbreak.connections.prepare_connections_concurrently(
+            unnamed_connections=(self.slow_factory(release),),
+            named_connections={},
+            timeout=0.05
+        )
+
+        with pytest.raises(dbreak.exc.ConnectionTimeoutError):
+            connections["db[0]"].open()
+
+        assert connections["db[0]"].status == "(timed out)"
+
+    def test_ping_failure(self, basic_raw_connections):
+        """ Test connections failing their ping are reported as failed """
+
+        # Used from a different thread, so the ping fails
+        connection = basic_raw_connections["conn1"]
+
+        connections = dbreak.connections.prepare_connections_concurrently(
+            unnamed_connections=(connection,),
+            named_connections={},
+            ping=True
+        )
+
+        assert connections["db[0]"].status == "(failed: ProgrammingError)"
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            connections["db[0]"].open()
+
+    def test_discarded_connection_closed(self, release):
+        """ Test unused connections opened for the console are closed when discarded """
+
+        opened = []
+
+        def factory():
+            release.wait(5)
+            opened.append(sqlite3.connect(":memory:", check_same_thread=False))
+            return opened[-1]
+
+        connections = dbreak.connections.prepare_connections_concurrently(
+            unnamed_connections=(lambda: sqlite3.connect(":memory:"), factory),
+            named_connections={}
+        )
+
+        release.set()
+
+        connections["db[1]"].future.result()
+
+        connections["db[1]"].discard()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            opened[0].execute("select 1")
@@ -1,7 +1,13 @@
 """ Tests for console.py module """
 
+import asyncio
+import sqlite3
+import threading
+import time
+
 import dbreak.console
 import dbreak.outputs
+import dbreak.spill
 import dbreak.exc
 
 
@@ -92,6 +98,25 @@ class TestDisplayOutput:
 
         assert out == "\n".join(expected), "Unexpected output"
 
+    def test_display_spilled_table(self, monkeypatch, capsys):
+        """ Test only the first page of a table spilled to disk is shown """
+
+        monkeypatch.setattr(dbreak.console, "RESULT_PAGE_SIZE", 1)
+
+        rows = dbreak.spill.SpilledRows(column_count=1)
+        rows.extend([("a",), ("b",)])
+
+        dbreak.console._display_output(dbreak.outputs.TableOutput(rows=rows, columns=["letter"]))
+
+        rows.close()
+
+        out, err = capsys.readouterr()
+
+        assert "a" in out.split("\n")
+        assert "b" not in out.split("\n")
+        assert "(2 row(s) returned)" in out
+        assert "Showing the first 1" in out
+
     def test_display_exception(self, capsys):
         """ Test displaying an exception """
 
@@ -108,3 +133,130 @@ class TestDisplayOutput:
         ]
 
         assert err == "\n".join(expected), "Unexpected output"
+
+
+class TestStartConsole:
+    """ Tests for the start_console function """
+
+    def test_threaded_consoles_are_queued(self, monkeypatch, capsys):
+        """ Test consoles started from multiple threads don't interleave """
+
+        prompts = []
+
+        def fake_input(prompt):
+            prompts.append((threading.current_thread().name, prompt))
+
+            # Give other threads a chance to cut in line
+            time.sleep(0.01)
+
+            return "!exit" if len(prompts) % 2 == 0 else "select 1"
+
+        monkeypatch.setattr("builtins.input", fake_input)
+
+        threads = [
+            threading.Thread(
+                target=dbreak.console.start_console,
+                args=(sqlite3.connect(":memory:", check_same_thread=False),),
+                kwargs={"threaded": True},
+                name=f"worker-{number}"
+            )
+            for number in range(3)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        thread_names = [name for name, _ in prompts]
+
+        # Each thread should get both of its prompts back to back
+        assert thread_names[0::2] == thread_names[1::2], "Console sessions were interleaved"
+        assert len(set(thread_names)) == 3, "Not every thread got a console"
+
+    def test_caller_variables(self, monkeypatch, capsys):
+        """ Test statements can reference the calling code's local variables """
+
+        commands = iter(["select :secret_value as x", "!exit"])
+
+        monkeypatch.setattr("builtins.input", lambda _: next(commands))
+
+        secret_value = "swordfish"
+
+        dbreak.console.start_console(sqlite3.connect(":memory:"))
+
+        out, err = capsys.readouterr()
+
+        assert secret_value in out, "Caller variable not bound"
+
+
+def run_async(coroutine):
+    """ Run a coroutine to completion on a fresh event loop """
+
+    loop = asyncio.new_event_loop()
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestStartConsoleAsync:
+    """ Tests for the start_console_async function """
+
+    def test_event_loop_keeps_running(self, monkeypatch, capsys):
+        """ Test other coroutines run while the console waits for input """
+
+        def slow_input(_):
+            time.sleep(0.2)
+            return "!exit"
+
+        monkeypatch.setattr("builtins.input", slow_input)
+
+        ticks = []
+
+        async def ticker():
+            for _ in range(1000):
+                ticks.append(None)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            ticker_task = asyncio.ensure_future(ticker())
+
+            await dbreak.console.start_console_async(
+                sqlite3.connect(":memory:", check_same_thread=False)
+            )
+
+            ticker_task.cancel()
+
+        run_async(main())
+
+        assert len(ticks) > 5, "Event loop was blocked by the console"
+
+    def test_consoles_are_queued(self, monkeypatch, capsys):
+        """ Test consoles awaited concurrently don't interleave """
+
+        prompts = []
+
+        def fake_input(prompt):
+            prompts.append(prompt)
+            time.sleep(0.01)
+            return "!exit" if len(prompts) % 2 == 0 else "select 1"
+
+        monkeypatch.setattr("builtins.input", fake_input)
+
+        async def main():
+            await asyncio.gather(
+                dbreak.console.start_console_async(
+                    first=sqlite3.connect(":memory:", check_same_thread=False)
+                ),
+                dbreak.console.start_console_async(
+                    second=sqlite3.connect(":memory:", check_same_thread=False)
+                )
+            )
+
+        run_async(main())
+
+        assert prompts[0] == prompts[1] and prompts[2] == prompts[3], "Consoles were interleaved"
+        assert len(set(prompts)) == 2, "Not every console was served"
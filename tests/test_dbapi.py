@@ -1,7 +1,12 @@
 """ Tests for dbapi.py module """
 
+import sqlite3
+
 import pytest
 
+import dbreak
+import dbreak.dbapi
+
 
 class TestDBAPIWrapper:
     """ Test usage of DBAPIWrapper functions """
@@ -87,3 +92,178 @@ class TestDBAPIWrapper:
         )
 
         assert outputs == []
+
+
+class CountingConnection:
+    """ sqlite3 connection that counts how many cursors it opens """
+
+    def __init__(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.cursors_opened = 0
+
+    def cursor(self):
+        self.cursors_opened += 1
+        return self.connection.cursor()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class TestCursorPool:
+    """ Test reuse of cursors by DBAPIWrapper """
+
+    def test_reuse(self):
+        """ Test a cursor is reused between statements """
+
+        raw_connection = CountingConnection()
+
+        wrapper = dbreak.DBAPIWrapper(raw_connection)
+
+        for number in range(3):
+            outputs = wrapper.execute_statement(f"select {number} as x")
+
+        assert outputs[0].rows == [(2,)], "Unexpected rows returned"
+        assert raw_connection.cursors_opened == 1, "Cursor was not reused"
+
+    def test_reuse_disabled(self):
+        """ Test each statement gets a fresh cursor when reuse is turned off """
+
+        raw_connection = CountingConnection()
+
+        wrapper = dbreak.DBAPIWrapper(raw_connection, reuse_cursors=False)
+
+        for number in range(3):
+            wrapper.execute_statement(f"select {number} as x")
+
+        assert raw_connection.cursors_opened == 3, "Cursor was reused"
+        assert len(wrapper.cursor_pool) == 0, "Cursor was kept open"
+
+    def test_failed_statement(self):
+        """ Test a cursor that raised an error isn't reused """
+
+        raw_connection = CountingConnection()
+
+        wrapper = dbreak.DBAPIWrapper(raw_connection)
+
+        with pytest.raises(sqlite3.OperationalError):
+            wrapper.execute_statement("select * from nowhere")
+
+        wrapper.execute_statement("select 1")
+
+        assert raw_connection.cursors_opened == 2, "Failed cursor was reused"
+
+    def test_prefers_matching_statement(self):
+        """ Test the cursor that last ran a statement is preferred for running it again """
+
+        raw_connection = CountingConnection()
+
+        pool = dbreak.dbapi.CursorPool(raw_connection, size=4)
+
+        first = pool.acquire("select 1")
+        second = pool.acquire("select 2")
+
+        pool.release(first, "select 1")
+        pool.release(second, "select 2")
+
+        assert pool.acquire("select 1") is first, "Wrong cursor reused"
+
+    def test_unhealthy_cursor(self):
+        """ Test idle cursors reporting themselves closed are thrown away """
+
+        class ClosableCursor:
+            description = None
+            arraysize = 1
+            closed = False
+
+            def close(self):
+                pass
+
+        class ClosableConnection:
+            def cursor(self):
+                return ClosableCursor()
+
+        pool = dbreak.dbapi.CursorPool(ClosableConnection(), size=4)
+
+        cursor = pool.acquire()
+        pool.release(cursor)
+
+        cursor.closed = True
+
+        assert pool.acquire() is not cursor, "Closed cursor was reused"
+
+    def test_detach(self):
+        """ Test idle cursors are closed when the session ends """
+
+        wrapper = dbreak.DBAPIWrapper(sqlite3.connect(":memory:"))
+
+        wrapper.execute_statement("select 1")
+
+        wrapper.detach()
+
+        assert len(wrapper.cursor_pool) == 0, "Idle cursors left open"
+
+
+class TestStreamStatement:
+    """ Test reading results a batch at a time with DBAPIWrapper.stream_statement """
+
+    def test_batches(self, monkeypatch):
+        """ Test rows are fetched in batches, and the cursor is reused once they've all been read """
+
+        raw_connection = CountingConnection()
+
+        wrapper = dbreak.DBAPIWrapper(raw_connection)
+
+        monkeypatch.setattr(wrapper, "FETCH_BATCH_SIZE", 2)
+
+        with wrapper.stream_statement("select 1 as x union all select 2 union all select :n", {"n": 3}) as stream:
+            assert stream.columns == ["x"]
+            assert list(stream.batches()) == [[(1,), (2,)], [(3,)]]
+
+        wrapper.execute_statement("select 1")
+
+        assert raw_connection.cursors_opened == 1, "Cursor was not returned to the pool"
+
+    def test_abandoned(self):
+        """ Test cursors closed before their results are read aren't reused """
+
+        raw_connection = CountingConnection()
+
+        wrapper = dbreak.DBAPIWrapper(raw_connection)
+
+        with wrapper.stream_statement("select 1", {}):
+            pass
+
+        wrapper.execute_statement("select 1")
+
+        assert raw_connection.cursors_opened == 2, "Unfinished cursor was reused"
+
+
+class TestInsertRows:
+    """ Tests for creating tables and inserting rows """
+
+    def test_create_and_insert(self, basic_wrapped_connections):
+        """ Test column types are judged from the first values that aren't NULL """
+
+        wrapper = basic_wrapped_connections["conn1"]
+
+        rows = [(None, "a", b"x"), (1, "b", None), (2.5, None, None)]
+
+        wrapper.create_table("copied", ["n", "count(*)", "data"], sample_rows=rows)
+
+        assert wrapper.insert_rows("copied", ["n", "count(*)", "data"], rows) == 3
+
+        wrapper.commit()
+
+        declared = [row[2] for row in wrapper.raw_connection.execute("PRAGMA table_info(copied)")]
+
+        assert declared == ["BIGINT", "TEXT", "BLOB"]
+        assert wrapper.execute_statement("select * from copied")[0].rows == rows
+
+    def test_usable_from_other_threads(self):
+        """ Test sqlite3 connections tied to their thread are detected """
+
+        assert not dbreak.DBAPIWrapper(sqlite3.connect(":memory:")).usable_from_other_threads()
+        assert dbreak.DBAPIWrapper(sqlite3.connect(":memory:", check_same_thread=False)).usable_from_other_threads()
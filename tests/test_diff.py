@@ -0,0 +1,138 @@
+""" Tests for diff.py module """
+
+import decimal
+import sqlite3
+
+import pytest
+
+import dbreak.diff
+
+
+ROWS_A = [(1, "a"), (2, "b"), (3, "c"), (5, "e")]
+ROWS_B = [(1, "a"), (2, "B"), (4, "d"), (5, "e")]
+
+
+@pytest.fixture()
+def diff(stream_of):
+    """ Compares two lists of rows """
+
+    def compare(rows_a, rows_b, **kwargs):
+        return dbreak.diff.diff_streams(stream_of(rows_a), stream_of(rows_b), "one", "two", **kwargs)
+
+    return compare
+
+
+def counts(result):
+    """ Returns the totals from a DiffResult """
+
+    return result.rows_a, result.rows_b, result.matching, result.only_a, result.only_b, result.changed
+
+
+class TestDiffStreams:
+    """ Tests for the diff_streams function """
+
+    @pytest.mark.parametrize("ordered", [False, True])
+    def test_keyed(self, ordered, diff):
+        """ Test rows are matched by key, whether merged or hashed """
+
+        result = diff(ROWS_A, ROWS_B, key_columns=["ID"], ordered=ordered)
+
+        assert counts(result) == (4, 4, 2, 1, 1, 1)
+        assert sorted(result.sample) == [
+            ("changed", "one", (2, "b")),
+            ("changed", "two", (2, "B")),
+            ("only in", "one", (3, "c")),
+            ("only in", "two", (4, "d"))
+        ]
+
+    @pytest.mark.parametrize("ordered", [False, True])
+    def test_unkeyed(self, ordered, diff):
+        """ Test results without a key are compared as multisets of rows """
+
+        result = diff(sorted(ROWS_A + [(1, "a")]), sorted(ROWS_B + [(1, "a")]), ordered=ordered)
+
+        assert counts(result) == (5, 5, 3, 2, 2, 0)
+
+    def test_equal_numbers(self, diff):
+        """ Test numbers of different types with the same value match """
+
+        result = diff([(1, decimal.Decimal("2.5"))], [(1.0, 2.5)])
+
+        assert result.matching == 1
+
+    def test_unordered(self, diff):
+        """ Test merging results that aren't ordered by key fails """
+
+        with pytest.raises(ValueError):
+            diff([(2, "b"), (1, "a")], ROWS_B, key_columns=["id"], ordered=True)
+
+    def test_unknown_key(self, diff):
+        """ Test keying by a column that isn't in the result fails """
+
+        with pytest.raises(KeyError):
+            diff(ROWS_A, ROWS_B, key_columns=["missing"])
+
+    def test_sample_size(self, diff):
+        """ Test only the first differences are kept """
+
+        result = diff([(n, "a") for n in range(10)], [], sample_size=3)
+
+        assert result.only_a == 10
+        assert len(result.sample) == 3
+
+    def test_spilled(self, monkeypatch, diff):
+        """ Test results over the memory budget are compared a partition at a time """
+
+        monkeypatch.setattr(dbreak.diff, "RESULT_MEMORY_BUDGET_BYTES", 500)
+
+        rows_a = [(n, str(n)) for n in range(200)]
+        rows_b = [(n, str(n) if n % 10 else "changed") for n in range(100, 300)]
+
+        result = diff(rows_a, rows_b, key_columns=["id"], sample_size=0)
+
+        assert counts(result) == (200, 200, 90, 100, 100, 10)
+        assert "spilled" in result.method
+
+    def test_spilled_driver_rows(self, monkeypatch, diff):
+        """ Test rows of unpicklable driver types, such as sqlite3.Row, can be spilled """
+
+        monkeypatch.setattr(dbreak.diff, "RESULT_MEMORY_BUDGET_BYTES", 100)
+
+        connection = sqlite3.connect(":memory:")
+        connection.row_factory = sqlite3.Row
+
+        rows_a = connection.execute(
+            "with recursive n(x) as (select 1 union all select x + 1 from n where x < 50) select x, 'r' || x from n"
+        ).fetchall()
+
+        result = diff(rows_a, [(n, f"r{n}") for n in range(2, 52)], key_columns=["id"])
+
+        connection.close()
+
+        assert counts(result) == (50, 50, 49, 1, 1, 0)
+        assert "spilled" in result.method
+
+
+class TestDiffOutputs:
+    """ Tests for the diff_outputs function """
+
+    def test_outputs(self, diff):
+        """ Test the summary, sample and method are laid out """
+
+        result = diff(ROWS_A, ROWS_B, key_columns=["id"], ordered=True)
+
+        summary, sample, method = dbreak.diff.diff_outputs(result, ["id", "name"], "one", "two")
+
+        assert summary.rows[3] == ("Only in one", 1)
+        assert sample.columns == ["Difference", "Connection", "id", "name"]
+        assert sample.rows[0] == ("changed", "one", 2, "b")
+        assert method == "Compared using a merge of results ordered by key"
+
+    def test_no_differences(self, diff):
+        """ Test no sample table is shown when the results match """
+
+        result = diff(ROWS_A, ROWS_A)
+
+        outputs = dbreak.diff.diff_outputs(result, ["id", "name"], "one", "two")
+
+        assert len(outputs) == 2
@@ -0,0 +1,116 @@
+""" Tests for join.py module """
+
+import sqlite3
+
+import pytest
+
+import dbreak.join
+import dbreak.spill
+
+
+USERS = [(1, "ann"), (2, "bob"), (3, "cy"), (None, "nobody")]
+SESSIONS = [(1.0, "s1"), (1, "s2"), (2, "s3"), (4, "s4"), (None, "s5")]
+
+
+@pytest.fixture()
+def join(stream_of):
+    """ Joins users to their sessions """
+
+    def join_users(how="inner", users=USERS, sessions=SESSIONS):
+        return dbreak.join.join_streams(
+            stream_a=stream_of(users, ["id", "name"]),
+            stream_b=stream_of(sessions, ["id", "session"]),
+            name_a="db",
+            name_b="cache",
+            on=[("id", "ID")],
+            how=how
+        )
+
+    return join_users
+
+
+class TestJoinStreams:
+    """ Tests for the join_streams function """
+
+    def test_inner(self, join):
+        """ Test matching rows are joined, with NULLs never matching """
+
+        result = join()
+
+        assert result.columns == ["db.id", "name", "cache.id", "session"]
+        assert sorted(result.rows, key=repr) == sorted(
+            [(1, "ann", 1.0, "s1"), (1, "ann", 1, "s2"), (2, "bob", 2, "s3")],
+            key=repr
+        )
+
+    @pytest.mark.parametrize("how, unmatched", [
+        ("left", [(3, "cy", None, None), (None, "nobody", None, None)]),
+        ("right", [(None, None, 4, "s4"), (None, None, None, "s5")]),
+        ("full", [(3, "cy", None, None), (None, "nobody", None, None), (None, None, 4, "s4"), (None, None, None, "s5")])
+    ])
+    def test_outer(self, how, unmatched, join):
+        """ Test outer joins keep unmatched rows, whichever side is built """
+
+        for users in (USERS, USERS * 3):
+
+            result = join(how, users=users)
+
+            matched = [row for row in result.rows if None not in row]
+            assert len(matched) == 3 * len(users) // 4
+
+            assert sorted(set(row for row in result.rows if None in row), key=repr) == sorted(unmatched, key=repr)
+
+    def test_spilled(self, monkeypatch, join):
+        """ Test results over the memory budget are joined a partition at a time """
+
+        monkeypatch.setattr(dbreak.join, "RESULT_MEMORY_BUDGET_BYTES", 500)
+
+        result = join(
+            how="left",
+            users=[(n, str(n)) for n in range(300)],
+            sessions=[(n % 100, f"s{n}") for n in range(200)]
+        )
+
+        assert "grace" in result.method
+        assert len(result.rows) == 400
+        assert sum(1 for row in result.rows if row[2] is None) == 200
+
+    def test_spilled_driver_rows(self, monkeypatch, join):
+        """ Test rows of unpicklable driver types, such as sqlite3.Row, can be spilled """
+
+        monkeypatch.setattr(dbreak.join, "RESULT_MEMORY_BUDGET_BYTES", 100)
+
+        connection = sqlite3.connect(":memory:")
+        connection.row_factory = sqlite3.Row
+
+        rows = connection.execute(
+            "with recursive n(x) as (select 1 union all select x + 1 from n where x < 50) select x, 'u' || x from n"
+        ).fetchall()
+
+        result = join(users=rows, sessions=[(n, f"s{n}") for n in range(50)])
+
+        connection.close()
+
+        assert "grace" in result.method
+        assert len(result.rows) == 49
+
+    def test_unknown_type(self, join):
+        """ Test unsupported join types are rejected """
+
+        with pytest.raises(ValueError):
+            join("sideways")
+
+
+class TestParseJoinCondition:
+    """ Tests for the parse_join_condition function """
+
+    def test_pairs(self):
+        """ Test several pairs of columns """
+
+        assert dbreak.join.parse_join_condition("id=user_id, org = org_id") == [("id", "user_id"), ("org", "org_id")]
+
+    def test_invalid(self):
+        """ Test conditions without = are rejected """
+
+        with pytest.raises(ValueError):
+            dbreak.join.parse_join_condition("id")
@@ -0,0 +1,178 @@
+""" Tests for load.py module """
+
+import functools
+import io
+import os
+import sqlite3
+
+import pytest
+
+import dbreak
+import dbreak.load
+
+
+@pytest.fixture()
+def database_factory(tmp_path):
+    """ Factory opening connections to a sqlite file database with a 10 row table """
+
+    path = str(tmp_path / "load.db")
+
+    connection = sqlite3.connect(path)
+    connection.execute("create table foobar (i int)")
+    connection.executemany("insert into foobar values (?)", [(i,) for i in range(10)])
+    connection.commit()
+    connection.close()
+
+    return functools.partial(sqlite3.connect, path, check_same_thread=False)
+
+
+class TestRunLoad:
+    """ Tests for the run_load function """
+
+    def test_threads(self, database_factory):
+        """ Test running a weighted statement mix on threads """
+
+        result = dbreak.run_load(
+            connection_factory=database_factory,
+            statements={"select * from foobar": 3, "select * from nowhere": 1},
+            workers=3,
+            iterations=40,
+            report_interval=None,
+            seed=1
+        )
+
+        stats = result.stats
+
+        assert stats.operations + stats.errors["OperationalError"] == 120, "Wrong number of statements run"
+        assert stats.errors["OperationalError"] > 0, "Failing statement never chosen"
+        assert stats.rows == stats.operations * 10, "Wrong number of rows counted"
+        assert stats.histogram.count == stats.operations, "Latencies not recorded"
+
+    def test_processes(self, database_factory):
+        """ Test running workers as separate processes """
+
+        result = dbreak.run_load(
+            connection_factory=database_factory,
+            statements="select * from foobar",
+            workers=2,
+            iterations=25,
+            processes=True,
+            report_interval=None
+        )
+
+        assert result.stats.operations == 50, "Wrong number of statements run"
+        assert result.processes, "Processes not reported"
+
+    def test_crashed_process(self):
+        """ Test a worker process dying without reporting back counts as an error rather than hanging """
+
+        result = dbreak.run_load(
+            connection_factory=functools.partial(os._exit, 3),
+            statements="select * from foobar",
+            workers=2,
+            iterations=5,
+            processes=True,
+            report_interval=None
+        )
+
+        assert result.stats.errors["worker process exited with code 3"] == 2, "Crashed workers not counted"
+        assert result.stats.operations == 0, "Statements counted for crashed workers"
+
+    def test_duration_and_reports(self, database_factory):
+        """ Test stopping after a duration, with progress reports along the way """
+
+        report_stream = io.StringIO()
+
+        result = dbreak.run_load(
+            connection_factory=database_factory,
+            statements=["select * from foobar"],
+            workers=2,
+            duration=0.3,
+            report_interval=0.1,
+            report_stream=report_stream
+        )
+
+        assert result.stats.operations > 0, "No statements run"
+        assert "operations=" in report_stream.getvalue(), "No progress reported"
+
+    def test_connection_failure(self):
+        """ Test workers whose connections fail are counted as errors """
+
+        def broken_factory():
+            raise ConnectionError("nope")
+
+        result = dbreak.run_load(
+            connection_factory=broken_factory,
+            statements="select 1",
+            workers=2,
+            iterations=1,
+            report_interval=None
+        )
+
+        assert result.stats.errors == {"connect: ConnectionError": 2}, "Connection errors not counted"
+
+    def test_no_limit(self, database_factory):
+        """ Test a duration or iteration count is required """
+
+        with pytest.raises(ValueError):
+            dbreak.run_load(database_factory, "select 1")
+
+    def test_outputs(self, database_factory):
+        """ Test results are summarized as tables """
+
+        result = dbreak.run_load(
+            connection_factory=database_factory,
+            statements="select * from nowhere",
+            workers=1,
+            iterations=2,
+            report_interval=None
+        )
+
+        summary, histogram, errors = result.to_outputs()
+
+        assert summary.rows[0][3] == 2, "Errors not summarized"
+        assert errors.rows == [("OperationalError", 2)], "Errors not listed"
+
+
+class TestLatencyHistogram:
+    """ Tests for the LatencyHistogram class """
+
+    def test_percentiles(self):
+        """ Test percentile estimates are within the bucket precision """
+
+        histogram = dbreak.load.LatencyHistogram()
+
+        for milliseconds in range(1, 101):
+            histogram.record(milliseconds / 1000)
+
+        assert histogram.percentile(50) == pytest.approx(0.050, rel=0.06), "Bad p50 estimate"
+        assert histogram.percentile(99) == pytest.approx(0.099, rel=0.06), "Bad p99 estimate"
+        assert histogram.percentile(100) == pytest.approx(0.100), "Bad maximum"
+
+    def test_merge(self):
+        """ Test merging histograms """
+
+        first = dbreak.load.LatencyHistogram()
+        second = dbreak.load.LatencyHistogram()
+
+        first.record(0.001)
+        second.record(0.002)
+        second.record(0.003)
+
+        first.merge(second)
+
+        assert first.count == 3, "Counts not merged"
+        assert first.maximum == 0.003, "Maximum not merged"
+
+    def test_output(self):
+        """ Test summarizing into power-of-two ranges """
+
+        histogram = dbreak.load.LatencyHistogram()
+
+        histogram.record(0.0005)
+        histogram.record(0.003)
+        histogram.record(0.0031)
+
+        output = histogram.to_output()
+
+        assert output.rows == [("0 - 1", 1, 33.3), ("2 - 4", 2, 66.7)], "Unexpected histogram"
@@ -0,0 +1,124 @@
+""" Tests for locks.py module """
+
+import sqlite3
+import threading
+import time
+
+import dbreak.locks
+
+
+class TestConsoleQueue:
+    """ Tests for the ConsoleQueue class """
+
+    def test_reentrant(self):
+        """ Test the same thread can acquire the console more than once """
+
+        queue = dbreak.locks.ConsoleQueue()
+
+        assert queue.acquire(), "First acquire failed"
+        assert queue.acquire(), "Reentrant acquire failed"
+
+        queue.release()
+
+        assert queue.owner is threading.current_thread(), "Console released too early"
+
+        queue.release()
+
+        assert queue.owner is None, "Console was not released"
+
+    def test_timeout(self):
+        """ Test acquiring a console held by another thread times out """
+
+        queue = dbreak.locks.ConsoleQueue()
+
+        holder = threading.Thread(target=queue.acquire)
+        holder.start()
+        holder.join()
+
+        assert not queue.acquire(timeout=0.05), "Acquired a console held by another thread"
+        assert queue.waiting == 0, "Timed out thread is still waiting"
+
+    def test_first_come_first_served(self):
+        """ Test waiting threads are served in the order they arrived """
+
+        queue = dbreak.locks.ConsoleQueue()
+
+        served = []
+
+        def wait_for_turn(number):
+            with queue:
+                served.append(number)
+
+        queue.acquire()
+
+        threads = []
+
+        for number in range(5):
+
+            thread = threading.Thread(target=wait_for_turn, args=(number,))
+            thread.start()
+
+            threads.append(thread)
+
+            # Make sure each thread is in line before starting the next
+            while queue.waiting <= number:
+                time.sleep(0.001)
+
+        queue.release()
+
+        for thread in threads:
+            thread.join()
+
+        assert served == [0, 1, 2, 3, 4], "Threads served out of order"
+
+
+class TestConnectionLock:
+    """ Tests for the connection_lock function """
+
+    def test_same_connection(self):
+        """ Test the same connection always gets the same lock """
+
+        connection = sqlite3.connect(":memory:")
+
+        first = dbreak.locks.connection_lock(connection)
+        second = dbreak.locks.connection_lock(connection)
+
+        assert first is second, "Got different locks for the same connection"
+
+    def test_different_connections(self):
+        """ Test different connections get different locks """
+
+        first = dbreak.locks.connection_lock(sqlite3.connect(":memory:"))
+        second = dbreak.locks.connection_lock(sqlite3.connect(":memory:"))
+
+        assert first is not second, "Got the same lock for different connections"
+
+    def test_unreferenceable_connection(self):
+        """ Test connections without weak reference support keep their lock until their wrapper closes """
+
+        class Connection:
+            __slots__ = ()
+
+            def close(self):
+                pass
+
+        connection = Connection()
+
+        wrapper = dbreak.ConnectionWrapper(connection)
+
+        lock = wrapper.lock
+
+        assert lock is dbreak.locks.connection_lock(connection), "Wrapper has wrong lock"
+
+        wrapper.close()
+
+        assert dbreak.locks.connection_lock(connection) is not lock, "Lock kept after close"
+
+    def test_wrapper_uses_connection_lock(self, basic_raw_connections):
+        """ Test ConnectionWrappers share their raw connection's lock """
+
+        connection = basic_raw_connections["conn1"]
+
+        wrapper = dbreak.DBAPIWrapper(connection)
+
+        assert wrapper.lock is dbreak.locks.connection_lock(connection), "Wrapper has wrong lock"
@@ -47,6 +47,14 @@ def command_lookup():
             "verbose_final_argument": True
         },
 
+        "optional-args": {
+            "func": lambda: "optional-args",
+            "description": "Command whose final argument is optional",
+            "arguments": ["a1", "a2"],
+            "minimum_arguments": 1,
+            "verbose_final_argument": True
+        },
+
         "no-args": {
             "func": lambda: "no-args",
             "description": "Command taking no arguments",
@@ -177,6 +185,23 @@ class TestParse:
                 command_lookup
             )
 
+    @pytest.mark.parametrize("command, expected", [
+        ("!optional-args foo", ["foo"]),
+        ("!optional-args foo bar baz", ["foo", "bar baz"])
+    ])
+    def test_parse_optional_arguments(self, command_lookup, command, expected):
+        """ Parse a command given or leaving out its optional argument """
+
+        func, arguments = dbreak.parser.parse(command, command_lookup)
+
+        assert arguments == expected, "Wrong arguments parsed"
+
+    def test_parse_missing_required_argument(self, command_lookup):
+        """ Parse a command missing an argument that isn't optional """
+
+        with pytest.raises(dbreak.exc.WrongNumberOfArgumentsError, match="1 to 2"):
+            dbreak.parser.parse("!optional-args", command_lookup)
+
     def test_parse_database_statement(self, command_lookup):
         """ Parse a statement that goes directly to the database """
 
@@ -187,3 +212,69 @@ class TestParse:
 
         assert func() == "execute", "Wrong function chosen"
         assert arguments == ["select '100', '200', '300'"], "Wrong number of arguments parsed"
+
+
+class TestParseOptions:
+    """ Tests for parse_options function """
+
+    def test_options(self):
+        """ Test splitting options off the front of a statement """
+
+        options, rest = dbreak.parser.parse_options(
+            "warmup=5 concurrency=2 select a=1 from foo",
+            allowed_options=("warmup", "concurrency")
+        )
+
+        assert options == {"warmup": "5", "concurrency": "2"}, "Unexpected options"
+        assert rest == "select a=1 from foo", "Unexpected remainder"
+
+    def test_no_options(self):
+        """ Test a string without options """
+
+        options, rest = dbreak.parser.parse_options(
+            "select 1",
+            allowed_options=("warmup",)
+        )
+
+        assert options == {}, "Unexpected options"
+        assert rest == "select 1", "Unexpected remainder"
+
+    def test_unknown_option(self):
+        """ Test parsing stops at an unrecognized option """
+
+        options, rest = dbreak.parser.parse_options(
+            "warmup=1 other=2 select 1",
+            allowed_options=("warmup",)
+        )
+
+        assert options == {"warmup": "1"}, "Unexpected options"
+        assert rest == "other=2 select 1", "Unexpected remainder"
+
+
+class TestIsReadStatement:
+    """ Tests for the is_read_statement function """
+
+    @pytest.mark.parametrize("statement", [
+        "select 1",
+        "  SELECT * from foo",
+        "with x as (select 1) select * from x",
+        "(select 1) union (select 2)",
+        "-- comment\nselect 1",
+        "/* comment */ explain select 1"
+    ])
+    def test_reads(self, statement):
+        """ Test statements that only read are recognized """
+
+        assert dbreak.parser.is_read_statement(statement)
+
+    @pytest.mark.parametrize("statement", [
+        "insert into foo values (1)",
+        "update foo set x = 1",
+        "pragma journal_mode = wal",
+        "-- select\ndelete from foo",
+        ""
+    ])
+    def test_writes(self, statement):
+        """ Test statements that may write are recognized """
+
+        assert not dbreak.parser.is_read_statement(statement)
@@ -0,0 +1,142 @@
+""" Tests for plans.py module """
+
+import json
+
+import dbreak
+import dbreak.plans
+
+# Trimmed output of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) from Postgres
+POSTGRES_PLAN = json.dumps([
+    {
+        "Plan": {
+            "Node Type": "Sort",
+            "Sort Method": "external merge",
+            "Sort Space Type": "Disk",
+            "Actual Rows": 1000,
+            "Actual Total Time": 12.5,
+            "Plans": [
+                {
+                    "Node Type": "Seq Scan",
+                    "Relation Name": "foo",
+                    "Actual Rows": 1000,
+                    "Shared Read Blocks": 40
+                },
+                {
+                    "Node Type": "Index Scan",
+                    "Relation Name": "bar",
+                    "Index Name": "bar_pkey",
+                    "Actual Rows": 1
+                }
+            ]
+        }
+    }
+])
+
+
+class TestPlanNode:
+    """ Tests for the PlanNode class """
+
+    def test_walk(self):
+        """ Test nodes are walked depth-first with their depths """
+
+        leaf = dbreak.plans.PlanNode("leaf")
+        middle = dbreak.plans.PlanNode("middle", children=[leaf])
+        root = dbreak.plans.PlanNode("root", children=[middle, dbreak.plans.PlanNode("other")])
+
+        found = [(depth, node.detail) for depth, node in root.walk()]
+
+        assert found == [(0, "root"), (1, "middle"), (2, "leaf"), (1, "other")]
+
+
+class TestRenderPlan:
+    """ Tests for the render_plan function """
+
+    def test_render(self):
+        """ Test steps are indented beneath their parents, with flags and metrics as columns """
+
+        root = dbreak.plans.PlanNode(
+            "root",
+            children=[dbreak.plans.PlanNode("child", flags=["A", "B"], metrics={"Rows": 5})]
+        )
+
+        table = dbreak.plans.render_plan([root])
+
+        assert table.columns == ["Plan", "Flags", "Rows"]
+        assert table.rows == [("root", "", ""), ("-> child", "A, B", 5)]
+
+
+class TestParseSQLitePlan:
+    """ Tests for the parse_sqlite_plan function """
+
+    def test_tree(self):
+        """ Test rows are nested by their parent ids """
+
+        rows = [
+            (2, 0, 0, "SEARCH t USING INDEX ta (a=?)"),
+            (5, 0, 0, "LIST SUBQUERY 1"),
+            (7, 5, 0, "SCAN t"),
+            (9, 0, 0, "USE TEMP B-TREE FOR ORDER BY")
+        ]
+
+        roots = dbreak.plans.parse_sqlite_plan(rows)
+
+        assert [root.detail for root in roots] == [
+            "SEARCH t USING INDEX ta (a=?)",
+            "LIST SUBQUERY 1",
+            "USE TEMP B-TREE FOR ORDER BY"
+        ]
+
+        assert roots[1].children[0].detail == "SCAN t"
+
+    def test_flags(self):
+        """ Test full scans and temp B-trees are flagged, and index scans aren't """
+
+        rows = [
+            (1, 0, 0, "SCAN t"),
+            (2, 0, 0, "SCAN TABLE t"),
+            (3, 0, 0, "SCAN t USING COVERING INDEX ta"),
+            (4, 0, 0, "SCAN CONSTANT ROW"),
+            (5, 0, 0, "USE TEMP B-TREE FOR ORDER BY")
+        ]
+
+        flags = [root.flags for root in dbreak.plans.parse_sqlite_plan(rows)]
+
+        assert flags == [
+            [dbreak.plans.FULL_SCAN],
+            [dbreak.plans.FULL_SCAN],
+            [],
+            [],
+            [dbreak.plans.TEMP_B_TREE]
+        ]
+
+
+class TestParsePostgresPlan:
+    """ Tests for the parse_postgres_plan function """
+
+    def test_tree(self):
+        """ Test nodes are described and nested """
+
+        root, = dbreak.plans.parse_postgres_plan(POSTGRES_PLAN)
+
+        assert root.detail == "Sort"
+        assert [child.detail for child in root.children] == [
+            "Seq Scan on foo",
+            "Index Scan on bar using bar_pkey"
+        ]
+
+    def test_flags(self):
+        """ Test sequential scans and sorts spilling to disk are flagged """
+
+        root, = dbreak.plans.parse_postgres_plan(POSTGRES_PLAN)
+
+        assert root.flags == [dbreak.plans.SORT_SPILL]
+        assert root.children[0].flags == [dbreak.plans.FULL_SCAN]
+        assert root.children[1].flags == []
+
+    def test_metrics(self):
+        """ Test timings and buffer counts are kept as metrics """
+
+        root, = dbreak.plans.parse_postgres_plan(POSTGRES_PLAN)
+
+        assert root.metrics == {"Rows": 1000, "Time (ms)": 12.5}
+        assert root.children[0].metrics == {"Rows": 1000, "Buffers Read": 40}
@@ -0,0 +1,81 @@
+""" Tests for profiler.py module """
+
+import statistics
+
+import pytest
+
+import dbreak.outputs
+import dbreak.profiler
+
+
+def profile(rows, columns):
+    """ Profile rows given as several batches """
+
+    stream = dbreak.outputs.ResultStream(
+        columns=columns,
+        batches=[rows[:2], rows[2:]]
+    )
+
+    return dbreak.profiler.profile_stream(stream)
+
+
+class TestHyperLogLog:
+    """ Tests for the HyperLogLog class """
+
+    @pytest.mark.parametrize("distinct", [10, 1000, 50000])
+    def test_estimate(self, distinct):
+        """ Test estimates are within a few percent """
+
+        sketch = dbreak.profiler.HyperLogLog()
+
+        for repeat in range(2):
+            for value in range(distinct):
+                sketch.add(f"value {value}")
+
+        assert abs(sketch.estimate() - distinct) <= distinct * 0.05
+
+
+class TestProfileStream:
+    """ Tests for the profile_stream function """
+
+    def test_numbers(self):
+        """ Test statistics of a numeric column """
+
+        numbers = [4, None, 1.5, 10, 4]
+
+        column, = profile([(number,) for number in numbers], ["n"])
+
+        present = [number for number in numbers if number is not None]
+
+        assert (column.rows, column.nulls) == (5, 1)
+        assert (column.minimum, column.maximum) == (1.5, 10)
+        assert column.mean == pytest.approx(statistics.mean(present))
+        assert column.standard_deviation == pytest.approx(statistics.stdev(present))
+        assert column.distinct.estimate() == 3
+        assert column.top_values(1) == [(4, 2)]
+
+    def test_strings(self):
+        """ Test statistics of a text column """
+
+        column, = profile([("",), ("a",), ("abc",), ("abcdefgh",), ("abc",)], ["s"])
+
+        assert (column.minimum, column.maximum) == ("", "abcdefgh")
+        assert column.numbers == 0
+        assert column.length_histogram() == [("0", 1), ("1", 1), ("2-3", 2), ("8-15", 1)]
+
+    def test_frequent_values(self):
+        """ Test frequent values are found among more distinct values than are tracked """
+
+        values = [number % 500 for number in range(2000)] + ["common"] * 300
+
+        column, = profile([(value,) for value in values], ["v"])
+
+        assert column.top_values(1)[0][0] == "common"
+
+    def test_table(self):
+        """ Test laying out profiles, one row per column """
+
+        table = dbreak.profiler.profile_table(profile([(1, "a"), (2, "b"), (3, None)], ["n", "s"]))
+
+        assert [row[:4] for row in table.rows] == [("n", 3, 0, 3), ("s", 3, 1, 2)]
+        assert table.rows[0][6] == 2
@@ -0,0 +1,156 @@
+""" Tests for registry.py module """
+
+import sqlite3
+
+import pytest
+
+import dbreak
+import dbreak.connections
+import dbreak.registry
+
+
+class TestWrapperRegistry:
+    """ Tests for the WrapperRegistry class """
+
+    @pytest.fixture()
+    def registry(self):
+        """ Provides an empty registry """
+
+        return dbreak.registry.WrapperRegistry()
+
+    @pytest.fixture()
+    def wrappers(self):
+        """ Provides wrapper classes with different SEARCH_RANKs, without registering them """
+
+        class Low:
+            SEARCH_RANK = 0
+
+        class High:
+            SEARCH_RANK = 1
+
+        return Low, High
+
+    def test_find_by_type(self, registry, wrappers, custom_connection):
+        """ Test wrappers registered for a connection class are found """
+
+        low, _ = wrappers
+
+        registry.register(low, types=[custom_connection])
+
+        assert registry.find(custom_connection()) is low
+
+    def test_find_by_base_class(self, registry, wrappers, custom_connection):
+        """ Test wrappers registered for a base class handle its subclasses """
+
+        low, _ = wrappers
+
+        class SubclassedConnection(custom_connection):
+            pass
+
+        registry.register(low, types=[custom_connection])
+
+        assert registry.find(SubclassedConnection()) is low
+
+    def test_find_by_type_name(self, registry, wrappers):
+        """ Test wrappers registered by class name are found """
+
+        low, _ = wrappers
+
+        registry.register(low, types=["sqlite3.Connection"])
+
+        assert registry.find(sqlite3.connect(":memory:")) is low
+
+    def test_find_by_module(self, registry, wrappers, custom_connection):
+        """ Test wrappers registered for a package handle classes in its modules """
+
+        low, _ = wrappers
+
+        # Fixture classes are defined in the conftest module
+        registry.register(low, modules=[custom_connection.__module__.split(".")[0]])
+
+        assert registry.find(custom_connection()) is low
+
+    def test_highest_rank_wins(self, registry, wrappers, custom_connection):
+        """ Test the wrapper with the highest SEARCH_RANK is chosen """
+
+        low, high = wrappers
+
+        registry.register(high, modules=[custom_connection.__module__])
+        registry.register(low, types=[custom_connection])
+
+        assert registry.find(custom_connection()) is high
+
+    def test_not_found(self, registry, custom_connection):
+        """ Test None is returned for connections with no registered wrapper """
+
+        assert registry.find(custom_connection()) is None
+
+    def test_register_clears_cache(self, registry, wrappers, custom_connection):
+        """ Test registering a wrapper after a failed lookup makes it findable """
+
+        low, _ = wrappers
+
+        assert registry.find(custom_connection()) is None
+
+        registry.register(low, types=[custom_connection])
+
+        assert registry.find(custom_connection()) is low
+
+
+class TestWrapperRegistration:
+    """ Tests for ConnectionWrapper subclasses registering themselves """
+
+    def test_declared_wrapper_used(self, custom_connection):
+        """ Test wrappers declaring HANDLES_TYPES are used without defining handles() """
+
+        class DeclaredWrapper(dbreak.ConnectionWrapper):
+            HANDLES_TYPES = (custom_connection,)
+
+        wrapped = dbreak.connections.wrap_connection(custom_connection())
+
+        assert type(wrapped) is DeclaredWrapper
+
+    def test_undeclared_subclass_not_registered(self, custom_connection):
+        """ Test subclasses of a registered wrapper aren't registered unless they declare types themselves """
+
+        class DeclaredWrapper(dbreak.ConnectionWrapper):
+            HANDLES_TYPES = (custom_connection,)
+
+        class TestOnlyWrapper(DeclaredWrapper):
+            SEARCH_RANK = 100
+
+        assert dbreak.registry.wrapper_registry.find(custom_connection()) is DeclaredWrapper
+
+    def test_handles_fallback(self, custom_connection, custom_connection_wrapper):
+        """ Test wrappers only defining handles() are still found """
+
+        wrapped = dbreak.connections.wrap_connection(custom_connection())
+
+        assert isinstance(wrapped, custom_connection_wrapper)
+
+    def test_higher_ranked_handles_wrapper_preferred(self):
+        """ Test a wrapper only defining handles() beats a registered wrapper it outranks """
+
+        raw_connection = sqlite3.connect(":memory:")
+
+        class UserWrapper(dbreak.DBAPIWrapper):
+            SEARCH_RANK = 2
+
+            @classmethod
+            def handles(cls, candidate):
+                return candidate is raw_connection
+
+        assert type(dbreak.connections.wrap_connection(raw_connection)) is UserWrapper
+        assert type(dbreak.connections.wrap_connection(sqlite3.connect(":memory:"))) is dbreak.SQLiteWrapper
+
+    def test_handles_wrappers_not_asked_needlessly(self, monkeypatch):
+        """ Test wrappers defining handles() aren't searched when none could outrank the registered wrapper """
+
+        monkeypatch.setattr(dbreak.registry.wrapper_registry, "highest_handles_rank", dbreak.SQLiteWrapper.SEARCH_RANK)
+
+        def search_loaded_wrappers(_):
+            raise AssertionError("Loaded wrappers searched")
+
+        monkeypatch.setattr(dbreak.connections, "_search_loaded_wrappers", search_loaded_wrappers)
+
+        assert type(dbreak.connections.wrap_connection(sqlite3.connect(":memory:"))) is dbreak.SQLiteWrapper
@@ -0,0 +1,168 @@
+""" Tests for remote.py module """
+
+import io
+import sqlite3
+import threading
+
+import pytest
+
+import dbreak
+import dbreak.exc
+import dbreak.remote
+import dbreak.sessions
+
+
+@pytest.fixture()
+def threadsafe_session():
+    """ A DebugSession whose connection may be used from a server thread """
+
+    connection = dbreak.DBAPIWrapper(sqlite3.connect(":memory:", check_same_thread=False))
+
+    return dbreak.sessions.DebugSession(
+        connections={"conn1": connection}
+    )
+
+
+def start_server(session, address, timeout=None):
+    """ Serve a session from a background thread, returning (server, thread) """
+
+    server = dbreak.remote.RemoteConsoleServer(
+        session=session,
+        address=address,
+        timeout=timeout
+    )
+
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+
+    server.ready.wait(5)
+
+    return server, thread
+
+
+class TestRemoteConsoleServer:
+    """ Tests for the RemoteConsoleServer class """
+
+    def test_tcp_session(self, threadsafe_session):
+        """ Test running commands over a loopback TCP port """
+
+        server, thread = start_server(threadsafe_session, "tcp:127.0.0.1:0")
+
+        output = io.StringIO()
+
+        reason = dbreak.remote.attach(
+            server.address,
+            input_stream=io.StringIO("select 42 as answer\n!exit\n"),
+            output_stream=output
+        )
+
+        thread.join(5)
+
+        assert reason == "Debug session ended", "Session did not end"
+        assert "42" in output.getvalue(), "Query results not shown"
+        assert "conn1> " in output.getvalue(), "Prompt not shown"
+        assert not thread.is_alive(), "Server still running"
+
+    def test_unix_session_reattach(self, threadsafe_session, tmp_path):
+        """ Test a client can detach and another attach to the same session """
+
+        address = f"unix:{tmp_path / 'console.sock'}"
+
+        server, thread = start_server(threadsafe_session, address)
+
+        # First client detaches by running out of input
+        first_reason = dbreak.remote.attach(
+            address,
+            input_stream=io.StringIO("!rename renamed\n"),
+            output_stream=io.StringIO()
+        )
+
+        output = io.StringIO()
+
+        second_reason = dbreak.remote.attach(
+            address,
+            input_stream=io.StringIO("!exit\n"),
+            output_stream=output
+        )
+
+        thread.join(5)
+
+        assert first_reason == "", "First client did not detach"
+        assert "renamed> " in output.getvalue(), "Session state lost between clients"
+        assert second_reason == "Debug session ended", "Session did not end"
+        assert not (tmp_path / "console.sock").exists(), "Socket file not removed"
+
+    def test_timeout(self, threadsafe_session):
+        """ Test the server gives up when nobody attaches """
+
+        server, thread = start_server(threadsafe_session, "tcp:127.0.0.1:0", timeout=0.1)
+
+        thread.join(5)
+
+        assert server.timed_out, "Server did not time out"
+
+
+class TestParseAddress:
+    """ Tests for the parse_address function """
+
+    def test_unix(self):
+        """ Test parsing a Unix socket address """
+
+        assert dbreak.remote.parse_address("unix:/tmp/x.sock") == ("unix", "/tmp/x.sock")
+
+    def test_tcp(self):
+        """ Test parsing a TCP address """
+
+        assert dbreak.remote.parse_address("tcp:localhost:7000") == ("tcp", ("localhost", 7000))
+
+    def test_tcp_port_only(self):
+        """ Test parsing a TCP address without a host """
+
+        assert dbreak.remote.parse_address("tcp:7000") == ("tcp", ("127.0.0.1", 7000))
+
+    def test_non_loopback(self):
+        """ Test refusing to listen beyond the local machine """
+
+        with pytest.raises(dbreak.exc.RemoteConsoleError):
+            dbreak.remote.parse_address("tcp:0.0.0.0:7000")
+
+    def test_invalid(self):
+        """ Test an unrecognized address """
+
+        with pytest.raises(dbreak.exc.RemoteConsoleError):
+            dbreak.remote.parse_address("carrier-pigeon")
+
+
+class TestStartConsoleRemote:
+    """ Tests for start_console with a remote address """
+
+    def test_start_console_remote(self, tmp_path):
+        """ Test start_console serves the session over a socket """
+
+        socket_path = tmp_path / "console.sock"
+
+        thread = threading.Thread(
+            target=dbreak.start_console,
+            args=(sqlite3.connect(":memory:", check_same_thread=False),),
+            kwargs={"remote": f"unix:{socket_path}", "remote_timeout": 5},
+            daemon=True
+        )
+
+        thread.start()
+
+        # Wait for the socket to appear
+        for _ in range(500):
+            if socket_path.exists():
+                break
+            threading.Event().wait(0.01)
+
+        reason = dbreak.remote.attach(
+            f"unix:{socket_path}",
+            input_stream=io.StringIO("!exit\n"),
+            output_stream=io.StringIO()
+        )
+
+        thread.join(5)
+
+        assert reason == "Debug session ended", "Session did not end"
+        assert not thread.is_alive(), "Application did not resume"
@@ -0,0 +1,58 @@
+""" Tests for sampling.py module """
+
+import collections
+import random
+
+import pytest
+
+import dbreak.sampling
+
+
+def numbers(count):
+    """ Rows (0,), (1,), ... """
+
+    return [(number,) for number in range(count)]
+
+
+class TestSampleStream:
+    """ Tests for the sample_stream function """
+
+    def test_small_result(self, stream_of):
+        """ Test results smaller than the sample are returned whole """
+
+        sample = dbreak.sampling.sample_stream(stream_of(numbers(5), ["n"], batch_size=100), size=10)
+
+        assert sample == dbreak.sampling.Sample(rows=[(n,) for n in range(5)], scanned=5, complete=True)
+
+    def test_uniform(self, stream_of):
+        """ Test every row is about equally likely to be sampled """
+
+        generator = random.Random(1)
+
+        counts = collections.Counter()
+
+        for _ in range(2000):
+
+            sample = dbreak.sampling.sample_stream(stream_of(numbers(100), ["n"], batch_size=7), size=10, random_generator=generator)
+
+            assert len(set(sample.rows)) == 10
+
+            counts.update(row[0] // 10 for row in sample.rows)
+
+        # Each tenth of the rows should make up about a tenth of the samples
+        for tenth in range(10):
+            assert 1800 < counts[tenth] < 2200
+
+    def test_budget(self, stream_of):
+        """ Test a sample of the rows read so far is returned once the budget runs out """
+
+        sample = dbreak.sampling.sample_stream(stream_of(numbers(1000), ["n"], batch_size=100), size=10, budget=0)
+
+        assert (sample.scanned, sample.complete) == (100, False)
+        assert all(row[0] < 100 for row in sample.rows)
+
+    def test_invalid_size(self, stream_of):
+        """ Test a sample must have at least one row """
+
+        with pytest.raises(ValueError):
+            dbreak.sampling.sample_stream(stream_of(numbers(10), ["n"], batch_size=100), size=0)
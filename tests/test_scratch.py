@@ -0,0 +1,76 @@
+""" Tests for scratch.py module """
+
+import pytest
+
+import dbreak.exc
+import dbreak.scratch
+
+
+class TestStashStream:
+    """ Tests for the stash_stream function """
+
+    @pytest.fixture()
+    def scratch(self):
+        """ Opened in-memory scratch database """
+
+        wrapper = dbreak.scratch.ScratchConnection().open()
+
+        yield wrapper
+
+        wrapper.close()
+
+    def test_stash(self, scratch, stream_of):
+        """ Test rows are copied into a new table """
+
+        rows = [(1, "a"), (2, "b"), (3, "c")]
+
+        assert dbreak.scratch.stash_stream(scratch, "people", stream_of(rows)) == 3
+
+        assert scratch.execute_statement("select * from people")[0].rows == rows
+
+    def test_append_and_replace(self, scratch, stream_of):
+        """ Test adding to an existing table, and replacing it """
+
+        dbreak.scratch.stash_stream(scratch, "people", stream_of([(1, "a")]))
+        dbreak.scratch.stash_stream(scratch, "people", stream_of([(2, "b")]), append=True)
+
+        assert scratch.execute_statement("select count(*) from people")[0].rows == [(2,)]
+
+        dbreak.scratch.stash_stream(scratch, "people", stream_of([(3, "c")]), replace=True)
+
+        assert scratch.execute_statement("select * from people")[0].rows == [(3, "c")]
+
+    def test_full(self, stream_of):
+        """ Test stashing more than the size limit allows fails """
+
+        scratch = dbreak.scratch.ScratchConnection(max_bytes=64 * 1024).open()
+
+        rows = ((number, "x" * 1000) for number in range(1000))
+
+        with pytest.raises(dbreak.exc.ScratchFullError):
+            dbreak.scratch.stash_stream(scratch, "big", stream_of(rows))
+
+        scratch.close()
+
+
+class TestConfigureScratch:
+    """ Tests for the configure_scratch function """
+
+    def test_file(self, tmp_path, stream_of):
+        """ Test scratch databases kept in a file outlive the connection """
+
+        path = str(tmp_path / "scratch.db")
+
+        dbreak.scratch.configure_scratch(path=path)
+
+        try:
+            scratch = dbreak.scratch.ScratchConnection().open()
+            dbreak.scratch.stash_stream(scratch, "people", stream_of([(1, "a")]))
+            scratch.close()
+
+            scratch = dbreak.scratch.ScratchConnection().open()
+            assert scratch.execute_statement("select * from people")[0].rows == [(1, "a")]
+            scratch.close()
+
+        finally:
+            dbreak.scratch.configure_scratch()
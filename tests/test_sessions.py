@@ -6,6 +6,8 @@ import pytest
 
 import dbreak
 import dbreak.exc
+import dbreak.connections
+import dbreak.scratch
 import dbreak.sessions
 
 
@@ -28,6 +30,19 @@ class TestDebugSession:
 
         assert session.current_connection_name == "conn1"
 
+    def test_scratch(self, basic_wrapped_connections):
+        """ Test sessions get a scratch database, unless a connection already has its name """
+
+        session = dbreak.sessions.DebugSession(connections=basic_wrapped_connections)
+
+        assert isinstance(session.connections["scratch"], dbreak.scratch.ScratchConnection)
+        assert session.current_connection_name == "conn1"
+        assert "scratch" not in basic_wrapped_connections, "Caller's connections changed"
+
+        session = dbreak.sessions.DebugSession(connections={"scratch": basic_wrapped_connections["conn1"]})
+
+        assert session.connections["scratch"] is basic_wrapped_connections["conn1"]
+
     def test_init_invalid_connection_name(self):
         """ Test an initialization with an invalid current_connection_name """
 
@@ -103,3 +118,96 @@ class TestDebugSession:
             dbreak.sessions.DebugSession(
                 connections={}
             )
+
+
+class TestLazyConnections:
+    """ Tests for sessions holding connections that aren't opened yet """
+
+    @pytest.fixture()
+    def lazy_session(self, basic_wrapped_connections):
+        """ Provides a session with one open connection and one factory, along with a list of opened connections """
+
+        opened = []
+
+        def factory():
+            connection = sqlite3.connect(":memory:")
+            opened.append(connection)
+            return connection
+
+        session = dbreak.sessions.DebugSession(
+            connections={
+                "conn1": basic_wrapped_connections["conn1"],
+                "lazy": dbreak.connections.LazyConnection(factory)
+            },
+            current_connection_name="conn1"
+        )
+
+        return session, opened
+
+    def test_not_opened_until_switched(self, lazy_session):
+        """ Test the factory is only called when the connection is switched to """
+
+        session, opened = lazy_session
+
+        assert not opened
+
+        session.current_connection_name = "lazy"
+
+        assert len(opened) == 1
+        assert session.current_connection.raw_connection is opened[0]
+
+    def test_opened_once(self, lazy_session):
+        """ Test the opened connection is reused for the rest of the session """
+
+        session, opened = lazy_session
+
+        session.current_connection_name = "lazy"
+        session.current_connection_name = "conn1"
+        session.current_connection_name = "lazy"
+
+        assert len(opened) == 1
+
+    def test_starting_connection_opened_when_used(self, basic_wrapped_connections):
+        """ Test a lazy starting connection is opened by its first use """
+
+        session = dbreak.sessions.DebugSession(
+            connections={
+                "lazy": dbreak.connections.LazyConnection(lambda: sqlite3.connect(":memory:"))
+            }
+        )
+
+        assert isinstance(session.connections["lazy"], dbreak.connections.LazyConnection)
+        assert isinstance(session.current_connection, dbreak.DBAPIWrapper)
+
+    def test_close(self, lazy_session):
+        """ Test connections opened by the session are closed with it, and others left open """
+
+        session, opened = lazy_session
+
+        session.current_connection_name = "lazy"
+
+        session.close()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            opened[0].execute("select 1")
+
+        session.connections["conn1"].raw_connection.execute("select 1")
+
+    def test_failed_open_keeps_current_connection(self, basic_wrapped_connections):
+        """ Test a factory that fails leaves the session on its previous connection """
+
+        def factory():
+            raise RuntimeError("Unavailable")
+
+        session = dbreak.sessions.DebugSession(
+            connections={
+                "conn1": basic_wrapped_connections["conn1"],
+                "broken": dbreak.connections.LazyConnection(factory)
+            },
+            current_connection_name="conn1"
+        )
+
+        with pytest.raises(RuntimeError):
+            session.current_connection_name = "broken"
+
+        assert session.current_connection_name == "conn1"
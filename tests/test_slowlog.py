@@ -0,0 +1,198 @@
+""" Tests for slowlog.py module """
+
+import json
+import sqlite3
+import sys
+import threading
+import types
+
+import pytest
+
+import dbreak
+import dbreak.commands
+import dbreak.slowlog
+
+
+@pytest.fixture()
+def slow_log(tmp_path):
+    """ Slow log enabled for the duration of a test, logging every statement """
+
+    slow_log = dbreak.enable_slow_log(path=str(tmp_path / "slow.log"), threshold=0)
+
+    yield slow_log
+
+    dbreak.disable_slow_log()
+
+
+class TestSlowLog:
+    """ Tests for the SlowLog class """
+
+    def test_threshold(self, tmp_path):
+        """ Test only statements at or over the threshold are written, normalized """
+
+        slow_log = dbreak.slowlog.SlowLog(path=str(tmp_path / "slow.log"), threshold=0.5)
+
+        slow_log.record("db", "select * from t where a = 1", 0.1, 5)
+        slow_log.record("db", "select * from t where a = 2", 0.75, 5)
+
+        slow_log.close()
+
+        with open(tmp_path / "slow.log") as file:
+            entries = [json.loads(line) for line in file]
+
+        assert len(entries) == 1
+        assert entries[0]["connection"] == "db"
+        assert entries[0]["duration_ms"] == 750.0
+        assert entries[0]["rows"] == 5
+        assert entries[0]["statement"] == "select * from t where a = ?"
+
+    def test_entries_filtered(self, tmp_path):
+        """ Test entries are read back newest first, across rotated files, with filters applied """
+
+        slow_log = dbreak.slowlog.SlowLog(path=str(tmp_path / "slow.log"), threshold=0, max_bytes=300)
+
+        for number in range(10):
+            slow_log.record("a" if number % 2 else "b", f"select {number} from orders", number, None)
+
+        entries = slow_log.entries(connection="a", min_ms=4000)
+
+        slow_log.close()
+
+        assert [entry["duration_ms"] for entry in entries] == [9000, 7000, 5000]
+        assert (tmp_path / "slow.log.1").exists(), "Log wasn't rotated"
+
+    def test_entries_limited(self, tmp_path):
+        """ Test the number of entries returned is limited """
+
+        slow_log = dbreak.slowlog.SlowLog(path=str(tmp_path / "slow.log"), threshold=0)
+
+        for number in range(5):
+            slow_log.record("db", "select * from Orders", number, 1)
+
+        entries = slow_log.entries(limit=2, contains="orders")
+
+        slow_log.close()
+
+        assert [entry["duration_ms"] for entry in entries] == [4000, 3000]
+
+    def test_overlapping_flushes(self, tmp_path):
+        """ Test flushes from several threads at once each see the entries recorded before them """
+
+        slow_log = dbreak.slowlog.SlowLog(path=str(tmp_path / "slow.log"), threshold=0)
+
+        def record_and_flush(number: int):
+            for iteration in range(20):
+                slow_log.record(f"db{number}", "select 1", 1, 1)
+                slow_log.flush()
+
+        threads = [threading.Thread(target=record_and_flush, args=(number,)) for number in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        entries = slow_log.entries(limit=100)
+
+        slow_log.close()
+
+        assert len(entries) == 80, "Entries lost or duplicated"
+
+
+class TestSlowLogConnection:
+    """ Tests for the SlowLogConnection class """
+
+    def test_logged_after_fetch(self, slow_log):
+        """ Test application statements are logged with the rows fetched """
+
+        connection = dbreak.SlowLogConnection(sqlite3.connect(":memory:"), name="app")
+
+        cursor = connection.cursor()
+        cursor.execute("select 1 union all select 2")
+
+        assert slow_log.entries() == [], "Logged before results were fetched"
+
+        assert list(cursor) == [(1,), (2,)]
+
+        entries = slow_log.entries()
+
+        assert len(entries) == 1
+        assert entries[0]["connection"] == "app"
+        assert entries[0]["rows"] == 2
+        assert entries[0]["statement"] == "select ? union all select ?"
+
+    def test_rows_affected(self, slow_log):
+        """ Test statements without results are logged with the rows they affected """
+
+        connection = dbreak.SlowLogConnection(sqlite3.connect(":memory:"), name="app")
+
+        connection.execute("create table t (a)")
+        connection.executemany("insert into t values (?)", [(1,), (2,), (3,)])
+
+        assert slow_log.entries(limit=1)[0]["rows"] == 3
+
+    def test_driver_paramstyle(self, monkeypatch):
+        """ Test wrappers bind variables in the wrapped driver's paramstyle, not qmark """
+
+        driver = types.ModuleType("pyformatdriver")
+        driver.paramstyle = "pyformat"
+
+        monkeypatch.setitem(sys.modules, "pyformatdriver", driver)
+
+        DriverConnection = type("DriverConnection", (), {"__module__": "pyformatdriver"})
+
+        wrapper = dbreak.DBAPIWrapper(dbreak.SlowLogConnection(DriverConnection(), name="app"))
+
+        assert wrapper.paramstyle == "pyformat"
+
+    def test_disabled(self):
+        """ Test statements run normally while the slow log is disabled """
+
+        connection = dbreak.SlowLogConnection(sqlite3.connect(":memory:"), name="app")
+
+        assert connection.execute("select 1").fetchall() == [(1,)]
+
+
+class TestSlowlogCommand:
+    """ Tests for the !slowlog command """
+
+    def test_console_statements(self, basic_debug_session, slow_log):
+        """ Test statements run from the console are logged and shown """
+
+        dbreak.commands.execute_command("select 1", basic_debug_session)
+        dbreak.commands.execute_command("select 2 union all select 3", basic_debug_session)
+
+        outputs = dbreak.commands.execute_command("!slowlog limit=1", basic_debug_session)
+
+        _, connection, _, rows, statement = outputs[0].rows[0]
+
+        assert (connection, rows, statement) == ("conn1", 2, "select ? union all select ?")
+
+    def test_console_statement_logged_once(self, slow_log):
+        """ Test console statements on a SlowLogConnection aren't logged again by the connection """
+
+        session = dbreak.sessions.DebugSession(
+            current_connection_name="app",
+            connections={
+                "app": dbreak.DBAPIWrapper(dbreak.SlowLogConnection(sqlite3.connect(":memory:"), name="app"))
+            }
+        )
+
+        dbreak.commands.execute_command("select 1", session)
+        dbreak.commands.execute_command("select 2", session)
+
+        assert len(slow_log.entries()) == 2, "Console statements logged more than once"
+
+    def test_not_enabled(self, basic_debug_session):
+        """ Test a message is shown while the slow log is disabled """
+
+        outputs = dbreak.commands.execute_command("!slowlog", basic_debug_session)
+
+        assert "isn't enabled" in outputs[0]
+
+    def test_unknown_filter(self, basic_debug_session, slow_log):
+        """ Test unrecognized filters are reported """
+
+        with pytest.raises(ValueError):
+            dbreak.commands.execute_command("!slowlog fastest=1", basic_debug_session)
@@ -0,0 +1,148 @@
+""" Tests for spill.py module """
+
+import datetime
+import os
+import sqlite3
+
+import pytest
+
+import dbreak.spill
+
+
+@pytest.fixture()
+def store():
+    """ SpilledRows store holding a few rows """
+
+    store = dbreak.spill.SpilledRows(column_count=2)
+
+    store.extend([("c", 3), ("a", 1), ("b", None), ("a", 2)])
+
+    yield store
+
+    store.close()
+
+
+class TestSpilledRows:
+    """ Tests for the SpilledRows class """
+
+    def test_sequence(self, store):
+        """ Test rows are read back in their original order """
+
+        assert len(store) == 4
+        assert list(store) == [("c", 3), ("a", 1), ("b", None), ("a", 2)]
+        assert store[1] == ("a", 1)
+        assert store[-1] == ("a", 2)
+        assert store[1:3] == [("a", 1), ("b", None)]
+
+        with pytest.raises(IndexError):
+            store[4]
+
+    def test_select_sorted(self, store):
+        """ Test sorting is stable, with the original order breaking ties """
+
+        rows = list(store.select(order_by=[(0, False)]))
+
+        assert rows == [("a", 1), ("a", 2), ("b", None), ("c", 3)]
+
+        rows = list(store.select(order_by=[(0, True), (1, True)], limit=2))
+
+        assert rows == [("c", 3), ("b", None)]
+
+    def test_select_filtered(self, store):
+        """ Test conditions are all applied """
+
+        assert list(store.select(conditions=[(0, "=", "a"), (1, ">", 1)])) == [("a", 2)]
+        assert list(store.select(conditions=[(1, "=", None)])) == [("b", None)]
+        assert store.count(conditions=[(1, "!=", None)]) == 3
+
+        with pytest.raises(ValueError):
+            store.count(conditions=[(1, "like", "a%")])
+
+    def test_original_values_kept(self):
+        """ Test values sqlite can't store are returned as they were """
+
+        day = datetime.date(2020, 1, 2)
+
+        store = dbreak.spill.SpilledRows(column_count=1)
+
+        store.extend([(day,)])
+
+        assert store[0] == (day,)
+        assert list(store.select(conditions=[(0, "=", day)])) == [(day,)]
+
+        store.close()
+
+    def test_close(self):
+        """ Test closing a store deletes its file """
+
+        store = dbreak.spill.SpilledRows(column_count=1)
+
+        path = store.path
+
+        store.close()
+
+        assert not os.path.exists(path)
+
+
+class TestCollectRows:
+    """ Tests for the collect_rows function """
+
+    def test_within_budget(self):
+        """ Test rows within the budget stay in memory """
+
+        rows = dbreak.spill.collect_rows(iter([(1,), (2,)]), column_count=1)
+
+        assert rows == [(1,), (2,)]
+
+    def test_over_budget(self):
+        """ Test rows over the budget are all moved to disk """
+
+        rows = dbreak.spill.collect_rows(((number,) for number in range(10)), column_count=1, budget_bytes=200)
+
+        assert isinstance(rows, dbreak.spill.SpilledRows)
+        assert list(rows) == [(number,) for number in range(10)]
+
+        rows.close()
+
+    def test_driver_rows(self):
+        """ Test rows of unpicklable driver types, such as sqlite3.Row, are spilled as tuples """
+
+        connection = sqlite3.connect(":memory:")
+        connection.row_factory = sqlite3.Row
+
+        cursor = connection.execute("select 1 as x union all select 2 union all select 3")
+
+        rows = dbreak.spill.collect_rows(cursor, column_count=1, budget_bytes=1)
+
+        assert isinstance(rows, dbreak.spill.SpilledRows)
+        assert list(rows) == [(1,), (2,), (3,)]
+
+        rows.close()
+        connection.close()
+
+
+class TestHashPartitions:
+    """ Tests for the HashPartitions class """
+
+    def test_partitions(self):
+        """ Test records with equal keys land in the same partition, and files are removed when closed """
+
+        partitions = dbreak.spill.HashPartitions(count=4)
+
+        for number in range(20):
+            partitions.add(number % 5, (number % 5, number))
+
+        records = [list(partitions.read(partition)) for partition in range(4)]
+
+        assert sorted(record for partition in records for record in partition) == sorted((n % 5, n) for n in range(20))
+
+        for partition in records:
+            assert all(partitions.partition_of(key) == records.index(partition) for key, _ in partition)
+
+        # Records can still be added after reading
+        partitions.add(0, (0, 20))
+        assert (0, 20) in partitions.read(partitions.partition_of(0))
+
+        partitions.close()
+
+        assert not os.path.exists(partitions.directory)
@@ -0,0 +1,335 @@
+""" Tests for sqlite.py module """
+
+import sqlite3
+import threading
+
+import pytest
+
+import dbreak
+import dbreak.commands
+import dbreak.connections
+import dbreak.exc
+import dbreak.sessions
+
+# Statement that keeps sqlite busy for a long time
+SLOW_STATEMENT = """
+    with recursive counter(n) as (select 1 union all select n + 1 from counter)
+    select count(*) from counter
+"""
+
+
+@pytest.fixture()
+def wrapper():
+    """ A SQLiteWrapper around an in-memory database """
+
+    return dbreak.SQLiteWrapper(sqlite3.connect(":memory:", check_same_thread=False))
+
+
+@pytest.fixture()
+def session(wrapper):
+    """ A DebugSession using the wrapper """
+
+    return dbreak.sessions.DebugSession(
+        connections={"conn1": wrapper}
+    )
+
+
+class TestSQLiteWrapper:
+    """ Tests for the SQLiteWrapper class """
+
+    def test_chosen_for_sqlite(self, basic_raw_connections):
+        """ Test sqlite3 connections are given a SQLiteWrapper """
+
+        wrapped = dbreak.connections.wrap_connection(basic_raw_connections["conn1"])
+
+        assert type(wrapped) is dbreak.SQLiteWrapper
+
+    def test_not_chosen_for_other_dbapi(self):
+        """ Test other DB API connections are still given a DBAPIWrapper when found via handles() """
+
+        class OtherConnection:
+
+            def cursor(self):
+                pass
+
+            def commit(self):
+                pass
+
+            def close(self):
+                pass
+
+        assert dbreak.connections.ConnectionWrapper.find_handler(OtherConnection()) is dbreak.DBAPIWrapper
+        assert type(dbreak.connections.wrap_connection(OtherConnection())) is dbreak.DBAPIWrapper
+
+    def test_execute(self, wrapper):
+        """ Test statements still return results """
+
+        assert wrapper.execute_statement("select 1 as x")[0].rows == [(1,)]
+
+    def test_script(self, wrapper):
+        """ Test several statements are run as a script """
+
+        wrapper.execute_statement("create table t (x int); insert into t values (1); insert into t values (2);")
+
+        assert wrapper.execute_statement("select count(*) from t")[0].rows == [(2,)]
+
+    def test_script_results(self, wrapper):
+        """ Test each statement in a script returns its results, with semicolons in literals left alone """
+
+        outputs = wrapper.execute_statement("select 'a;b' as x; select 2 as y")
+
+        assert [output.rows for output in outputs] == [[("a;b",)], [(2,)]]
+
+    def test_script_keeps_transaction(self, wrapper):
+        """ Test a script leaves the application's open transaction open """
+
+        wrapper.raw_connection.execute("create table t (x int)")
+        wrapper.raw_connection.commit()
+
+        wrapper.raw_connection.execute("insert into t values (1)")
+
+        wrapper.execute_statement("select 1; select 2")
+
+        assert wrapper.raw_connection.in_transaction, "Application's transaction committed"
+
+        wrapper.raw_connection.rollback()
+
+        assert wrapper.execute_statement("select count(*) from t")[0].rows == [(0,)]
+
+    def test_timeout(self, wrapper):
+        """ Test statements running past the timeout are cancelled """
+
+        wrapper.statement_timeout = 0.05
+
+        with pytest.raises(dbreak.exc.StatementCancelledError):
+            wrapper.execute_statement(SLOW_STATEMENT)
+
+        # The connection is still usable afterwards
+        assert wrapper.execute_statement("select 1")[0].rows == [(1,)]
+
+    def test_cancel(self, wrapper):
+        """ Test cancelling a statement from another thread """
+
+        timer = threading.Timer(0.05, wrapper.cancel)
+        timer.start()
+
+        try:
+            with pytest.raises(dbreak.exc.StatementCancelledError):
+                wrapper.execute_statement(SLOW_STATEMENT)
+        finally:
+            timer.cancel()
+
+    def test_progress(self, wrapper, capsys):
+        """ Test long-running statements are reported on """
+
+        wrapper.statement_timeout = 0.2
+        wrapper.progress_interval = 0.05
+
+        with pytest.raises(dbreak.exc.StatementCancelledError):
+            wrapper.execute_statement(SLOW_STATEMENT)
+
+        assert "Statement still running" in capsys.readouterr().err
+
+    def test_application_progress_handler_restored(self, wrapper):
+        """ Test a progress handler set through the wrapper is put back after console statements """
+
+        calls = []
+
+        wrapper.set_progress_handler(lambda: calls.append(1) or 0, 1)
+
+        wrapper.execute_statement("select 1")
+
+        calls.clear()
+
+        wrapper.raw_connection.execute("select 1").fetchall()
+
+        assert calls
+
+
+class TestCommands:
+    """ Tests for the SQLiteWrapper's custom commands """
+
+    def test_timeout_command(self, session, wrapper):
+        """ Test !timeout sets and clears the statement timeout """
+
+        dbreak.commands.execute_command("!timeout 2.5", session)
+
+        assert wrapper.statement_timeout == 2.5
+
+        dbreak.commands.execute_command("!timeout 0", session)
+
+        assert wrapper.statement_timeout is None
+
+    def test_tune_restored_on_detach(self, session, wrapper):
+        """ Test tuned PRAGMAs are restored when the session ends """
+
+        original = wrapper.raw_connection.execute("PRAGMA cache_size").fetchone()[0]
+
+        outputs = dbreak.commands.execute_command("!tune cache_size -4000", session)
+
+        assert ("cache_size", -4000, original) in outputs[0].rows
+
+        session.close()
+
+        assert wrapper.raw_connection.execute("PRAGMA cache_size").fetchone()[0] == original
+
+    def test_tune_unknown_pragma(self, session):
+        """ Test only the tunable PRAGMAs can be set """
+
+        with pytest.raises(ValueError):
+            dbreak.commands.execute_command("!tune synchronous off", session)
+
+    def test_tune_invalid_value(self, session):
+        """ Test values that aren't numbers or words are rejected """
+
+        with pytest.raises(ValueError):
+            dbreak.commands.execute_command("!tune cache_size 1;drop", session)
+
+    def test_stats(self, session):
+        """ Test !stats shows sqlite_stat1 once ANALYZE has run """
+
+        assert dbreak.commands.execute_command("!stats", session) == [
+            "No statistics found. Run ANALYZE to gather them."
+        ]
+
+        dbreak.commands.execute_command(
+            "create table t (x int); create index t_x on t (x); "
+            "insert into t values (1); insert into t values (1); analyze;",
+            session
+        )
+
+        outputs = dbreak.commands.execute_command("!stats", session)
+
+        assert outputs[0].rows == [("t", "t_x", "2", "2")]
+
+
+class TestIsolatedReads:
+    """ Tests for sending reads to a separate read-only connection """
+
+    @pytest.fixture()
+    def file_session(self, tmp_path):
+        """ A DebugSession on a WAL-mode database file, with an uncommitted insert pending """
+
+        connection = sqlite3.connect(str(tmp_path / "app.db"), check_same_thread=False)
+
+        connection.execute("PRAGMA journal_mode = wal")
+        connection.execute("create table t (x int)")
+        connection.commit()
+
+        # Left uncommitted, as if paused mid-transaction
+        connection.execute("insert into t values (1)")
+
+        return dbreak.sessions.DebugSession(
+            connections={"conn1": dbreak.SQLiteWrapper(connection)}
+        )
+
+    def test_reads_skip_open_transaction(self, file_session):
+        """ Test isolated reads don't see the application's uncommitted changes """
+
+        dbreak.commands.execute_command("!isolate", file_session)
+
+        outputs = dbreak.commands.execute_command("select count(*) from t", file_session)
+
+        assert outputs[0].rows == [(0,)]
+
+    def test_writes_need_write_command(self, file_session):
+        """ Test statements that may write must be sent with !write """
+
+        dbreak.commands.execute_command("!isolate", file_session)
+
+        with pytest.raises(dbreak.exc.WriteNotRoutedError):
+            dbreak.commands.execute_command("insert into t values (2)", file_session)
+
+        dbreak.commands.execute_command("!write insert into t values (2)", file_session)
+
+        raw_connection = file_session.current_connection.raw_connection
+
+        assert raw_connection.execute("select count(*) from t").fetchone() == (2,)
+
+    def test_bench_routed(self, file_session):
+        """ Test !bench runs reads on the read connection, and won't run writes """
+
+        file_session.current_connection.raw_connection.execute("create table pending (x int)")
+
+        dbreak.commands.execute_command("!isolate", file_session)
+
+        with pytest.raises(sqlite3.OperationalError, match="no such table"):
+            dbreak.commands.execute_command("!bench 2 select * from pending", file_session)
+
+        with pytest.raises(dbreak.exc.WriteNotRoutedError):
+            dbreak.commands.execute_command("!bench 2 insert into t values (2)", file_session)
+
+        raw_connection = file_session.current_connection.raw_connection
+
+        assert raw_connection.execute("select count(*) from t").fetchone() == (1,)
+
+    def test_explain_routed(self, file_session):
+        """ Test !explain plans reads on the read connection """
+
+        file_session.current_connection.raw_connection.execute("create table pending (x int)")
+
+        dbreak.commands.execute_command("!isolate", file_session)
+
+        with pytest.raises(sqlite3.OperationalError, match="no such table"):
+            dbreak.commands.execute_command("!explain select * from pending", file_session)
+
+        outputs = dbreak.commands.execute_command("!explain select * from t", file_session)
+
+        assert outputs, "Plan not shown"
+
+    def test_toggle_off(self, file_session):
+        """ Test a second !isolate sends reads to the application's connection again """
+
+        dbreak.commands.execute_command("!isolate", file_session)
+        dbreak.commands.execute_command("!isolate", file_session)
+
+        assert file_session.current_connection.read_connection is None
+
+        outputs = dbreak.commands.execute_command("select count(*) from t", file_session)
+
+        assert outputs[0].rows == [(1,)]
+
+    def test_closed_with_session(self, file_session):
+        """ Test the read connection is closed when the session ends """
+
+        dbreak.commands.execute_command("!isolate", file_session)
+
+        reader = file_session.current_connection.read_connection
+
+        file_session.close()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            reader.raw_connection.execute("select 1")
+
+    def test_memory_database(self, session):
+        """ Test in-memory databases can't be isolated """
+
+        with pytest.raises(dbreak.exc.ReadConnectionUnavailableError):
+            dbreak.commands.execute_command("!isolate", session)
+
+
+class TestExplain:
+    """ Tests for explaining statements """
+
+    def test_explain_command(self, session):
+        """ Test !explain shows the plan with full scans flagged """
+
+        dbreak.commands.execute_command("create table t (a int, b int); create index t_a on t (a)", session)
+        dbreak.commands.execute_command("!set b 1", session)
+
+        outputs = dbreak.commands.execute_command("!explain select * from t where b = :b order by b + 1", session)
+
+        table = outputs[0]
+
+        assert table.columns == ["Plan", "Flags"]
+        assert ("SCAN t", "FULL SCAN") in table.rows
+        assert ("USE TEMP B-TREE FOR ORDER BY", "TEMP B-TREE") in table.rows
+
+    def test_explain_index(self, session):
+        """ Test searches using an index aren't flagged """
+
+        dbreak.commands.execute_command("create table t (a int, b int); create index t_a on t (a)", session)
+
+        outputs = dbreak.commands.execute_command("!explain select * from t where a = 1", session)
+
+        assert outputs[0].rows == [("SEARCH t USING INDEX t_a (a=?)", "")]
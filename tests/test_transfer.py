@@ -0,0 +1,95 @@
+""" Tests for transfer.py module """
+
+import sqlite3
+
+import pytest
+
+import dbreak
+import dbreak.transfer
+
+
+def wrapper(check_same_thread=True):
+    """ Wrapped in-memory sqlite connection """
+
+    return dbreak.DBAPIWrapper(sqlite3.connect(":memory:", check_same_thread=check_same_thread))
+
+
+def numbers_stream(source, count=2500):
+    """ Stream of count numbers from a source connection, fetched 1000 at a time """
+
+    return source.stream_statement(
+        "with recursive n(x) as (select 1 union all select x + 1 from n where x < :count) select x, 'row ' || x as label from n",
+        {"count": count}
+    )
+
+
+class TestCopyStream:
+    """ Tests for the copy_stream function """
+
+    @pytest.mark.parametrize("source_threads, target_threads, worker", [
+        (True, True, "fetch"),
+        (False, True, "insert"),
+        (False, False, None)
+    ])
+    def test_copy(self, source_threads, target_threads, worker):
+        """ Test whichever connection can be used from another thread is handed to the worker """
+
+        source = wrapper(check_same_thread=not source_threads)
+        target = wrapper(check_same_thread=not target_threads)
+
+        with numbers_stream(source) as stream:
+            result = dbreak.transfer.copy_stream(stream, source, target, "numbers", create=True, commit_rows=1000)
+
+        assert (result.rows, result.commits, result.worker) == (2500, 3, worker)
+
+        rows = target.execute_statement("select count(*), sum(x), max(label) from numbers")[0].rows
+
+        assert rows == [(2500, 2500 * 2501 // 2, "row 999")]
+
+    def test_existing_table(self):
+        """ Test copying into a table that already exists """
+
+        source, target = wrapper(False), wrapper(False)
+
+        target.execute_statement("create table numbers (x integer, label text)")
+
+        with numbers_stream(source, 10) as stream:
+            result = dbreak.transfer.copy_stream(stream, source, target, "numbers")
+
+        assert result.rows == 10
+
+    def test_error(self):
+        """ Test an error inserting stops the copy and is raised """
+
+        source, target = wrapper(False), wrapper(False)
+
+        with numbers_stream(source) as stream:
+            with pytest.raises(sqlite3.OperationalError):
+                dbreak.transfer.copy_stream(stream, source, target, "missing")
+
+    def test_error_rolled_back(self):
+        """ Test rows inserted since the last commit are rolled back when the copy fails """
+
+        source, target = wrapper(False), wrapper(False)
+
+        target.execute_statement("create table numbers (x integer check (x <= 1500), label text)")
+
+        with numbers_stream(source) as stream:
+            with pytest.raises(sqlite3.IntegrityError):
+                dbreak.transfer.copy_stream(stream, source, target, "numbers", commit_rows=1000)
+
+        assert not target.raw_connection.in_transaction, "Transaction left open"
+        assert target.execute_statement("select count(*) from numbers")[0].rows == [(1000,)]
+
+
+class TestCopySummary:
+    """ Tests for the copy_summary function """
+
+    def test_summary(self):
+        """ Test throughput is reported """
+
+        result = dbreak.transfer.CopyResult(rows=5000, seconds=2.0, commits=1, worker="fetch")
+
+        summary = dbreak.transfer.copy_summary(result, "numbers")
+
+        assert summary.startswith("Copied 5000 row(s) into numbers in 2.00s (2,500 rows/s, 1 commit(s))")
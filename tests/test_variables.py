@@ -0,0 +1,116 @@
+""" Tests for variables.py module """
+
+import pytest
+
+import dbreak.variables
+
+
+class TestBindVariables:
+    """ Tests for the bind_variables function """
+
+    @pytest.mark.parametrize(
+        "paramstyle,expected_statement,expected_parameters",
+        [
+            ("qmark", "select * from t where a = ? and b = ?", [1, "x"]),
+            ("numeric", "select * from t where a = :1 and b = :2", [1, "x"]),
+            ("named", "select * from t where a = :a and b = :b", {"a": 1, "b": "x"}),
+            ("format", "select * from t where a = %s and b = %s", [1, "x"]),
+            ("pyformat", "select * from t where a = %(a)s and b = %(b)s", {"a": 1, "b": "x"}),
+        ]
+    )
+    def test_paramstyles(self, paramstyle, expected_statement, expected_parameters):
+        """ Test rewriting placeholders for each DB API paramstyle """
+
+        statement, parameters = dbreak.variables.bind_variables(
+            statement="select * from t where a = :a and b = :b",
+            variables={"a": 1, "b": "x"},
+            paramstyle=paramstyle
+        )
+
+        assert statement == expected_statement, "Unexpected statement"
+        assert parameters == expected_parameters, "Unexpected parameters"
+
+    def test_no_variables_referenced(self):
+        """ Test statements without variables are left alone """
+
+        statement, parameters = dbreak.variables.bind_variables(
+            statement="select '100%' as a",
+            variables={"a": 1},
+            paramstyle="format"
+        )
+
+        assert statement == "select '100%' as a", "Statement was changed"
+        assert parameters is None, "Unexpected parameters"
+
+    def test_ignored_contexts(self):
+        """ Test :name inside literals, comments and casts isn't bound """
+
+        statement, parameters = dbreak.variables.bind_variables(
+            statement="select ':a', \":a\", x::a, :a -- :a\n/* :a */",
+            variables={"a": 1},
+            paramstyle="qmark"
+        )
+
+        assert statement == "select ':a', \":a\", x::a, ? -- :a\n/* :a */", "Unexpected statement"
+        assert parameters == [1], "Unexpected parameters"
+
+    def test_unknown_variable(self):
+        """ Test references to unknown variables are left for the driver """
+
+        statement, parameters = dbreak.variables.bind_variables(
+            statement="select :a, :b",
+            variables={"a": 1},
+            paramstyle="qmark"
+        )
+
+        assert statement == "select ?, :b", "Unexpected statement"
+        assert parameters == [1], "Unexpected parameters"
+
+    def test_percent_escaped(self):
+        """ Test literal percent signs are doubled for percent-based paramstyles """
+
+        statement, _ = dbreak.variables.bind_variables(
+            statement="select * from t where name like 'a%' and id = :id",
+            variables={"id": 1},
+            paramstyle="pyformat"
+        )
+
+        assert statement == "select * from t where name like 'a%%' and id = %(id)s", "Unexpected statement"
+
+
+class TestParseValue:
+    """ Tests for the parse_value function """
+
+    @pytest.mark.parametrize(
+        "text,expected",
+        [
+            ("42", 42),
+            ("1.5", 1.5),
+            ("None", None),
+            ("'quoted'", "quoted"),
+            ("plain text", "plain text"),
+        ]
+    )
+    def test_parse_value(self, text, expected):
+        """ Test converting console text into values """
+
+        assert dbreak.variables.parse_value(text) == expected, "Unexpected value"
+
+
+class TestRowPlaceholders:
+    """ Tests for the row_placeholders function """
+
+    @pytest.mark.parametrize("paramstyle, expected_placeholders, expected_parameters", [
+        ("qmark", ["?", "?"], (1, "a")),
+        ("numeric", [":1", ":2"], (1, "a")),
+        ("named", [":p1", ":p2"], {"p1": 1, "p2": "a"}),
+        ("format", ["%s", "%s"], (1, "a")),
+        ("pyformat", ["%(p1)s", "%(p2)s"], {"p1": 1, "p2": "a"})
+    ])
+    def test_paramstyles(self, paramstyle, expected_placeholders, expected_parameters):
+        """ Test placeholders and parameters for each paramstyle """
+
+        placeholders, to_parameters = dbreak.variables.row_placeholders(paramstyle, 2)
+
+        assert placeholders == expected_placeholders
+        assert to_parameters([1, "a"]) == expected_parameters
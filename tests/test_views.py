@@ -0,0 +1,113 @@
+""" Tests for views.py module """
+
+import pytest
+
+import dbreak.outputs
+import dbreak.spill
+import dbreak.views
+
+ROWS = [
+    (1, "b", 2.5),
+    (2, "a", None),
+    (3, "b", 1),
+    (4, None, 7),
+    (5, "c", 1)
+]
+
+
+@pytest.fixture(params=["memory", "spilled"])
+def view(request):
+    """ View of the same rows, held in memory or spilled to disk """
+
+    if request.param == "memory":
+        rows = list(ROWS)
+    else:
+        rows = dbreak.spill.SpilledRows(column_count=3)
+        rows.extend(ROWS)
+
+    yield dbreak.views.ResultView(dbreak.outputs.TableOutput(rows=rows, columns=["id", "Name", "score"]))
+
+    if request.param == "spilled":
+        rows.close()
+
+
+def ids(view):
+    """ Returns the ids of the rows in a view """
+
+    return [row[0] for row in view.rows()]
+
+
+class TestResultView:
+    """ Tests for the ResultView class, run against rows in memory and on disk """
+
+    @pytest.mark.parametrize("column, operator, value, expected", [
+        ("name", "=", "b", [1, 3]),
+        ("name", "!=", "b", [2, 5]),
+        ("name", "=", None, [4]),
+        ("name", "!=", None, [1, 2, 3, 5]),
+        ("score", "=", 1, [3, 5]),
+        ("score", "<", 2.5, [3, 5]),
+        ("score", "<=", 2.5, [1, 3, 5]),
+        ("score", ">", 1, [1, 4]),
+        ("score", ">=", 7, [4]),
+        ("name", ">", "a", [1, 3, 5])
+    ])
+    def test_where(self, view, column, operator, value, expected):
+        """ Test each operator matches as sqlite would, with NULLs never matching ranges """
+
+        view.where(column, operator, value)
+
+        assert ids(view) == expected
+        assert len(view) == len(expected)
+
+    def test_where_combined(self, view):
+        """ Test filters are combined, and can be cleared """
+
+        view.where("name", "=", "b")
+        view.where("score", "<", 2)
+
+        assert ids(view) == [3]
+
+        view.clear_conditions()
+
+        assert ids(view) == [1, 2, 3, 4, 5]
+
+    @pytest.mark.parametrize("order_by, expected", [
+        ([("score", False)], [2, 3, 5, 1, 4]),
+        ([("score", True)], [4, 1, 3, 5, 2]),
+        ([("name", False), ("score", True)], [4, 2, 1, 3, 5]),
+        ([], [1, 2, 3, 4, 5])
+    ])
+    def test_sort(self, view, order_by, expected):
+        """ Test sorting is stable in both directions, with NULLs first when ascending """
+
+        view.sort(order_by)
+
+        assert ids(view) == expected
+
+    def test_sort_filtered_window(self, view):
+        """ Test sorting, filtering and windowing together """
+
+        view.where("score", "!=", None)
+        view.sort([("score", True)])
+
+        assert [row[0] for row in view.rows(offset=1, limit=2)] == [1, 3]
+
+    def test_columns(self, view):
+        """ Test choosing columns, ignoring the case of their names """
+
+        view.select_columns(["SCORE", "id"])
+
+        assert view.columns == ["score", "id"]
+        assert next(view.rows()) == (2.5, 1)
+
+        with pytest.raises(KeyError):
+            view.select_columns(["missing"])
+
+    def test_describe(self, view):
+        """ Test describing the filters and sort order """
+
+        view.where("name", "=", "b")
+        view.sort([("id", True)])
+
+        assert view.describe() == "2 of 5 row(s) where Name = 'b', sorted by id desc"